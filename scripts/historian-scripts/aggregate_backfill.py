@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*- {{{
+# ===----------------------------------------------------------------------===
+#
+#                 Component of Eclipse VOLTTRON
+#
+# ===----------------------------------------------------------------------===
+#
+# Copyright 2023 Battelle Memorial Institute
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not
+# use this file except in compliance with the License. You may obtain a copy
+# of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+#
+# ===----------------------------------------------------------------------===
+# }}}
+
+"""
+Backfill historical aggregates with a running aggregate historian.
+
+Starts a backfill job through the aggregate historian's backfill RPC and prints its progress until the job
+finishes. Chunks completed by an earlier run are skipped, so an interrupted backfill can be resumed by running
+the same command again. The volttron instance must be running.
+
+Example::
+
+    python aggregate_backfill.py --vip-identity aggregate-historian --start 2020-01-01T00:00:00 \\
+        --aggregation-period 1h --max-workers 4
+"""
+
+import argparse
+import sys
+import time
+
+from volttron.platform.vip.agent.utils import build_agent
+
+
+def print_status(status):
+    print("{job_id}: {state} {percent_complete:5.1f}% ({completed_chunks} completed, {skipped_chunks} skipped, "
+          "{failed_chunks} failed of {total_chunks} chunks) {elapsed_seconds}s".format(**status))
+    for error in status['errors']:
+        print("  error: {}".format(error))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--vip-identity", required=True, help="vip identity of the aggregate historian")
+    parser.add_argument("--start", help="start of the time range to backfill (ISO 8601)")
+    parser.add_argument("--end", help="end of the time range to backfill (ISO 8601). Defaults to the start of "
+                                      "the live aggregation schedule")
+    parser.add_argument("--aggregation-period", help="only backfill this aggregation period, for example 1h")
+    parser.add_argument("--max-workers", type=int, help="number of chunks computed in parallel")
+    parser.add_argument("--chunk-size", type=int, help="number of aggregation periods in a chunk")
+    parser.add_argument("--status", metavar="JOB_ID", help="print the status of a backfill job and exit")
+    parser.add_argument("--cancel", metavar="JOB_ID", help="cancel a backfill job and exit")
+    parser.add_argument("--no-wait", action="store_true", help="exit once the backfill job is started")
+    parser.add_argument("--interval", type=float, default=5, help="seconds between progress updates")
+    args = parser.parse_args()
+
+    if not (args.start or args.status or args.cancel):
+        parser.error("one of --start, --status or --cancel is required")
+
+    agent = build_agent()
+    try:
+        if args.status:
+            print_status(agent.vip.rpc.call(args.vip_identity, "get_backfill_status", args.status).get(timeout=10))
+            return 0
+        if args.cancel:
+            print_status(agent.vip.rpc.call(args.vip_identity, "cancel_backfill", args.cancel).get(timeout=10))
+            return 0
+
+        status = agent.vip.rpc.call(args.vip_identity, "backfill", args.start, end=args.end,
+                                    aggregation_period=args.aggregation_period, max_workers=args.max_workers,
+                                    chunk_size=args.chunk_size).get(timeout=60)
+        print_status(status)
+        while not args.no_wait and status['state'] == 'RUNNING':
+            time.sleep(args.interval)
+            status = agent.vip.rpc.call(args.vip_identity, "get_backfill_status",
+                                        status['job_id']).get(timeout=10)
+            print_status(status)
+        return 1 if status['state'] == 'FAILED' else 0
+    except KeyboardInterrupt:
+        print("Stopped following the backfill. The job keeps running in the aggregate historian")
+        return 0
+    finally:
+        agent.core.stop()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*- {{{
+# ===----------------------------------------------------------------------===
+#
+#                 Component of Eclipse VOLTTRON
+#
+# ===----------------------------------------------------------------------===
+#
+# Copyright 2023 Battelle Memorial Institute
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not
+# use this file except in compliance with the License. You may obtain a copy
+# of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+#
+# ===----------------------------------------------------------------------===
+# }}}
+
+"""
+Compare the ingest rate of the PostgreSQL historian bulk insert paths.
+
+Inserts the same generated records with INSERT ... ON CONFLICT (execute_values) and with COPY into a temporary
+table followed by a merge, and prints rows/sec for each. Tables are created with the given table prefix and
+dropped at the end.
+
+Example::
+
+    python benchmark_postgresql_insert.py --dbname test_historian --user historian --password historian \\
+        --records 50000 --batch-size 1000
+"""
+
+import argparse
+import time
+from datetime import datetime, timedelta
+
+import pytz
+from psycopg2.sql import Identifier, SQL
+
+from volttron.platform.dbutils.postgresqlfuncts import PostgreSqlFuncts
+
+
+def build_records(count, topic_count):
+    start = datetime(2020, 1, 1, tzinfo=pytz.UTC)
+    for i in range(count):
+        yield start + timedelta(seconds=i // topic_count), i % topic_count + 1, float(i)
+
+
+def run(functs, records, batch_size):
+    start = time.perf_counter()
+    for i in range(0, len(records), batch_size):
+        with functs.bulk_insert() as insert_data:
+            for ts, topic_id, value in records[i:i + batch_size]:
+                insert_data(ts, topic_id, value)
+        functs.commit()
+    return len(records) / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=5432)
+    parser.add_argument("--dbname", required=True)
+    parser.add_argument("--user", required=True)
+    parser.add_argument("--password", required=True)
+    parser.add_argument("--records", type=int, default=50000, help="number of records to insert per run")
+    parser.add_argument("--topics", type=int, default=500, help="number of distinct topics")
+    parser.add_argument("--batch-size", type=int, default=1000,
+                        help="records per bulk insert, same as the historian's submit_size_limit")
+    parser.add_argument("--table-prefix", default="benchmark")
+    args = parser.parse_args()
+
+    records = list(build_records(args.records, args.topics))
+    results = {}
+    for name, use_copy in (("insert", False), ("copy", True)):
+        connect_params = {"host": args.host, "port": args.port, "dbname": args.dbname, "user": args.user,
+                          "password": args.password, "copy_bulk_insert": use_copy}
+        table_names = {"data_table": f"{args.table_prefix}_{name}_data",
+                       "topics_table": f"{args.table_prefix}_{name}_topics",
+                       "meta_table": f"{args.table_prefix}_{name}_topics"}
+        functs = PostgreSqlFuncts(connect_params, table_names)
+        functs.setup_historian_tables()
+        try:
+            results[name] = run(functs, records, args.batch_size)
+            if use_copy and not functs.copy_bulk_insert:
+                print("COPY failed and fell back to INSERT. See log for details")
+        finally:
+            for table in (functs.data_table, functs.topics_table):
+                functs.execute_stmt(SQL("DROP TABLE IF EXISTS {}").format(Identifier(table)))
+            functs.close()
+        print(f"{name:>6}: {results[name]:12.0f} rows/sec")
+
+    print(f"speedup: {results['copy'] / results['insert']:.2f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,305 @@
+# -*- coding: utf-8 -*- {{{
+# ===----------------------------------------------------------------------===
+#
+#                 Component of Eclipse VOLTTRON
+#
+# ===----------------------------------------------------------------------===
+#
+# Copyright 2023 Battelle Memorial Institute
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not
+# use this file except in compliance with the License. You may obtain a copy
+# of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+#
+# ===----------------------------------------------------------------------===
+# }}}
+
+"""
+Export raw SQLHistorian data to per topic files for offline analysis.
+
+Reads the data table of a sqlite, mysql or postgresql historian directly,
+using the connection details of the historian's agent configuration file,
+instead of paging through the historian's query RPC. Rows are streamed with
+a server side cursor in topic and time order and written in chunks, so memory
+use does not depend on the amount of data exported. The volttron instance
+does not need to be running.
+
+Each topic is written to a file named after the topic under the output
+directory:
+
+  - csv: <topic>.csv with the columns ts and value
+  - npz: <topic>/part-NNNNN.npz NumPy archives of chunk-rows rows with a
+    datetime64[us] UTC ts array and a value array typed bool, int64, float64
+    or str depending on the values of the chunk. Requires numpy
+
+A manifest.json file lists the rows, time range and files of every topic.
+Topics are split into contiguous ranges of topic ids that are exported in
+parallel by worker processes, each with its own database connection.
+
+Example::
+
+    python export_historian_data.py --config sqlhistorian.config --output-dir export \\
+        --pattern '^campus/building1/' --start 2022-01-01T00:00:00 --end 2023-01-01T00:00:00 \\
+        --format npz --workers 4
+"""
+
+import argparse
+import csv
+import os
+import re
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import pytz
+
+from volttron.platform import jsonapi
+from volttron.platform.agent import utils
+from volttron.platform.dbutils import sqlutils
+
+CSV = 'csv'
+NPZ = 'npz'
+# maximum number of topic ids in a single query
+QUERY_MAX_TOPICS = 500
+
+
+def get_table_names(tables_def):
+    # same defaults and table_prefix handling as the historian. The agent
+    # modules are not imported because they monkey patch the process for
+    # gevent, which breaks the worker process pool
+    tables_def = dict({"table_prefix": "", "data_table": "data", "topics_table": "topics", "meta_table": "meta"},
+                      **(tables_def or {}))
+    table_prefix = tables_def.pop("table_prefix") or ""
+    if table_prefix:
+        table_prefix += "_"
+    table_names = {key: table_prefix + value for key, value in tables_def.items()}
+    table_names["agg_topics_table"] = table_prefix + "aggregate_" + tables_def["topics_table"]
+    table_names["agg_meta_table"] = table_prefix + "aggregate_" + tables_def["meta_table"]
+    return table_names
+
+
+def get_dbfuncts(config):
+    connection = config['connection']
+    table_names = get_table_names(config.get('tables_def'))
+    db_functs_class = sqlutils.get_dbfuncts_class(connection['type'])
+    return db_functs_class(connection['params'], table_names)
+
+
+def get_topics(config, pattern=None):
+    """
+    :return: list of (topic_id, topic_name) of the topics whose name matches
+             the pattern, ordered by topic id
+    """
+    dbfuncts = get_dbfuncts(config)
+    try:
+        id_map, name_map = dbfuncts.get_topic_map()
+    finally:
+        dbfuncts.close()
+    regex = re.compile(pattern, re.IGNORECASE) if pattern else None
+    return sorted((topic_id, name_map[lower_name]) for lower_name, topic_id in id_map.items()
+                  if regex is None or regex.search(name_map[lower_name]))
+
+
+def split_topic_ranges(topics, count):
+    """
+    Split topics into at most count contiguous ranges of similar size
+    """
+    count = max(1, min(count, len(topics)))
+    size, extra = divmod(len(topics), count)
+    ranges = []
+    start = 0
+    for i in range(count):
+        end = start + size + (1 if i < extra else 0)
+        ranges.append(topics[start:end])
+        start = end
+    return [r for r in ranges if r]
+
+
+def to_utc(ts):
+    if isinstance(ts, str):
+        ts = utils.parse_timestamp_string(ts)
+    if ts.tzinfo is None:
+        return ts.replace(tzinfo=pytz.UTC)
+    return ts.astimezone(pytz.UTC)
+
+
+def topic_path(output_dir, topic):
+    return os.path.join(output_dir, *topic.split('/'))
+
+
+class CsvTopicWriter:
+
+    def __init__(self, output_dir, topic):
+        self.path = topic_path(output_dir, topic) + '.csv'
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self.files = [os.path.relpath(self.path, output_dir)]
+        self._file = open(self.path, 'w', newline='')
+        self._writer = csv.writer(self._file)
+        self._writer.writerow(['ts', 'value'])
+
+    def write(self, timestamps, values):
+        self._writer.writerows((utils.format_timestamp(ts), value if isinstance(value, str) else jsonapi.dumps(value))
+                               for ts, value in zip(timestamps, values))
+
+    def close(self):
+        self._file.close()
+
+
+class NumpyTopicWriter:
+
+    def __init__(self, output_dir, topic):
+        import numpy
+        self._numpy = numpy
+        self._output_dir = output_dir
+        self.path = topic_path(output_dir, topic)
+        os.makedirs(self.path, exist_ok=True)
+        self.files = []
+
+    def write(self, timestamps, values):
+        np = self._numpy
+        ts = np.array([t.replace(tzinfo=None) for t in timestamps], dtype='datetime64[us]')
+        path = os.path.join(self.path, 'part-{:05d}.npz'.format(len(self.files)))
+        np.savez(path, ts=ts, value=self._value_array(values))
+        self.files.append(os.path.relpath(path, self._output_dir))
+
+    def _value_array(self, values):
+        np = self._numpy
+        if all(isinstance(v, bool) for v in values):
+            return np.array(values, dtype=bool)
+        if all(isinstance(v, int) and not isinstance(v, bool) for v in values):
+            return np.array(values, dtype=np.int64)
+        if all(v is None or (isinstance(v, (int, float)) and not isinstance(v, bool)) for v in values):
+            return np.array([np.nan if v is None else v for v in values], dtype=np.float64)
+        return np.array([v if isinstance(v, str) else jsonapi.dumps(v) for v in values], dtype=str)
+
+    def close(self):
+        pass
+
+
+WRITERS = {CSV: CsvTopicWriter, NPZ: NumpyTopicWriter}
+
+
+def export_topics(config, topics, options):
+    """
+    Export the data of a range of topics. Run in a worker process with its
+    own database connection.
+    :param config: historian agent configuration
+    :param topics: list of (topic_id, topic_name) ordered by topic id
+    :param options: dictionary with output_dir, format, start, end,
+                    chunk_rows and fetch_size
+    :return: dictionary of {topic_name: manifest entry}
+    """
+    dbfuncts = get_dbfuncts(config)
+    names = dict(topics)
+    writer_class = WRITERS[options['format']]
+    chunk_rows = options['chunk_rows']
+    manifest = {}
+    state = {'topic_id': None, 'writer': None, 'timestamps': [], 'values': []}
+
+    def flush():
+        if state['timestamps']:
+            state['writer'].write(state['timestamps'], state['values'])
+            state['timestamps'], state['values'] = [], []
+
+    def finish_topic():
+        if state['writer'] is None:
+            return
+        flush()
+        state['writer'].close()
+        manifest[names[state['topic_id']]]['files'] = state['writer'].files
+        state['writer'] = None
+
+    try:
+        for i in range(0, len(topics), QUERY_MAX_TOPICS):
+            topic_ids = [topic_id for topic_id, _ in topics[i:i + QUERY_MAX_TOPICS]]
+            rows = dbfuncts.stream_data(topic_ids, options['start'], options['end'], options['fetch_size'])
+            for topic_id, ts, value_string in rows:
+                ts = to_utc(ts)
+                if topic_id != state['topic_id']:
+                    finish_topic()
+                    state['topic_id'] = topic_id
+                    state['writer'] = writer_class(options['output_dir'], names[topic_id])
+                    manifest[names[topic_id]] = {'rows': 0, 'first': utils.format_timestamp(ts)}
+                entry = manifest[names[topic_id]]
+                entry['rows'] += 1
+                entry['last'] = utils.format_timestamp(ts)
+                state['timestamps'].append(ts)
+                state['values'].append(jsonapi.loads(value_string))
+                if len(state['timestamps']) >= chunk_rows:
+                    flush()
+        finish_topic()
+    finally:
+        if state['writer'] is not None:
+            state['writer'].close()
+        dbfuncts.close()
+    return manifest
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--config", required=True,
+                        help="SQLHistorian agent configuration file with the database connection details")
+    parser.add_argument("--output-dir", required=True, help="directory the files are written to")
+    parser.add_argument("--pattern", help="only export topics matching this regular expression (case insensitive)")
+    parser.add_argument("--start", help="export data at or after this time (ISO 8601)")
+    parser.add_argument("--end", help="export data before this time (ISO 8601)")
+    parser.add_argument("--format", choices=(CSV, NPZ), default=CSV, help="output file format")
+    parser.add_argument("--workers", type=int, default=1, help="number of topic ranges exported in parallel")
+    parser.add_argument("--chunk-rows", type=int, default=100000,
+                        help="rows buffered per topic before they are written. One npz file per chunk")
+    parser.add_argument("--fetch-size", type=int, default=10000, help="rows fetched from the database at a time")
+    args = parser.parse_args()
+
+    if args.format == NPZ:
+        try:
+            import numpy  # noqa: F401
+        except ImportError:
+            parser.error("numpy is required for the npz format. Install it with pip install numpy")
+
+    config = utils.load_config(args.config)
+    if 'connection' not in config:
+        parser.error("{} does not contain a connection".format(args.config))
+    options = {'output_dir': os.path.abspath(args.output_dir),
+               'format': args.format,
+               'start': to_utc(args.start) if args.start else None,
+               'end': to_utc(args.end) if args.end else None,
+               'chunk_rows': max(1, args.chunk_rows),
+               'fetch_size': max(1, args.fetch_size)}
+    os.makedirs(options['output_dir'], exist_ok=True)
+
+    started = time.time()
+    topics = get_topics(config, args.pattern)
+    print("Exporting {} topics to {}".format(len(topics), options['output_dir']))
+    manifest = {}
+    ranges = split_topic_ranges(topics, args.workers)
+    if len(ranges) <= 1:
+        for topic_range in ranges:
+            manifest.update(export_topics(config, topic_range, options))
+    else:
+        with ProcessPoolExecutor(max_workers=len(ranges)) as executor:
+            futures = [executor.submit(export_topics, config, topic_range, options) for topic_range in ranges]
+            for future in as_completed(futures):
+                result = future.result()
+                manifest.update(result)
+                print("Exported {} topics, {} rows".format(len(result), sum(e['rows'] for e in result.values())))
+
+    with open(os.path.join(options['output_dir'], 'manifest.json'), 'w') as f:
+        f.write(jsonapi.dumps({'format': args.format,
+                               'start': args.start,
+                               'end': args.end,
+                               'topics': dict(sorted(manifest.items()))}, indent=2))
+    print("Exported {} rows of {} topics in {:.1f}s".format(sum(e['rows'] for e in manifest.values()),
+                                                           len(manifest), time.time() - started))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
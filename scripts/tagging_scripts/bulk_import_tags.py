@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*- {{{
+# ===----------------------------------------------------------------------===
+#
+#                 Component of Eclipse VOLTTRON
+#
+# ===----------------------------------------------------------------------===
+#
+# Copyright 2023 Battelle Memorial Institute
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not
+# use this file except in compliance with the License. You may obtain a copy
+# of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+#
+# ===----------------------------------------------------------------------===
+# }}}
+
+"""
+Bulk import tags from a csv or Haystack JSON file with a running SQLite or
+MongoDB tagging service.
+
+The file is read by the tagging service, so it must be copied to the tag import
+directory of the tagging service first. That is the tag_import_dir configured
+for the service, or its agent-data directory. The file name is relative to
+that directory. It is streamed and written in batches. csv files have the
+columns topic, tag and value. Haystack JSON files are grids or lists of
+entities whose topic is the topic tag or the id ref of the entity.
+
+Example::
+
+    python bulk_import_tags.py --vip-identity platform.tagging tags.csv
+    python bulk_import_tags.py --vip-identity platform.tagging --batch-size 10000 site.json
+"""
+
+import argparse
+import sys
+import time
+
+from volttron.platform.vip.agent.utils import build_agent
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("file", help="csv, Haystack JSON grid or JSON lines file with the tags to import, "
+                                     "relative to the tag import directory of the tagging service")
+    parser.add_argument("--vip-identity", default="platform.tagging", help="vip identity of the tagging service")
+    parser.add_argument("--format", choices=("csv", "json", "jsonl"),
+                        help="format of the file. Defaults to the file extension")
+    parser.add_argument("--batch-size", type=int, default=5000, help="number of records written together")
+    parser.add_argument("--timeout", type=float, default=3600, help="seconds to wait for the import to finish")
+    args = parser.parse_args()
+
+    agent = build_agent()
+    try:
+        start = time.time()
+        result = agent.vip.rpc.call(args.vip_identity, "import_tags", args.file, file_format=args.format,
+                                    batch_size=args.batch_size).get(timeout=args.timeout)
+        print("Imported {tags} tags of {topics} topic prefixes from {records} records with version {version} of "
+              "the topic list in {elapsed:.1f}s".format(version=result['snapshot_version'],
+                                                        elapsed=time.time() - start, **result))
+        if result['error_count']:
+            print("{} records failed:".format(result['error_count']))
+            for topic, error in result['error'].items():
+                print("  {}: {}".format(topic, error))
+            if result['error_count'] > len(result['error']):
+                print("  ...")
+            return 1
+        return 0
+    finally:
+        agent.core.stop()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
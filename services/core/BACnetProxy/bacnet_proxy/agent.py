@@ -24,7 +24,12 @@
 
 import logging
 import sys
+import time
 import datetime
+from contextlib import contextmanager
+
+import gevent
+from gevent.lock import BoundedSemaphore, DummySemaphore
 
 from volttron.platform.vip.agent import Agent, RPC
 from volttron.platform.async_ import AsyncCall
@@ -36,7 +41,10 @@ _log = logging.getLogger(__name__)
 
 bacnet_logger = logging.getLogger("bacpypes")
 bacnet_logger.setLevel(logging.WARNING)
-__version__ = '0.5'
+__version__ = '0.6'
+
+# seconds to wait for the response to a confirmed request
+REQUEST_TIMEOUT = 10
 
 from collections import defaultdict
 
@@ -104,6 +112,29 @@ class SubscriptionContext:
         self.lifetime = lifetime
 
 
+class TargetThrottle:
+    """
+    Limits the confirmed requests to a target device: at most window requests
+    are in flight and requests are sent at least min_interval seconds apart.
+    """
+
+    def __init__(self, window=1, min_interval=0.0):
+        self.window = BoundedSemaphore(max(1, int(window)))
+        self.min_interval = float(min_interval)
+        self._next_send = 0.0
+
+    @contextmanager
+    def request(self):
+        with self.window:
+            if self.min_interval > 0:
+                now = time.time()
+                wait = self._next_send - now
+                self._next_send = max(now, self._next_send) + self.min_interval
+                if wait > 0:
+                    gevent.sleep(wait)
+            yield
+
+
 class BACnetApplication(BIPSimpleApplication, RecurringTask):
     def __init__(self, i_am_callback, send_cov_subscription_callback, forward_cov_callback, request_check_interval,
                  *args):
@@ -121,6 +152,10 @@ class BACnetApplication(BIPSimpleApplication, RecurringTask):
 
         # keep track of requests to line up responses
         self.iocb = {}
+        # requests that timed out before they were sent. Requests are registered on the bacpypes thread and
+        # forgotten on the agent's thread, so both hold the lock
+        self._forgotten = set()
+        self._iocb_lock = threading.Lock()
 
         # Tracking mechanism for matching COVNotifications to a COV
         # subscriptionContext object
@@ -141,6 +176,16 @@ class BACnetApplication(BIPSimpleApplication, RecurringTask):
     def submit_request(self, iocb):
         self.request_queue.put(iocb)
 
+    def forget_request(self, iocb):
+        """Stop waiting for the response to a request that timed out, freeing its invoke ID."""
+        with self._iocb_lock:
+            for invoke_key, request_iocb in list(self.iocb.items()):
+                if request_iocb is iocb:
+                    self.iocb.pop(invoke_key, None)
+                    return
+            # not sent yet, handle_request drops it
+            self._forgotten.add(iocb)
+
     def get_next_invoke_id(self, addr):
         """Called to get an unused invoke ID."""
 
@@ -162,17 +207,23 @@ class BACnetApplication(BIPSimpleApplication, RecurringTask):
     def handle_request(self, iocb):
         apdu = iocb.ioRequest
 
-        if isinstance(apdu, ConfirmedRequestSequence):
-            # assign an invoke identifier
-            apdu.apduInvokeID = self.get_next_invoke_id(apdu.pduDestination)
+        try:
+            if isinstance(apdu, ConfirmedRequestSequence):
+                with self._iocb_lock:
+                    if iocb in self._forgotten:
+                        # timed out while it was queued
+                        self._forgotten.discard(iocb)
+                        return
 
-            # build a key to reference the IOCB when the response comes back
-            invoke_key = (apdu.pduDestination, apdu.apduInvokeID)
+                    # assign an invoke identifier, pipelined requests to a device use different ones
+                    apdu.apduInvokeID = self.get_next_invoke_id(apdu.pduDestination)
 
-            # keep track of the request
-            self.iocb[invoke_key] = iocb
+                    # build a key to reference the IOCB when the response comes back
+                    invoke_key = (apdu.pduDestination, apdu.apduInvokeID)
+
+                    # keep track of the request
+                    self.iocb[invoke_key] = iocb
 
-        try:
             self.request(apdu)
         except Exception as e:
             iocb.set_exception(e)
@@ -182,11 +233,11 @@ class BACnetApplication(BIPSimpleApplication, RecurringTask):
 
     def _get_iocb_for_apdu(self, apdu, invoke_key):
         # find the request
-        working_iocb = self.iocb.get(invoke_key, None)
+        with self._iocb_lock:
+            working_iocb = self.iocb.pop(invoke_key, None)
         if working_iocb is None:
             _log.error("no matching request for confirmation")
             return None
-        del self.iocb[invoke_key]
 
         if isinstance(apdu, AbortPDU):
             working_iocb.set_exception(RuntimeError("Device communication aborted: " + str(apdu)))
@@ -417,9 +468,18 @@ def bacnet_proxy_agent(config_path, **kwargs):
     ven_id = config.get("vendor_id", 15)
     max_per_request = config.get("default_max_per_request", 1000000)
     request_check_interval = config.get("request_check_interval", 100)
+    max_in_flight_per_device = config.get("max_in_flight_per_device", 1)
+    min_request_interval = config.get("min_request_interval", 0.0)
+    max_concurrent_requests = config.get("max_concurrent_requests", 0)
+    device_throttles = config.get("device_throttles", {})
 
     return BACnetProxyAgent(device_address, max_apdu_len, seg_supported, obj_id, obj_name, ven_id, max_per_request,
-                            request_check_interval=request_check_interval, heartbeat_autostart=True, **kwargs)
+                            request_check_interval=request_check_interval,
+                            max_in_flight_per_device=max_in_flight_per_device,
+                            min_request_interval=min_request_interval,
+                            max_concurrent_requests=max_concurrent_requests,
+                            device_throttles=device_throttles,
+                            heartbeat_autostart=True, **kwargs)
 
 
 class BACnetProxyAgent(Agent):
@@ -427,7 +487,8 @@ class BACnetProxyAgent(Agent):
     This agent creates a virtual bacnet device that is used by the bacnet driver interface to communicate with devices.
     """
     def __init__(self, device_address, max_apdu_len, seg_supported, obj_id, obj_name, ven_id, max_per_request,
-                 request_check_interval=100, **kwargs):
+                 request_check_interval=100, max_in_flight_per_device=1, min_request_interval=0.0,
+                 max_concurrent_requests=0, device_throttles=None, **kwargs):
         super(BACnetProxyAgent, self).__init__(**kwargs)
 
         async_call = AsyncCall()
@@ -449,6 +510,14 @@ class BACnetProxyAgent(Agent):
         self.iocb_class = IOCB
         self._max_per_request = max_per_request
 
+        # Confirmed requests are limited per target device and in total.
+        self._max_in_flight_per_device = max_in_flight_per_device
+        self._min_request_interval = min_request_interval
+        self._device_throttles = device_throttles or {}
+        self._throttles = {}
+        self._request_slots = BoundedSemaphore(int(max_concurrent_requests)) if max_concurrent_requests \
+            else DummySemaphore()
+
         self.setup_device(async_call, device_address, max_apdu_len, seg_supported, obj_id, obj_name, ven_id,
                           request_check_interval)
 
@@ -550,6 +619,30 @@ class BACnetProxyAgent(Agent):
         """
         self.vip.rpc.call(PLATFORM_DRIVER, 'forward_bacnet_cov_value', device_path, point_name, result_dict)
 
+    def _get_throttle(self, target_address):
+        throttle = self._throttles.get(target_address)
+        if throttle is None:
+            settings = self._device_throttles.get(target_address, {})
+            throttle = TargetThrottle(settings.get("max_in_flight", self._max_in_flight_per_device),
+                                      settings.get("min_request_interval", self._min_request_interval))
+            self._throttles[target_address] = throttle
+        return throttle
+
+    def _send_request(self, target_address, request):
+        """
+        Send a confirmed request to a target device within the limits of its
+        throttle and wait for the response.
+        """
+        request.pduDestination = Address(target_address)
+        with self._get_throttle(target_address).request(), self._request_slots:
+            iocb = self.iocb_class(request)
+            self.bacnet_application.submit_request(iocb)
+            try:
+                return iocb.ioResult.get(timeout=REQUEST_TIMEOUT)
+            except gevent.Timeout:
+                self.bacnet_application.forget_request(iocb)
+                raise
+
     @RPC.export
     def who_is(self, low_device_id=None, high_device_id=None, target_address=None):
         _log.debug("Sending WhoIs: low_id: {low} high: {high} address: {address}".format(
@@ -623,8 +716,6 @@ class BACnetProxyAgent(Agent):
         request.propertyValue = Any()
         request.propertyValue.cast_in(bac_value)
 
-        request.pduDestination = Address(target_address)
-
         # Optional index
         if index is not None:
             request.propertyArrayIndex = index
@@ -633,9 +724,7 @@ class BACnetProxyAgent(Agent):
         if priority is not None:
             request.priority = priority
 
-        iocb = self.iocb_class(request)
-        self.bacnet_application.submit_request(iocb)
-        result = iocb.ioResult.get(10)
+        result = self._send_request(target_address, request)
         if isinstance(result, SimpleAckPDU):
             return value
         raise RuntimeError("Failed to set value: " + str(result))
@@ -668,11 +757,7 @@ class BACnetProxyAgent(Agent):
             objectIdentifier=(object_type, instance_number),
             propertyIdentifier=property_name,
             propertyArrayIndex=property_index)
-        request.pduDestination = Address(target_address)
-        iocb = self.iocb_class(request)
-        self.bacnet_application.submit_request(iocb)
-        bacnet_results = iocb.ioResult.get(10)
-        return bacnet_results
+        return self._send_request(target_address, request)
 
     def _get_access_spec(self, obj_data, properties):
         count = 0
@@ -715,6 +800,11 @@ class BACnetProxyAgent(Agent):
     def read_properties(self, target_address, point_map, max_per_request=None, use_read_multiple=True):
         """
         Read a set of points and return the results
+
+        The points are read with ReadPropertyMultiple requests of up to
+        max_per_request objects. The requests are pipelined, up to the
+        in-flight window of the target device are sent without waiting for
+        the responses.
         """
 
         if not use_read_multiple:
@@ -730,7 +820,7 @@ class BACnetProxyAgent(Agent):
         # reverse_point_map
         (object_property_map, reverse_point_map) = self._get_object_properties(point_map, target_address)
 
-        result_dict = {}
+        requests = []
         finished = False
 
         while not finished:
@@ -747,23 +837,34 @@ class BACnetProxyAgent(Agent):
                 read_access_spec_list.append(spec_list)
 
             if read_access_spec_list:
-                _log.debug("Requesting {count} properties from {target}".format(count=count, target=target_address))
-                request = ReadPropertyMultipleRequest(listOfReadAccessSpecs=read_access_spec_list)
-                request.pduDestination = Address(target_address)
-
-                iocb = self.iocb_class(request)
-                self.bacnet_application.submit_request(iocb)
-                bacnet_results = iocb.ioResult.get(10)
+                requests.append((read_access_spec_list, count))
 
-                _log.debug("Received read response from {target} count: {count}".format(
-                    count=count, target=target_address))
+        if len(requests) == 1:
+            responses = [self._read_multiple(target_address, *requests[0])]
+        else:
+            greenlets = [gevent.spawn(self._read_multiple, target_address, *request) for request in requests]
+            gevent.joinall(greenlets)
+            for greenlet in greenlets:
+                if not greenlet.successful():
+                    raise greenlet.exception
+            responses = [greenlet.value for greenlet in greenlets]
 
-                for prop_tuple, value in bacnet_results.items():
-                    name = reverse_point_map[prop_tuple]
-                    result_dict[name] = value
+        result_dict = {}
+        for bacnet_results in responses:
+            for prop_tuple, value in bacnet_results.items():
+                name = reverse_point_map[prop_tuple]
+                result_dict[name] = value
 
         return result_dict
 
+    def _read_multiple(self, target_address, read_access_spec_list, count):
+        _log.debug("Requesting {count} properties from {target}".format(count=count, target=target_address))
+        request = ReadPropertyMultipleRequest(listOfReadAccessSpecs=read_access_spec_list)
+        bacnet_results = self._send_request(target_address, request)
+        _log.debug("Received read response from {target} count: {count}".format(
+            count=count, target=target_address))
+        return bacnet_results
+
     @RPC.export
     def create_cov_subscription(self, address, device_path, point_name, object_type, instance_number, lifetime=None):
         """
@@ -0,0 +1,134 @@
+import time
+
+import gevent
+import pytest
+from bacpypes.apdu import ReadPropertyRequest
+from bacpypes.app import BIPSimpleApplication
+from bacpypes.task import RecurringTask
+from mock import MagicMock
+
+from bacnet_proxy import agent
+from bacnet_proxy.agent import BACnetApplication, BACnetProxyAgent
+from volttron.platform.vip.agent import Agent
+from volttrontesting.utils.utils import AgentMock
+
+BACnetProxyAgent.__bases__ = (AgentMock.imitate(Agent, Agent()),)
+
+TARGET = "10.0.0.5"
+
+
+class FakeApplication:
+    """
+    BACnet application recording the requests sent by the proxy. Responses are set by the tests.
+    """
+
+    def __init__(self):
+        self.sent = []
+        self.forgotten = []
+
+    def submit_request(self, iocb):
+        self.sent.append((time.time(), iocb))
+
+    def forget_request(self, iocb):
+        self.forgotten.append(iocb)
+
+    def respond(self, index, value):
+        self.sent[index][1].ioResult.set(value)
+
+
+def read_request():
+    return ReadPropertyRequest(objectIdentifier=("analogInput", 1), propertyIdentifier="presentValue")
+
+
+@pytest.fixture()
+def proxy(monkeypatch):
+    monkeypatch.setattr(BACnetProxyAgent, "setup_device", lambda self, *args: None)
+
+    def create(**kwargs):
+        proxy = BACnetProxyAgent("10.0.0.1/24", 1024, "segmentedBoth", 599, "proxy", 15, 1000, **kwargs)
+        proxy.bacnet_application = FakeApplication()
+        return proxy
+    return create
+
+
+@pytest.fixture()
+def application(monkeypatch):
+    # no socket and no bacpypes task manager
+    monkeypatch.setattr(BIPSimpleApplication, "__init__", lambda self, *args: None)
+    monkeypatch.setattr(RecurringTask, "__init__", lambda self, *args: None)
+    monkeypatch.setattr(BACnetApplication, "install_task", lambda self: None)
+    application = BACnetApplication(None, None, None, 100)
+    application.request = MagicMock()
+    return application
+
+
+@pytest.mark.driver_unit
+def test_requests_should_be_limited_by_window_and_interval(proxy):
+    proxy = proxy(max_in_flight_per_device=2, min_request_interval=0.05)
+    application = proxy.bacnet_application
+    greenlets = [gevent.spawn(proxy._send_request, TARGET, read_request()) for _ in range(3)]
+
+    gevent.sleep(0.2)
+    # the third request waits for a response
+    assert len(application.sent) == 2
+    assert application.sent[1][0] - application.sent[0][0] >= 0.045
+
+    application.respond(0, "first")
+    gevent.sleep(0.1)
+    assert len(application.sent) == 3
+    application.respond(1, "second")
+    application.respond(2, "third")
+
+    gevent.joinall(greenlets, timeout=1)
+    assert [g.value for g in greenlets] == ["first", "second", "third"]
+
+
+@pytest.mark.driver_unit
+def test_read_properties_should_raise_exception_of_a_chunk(proxy, monkeypatch):
+    proxy = proxy(max_in_flight_per_device=4)
+    object_properties = {("analogInput", i): ["presentValue"] for i in range(3)}
+    reverse_point_map = {("analogInput", i, "presentValue", None): "Point{}".format(i) for i in range(3)}
+    monkeypatch.setattr(proxy, "_get_object_properties",
+                        lambda point_map, target: (dict(object_properties), reverse_point_map))
+    monkeypatch.setattr(proxy, "_get_access_spec", lambda obj_data, properties: (obj_data, 1))
+
+    def read_multiple(target_address, read_access_spec_list, count):
+        object_type, instance = read_access_spec_list[0]
+        gevent.sleep(0.01)
+        return {(object_type, instance, "presentValue", None): instance * 10.0}
+
+    monkeypatch.setattr(proxy, "_read_multiple", read_multiple)
+    assert proxy.read_properties(TARGET, {}, max_per_request=1) == {"Point0": 0.0, "Point1": 10.0,
+                                                                    "Point2": 20.0}
+
+    def failing_read_multiple(target_address, read_access_spec_list, count):
+        if read_access_spec_list[0] == ("analogInput", 1):
+            raise RuntimeError("Device communication aborted")
+        return read_multiple(target_address, read_access_spec_list, count)
+
+    monkeypatch.setattr(proxy, "_read_multiple", failing_read_multiple)
+    with pytest.raises(RuntimeError, match="aborted"):
+        proxy.read_properties(TARGET, {}, max_per_request=1)
+
+
+@pytest.mark.driver_unit
+def test_timed_out_request_should_be_forgotten(proxy, application, monkeypatch):
+    monkeypatch.setattr(agent, "REQUEST_TIMEOUT", 0.05)
+    proxy = proxy()
+    proxy.bacnet_application = application
+
+    # sent before it timed out
+    greenlet = gevent.spawn(proxy._send_request, TARGET, read_request())
+    gevent.sleep(0)
+    application.process_task()
+    assert len(application.iocb) == 1
+    gevent.joinall([greenlet])
+    assert isinstance(greenlet.exception, gevent.Timeout)
+    assert application.iocb == {}
+
+    # timed out while queued for the bacpypes thread
+    greenlet = gevent.spawn(proxy._send_request, TARGET, read_request())
+    gevent.joinall([greenlet])
+    application.process_task()
+    assert application.iocb == {}
+    assert application.request.call_count == 1
@@ -0,0 +1,233 @@
+# -*- coding: utf-8 -*- {{{
+# ===----------------------------------------------------------------------===
+#
+#                 Component of Eclipse VOLTTRON
+#
+# ===----------------------------------------------------------------------===
+#
+# Copyright 2023 Battelle Memorial Institute
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not
+# use this file except in compliance with the License. You may obtain a copy
+# of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+#
+# ===----------------------------------------------------------------------===
+# }}}
+
+import logging
+import os
+import sys
+from datetime import timedelta
+
+from volttron.platform.agent import utils
+from volttron.platform.agent.device_schema import DeviceSchemaCache, is_compact_publish
+from volttron.platform.messaging import headers as headers_mod
+from volttron.platform.messaging import topics
+from volttron.platform.scheduling import periodic
+from volttron.platform.vip.agent import Agent, Core, RPC
+
+from .cache import LastValueCache
+
+utils.setup_logging()
+_log = logging.getLogger(__name__)
+__version__ = "1.0"
+
+
+def last_value_cache_agent(config_path, **kwargs):
+    """Parses the Last Value Cache Agent configuration and returns an
+    instance of the agent created using that configuration.
+
+    :param config_path: Path to a configuration file.
+
+    :type config_path: str
+    :returns: Last Value Cache Agent
+    :rtype: LastValueCacheAgent
+    """
+    try:
+        config = utils.load_config(config_path)
+    except Exception:
+        config = {}
+
+    if not config:
+        _log.info("Using Last Value Cache Agent defaults for starting configuration.")
+
+    return LastValueCacheAgent(config.get('snapshot_file', 'last_values.json.gz'),
+                               float(config.get('snapshot_interval', 300)),
+                               **kwargs)
+
+
+class LastValueCacheAgent(Agent):
+    """
+    Keeps the latest value, timestamp and metadata of every point published
+    by the platform driver on devices/.../all topics and serves them over RPC,
+    so that agents that need the current value of a point do not have to
+    scrape the device or query the historian.
+
+    :param snapshot_file: File the cache is saved to periodically and on
+        shutdown and restored from on startup. A relative path is relative to
+        the agent-data directory. None disables snapshots.
+    :param snapshot_interval: Seconds between snapshots. 0 only saves the
+        snapshot on shutdown.
+
+    :type snapshot_file: str
+    :type snapshot_interval: float
+    """
+
+    def __init__(self, snapshot_file='last_values.json.gz', snapshot_interval=300, **kwargs):
+        super(LastValueCacheAgent, self).__init__(**kwargs)
+        self.cache = LastValueCache()
+        self._device_schemas = DeviceSchemaCache()
+        self.snapshot_file = snapshot_file
+        self.snapshot_interval = snapshot_interval
+        self._snapshot_event = None
+        self._snapshot_loaded = False
+        self._subscribed = False
+
+        self.default_config = {"snapshot_file": snapshot_file,
+                               "snapshot_interval": snapshot_interval}
+        self.vip.config.set_default("config", self.default_config)
+        self.vip.config.subscribe(self.configure, actions=["NEW", "UPDATE"], pattern="config")
+
+    def configure(self, config_name, action, contents):
+        config = self.default_config.copy()
+        config.update(contents)
+
+        _log.debug("Configuring Last Value Cache Agent")
+
+        try:
+            snapshot_file = config["snapshot_file"]
+            snapshot_interval = float(config["snapshot_interval"] or 0)
+        except ValueError as e:
+            _log.error("ERROR PROCESSING CONFIGURATION: {}".format(e))
+            return
+
+        self.snapshot_file = snapshot_file
+        self.snapshot_interval = snapshot_interval
+
+        if not self._snapshot_loaded:
+            self._snapshot_loaded = True
+            path = self._get_snapshot_path()
+            if path is not None:
+                try:
+                    self.cache.load(path)
+                except Exception as e:
+                    _log.error("Unable to load last value snapshot {}: {}".format(path, e))
+
+        if self._snapshot_event is not None:
+            self._snapshot_event.cancel()
+            self._snapshot_event = None
+        if self.snapshot_file and self.snapshot_interval > 0:
+            self._snapshot_event = self.core.schedule(
+                periodic(self.snapshot_interval, start=timedelta(seconds=self.snapshot_interval)),
+                self.save_snapshot)
+
+        if not self._subscribed:
+            self.vip.pubsub.subscribe(peer='pubsub',
+                                      prefix=topics.DRIVER_TOPIC_BASE,
+                                      callback=self._capture_device_data)
+            self._subscribed = True
+
+    def _get_snapshot_path(self):
+        if not self.snapshot_file:
+            return None
+        if os.path.isabs(self.snapshot_file):
+            return self.snapshot_file
+        # agents only have write access to their agent-data directory in agent isolation mode
+        agent_data_dir = os.path.join(os.getcwd(), os.path.basename(os.getcwd()) + ".agent-data")
+        if os.path.exists(agent_data_dir):
+            return os.path.join(agent_data_dir, self.snapshot_file)
+        return os.path.join(os.getcwd(), self.snapshot_file)
+
+    def _capture_device_data(self, peer, sender, bus, topic, headers, message):
+        self._device_schemas.receive(self.vip, topic, headers, message, self._update_device)
+
+    def _update_device(self, topic, headers, message):
+        if not topic.endswith('/all'):
+            return
+        if is_compact_publish(topic, headers):
+            message = self._device_schemas.expand(headers, message)
+        if not isinstance(message, list) or not message or not isinstance(message[0], dict):
+            return
+        device = topic[len(topics.DRIVER_TOPIC_BASE) + 1:-len('/all')]
+        meta = message[1] if len(message) > 1 else None
+        timestamp = headers.get(headers_mod.TIMESTAMP, headers.get(headers_mod.DATE))
+        self.cache.update_device(device, message[0], meta, timestamp)
+
+    @RPC.export
+    def get_latest(self, topics=None, pattern=None, include_meta=False, max_age=None):
+        """
+        Get the latest values of points.
+
+        Topics are the device topic without the devices/ prefix followed by
+        the point name, the same topic names the historians store, e.g.
+        campus/building/device/point.
+
+        :param topics: topic name or list of topic names
+        :param pattern: regular expression searched for in topic names. Same
+            matching as the historian's get_topics_by_pattern
+        :param include_meta: include the metadata of the points
+        :param max_age: leave out values older than max_age seconds
+        :type topics: str or list
+        :type pattern: str
+        :type include_meta: bool
+        :type max_age: float
+        :returns: {'values': {topic: [timestamp, value]},
+            'metadata': {topic: metadata}}. Topics without a cached value are
+            left out.
+        :rtype: dict
+        """
+        return self.cache.get_latest(topics, pattern, include_meta, max_age)
+
+    @RPC.export
+    def get_topic_list(self):
+        """
+        :returns: the topics of all cached points
+        :rtype: list
+        """
+        return self.cache.get_topic_list()
+
+    @RPC.export
+    def save_snapshot(self):
+        """
+        Save the cache to the snapshot file
+
+        :returns: path of the snapshot file, None if snapshots are disabled
+        :rtype: str
+        """
+        path = self._get_snapshot_path()
+        if path is None:
+            return None
+        try:
+            self.cache.save(path)
+        except Exception as e:
+            _log.error("Unable to save last value snapshot {}: {}".format(path, e))
+            return None
+        return path
+
+    @Core.receiver("onstop")
+    def onstop(self, sender, **kwargs):
+        if self._snapshot_event is not None:
+            self._snapshot_event.cancel()
+        self.save_snapshot()
+
+
+def main():
+    """Main method called to start the agent."""
+    utils.vip_main(last_value_cache_agent, identity='platform.lastvalue',
+                   version=__version__)
+
+
+if __name__ == '__main__':
+    # Entry point for script
+    try:
+        sys.exit(main())
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,198 @@
+# -*- coding: utf-8 -*- {{{
+# ===----------------------------------------------------------------------===
+#
+#                 Component of Eclipse VOLTTRON
+#
+# ===----------------------------------------------------------------------===
+#
+# Copyright 2023 Battelle Memorial Institute
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not
+# use this file except in compliance with the License. You may obtain a copy
+# of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+#
+# ===----------------------------------------------------------------------===
+# }}}
+
+"""
+In-memory table of the latest value of every device point.
+
+Points are numbered as they are first seen and their values are kept in
+column lists indexed by point id. The timestamp of a value is stored once
+per device since all points of a devices/.../all publish share it, and the
+metadata of points is interned so that points with identical metadata share
+a single dictionary.
+"""
+
+import gzip
+import json
+import logging
+import os
+import time
+
+from volttron.platform.dbutils.topicindex import TopicIndex
+
+_log = logging.getLogger(__name__)
+
+SNAPSHOT_VERSION = 1
+
+
+class LastValueCache:
+
+    def __init__(self):
+        self._index = TopicIndex()
+        self._point_ids = {}
+        # columns indexed by point id
+        self._topics = []
+        self._values = []
+        self._point_devices = []
+        self._point_meta = []
+        # columns indexed by device id
+        self._device_ids = {}
+        self._device_names = []
+        self._device_timestamps = []
+        self._device_received = []
+        self._device_points = []
+        # meta id -> metadata dictionary
+        self._meta = []
+        self._meta_ids = {}
+
+    def __len__(self):
+        return len(self._topics)
+
+    def update_device(self, device, values, meta=None, timestamp=None, received=None):
+        """
+        Store the values of a device publish
+        :param device: device topic without the devices/ prefix and /all suffix
+        :param values: dictionary of {point: value}
+        :param meta: dictionary of {point: metadata}
+        :param timestamp: timestamp string of the publish
+        :param received: epoch seconds the publish was received at. Defaults
+                         to now
+        """
+        device_id = self._device_ids.get(device)
+        if device_id is None:
+            device_id = self._device_ids[device] = len(self._device_names)
+            self._device_names.append(device)
+            self._device_timestamps.append(None)
+            self._device_received.append(None)
+            self._device_points.append({})
+        self._device_timestamps[device_id] = timestamp
+        self._device_received[device_id] = time.time() if received is None else received
+        points = self._device_points[device_id]
+        meta = meta or {}
+        for point, value in values.items():
+            point_id = points.get(point)
+            if point_id is None:
+                point_id = points[point] = self._add_point(device + '/' + point, device_id)
+            self._values[point_id] = value
+            point_meta = meta.get(point)
+            if point_meta is not None and point_meta != self._meta[self._point_meta[point_id]]:
+                self._point_meta[point_id] = self._intern_meta(point_meta)
+
+    def _add_point(self, topic, device_id):
+        point_id = len(self._topics)
+        self._point_ids[topic] = point_id
+        self._topics.append(topic)
+        self._values.append(None)
+        self._point_devices.append(device_id)
+        self._point_meta.append(self._intern_meta({}))
+        self._index.add(topic, point_id)
+        return point_id
+
+    def _intern_meta(self, meta):
+        key = json.dumps(meta, sort_keys=True, default=str)
+        meta_id = self._meta_ids.get(key)
+        if meta_id is None:
+            meta_id = self._meta_ids[key] = len(self._meta)
+            self._meta.append(meta)
+        return meta_id
+
+    def get_topic_list(self):
+        return list(self._topics)
+
+    def get_latest(self, topics=None, pattern=None, include_meta=False, max_age=None):
+        """
+        Look up the latest values of points
+        :param topics: topic name or list of topic names
+        :param pattern: regular expression searched for in topic names, with
+                        the case insensitive semantics of the historian's
+                        get_topics_by_pattern
+        :param include_meta: include the metadata of the points
+        :param max_age: leave out values received more than max_age seconds
+                        ago
+        :return: dictionary {'values': {topic: [timestamp, value]},
+                 'metadata': {topic: metadata}}. Topics that are not cached
+                 are left out
+        """
+        point_ids = []
+        if isinstance(topics, str):
+            topics = [topics]
+        for topic in topics or ():
+            point_id = self._point_ids.get(topic)
+            if point_id is not None:
+                point_ids.append(point_id)
+        if pattern is not None:
+            point_ids.extend(sorted(self._index.match(pattern).values()))
+
+        oldest = time.time() - max_age if max_age is not None else None
+        values = {}
+        metadata = {}
+        for point_id in point_ids:
+            device_id = self._point_devices[point_id]
+            if oldest is not None and self._device_received[device_id] < oldest:
+                continue
+            topic = self._topics[point_id]
+            values[topic] = [self._device_timestamps[device_id], self._values[point_id]]
+            if include_meta:
+                metadata[topic] = self._meta[self._point_meta[point_id]]
+        return {'values': values, 'metadata': metadata}
+
+    def save(self, path):
+        """
+        Write the table to a gzip compressed json file. The file is replaced
+        atomically so that a crash while saving keeps the previous snapshot
+        """
+        devices = {}
+        for device_id, device in enumerate(self._device_names):
+            points = {point: [self._values[point_id], self._point_meta[point_id]]
+                      for point, point_id in self._device_points[device_id].items()}
+            devices[device] = {'timestamp': self._device_timestamps[device_id],
+                               'received': self._device_received[device_id],
+                               'points': points}
+        snapshot = {'version': SNAPSHOT_VERSION, 'meta': self._meta, 'devices': devices}
+        temp_path = path + '.tmp'
+        with gzip.open(temp_path, 'wt') as f:
+            json.dump(snapshot, f, default=str)
+        os.replace(temp_path, path)
+        _log.debug("Saved {} point values to {}".format(len(self), path))
+
+    def load(self, path):
+        """
+        Add the values of a snapshot written by :py:meth:`save`
+        :return: False if there is no snapshot at path
+        """
+        if not os.path.exists(path):
+            return False
+        with gzip.open(path, 'rt') as f:
+            snapshot = json.load(f)
+        if snapshot.get('version') != SNAPSHOT_VERSION:
+            _log.warning("Ignoring snapshot {} with unsupported version {}".format(path, snapshot.get('version')))
+            return False
+        meta = snapshot['meta']
+        for device, entry in snapshot['devices'].items():
+            points = entry['points']
+            self.update_device(device,
+                               {point: value for point, (value, _) in points.items()},
+                               {point: meta[meta_id] for point, (_, meta_id) in points.items()},
+                               entry['timestamp'], entry['received'])
+        _log.info("Loaded {} point values from {}".format(len(self), path))
+        return True
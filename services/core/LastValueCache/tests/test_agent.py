@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*- {{{
+# ===----------------------------------------------------------------------===
+#
+#                 Component of Eclipse VOLTTRON
+#
+# ===----------------------------------------------------------------------===
+#
+# Copyright 2023 Battelle Memorial Institute
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not
+# use this file except in compliance with the License. You may obtain a copy
+# of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+#
+# ===----------------------------------------------------------------------===
+# }}}
+
+import gevent
+import pytest
+from mock import MagicMock
+
+from lastvalue.agent import LastValueCacheAgent
+from volttron.platform.agent.device_schema import make_schema
+from volttron.platform.messaging import headers as headers_mod
+from volttron.platform.vip.agent import Agent
+from volttrontesting.utils.utils import AgentMock
+
+LastValueCacheAgent.__bases__ = (AgentMock.imitate(Agent, Agent()),)
+
+TIMESTAMP = "2023-01-01T00:00:00+00:00"
+
+
+@pytest.fixture()
+def agent():
+    agent = LastValueCacheAgent(snapshot_file=None)
+    agent.vip.rpc.call = MagicMock()
+    return agent
+
+
+def test_device_publish_should_update_cache(agent):
+    agent._capture_device_data("", "", "", "devices/campus/building/rtu/all", {headers_mod.TIMESTAMP: TIMESTAMP},
+                               [{"ZoneTemp": 72.5}, {"ZoneTemp": {"units": "F"}}])
+
+    assert agent.get_latest(["campus/building/rtu/ZoneTemp"]) == {
+        "values": {"campus/building/rtu/ZoneTemp": [TIMESTAMP, 72.5]}, "metadata": {}}
+
+
+def test_compact_publish_should_update_cache(agent):
+    schema = make_schema({"ZoneTemp": {"units": "F"}, "Fan": {"units": None}})
+    headers = {headers_mod.TIMESTAMP: TIMESTAMP, headers_mod.SCHEMA_ID: schema["id"]}
+    agent.vip.rpc.call.return_value.get.side_effect = RuntimeError("driver not running")
+
+    # held until the schema is published
+    agent._capture_device_data("", "", "", "devices/campus/building/rtu/all", dict(headers), [1, 72.5])
+    gevent.sleep(0.1)
+    assert len(agent.cache) == 0
+
+    agent._capture_device_data("", "", "", "devices/campus/building/rtu/schema", dict(headers), schema)
+    agent._capture_device_data("", "", "", "devices/campus/building/rtu/all", dict(headers), [0, None])
+
+    assert agent.get_latest(["campus/building/rtu/ZoneTemp", "campus/building/rtu/Fan"], include_meta=True) == {
+        "values": {"campus/building/rtu/ZoneTemp": [TIMESTAMP, 72.5], "campus/building/rtu/Fan": [TIMESTAMP, 0]},
+        "metadata": {"campus/building/rtu/ZoneTemp": {"units": "F"}, "campus/building/rtu/Fan": {"units": None}}}
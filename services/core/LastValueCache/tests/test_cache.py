@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*- {{{
+# ===----------------------------------------------------------------------===
+#
+#                 Component of Eclipse VOLTTRON
+#
+# ===----------------------------------------------------------------------===
+#
+# Copyright 2023 Battelle Memorial Institute
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not
+# use this file except in compliance with the License. You may obtain a copy
+# of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+#
+# ===----------------------------------------------------------------------===
+# }}}
+
+import time
+
+import pytest
+
+from lastvalue.cache import LastValueCache
+
+TEMP_META = {"type": "float", "tz": "US/Pacific", "units": "F"}
+FLAG_META = {"type": "integer", "tz": "US/Pacific", "units": None}
+
+
+@pytest.fixture()
+def cache():
+    cache = LastValueCache()
+    cache.update_device("campus/building/rtu1", {"ZoneTemp": 72.5, "Fan": 1},
+                        {"ZoneTemp": TEMP_META, "Fan": FLAG_META}, "2023-01-01T00:00:00", received=100)
+    cache.update_device("campus/building/rtu2", {"ZoneTemp": 70.0, "Fan": 0},
+                        {"ZoneTemp": dict(TEMP_META), "Fan": dict(FLAG_META)}, "2023-01-01T00:00:05")
+    return cache
+
+
+def test_get_latest_by_topics(cache):
+    cache.update_device("campus/building/rtu1", {"ZoneTemp": 73.0}, {"ZoneTemp": TEMP_META}, "2023-01-01T00:01:00")
+
+    assert cache.get_latest(["campus/building/rtu1/ZoneTemp", "campus/building/rtu2/Fan", "unknown/point"]) == {
+        "values": {"campus/building/rtu1/ZoneTemp": ["2023-01-01T00:01:00", 73.0],
+                   "campus/building/rtu2/Fan": ["2023-01-01T00:00:05", 0]},
+        "metadata": {}}
+    assert cache.get_latest("campus/building/rtu1/Fan")["values"] == {
+        "campus/building/rtu1/Fan": ["2023-01-01T00:01:00", 1]}
+
+
+def test_get_latest_by_pattern_with_meta(cache):
+    result = cache.get_latest(pattern="^campus/building/.*/zonetemp", include_meta=True)
+
+    assert sorted(result["values"]) == ["campus/building/rtu1/ZoneTemp", "campus/building/rtu2/ZoneTemp"]
+    assert result["metadata"]["campus/building/rtu2/ZoneTemp"] == TEMP_META
+    # points with identical metadata share a dictionary
+    assert result["metadata"]["campus/building/rtu1/ZoneTemp"] is result["metadata"]["campus/building/rtu2/ZoneTemp"]
+
+
+def test_get_latest_should_leave_out_old_values(cache):
+    assert sorted(cache.get_latest(pattern="Fan", max_age=time.time() - 50)["values"]) == \
+        ["campus/building/rtu1/Fan", "campus/building/rtu2/Fan"]
+    assert list(cache.get_latest(pattern="Fan", max_age=60)["values"]) == ["campus/building/rtu2/Fan"]
+
+
+def test_snapshot_round_trip(cache, tmp_path):
+    path = str(tmp_path / "last_values.json.gz")
+    cache.save(path)
+
+    restored = LastValueCache()
+    assert restored.load(path)
+    assert len(restored) == 4
+    assert restored.get_latest(pattern=".*", include_meta=True) == cache.get_latest(pattern=".*", include_meta=True)
+    assert not LastValueCache().load(str(tmp_path / "missing.json.gz"))
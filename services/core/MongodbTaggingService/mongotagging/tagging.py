@@ -404,6 +404,21 @@ class MongodbTaggingService(BaseTaggingService):
 
         return result
 
+    @doc_inherit
+    def insert_topic_tags_batch(self, rows):
+        db = self._client.get_default_database()
+        topic_tags = OrderedDict()
+        for prefix, tag, value in rows:
+            topic_tags.setdefault(prefix, {'_id': prefix})[tag] = value
+        updates = [UpdateOne({'_id': prefix}, {'$set': tags}, upsert=True)
+                   for prefix, tags in topic_tags.items()]
+        try:
+            db[self.topic_tags_collection].bulk_write(updates, ordered=False)
+        except BulkWriteError as bwe:
+            errors = bwe.details['writeErrors']
+            _log.error("bwe error count {}".format(len(errors)))
+            raise
+
     @doc_inherit
     def query_tags_by_topic(self, topic_prefix, include_kind=False,
                             include_description=False, skip=0, count=None,
@@ -25,11 +25,14 @@
 import logging
 import sys
 import gevent
-from collections import defaultdict
-from volttron.platform.vip.agent import Agent, RPC
+from collections import Counter, defaultdict
+from volttron.platform.vip.agent import Agent, Core, RPC
 from volttron.platform.agent import utils
 from volttron.platform.agent import math_utils
 from volttron.platform.agent.known_identities import PLATFORM_DRIVER
+from volttron.platform.messaging import headers as headers_mod
+from volttron.platform.messaging.topics import DRIVER_STATS
+from volttron.platform.scheduling import periodic
 from .driver import DriverAgent
 import resource
 from datetime import datetime, timedelta
@@ -38,6 +41,9 @@ import fnmatch
 from volttron.platform import jsonapi
 from .interfaces import DriverInterfaceError
 from .driver_locks import configure_socket_lock, configure_publish_lock
+from .scrape_scheduler import ScrapeScheduler
+from .sharding import ShardWorker, RemoteDriver, assign_worker
+from .scrape_stats import ScrapeTelemetry, merge_stats
 
 utils.setup_logging()
 _log = logging.getLogger(__name__)
@@ -88,6 +94,8 @@ def platform_driver_agent(config_path, **kwargs):
 
     scalability_test = get_config('scalability_test', False)
     scalability_test_iterations = get_config('scalability_test_iterations', 3)
+    scalability_test_warmup = get_config('scalability_test_warmup', 0)
+    scalability_test_report = get_config('scalability_test_report', 'scalability_test_report.jsonl')
 
     driver_scrape_interval = get_config('driver_scrape_interval', 0.02)
 
@@ -102,6 +110,16 @@ def platform_driver_agent(config_path, **kwargs):
 
     group_offset_interval = get_config("group_offset_interval", 0.0)
 
+    central_scheduler = bool(get_config("central_scheduler", False))
+    scheduler_tick = get_config("scheduler_tick", 0.1)
+    interface_concurrency = get_config("interface_concurrency", {})
+
+    worker_processes = get_config("worker_processes", 0)
+    device_workers = get_config("device_workers", {})
+    shard_parent = get_config("shard_parent", None)
+
+    stats_publish_interval = get_config("stats_publish_interval", 300)
+
     return PlatformDriverAgent(driver_config_list, scalability_test,
                              scalability_test_iterations,
                              driver_scrape_interval,
@@ -113,6 +131,15 @@ def platform_driver_agent(config_path, **kwargs):
                              publish_breadth_first_all,
                              publish_depth_first,
                              publish_breadth_first,
+                             central_scheduler,
+                             scheduler_tick,
+                             interface_concurrency,
+                             worker_processes=worker_processes,
+                             device_workers=device_workers,
+                             shard_parent=shard_parent,
+                             stats_publish_interval=stats_publish_interval,
+                             scalability_test_warmup=scalability_test_warmup,
+                             scalability_test_report=scalability_test_report,
                              heartbeat_autostart=True, **kwargs)
 
 
@@ -128,11 +155,22 @@ class PlatformDriverAgent(Agent):
                  publish_breadth_first_all=False,
                  publish_depth_first=False,
                  publish_breadth_first=False,
+                 central_scheduler=False,
+                 scheduler_tick=0.1,
+                 interface_concurrency=None,
+                 worker_processes=0,
+                 device_workers=None,
+                 shard_parent=None,
+                 stats_publish_interval=300,
+                 scalability_test_warmup=0,
+                 scalability_test_report='scalability_test_report.jsonl',
                  **kwargs):
         super(PlatformDriverAgent, self).__init__(**kwargs)
         self.instances = {}
         self.scalability_test = scalability_test
         self.scalability_test_iterations = scalability_test_iterations
+        self.scalability_test_warmup = scalability_test_warmup
+        self.scalability_test_report = scalability_test_report
         try:
             self.driver_scrape_interval = float(driver_scrape_interval)
         except ValueError:
@@ -157,6 +195,15 @@ class PlatformDriverAgent(Agent):
         self._override_devices = set()
         self._override_patterns = None
         self._override_interval_events = {}
+        self.scrape_scheduler = None
+        self.workers = []
+        self.device_workers = device_workers or {}
+        # identity of the platform driver if this agent is one of its workers
+        self.shard_parent = shard_parent
+        self.scrape_telemetry = ScrapeTelemetry()
+        self.stats_publish_interval = None
+        self._stats_publish_event = None
+        self.settings = {}
 
         if scalability_test:
             self.waiting_to_finish = set()
@@ -166,6 +213,8 @@ class PlatformDriverAgent(Agent):
 
         self.default_config = {"scalability_test": scalability_test,
                                "scalability_test_iterations": scalability_test_iterations,
+                               "scalability_test_warmup": scalability_test_warmup,
+                               "scalability_test_report": scalability_test_report,
                                "max_open_sockets": max_open_sockets,
                                "max_concurrent_publishes": max_concurrent_publishes,
                                "driver_scrape_interval": self.driver_scrape_interval,
@@ -173,7 +222,13 @@ class PlatformDriverAgent(Agent):
                                "publish_depth_first_all": self.publish_depth_first_all,
                                "publish_breadth_first_all": self.publish_breadth_first_all,
                                "publish_depth_first": self.publish_depth_first,
-                               "publish_breadth_first": self.publish_breadth_first}
+                               "publish_breadth_first": self.publish_breadth_first,
+                               "central_scheduler": bool(central_scheduler),
+                               "scheduler_tick": scheduler_tick,
+                               "interface_concurrency": interface_concurrency or {},
+                               "worker_processes": worker_processes,
+                               "device_workers": self.device_workers,
+                               "stats_publish_interval": stats_publish_interval}
 
         self.vip.config.set_default("config", self.default_config)
         self.vip.config.subscribe(self.configure_main, actions=["NEW", "UPDATE"], pattern="config")
@@ -212,6 +267,24 @@ class PlatformDriverAgent(Agent):
 
                 self.scalability_test = bool(config["scalability_test"])
                 self.scalability_test_iterations = int(config["scalability_test_iterations"])
+                self.scalability_test_warmup = int(config["scalability_test_warmup"])
+                self.scalability_test_report = config["scalability_test_report"]
+
+                self.worker_processes = int(config["worker_processes"])
+                self.device_workers = config["device_workers"] or {}
+                if self.worker_processes > 0 and self.shard_parent is None:
+                    if utils.get_messagebus() != 'zmq':
+                        _log.error("Driver worker processes require the zmq message bus, scraping all devices in the "
+                                   "platform driver")
+                    else:
+                        self._start_workers(config)
+
+                self.central_scheduler = bool(config["central_scheduler"])
+                if self.central_scheduler and not self.workers:
+                    self.scrape_scheduler = ScrapeScheduler(float(config["scheduler_tick"]),
+                                                            interface_concurrency=config["interface_concurrency"])
+                    self.scrape_scheduler.start()
+                    _log.info("Scraping devices with the central scrape scheduler")
 
                 if self.scalability_test:
                     self.waiting_to_finish = set()
@@ -229,6 +302,18 @@ class PlatformDriverAgent(Agent):
                 _log.info("The platform driver must be restarted for changes to the max_open_sockets setting to take "
                           "effect")
 
+            if self.worker_processes != int(config["worker_processes"]) or \
+                    self.device_workers != (config["device_workers"] or {}):
+                _log.info("The platform driver must be restarted for changes to the worker_processes and "
+                          "device_workers settings to take effect")
+            elif self.workers:
+                _log.info("The platform driver must be restarted for configuration changes to take effect in the "
+                          "driver worker processes")
+
+            if self.central_scheduler != bool(config["central_scheduler"]):
+                _log.info("The platform driver must be restarted for changes to the central_scheduler setting to take "
+                          "effect")
+
             if self.max_concurrent_publishes != config["max_concurrent_publishes"]:
                 _log.info("The platform driver must be restarted for changes to the max_concurrent_publishes setting to "
                           "take effect")
@@ -293,6 +378,13 @@ class PlatformDriverAgent(Agent):
             _log.info("Running scalability test. Settings may not be changed without restart.")
             return
 
+        self.settings = config
+        try:
+            self.update_stats_publish(float(config["stats_publish_interval"] or 0.0))
+        except ValueError as e:
+            _log.error("ERROR PROCESSING CONFIGURATION: {}".format(e))
+            _log.error("Platform driver stats publish settings unchanged")
+
         if (self.driver_scrape_interval != driver_scrape_interval or
                 self.group_offset_interval != group_offset_interval):
             self.driver_scrape_interval = driver_scrape_interval
@@ -303,7 +395,7 @@ class PlatformDriverAgent(Agent):
             # Reset all scrape schedules
             self.freed_time_slots.clear()
             self.group_counts.clear()
-            for driver in self.instances.values():
+            for driver in self.driver_agents():
                 time_slot = self.group_counts[driver.group]
                 driver.update_scrape_schedule(time_slot, self.driver_scrape_interval,
                                               driver.group, self.group_offset_interval)
@@ -315,12 +407,62 @@ class PlatformDriverAgent(Agent):
         self.publish_breadth_first = bool(config["publish_breadth_first"])
 
         # Update the publish settings on running devices.
-        for driver in self.instances.values():
+        for driver in self.driver_agents():
             driver.update_publish_types(self.publish_depth_first_all,
                                         self.publish_breadth_first_all,
                                         self.publish_depth_first,
                                         self.publish_breadth_first)
 
+        if action == "NEW" and self.shard_parent is not None:
+            self.core.spawn(self._notify_shard_parent)
+
+    def _start_workers(self, config):
+        worker_config = dict(config)
+        worker_config.update(worker_processes=0, device_workers={}, shard_parent=self.core.identity,
+                             scalability_test=False, stats_publish_interval=0)
+        if self.scalability_test:
+            _log.warning("Scalability tests are not supported with driver worker processes")
+        if config["max_open_sockets"] is not None:
+            # The socket limit is shared by the workers
+            worker_config["max_open_sockets"] = max(1, int(config["max_open_sockets"]) // self.worker_processes)
+        for index in range(self.worker_processes):
+            worker = ShardWorker(self, index, worker_config)
+            worker.start()
+            self.workers.append(worker)
+        _log.info("Scraping devices in {} driver worker processes".format(self.worker_processes))
+
+    def _notify_shard_parent(self):
+        try:
+            self.vip.rpc.call(self.shard_parent, 'driver_worker_started', self.core.identity).get(timeout=30.0)
+        except Exception as e:
+            _log.error("Failed to notify platform driver {} of worker start: {}".format(self.shard_parent, e))
+
+    def _check_shard_caller(self, worker_only=False):
+        """
+        Driver workers only accept RPC calls of their platform driver.
+
+        :param worker_only: the method is only available on driver workers
+        """
+        if self.shard_parent is None:
+            if worker_only:
+                raise RuntimeError("Only available on driver worker processes")
+            return
+        peer = self.vip.rpc.context.vip_message.peer
+        if peer != self.shard_parent:
+            raise RuntimeError("Driver worker {} only accepts calls from {}, not from {}".format(
+                self.core.identity, self.shard_parent, peer))
+
+    @Core.receiver('onstop')
+    def stop_workers(self, sender, **kwargs):
+        for worker in self.workers:
+            worker.stop()
+
+    def driver_agents(self):
+        """
+        :return: the DriverAgents of the devices scraped by this agent
+        """
+        return [driver for driver in self.instances.values() if not isinstance(driver, RemoteDriver)]
+
     def derive_device_topic(self, config_name):
         _, topic = config_name.split('/', 1)
         return topic
@@ -335,6 +477,14 @@ class PlatformDriverAgent(Agent):
 
         _log.info("Stopping driver: {}".format(real_name))
 
+        if isinstance(driver, RemoteDriver):
+            driver.worker.remove_device(real_name)
+            return
+
+        if self.scrape_scheduler is not None:
+            self.scrape_scheduler.remove(real_name)
+        self.scrape_telemetry.remove(real_name)
+
         try:
             driver.core.stop(timeout=5.0)
         except Exception as e:
@@ -348,6 +498,15 @@ class PlatformDriverAgent(Agent):
         topic = self.derive_device_topic(config_name)
         self.stop_driver(topic)
 
+        if self.workers:
+            worker = self.workers[assign_worker(topic, len(self.workers), self.device_workers)]
+            _log.info("Starting driver: {} on {}".format(topic, worker.identity))
+            self.instances[topic] = RemoteDriver(worker, topic, contents)
+            self._name_map[topic.lower()] = topic
+            self._update_override_state(topic, 'add')
+            worker.add_device(topic, contents)
+            return
+
         group = int(contents.get("group", 0))
 
         slot = self.group_counts[group]
@@ -361,7 +520,8 @@ class PlatformDriverAgent(Agent):
                              self.publish_depth_first_all,
                              self.publish_breadth_first_all,
                              self.publish_depth_first,
-                             self.publish_breadth_first)
+                             self.publish_breadth_first,
+                             self.scrape_scheduler)
         gevent.spawn(driver.core.run)
         self.instances[topic] = driver
         self.group_counts[group] += 1
@@ -373,6 +533,50 @@ class PlatformDriverAgent(Agent):
         self.stop_driver(topic)
         self._update_override_state(topic, 'remove')
 
+    @RPC.export
+    def add_device(self, path, contents):
+        """RPC method
+
+        Start scraping a device. Called by the platform driver on its driver
+        worker processes.
+
+        :param path: device path
+        :type path: str
+        :param contents: device configuration
+        :type contents: dict
+        """
+        self._check_shard_caller(worker_only=True)
+        self.update_driver("devices/" + path, "NEW", contents)
+
+    @RPC.export
+    def remove_device(self, path):
+        """RPC method
+
+        Stop scraping a device. Called by the platform driver on its driver
+        worker processes.
+
+        :param path: device path
+        :type path: str
+        """
+        self._check_shard_caller(worker_only=True)
+        self.remove_driver("devices/" + path, "DELETE", None)
+
+    @RPC.export
+    def driver_worker_started(self, identity):
+        """RPC method
+
+        Called by a driver worker process when it is ready to scrape devices.
+
+        :param identity: identity of the worker
+        :type identity: str
+        """
+        peer = self.vip.rpc.context.vip_message.peer
+        for worker in self.workers:
+            if worker.identity == identity and peer == identity:
+                self.core.spawn(worker.started)
+                return
+        _log.warning("Unknown driver worker {} started, called by {}".format(identity, peer))
+
     # def device_startup_callback(self, topic, driver):
     #     _log.debug("Driver hooked up for "+topic)
     #     topic = topic.strip('/')
@@ -405,20 +609,86 @@ class PlatformDriverAgent(Agent):
             end = datetime.now()
             delta = end - self.current_test_start
             delta = delta.total_seconds()
-            self.test_results.append(delta)
-
             self.test_iterations += 1
 
+            if self.test_iterations <= self.scalability_test_warmup:
+                _log.info("warm up publish {} took {} seconds".format(self.test_iterations, delta))
+                # Only the measured iterations count in the report
+                self.scrape_telemetry.reset()
+                return
+
+            self.test_results.append(delta)
+
             _log.info("publish {} took {} seconds".format(self.test_iterations, delta))
 
-            if self.test_iterations >= self.scalability_test_iterations:
+            if len(self.test_results) >= self.scalability_test_iterations:
                 # Test is now over. Button it up and shutdown.
                 mean = math_utils.mean(self.test_results)
-                stdev = math_utils.stdev(self.test_results)
+                stdev = math_utils.stdev(self.test_results) if len(self.test_results) > 1 else 0.0
                 _log.info("Mean total publish time: "+str(mean))
                 _log.info("Std dev publish time: "+str(stdev))
+                self.write_scalability_report(mean, stdev)
                 sys.exit(0)
 
+    def write_scalability_report(self, mean, stdev):
+        """
+        Append the results of a scalability test, the settings of the
+        platform driver and the scrape statistics by driver type to the
+        scalability_test_report file as one line of JSON, so reports of
+        repeated tests can be compared.
+        """
+        if not self.scalability_test_report:
+            return
+        report = {"timestamp": utils.format_timestamp(utils.get_aware_utc_now()),
+                  "devices": len(self.instances),
+                  "driver_types": dict(Counter(driver.config["driver_type"] for driver in self.driver_agents())),
+                  "warmup_iterations": self.scalability_test_warmup,
+                  "iterations": len(self.test_results),
+                  "results": self.test_results,
+                  "mean": mean,
+                  "stdev": stdev,
+                  "min": min(self.test_results),
+                  "max": max(self.test_results),
+                  "settings": self.settings,
+                  "scrape_stats": self.scrape_telemetry.get_stats()["interfaces"]}
+        try:
+            with open(self.scalability_test_report, 'a') as report_file:
+                report_file.write(jsonapi.dumps(report) + "\n")
+            _log.info("Scalability test report written to {}".format(self.scalability_test_report))
+        except OSError as e:
+            _log.error("Failed to write scalability test report {}: {}".format(self.scalability_test_report, e))
+
+    def record_scrape(self, device_path, driver_type, duration, points=None, lateness=None, failed=False):
+        """
+        Called by the DriverAgents after every scrape.
+        """
+        self.scrape_telemetry.record(device_path, driver_type, duration, points, lateness, failed)
+
+    def update_stats_publish(self, interval):
+        """
+        Publish the scrape statistics every interval seconds, never if the
+        interval is 0 or for driver workers.
+        """
+        if self.shard_parent is not None or interval == self.stats_publish_interval:
+            return
+        self.stats_publish_interval = interval
+        if self._stats_publish_event is not None:
+            self._stats_publish_event.cancel()
+            self._stats_publish_event = None
+        if interval > 0:
+            self._stats_publish_event = self.core.schedule(periodic(interval), self.publish_scrape_stats)
+
+    def publish_scrape_stats(self):
+        try:
+            stats = self.get_scrape_stats()
+        except Exception as e:
+            _log.error("Failed to collect scrape statistics: {}".format(e))
+            return
+        utcnow_string = utils.format_timestamp(utils.get_aware_utc_now())
+        headers = {headers_mod.DATE: utcnow_string,
+                   headers_mod.TIMESTAMP: utcnow_string}
+        self.vip.pubsub.publish('pubsub', DRIVER_STATS(agent=self.core.identity), headers=headers, message=stats)
+
     @RPC.export
     def get_point(self, path, point_name, **kwargs):
         """RPC method
@@ -431,6 +701,7 @@ class PlatformDriverAgent(Agent):
         :param kwargs: additional arguments for the device
         :type kwargs: arguments pointer
         """
+        self._check_shard_caller()
         return self.instances[path].get_point(point_name, **kwargs)
 
     @RPC.export
@@ -447,6 +718,7 @@ class PlatformDriverAgent(Agent):
         :param kwargs: additional arguments for the device
         :type kwargs: arguments pointer
         """
+        self._check_shard_caller()
         if path in self._override_devices:
             raise OverrideError(
                 "Cannot set point on device {} since global override is set".format(path))
@@ -455,10 +727,12 @@ class PlatformDriverAgent(Agent):
 
     @RPC.export
     def scrape_all(self, path):
+        self._check_shard_caller()
         return self.instances[path].scrape_all()
 
     @RPC.export
     def get_multiple_points(self, path, point_names, **kwargs):
+        self._check_shard_caller()
         return self.instances[path].get_multiple_points(point_names, **kwargs)
 
     @RPC.export
@@ -473,20 +747,84 @@ class PlatformDriverAgent(Agent):
         :param kwargs: additional arguments for the device
         :type kwargs: arguments pointer
         """
+        self._check_shard_caller()
         if path in self._override_devices:
             raise OverrideError(
                 "Cannot set point on device {} since global override is set".format(path))
         else:
             return self.instances[path].set_multiple_points(point_names_values, **kwargs)
 
+    @RPC.export
+    def get_device_schema(self, path):
+        """RPC method
+
+        Get the schema of the compact publishes of a device, for subscribers
+        that missed the last schema publish.
+
+        :param path: device path
+        :type path: str
+        :return: schema with the id, the ordered point names and their metadata
+        :rtype: dict
+        """
+        self._check_shard_caller()
+        return self.instances[path].schema
+
+    @RPC.export
+    def get_scrape_schedule(self):
+        """RPC method
+
+        Get the scrape offset, average scrape duration and the number of
+        scrapes, overruns (scrapes skipped because the previous scrape was
+        still running) and missed scrapes of every device. Only available with
+        the central scrape scheduler.
+
+        :return: dictionary of scrape information by device path
+        :rtype: dict
+        """
+        if self.workers:
+            schedule = {}
+            for worker in self.workers:
+                schedule.update(worker.call('get_scrape_schedule'))
+            return schedule
+        if self.scrape_scheduler is None:
+            return {}
+        return self.scrape_scheduler.get_schedule()
+
+    @RPC.export
+    def get_scrape_stats(self, path=None):
+        """RPC method
+
+        Get the scrape statistics of every device and driver type since the
+        platform driver started: the number of scrapes and failed scrapes and
+        histograms of the scrape duration, the number of points scraped and
+        the lateness of the scrapes in seconds.
+
+        :param path: only include this device
+        :type path: str
+        :return: dictionary with the statistics by device and by driver type
+        :rtype: dict
+        """
+        if self.workers:
+            return merge_stats([worker.call('get_scrape_stats', path) for worker in self.workers])
+        return self.scrape_telemetry.get_stats(path)
+
     @RPC.export
     def heart_beat(self):
         """RPC method
 
         Sends heartbeat to all devices
         """
+        self._check_shard_caller()
         _log.debug("sending heartbeat")
-        for device in self.instances.values():
+        for worker in self.workers:
+            if not worker.ready.is_set():
+                _log.debug("Skipping heart_beat of driver worker {} which is not running".format(worker.identity))
+                continue
+            try:
+                worker.call('heart_beat')
+            except (Exception, gevent.Timeout) as e:
+                _log.warning(f'Failed to send heart_beat to driver worker: {worker.identity} -- {e}.')
+        for device in self.driver_agents():
             try:
                 device.heart_beat()
             except (Exception, gevent.Timeout) as e:
@@ -505,6 +843,7 @@ class PlatformDriverAgent(Agent):
         :param kwargs: additional arguments for the device
         :type kwargs: arguments pointer
         """
+        self._check_shard_caller()
         if path in self._override_devices:
             raise OverrideError(
                 "Cannot revert point on device {} since global override is set".format(path))
@@ -522,6 +861,7 @@ class PlatformDriverAgent(Agent):
         :param kwargs: additional arguments for the device
         :type kwargs: arguments pointer
         """
+        self._check_shard_caller()
         if path in self._override_devices:
             raise OverrideError(
                 "Cannot revert device {} since global override is set".format(path))
@@ -760,6 +1100,7 @@ class PlatformDriverAgent(Agent):
         :param point_name: name of the point in the COV notification
         :param point_values: dictionary of updated values sent by the device
         """
+        self._check_shard_caller()
         for driver in self.instances.values():
             if driver.device_path == source_address:
                 driver.publish_cov_value(point_name, point_values)
@@ -0,0 +1,253 @@
+# -*- coding: utf-8 -*- {{{
+# ===----------------------------------------------------------------------===
+#
+#                 Component of Eclipse VOLTTRON
+#
+# ===----------------------------------------------------------------------===
+#
+# Copyright 2023 Battelle Memorial Institute
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not
+# use this file except in compliance with the License. You may obtain a copy
+# of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+#
+# ===----------------------------------------------------------------------===
+# }}}
+
+"""
+Pool of persistent client connections to TCP gateways.
+
+Connections are keyed by (host, port), so all devices behind the same gateway
+share its connections instead of opening a new connection for every scrape.
+Each gateway allows at most ``max_connections`` connections in use at a time.
+Idle connections are kept open for ``idle_timeout`` seconds and checked
+before they are reused. A connection that fails is closed, and after a failed
+connection attempt the gateway is not contacted again until an exponentially
+growing backoff has passed.
+
+A connection holds the driver's socket_lock only while it is in use. Idle
+connections are not counted against max_open_sockets.
+
+Clients are created by a factory and must provide ``connect()`` (returning
+True on success), ``close()`` and ``is_socket_open()``, as the pymodbus
+clients do.
+"""
+
+import logging
+import select
+import time
+from contextlib import contextmanager
+
+from gevent.lock import BoundedSemaphore
+
+from platform_driver.driver_locks import socket_lock
+
+_log = logging.getLogger(__name__)
+
+DEFAULT_MAX_CONNECTIONS = 1
+DEFAULT_IDLE_TIMEOUT = 300.0
+DEFAULT_INITIAL_BACKOFF = 1.0
+DEFAULT_MAX_BACKOFF = 60.0
+
+
+class Gateway:
+    """
+    Connections to a single (host, port)
+
+    :param host: host name or IP address of the gateway
+    :param port: TCP port of the gateway
+    :param max_connections: maximum number of connections in use at a time
+    :param idle_timeout: seconds an unused connection is kept open
+    :param initial_backoff: seconds before reconnecting after the first failed connection attempt
+    :param max_backoff: maximum seconds between reconnection attempts
+    """
+
+    def __init__(self, host, port, max_connections=DEFAULT_MAX_CONNECTIONS, idle_timeout=DEFAULT_IDLE_TIMEOUT,
+                 initial_backoff=DEFAULT_INITIAL_BACKOFF, max_backoff=DEFAULT_MAX_BACKOFF):
+        self.host = host
+        self.port = port
+        self.max_connections = max(1, int(max_connections))
+        self.idle_timeout = float(idle_timeout)
+        self.initial_backoff = float(initial_backoff)
+        self.max_backoff = float(max_backoff)
+        self.semaphore = BoundedSemaphore(self.max_connections)
+        # (client, last used time) of open connections that are not in use
+        self.idle = []
+        self.failures = 0
+        self.retry_at = 0.0
+
+    def backoff(self):
+        """
+        :return: seconds to wait before the next connection attempt
+        """
+        if not self.failures:
+            return 0.0
+        return min(self.max_backoff, self.initial_backoff * 2 ** (self.failures - 1))
+
+    def connection_failed(self, now):
+        self.failures += 1
+        self.retry_at = now + self.backoff()
+
+    def connection_succeeded(self):
+        self.failures = 0
+        self.retry_at = 0.0
+
+    def close_idle(self, now=None):
+        """
+        Close idle connections. If now is given only connections unused for
+        idle_timeout seconds are closed.
+        """
+        keep = []
+        for client, last_used in self.idle:
+            if now is not None and now - last_used < self.idle_timeout:
+                keep.append((client, last_used))
+            else:
+                _close_client(client)
+        self.idle = keep
+
+
+class ConnectionPool:
+    """
+    Pool of client connections keyed by (host, port)
+
+    :param client_factory: callable taking host, port and keyword arguments
+                           that returns a new, unconnected client
+    :param connection_error: exception class raised if a connection can not
+                             be established
+    :param broken_errors: exceptions that close the connection they were
+                          raised on
+    """
+
+    def __init__(self, client_factory, connection_error=ConnectionError, broken_errors=(OSError,)):
+        self.client_factory = client_factory
+        self.connection_error = connection_error
+        self.broken_errors = tuple(broken_errors)
+        self.gateways = {}
+        self._last_sweep = time.monotonic()
+
+    def configure_gateway(self, host, port, **kwargs):
+        """
+        Return the gateway for host and port, creating it with the given
+        settings if it does not exist yet. Settings of an existing gateway
+        are not changed.
+
+        :param kwargs: settings of :py:class:`Gateway`
+        """
+        key = (host, port)
+        gateway = self.gateways.get(key)
+        if gateway is None:
+            gateway = self.gateways[key] = Gateway(host, port, **kwargs)
+        elif kwargs.get('max_connections', gateway.max_connections) != gateway.max_connections:
+            _log.warning("Gateway {}:{} already configured with {} connections".format(
+                host, port, gateway.max_connections))
+        return gateway
+
+    @contextmanager
+    def connection(self, host, port, **client_kwargs):
+        """
+        Context manager that checks out a connected client for host and port
+        and returns it to the pool afterwards. The client is closed instead if
+        one of the broken_errors or connection_error is raised while it is in use.
+
+        :param client_kwargs: additional arguments of client_factory
+        """
+        gateway = self.configure_gateway(host, port)
+        self._sweep()
+        with gateway.semaphore:
+            with socket_lock():
+                client = self._checkout(gateway, client_kwargs)
+                try:
+                    yield client
+                except self.broken_errors + (self.connection_error,):
+                    _log.debug("Closing connection to {}:{} after an error".format(host, port))
+                    _close_client(client)
+                    raise
+                except BaseException:
+                    # a device level error, the connection is still good
+                    self._checkin(gateway, client)
+                    raise
+                else:
+                    self._checkin(gateway, client)
+
+    def close_all(self):
+        """
+        Close all idle connections
+        """
+        for gateway in self.gateways.values():
+            gateway.close_idle()
+
+    def _checkout(self, gateway, client_kwargs):
+        while gateway.idle:
+            client, last_used = gateway.idle.pop()
+            if time.monotonic() - last_used < gateway.idle_timeout and _is_healthy(client):
+                return client
+            _close_client(client)
+
+        now = time.monotonic()
+        if now < gateway.retry_at:
+            raise self.connection_error("Not connecting to {}:{} for {:.1f} more seconds after {} failed "
+                                        "attempts".format(gateway.host, gateway.port, gateway.retry_at - now,
+                                                          gateway.failures))
+        client = self.client_factory(gateway.host, gateway.port, **client_kwargs)
+        try:
+            connected = client.connect()
+        except self.broken_errors as e:
+            _log.debug("Error connecting to {}:{}: {}".format(gateway.host, gateway.port, e))
+            connected = False
+        if not connected:
+            _close_client(client)
+            gateway.connection_failed(now)
+            _log.warning("Failed to connect to {}:{}, retrying in {:.1f} seconds".format(
+                gateway.host, gateway.port, gateway.backoff()))
+            raise self.connection_error("Failed to connect to {}:{}".format(gateway.host, gateway.port))
+        if gateway.failures:
+            _log.info("Reconnected to {}:{}".format(gateway.host, gateway.port))
+        gateway.connection_succeeded()
+        return client
+
+    def _checkin(self, gateway, client):
+        gateway.idle.append((client, time.monotonic()))
+
+    def _sweep(self):
+        """
+        Close connections that were idle too long, at most once a minute
+        """
+        now = time.monotonic()
+        if now - self._last_sweep < 60.0:
+            return
+        self._last_sweep = now
+        for gateway in self.gateways.values():
+            gateway.close_idle(now)
+
+
+def _is_healthy(client):
+    """
+    :return: False if the client's socket is closed. An idle socket that is
+             readable was closed by the peer or holds a stale response, and
+             is not reused either.
+    """
+    try:
+        if not client.is_socket_open():
+            return False
+        sock = getattr(client, 'socket', None)
+        if sock is None:
+            return True
+        readable, _, _ = select.select([sock], [], [], 0)
+        return not readable
+    except (OSError, ValueError):
+        return False
+
+
+def _close_client(client):
+    try:
+        client.close()
+    except Exception as e:
+        _log.debug("Error closing connection: {}".format(e))
@@ -24,9 +24,11 @@
 
 from volttron.platform.vip.agent import BasicAgent, Core
 from volttron.platform.agent import utils
+from volttron.platform.agent.device_schema import SCHEMA_TOPIC_SUFFIX, compact_values, make_schema
 import logging
 import random
 import gevent
+import time
 import traceback
 from volttron.platform.messaging import headers as headers_mod
 from volttron.platform.messaging.topics import (DRIVER_TOPIC_BASE,
@@ -49,6 +51,7 @@ class DriverAgent(BasicAgent):
                  default_publish_breadth_first_all=True,
                  default_publish_depth_first=True,
                  default_publish_breadth_first=True,
+                 scrape_scheduler=None,
                  **kwargs):
         super(DriverAgent, self).__init__(**kwargs)
         self.heart_beat_value = 0
@@ -76,6 +79,35 @@ class DriverAgent(BasicAgent):
         self.interval = interval
         self.periodic_read_event = None
 
+        # Report by exception: publish changed points only, with a full publish every full_publish_interval scrapes.
+        self.publish_on_change = bool(config.get("publish_on_change", False))
+        try:
+            self.full_publish_interval = int(config.get("full_publish_interval", 10))
+            if self.full_publish_interval < 1:
+                raise ValueError
+        except ValueError:
+            _log.warning("Invalid full_publish_interval {}. Defaulting to 10 scrapes.".format(
+                config.get("full_publish_interval")))
+            self.full_publish_interval = 10
+        self.deadbands = {}
+        self.last_published = {}
+        self.scrapes_until_full = 0
+
+        # Compact "all" publishes: values in schema order, the schema is published separately.
+        self.compact_publish = bool(config.get("compact_publish", False))
+        try:
+            self.schema_publish_interval = int(config.get("schema_publish_interval", 60))
+            if self.schema_publish_interval < 1:
+                raise ValueError
+        except ValueError:
+            _log.warning("Invalid schema_publish_interval {}. Defaulting to 60 scrapes.".format(
+                config.get("schema_publish_interval")))
+            self.schema_publish_interval = 60
+        self.schema = None
+        self.scrapes_until_schema = 0
+        # Central ScrapeScheduler of the platform driver, None if the device schedules its own scrapes.
+        self.scrape_scheduler = scrape_scheduler
+
         self.update_scrape_schedule(time_slot, driver_scrape_interval, group, group_offset_interval)
 
     def update_publish_types(self, publish_depth_first_all,
@@ -91,6 +123,12 @@ class DriverAgent(BasicAgent):
 
 
     def update_scrape_schedule(self, time_slot, driver_scrape_interval, group, group_offset_interval):
+        if self.scrape_scheduler is not None:
+            # The scheduler spreads the scrapes and sets time_slot_offset.
+            self.time_slot = time_slot
+            self.group = group
+            return
+
         self.time_slot_offset = (time_slot * driver_scrape_interval) + (group * group_offset_interval)
         self.time_slot = time_slot
         self.group = group
@@ -151,12 +189,16 @@ class DriverAgent(BasicAgent):
         # interval = self.config.get("interval", 60)
         # self.core.periodic(interval, self.periodic_read, wait=None)
 
+        self.all_path_depth, self.all_path_breadth = self.get_paths_for_point(DRIVER_TOPIC_ALL)
+
+        if self.scrape_scheduler is not None:
+            self.scrape_scheduler.add(self.device_path, self, self.interval, self.group, self.config["driver_type"])
+            return
+
         next_periodic_read = self.find_starting_datetime(utils.get_aware_utc_now())
 
         self.periodic_read_event = self.core.schedule(next_periodic_read, self.periodic_read, next_periodic_read)
 
-        self.all_path_depth, self.all_path_breadth = self.get_paths_for_point(DRIVER_TOPIC_ALL)
-
 
     def setup_device(self):
 
@@ -166,7 +208,7 @@ class DriverAgent(BasicAgent):
         registry_config = config.get("registry_config")
 
         self.heart_beat_point = config.get("heart_beat_point")
-
+        self.deadbands = self.get_deadbands(registry_config)
 
 
         self.interface = self.get_interface(driver_type, driver_config, registry_config)
@@ -190,6 +232,11 @@ class DriverAgent(BasicAgent):
                                      'type': ts_type,
                                      'tz': config.get('timezone', '')}
 
+        schema = make_schema(self.meta_data)
+        if self.schema is None or schema['id'] != self.schema['id']:
+            self.schema = schema
+            self.scrapes_until_schema = 0
+
         self.base_topic = DEVICES_VALUE(campus='',
                                         building='',
                                         unit='',
@@ -224,9 +271,19 @@ class DriverAgent(BasicAgent):
 
         self.periodic_read_event = self.core.schedule(next_scrape_time, self.periodic_read, next_scrape_time)
 
+        self.scrape_and_publish(now)
+
+    def scrape_and_publish(self, now):
+        """
+        Scrape the device and publish the results.
+
+        :param now: time the scrape was scheduled for
+        """
         _log.debug("scraping device: " + self.device_name)
 
         self.parent.scrape_starting(self.device_name)
+        start = time.time()
+        lateness = start - now.timestamp()
 
         try:
             results = self.interface.scrape_all()
@@ -237,12 +294,24 @@ class DriverAgent(BasicAgent):
         except (Exception, gevent.Timeout) as ex:
             tb = traceback.format_exc()
             _log.error('Failed to scrape ' + self.device_name + ':\n' + tb)
+            self.parent.record_scrape(self.device_path, self.config["driver_type"], time.time() - start,
+                                      lateness=lateness, failed=True)
             return
 
+        self.parent.record_scrape(self.device_path, self.config["driver_type"], time.time() - start,
+                                  points=len(results), lateness=lateness, failed=not results)
+
         # XXX: Does a warning need to be printed?
         if not results:
             return
 
+        publish_type = None
+        if self.publish_on_change:
+            results, publish_type = self.filter_changed_points(results)
+            if not results:
+                self.parent.scrape_ending(self.device_name)
+                return
+
         utcnow = utils.get_aware_utc_now()
         utcnow_string = utils.format_timestamp(utcnow)
         sync_timestamp = utils.format_timestamp(now - datetime.timedelta(seconds=self.time_slot_offset))
@@ -252,6 +321,8 @@ class DriverAgent(BasicAgent):
             headers_mod.TIMESTAMP: utcnow_string,
             headers_mod.SYNC_TIMESTAMP: sync_timestamp
         }
+        if publish_type is not None:
+            headers[headers_mod.PUBLISH_TYPE] = publish_type
 
         if self.publish_depth_first or self.publish_breadth_first:
             for point, value in results.items():
@@ -268,7 +339,17 @@ class DriverAgent(BasicAgent):
                                           headers=headers,
                                           message=message)
 
-        message = [results, self.meta_data]
+        if not (self.publish_depth_first_all or self.publish_breadth_first_all):
+            message = None
+        elif self.compact_publish:
+            self.publish_schema_if_due()
+            headers[headers_mod.SCHEMA_ID] = self.schema['id']
+            message = compact_values(self.schema, results)
+        elif publish_type == headers_mod.PUBLISH_TYPE.DELTA:
+            message = [results, {point: self.meta_data[point] for point in results}]
+        else:
+            message = [results, self.meta_data]
+
         if self.publish_depth_first_all:
             self._publish_wrapper(self.all_path_depth,
                                   headers=headers,
@@ -281,6 +362,84 @@ class DriverAgent(BasicAgent):
 
         self.parent.scrape_ending(self.device_name)
 
+    def publish_schema_if_due(self):
+        """
+        Publish the device schema of compact publishes on the first scrape,
+        when it changed and every schema_publish_interval scrapes.
+        """
+        if self.scrapes_until_schema > 0:
+            self.scrapes_until_schema -= 1
+            return
+        self.scrapes_until_schema = self.schema_publish_interval - 1
+        utcnow_string = utils.format_timestamp(utils.get_aware_utc_now())
+        headers = {
+            headers_mod.DATE: utcnow_string,
+            headers_mod.TIMESTAMP: utcnow_string,
+            headers_mod.SCHEMA_ID: self.schema['id']
+        }
+        self._publish_wrapper(self.base_topic(point=SCHEMA_TOPIC_SUFFIX), headers=headers, message=self.schema)
+
+    @staticmethod
+    def get_deadbands(registry_config):
+        """
+        Read the "Deadband" (absolute) and "Percent Deadband" columns of a CSV
+        registry configuration.
+
+        :return: dictionary of (absolute, percent) deadbands by point name
+        """
+        deadbands = {}
+        if not isinstance(registry_config, list):
+            return deadbands
+        for row in registry_config:
+            if not isinstance(row, dict) or not row.get("Volttron Point Name"):
+                continue
+            point = row["Volttron Point Name"]
+            try:
+                absolute = float(row.get("Deadband") or 0.0)
+                percent = float(row.get("Percent Deadband") or 0.0)
+            except (TypeError, ValueError):
+                _log.warning("Invalid deadband for point {}. Publishing all changes.".format(point))
+                continue
+            if absolute or percent:
+                deadbands[point] = (abs(absolute), abs(percent))
+        return deadbands
+
+    def filter_changed_points(self, results):
+        """
+        Select the points to publish when publishing on change. Every
+        full_publish_interval scrapes all points are published. Otherwise only
+        points whose value changed since it was last published are, where
+        numeric values must change by more than the absolute deadband and the
+        percent deadband of the point.
+
+        :param results: scrape results
+        :return: (points to publish, publish type) where the publish type is
+                 headers_mod.PUBLISH_TYPE.FULL or headers_mod.PUBLISH_TYPE.DELTA
+        """
+        if self.scrapes_until_full <= 0:
+            self.scrapes_until_full = self.full_publish_interval - 1
+            self.last_published = dict(results)
+            return results, headers_mod.PUBLISH_TYPE.FULL
+
+        self.scrapes_until_full -= 1
+        changed = {}
+        for point, value in results.items():
+            if point in self.last_published and not self._value_changed(point, self.last_published[point], value):
+                continue
+            changed[point] = value
+            self.last_published[point] = value
+        return changed, headers_mod.PUBLISH_TYPE.DELTA
+
+    def _value_changed(self, point, last, value):
+        if value == last and type(value) is type(last):
+            return False
+        if point not in self.deadbands or isinstance(value, bool) or isinstance(last, bool) or \
+                not isinstance(value, (int, float)) or not isinstance(last, (int, float)):
+            return True
+        absolute, percent = self.deadbands[point]
+        change = abs(value - last)
+        return change > absolute and change > abs(last) * percent / 100.0
+
     def _publish_wrapper(self, topic, headers, message):
         while True:
             try:
@@ -374,6 +533,7 @@ class DriverAgent(BasicAgent):
         :param point_name: point which sent COV notifications
         :param point_values: COV point values
         """
+        self.interface.cov_update(point_name, point_values)
         utcnow = utils.get_aware_utc_now()
         utcnow_string = utils.format_timestamp(utcnow)
         headers = {
@@ -385,6 +385,17 @@ class BaseInterface(object, metaclass=abc.ABCMeta):
         :param kwargs: Any interface specific parameters.
         """
 
+    def cov_update(self, point_name, point_values):
+        """
+        Called with the values of a change of value notification for a point
+        of the device. Interfaces that keep point values may update them.
+
+        :param point_name: Name of the point
+        :param point_values: Property names to values of the notification
+        :type point_name: str
+        :type point_values: dict
+        """
+
     def get_multiple_points(self, path, point_names, **kwargs):
         """
         Read multiple points from the interface.
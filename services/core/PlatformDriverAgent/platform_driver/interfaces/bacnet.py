@@ -24,10 +24,11 @@
 
 import gevent
 import logging
+import time
 from datetime import datetime, timedelta
 
 from platform_driver.driver_exceptions import DriverConfigError
-from platform_driver.interfaces import BaseInterface, BaseRegister
+from platform_driver.interfaces import BaseInterface, BaseRegister, DriverInterfaceError
 from volttron.platform.vip.agent import errors
 from volttron.platform.jsonrpc import RemoteError
 
@@ -60,13 +61,18 @@ class Interface(BaseInterface):
         self.register_count = 10000
         self.register_count_divisor = 1
         self.cov_points = []
+        # latest (value, time) of COV points from change of value notifications
+        self.cov_cache = {}
 
     def configure(self, config_dict, registry_config_str):
         self.min_priority = config_dict.get("min_priority", 8)
+        self.cov_first = bool(config_dict.get("cov_first", False))
         self.parse_config(registry_config_str)
         self.target_address = config_dict.get("device_address")
         self.device_id = int(config_dict.get("device_id"))
         self.cov_lifetime = config_dict.get("cov_lifetime", DEFAULT_COV_LIFETIME)
+        # Subscriptions are renewed before the lifetime ends and devices notify the current value on every renewal.
+        self.cov_stale_after = float(config_dict.get("cov_stale_after", 2 * self.cov_lifetime))
         self.proxy_address = config_dict.get("proxy_address", "platform.bacnet_proxy")
         self.max_per_request = config_dict.get("max_per_request", 24)
         self.use_read_multiple = config_dict.get("use_read_multiple", True)
@@ -143,6 +149,8 @@ class Interface(BaseInterface):
                 priority if priority is not None else register.priority,
                 register.index]
         result = self.vip.rpc.call(self.proxy_address, 'write_property', *args).get(timeout=self.timeout)
+        # The cached value is outdated until the device notifies the change
+        self.cov_cache.pop(point_name, None)
         return result
 
     def scrape_all(self):
@@ -151,12 +159,19 @@ class Interface(BaseInterface):
         read_registers = self.get_registers_by_type("byte", True)
         write_registers = self.get_registers_by_type("byte", False)
 
+        cached = self.get_cached_values() if self.cov_first else {}
+
         for register in read_registers + write_registers:
+            if register.point_name in cached:
+                continue
             point_map[register.point_name] = [register.object_type,
                                               register.instance_number,
                                               register.property,
                                               register.index]
 
+        if not point_map:
+            return cached
+
         while True:
             try:
                 result = self.vip.rpc.call(self.proxy_address, 'read_properties',
@@ -185,8 +200,28 @@ class Interface(BaseInterface):
             else:
                 break
 
+        result.update(cached)
         return result
 
+    def get_cached_values(self):
+        """
+        :return: values of the COV points notified within cov_stale_after seconds
+        """
+        oldest = time.time() - self.cov_stale_after
+        return {point_name: value for point_name, (value, timestamp) in self.cov_cache.items()
+                if timestamp >= oldest}
+
+    def cov_update(self, point_name, point_values):
+        """
+        Keep the value of the property of the point from a COV notification.
+        """
+        try:
+            register = self.get_register_by_name(point_name)
+        except DriverInterfaceError:
+            return
+        if register.property in point_values:
+            self.cov_cache[point_name] = (point_values[register.property], time.time())
+
     def revert_all(self, priority=None):
         """
         Revert entrire device to it's default state
@@ -218,7 +253,8 @@ class Interface(BaseInterface):
             point_name = regDef.get('Volttron Point Name')
 
             # checks if the point is flagged for change of value
-            is_cov = regDef.get("COV Flag", 'false').lower() == "true"
+            cov_flag = (regDef.get("COV Flag") or '').strip().lower()
+            is_cov = cov_flag == "true"
 
             index = int(regDef.get('Index'))
 
@@ -259,7 +295,8 @@ class Interface(BaseInterface):
 
             self.insert_register(register)
 
-            if is_cov:
+            # In COV first mode the present value of objects supporting COV is subscribed unless the flag is false
+            if is_cov or (self.cov_first and not cov_flag and property_name == "presentValue"):
                 self.cov_points.append(point_name)
 
     def establish_cov_subscription(self, point_name, lifetime, renew=False):
@@ -34,9 +34,15 @@ from volttron.platform.vip.agent import Agent
 import logging
 import requests
 from requests import get
+from requests.adapters import HTTPAdapter
 
 _log = logging.getLogger(__name__)
 
+# seconds to wait for Home Assistant to answer a request
+DEFAULT_TIMEOUT = 30.0
+# keep-alive connections kept open to Home Assistant
+POOL_SIZE = 4
+
 
 # ===================
 # Types and Registers
@@ -81,29 +87,61 @@ class HomeAssistantRegister(BaseRegister):
 
 
 class HomeAssistantAPI:
-    """Thin wrapper for HA HTTP API."""
+    """
+    Thin wrapper for HA HTTP API.
 
-    def __init__(self, ip, port, token):
+    All requests share a keep-alive session, so scrapes and writes reuse
+    open connections to Home Assistant.
+    """
+
+    def __init__(self, ip, port, token, timeout=DEFAULT_TIMEOUT):
         self.base_url = f"http://{ip}:{port}/api"
         self.headers = {
             "Authorization": f"Bearer {token}",
             "Content-Type": "application/json",
         }
+        self.timeout = timeout
+        self.session = requests.Session()
+        self.session.headers.update(self.headers)
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=POOL_SIZE)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
 
     def get_state(self, entity_id):
         url = f"{self.base_url}/states/{entity_id}"
         try:
-            resp = requests.get(url, headers=self.headers)
+            resp = self.session.get(url, timeout=self.timeout)
             if resp.status_code == 200:
                 return resp.json()
             raise Exception(f"GET {url} failed {resp.status_code} {resp.text}")
         except requests.RequestException as e:
             raise Exception(f"GET {url} error {e}") from e
 
+    def get_states(self, entity_ids=None):
+        """
+        Fetch the states of all entities with a single request.
+
+        :param entity_ids: only keep the states of these entities
+        :return: dictionary of entity data by entity id
+        """
+        url = f"{self.base_url}/states"
+        try:
+            resp = self.session.get(url, timeout=self.timeout)
+            if resp.status_code != 200:
+                raise Exception(f"GET {url} failed {resp.status_code} {resp.text}")
+            states = resp.json()
+        except requests.RequestException as e:
+            raise Exception(f"GET {url} error {e}") from e
+        return {
+            entity_data["entity_id"]: entity_data
+            for entity_data in states
+            if entity_ids is None or entity_data.get("entity_id") in entity_ids
+        }
+
     def service_call(self, device, action, payload, desc):
         url = f"{self.base_url}/services/{device}/{action}"
         try:
-            resp = requests.post(url, headers=self.headers, json=payload)
+            resp = self.session.post(url, json=payload, timeout=self.timeout)
             if resp.status_code == 200:
                 _log.info("Success: %s", desc)
                 return resp.json() if resp.content else None
@@ -115,6 +153,52 @@ class HomeAssistantAPI:
             _log.error(msg)
             raise Exception(msg) from e
 
+    def close(self):
+        self.session.close()
+
+
+class ServiceCallBatch:
+    """
+    Collects the service calls of several point writes and sends the calls
+    of the same service with the same data as one call with a list of
+    entity ids, e.g. turning on ten lights is a single light/turn_on call.
+
+    Entity handlers use it in place of :py:class:`HomeAssistantAPI`.
+    """
+
+    def __init__(self):
+        # point being written, the service calls are tagged with it
+        self.point_name = None
+        # (device, action, data key) -> [device, action, data, entity ids, point names]
+        self._calls = {}
+
+    def service_call(self, device, action, payload, desc):
+        data = {k: v for k, v in payload.items() if k != "entity_id"}
+        key = (device, action, json.dumps(data, sort_keys=True))
+        call = self._calls.setdefault(key, [device, action, data, [], []])
+        if payload["entity_id"] not in call[3]:
+            call[3].append(payload["entity_id"])
+        call[4].append(self.point_name)
+
+    def send(self, api):
+        """
+        Send the collected service calls.
+
+        :param api: HomeAssistantAPI to send the calls with
+        :return: dictionary of the exception by point name of the failed calls
+        """
+        errors = {}
+        for device, action, data, entity_ids, point_names in self._calls.values():
+            payload = {"entity_id": entity_ids[0] if len(entity_ids) == 1 else entity_ids}
+            payload.update(data)
+            try:
+                api.service_call(device, action, payload, f"{device}/{action} {', '.join(entity_ids)}")
+            except Exception as e:
+                for point_name in point_names:
+                    errors[point_name] = e
+        self._calls.clear()
+        return errors
+
 
 # ===================
 # Entity Abstractions
@@ -361,12 +445,18 @@ class EntityFactory:
         """Allow overriding or adding new domain handlers."""
         self._registry[domain] = entity_cls
 
-    def create(self, entity_id):
-        if not self.api:
+    def create(self, entity_id, api=None):
+        """
+        :param entity_id: Home Assistant entity id
+        :param api: sends the service calls of the handler in place of the
+                    factory API, e.g. a ServiceCallBatch
+        """
+        api = api or self.api
+        if not api:
             raise Exception("API not initialized")
         domain = entity_id.split(".", 1)[0]
         entity_cls = self._registry.get(domain, HomeAssistantEntity)
-        return entity_cls(self.api, entity_id)
+        return entity_cls(api, entity_id)
 
 
 # =======================
@@ -384,6 +474,7 @@ class Interface(BasicRevert, BaseInterface):
         self.units = None
         self.api = None
         self.entity_factory = None
+        self.bulk_states = True
 
     def configure(self, config_dict, registry_config_str):
         self.ip_address = config_dict.get("ip_address")
@@ -400,7 +491,13 @@ class Interface(BasicRevert, BaseInterface):
             _log.error("Port is not set.")
             raise ValueError("Port is required.")
 
-        self.api = HomeAssistantAPI(self.ip_address, int(self.port), self.access_token)
+        # fetch the states of all entities with one request per scrape
+        self.bulk_states = config_dict.get("bulk_states", True)
+
+        if self.api is not None:
+            self.api.close()
+        self.api = HomeAssistantAPI(self.ip_address, int(self.port), self.access_token,
+                                    timeout=float(config_dict.get("timeout", DEFAULT_TIMEOUT)))
         self.entity_factory = EntityFactory(self.api)
         self.parse_config(registry_config_str)
 
@@ -420,6 +517,44 @@ class Interface(BasicRevert, BaseInterface):
 
     def _set_point(self, point_name, value):
         register = self.get_register_by_name(point_name)
+        register.value = self._write_point(register, value, self.api)
+        return register.value
+
+    def set_multiple_points(self, path, point_names_values, **kwargs):
+        """
+        Set multiple points, sending one service call for all the entities
+        written with the same service and data.
+        """
+        results = {}
+        batch = ServiceCallBatch()
+        written = {}
+        for point_name, value in point_names_values:
+            try:
+                register = self.get_register_by_name(point_name)
+                batch.point_name = point_name
+                written[point_name] = (register, self._write_point(register, value, batch))
+            except Exception as e:
+                results[path + '/' + point_name] = repr(e)
+
+        errors = batch.send(self.api)
+        for point_name, (register, cast_value) in written.items():
+            if point_name in errors:
+                results[path + '/' + point_name] = repr(errors[point_name])
+                continue
+            register.value = cast_value
+            self._tracker.mark_dirty_point(point_name)
+        return results
+
+    def _write_point(self, register, value, api):
+        """
+        Validate the value of a point and send the service call writing it.
+
+        :param register: register of the point
+        :param value: value to write
+        :param api: HomeAssistantAPI or ServiceCallBatch sending the call
+        :return: value cast to the register type
+        """
+        point_name = register.point_name
         if register.read_only:
             raise IOError(
                 "Trying to write to a point configured read only: " + point_name
@@ -431,7 +566,7 @@ class Interface(BasicRevert, BaseInterface):
         except Exception as e:
             raise ValueError(f"Cannot cast {value!r} to {register.reg_type}") from e
 
-        handler = self.entity_factory.create(register.entity_id)
+        handler = self.entity_factory.create(register.entity_id, api=api)
         entity_point = register.entity_point
 
         if entity_point == "state":
@@ -448,22 +583,31 @@ class Interface(BasicRevert, BaseInterface):
                     f"Unexpected point_name {point_name} for entity {register.entity_id}"
                 )
 
-        register.value = cast_value
-        return register.value
+        return cast_value
 
     def _scrape_all(self):
         """Read all points and normalize states to numbers where needed."""
         result = {}
         read_registers = self.get_registers_by_type("byte", True)
         write_registers = self.get_registers_by_type("byte", False)
+        registers = read_registers + write_registers
 
-        for register in read_registers + write_registers:
+        states = None
+        if self.bulk_states:
+            states = self.api.get_states({register.entity_id for register in registers})
+
+        for register in registers:
             entity_id = register.entity_id
             entity_point = register.entity_point
             domain = entity_id.split(".", 1)[0]
 
             try:
-                entity_data = self.get_entity_data(entity_id)
+                if states is None:
+                    entity_data = self.get_entity_data(entity_id)
+                elif entity_id in states:
+                    entity_data = states[entity_id]
+                else:
+                    raise ValueError(f"Entity {entity_id} not found")
                 state = entity_data.get("state")
                 attrs = entity_data.get("attributes", {})
 
@@ -35,15 +35,28 @@ from pymodbus.constants import Defaults
 
 from contextlib import contextmanager, closing
 
+from platform_driver.connection_pool import ConnectionPool
 from platform_driver.driver_locks import socket_lock
+from platform_driver.modbus_scheduler import (GatewayScheduler, ModbusDeviceException, ReadRequest, READ_COILS,
+                                              READ_DISCRETE_INPUTS, READ_HOLDING_REGISTERS, READ_INPUT_REGISTERS)
 from platform_driver.interfaces import BaseInterface, BaseRegister, BasicRevert, DriverInterfaceError
 from volttron.platform.agent import utils
 
+
 @contextmanager
-def modbus_client(address, port):
-    with socket_lock():
-        with closing(SyncModbusClient(address, port)) as client:
+def modbus_client(address, port, pooled=True):
+    """
+    Context manager returning a connected client for address and port. Pooled
+    clients are shared by all devices behind the same gateway and stay
+    connected between calls.
+    """
+    if pooled:
+        with connection_pool.connection(address, port) as client:
             yield client
+    else:
+        with socket_lock():
+            with closing(SyncModbusClient(address, port)) as client:
+                yield client
 
 
 modbus_logger = logging.getLogger("pymodbus")
@@ -61,6 +74,49 @@ class ModbusInterfaceException(ModbusException):
     pass
 
 
+def check_response(response, unit):
+    """
+    Raise the error of a missing response or the ModbusDeviceException of an exception response of the device
+
+    :return: the response
+    """
+    if response is None:
+        raise ModbusInterfaceException("pymodbus returned None")
+    if isinstance(response, ExceptionResponse):
+        raise ModbusDeviceException(unit, response.original_code, response.exception_code)
+    if isinstance(response, ModbusException):
+        raise response
+    return response
+
+
+# Errors after which a pooled connection is closed instead of reused. Exception responses of a device
+# (ModbusDeviceException) do not affect the connection.
+connection_pool = ConnectionPool(SyncModbusClient, connection_error=ConnectionException,
+                                 broken_errors=(ModbusIOException, ModbusInterfaceException, OSError))
+# GatewayScheduler of every pooled (host, port)
+gateway_schedulers = {}
+
+# Read function of each register type and read only flag
+READ_FUNCTIONS = {('byte', True): READ_INPUT_REGISTERS,
+                  ('byte', False): READ_HOLDING_REGISTERS,
+                  ('bit', True): READ_DISCRETE_INPUTS,
+                  ('bit', False): READ_COILS}
+
+
+def get_gateway_scheduler(address, port, **kwargs):
+    """
+    Return the scheduler of the gateway at address and port, creating it with
+    the given settings if it does not exist yet.
+
+    :param kwargs: settings of :py:class:`GatewayScheduler`
+    """
+    key = (address, port)
+    scheduler = gateway_schedulers.get(key)
+    if scheduler is None:
+        scheduler = gateway_schedulers[key] = GatewayScheduler(connection_pool, address, port, **kwargs)
+    return scheduler
+
+
 class ModbusRegisterBase(BaseRegister):
     def __init__(self, address, register_type, read_only, pointName, units, description='', slave_id=0):
         super(ModbusRegisterBase, self).__init__(register_type, read_only, pointName, units, description=description)
@@ -87,18 +143,12 @@ class ModbusBitRegister(ModbusRegisterBase):
     def get_state(self, client):
         response_bits = client.read_discrete_inputs(self.address, unit=self.slave_id) if self.read_only else \
             client.read_coils(self.address, unit=self.slave_id)
-        if response_bits is None:
-            raise ModbusInterfaceException("pymodbus returned None")
-        return response_bits.bits[0]
+        return check_response(response_bits, self.slave_id).bits[0]
 
     def set_state(self, client, value):
         if not self.read_only:
             response = client.write_coil(self.address, value, unit=self.slave_id)
-            if response is None:
-                raise ModbusInterfaceException("pymodbus returned None")
-            if isinstance(response, ExceptionResponse):
-                raise ModbusInterfaceException(str(response))
-            return response.value
+            return check_response(response, self.slave_id).value
         return None
 
 class ModbusByteRegister(ModbusRegisterBase):
@@ -151,9 +201,7 @@ class ModbusByteRegister(ModbusRegisterBase):
             response = client.read_input_registers(self.address, count=self.get_register_count(), unit=self.slave_id)
         else:
             response = client.read_holding_registers(self.address, count=self.get_register_count(), unit=self.slave_id)
-
-        if response is None:
-            raise ModbusInterfaceException("pymodbus returned None")
+        check_response(response, self.slave_id)
 
         if self.mixed_endian:
             response.registers.reverse()
@@ -170,7 +218,7 @@ class ModbusByteRegister(ModbusRegisterBase):
                 register_values.extend(PYMODBUS_REGISTER_STRUCT.unpack_from(value_bytes, i))
             if self.mixed_endian:
                 register_values.reverse()
-            client.write_registers(self.address, register_values, unit=self.slave_id)
+            check_response(client.write_registers(self.address, register_values, unit=self.slave_id), self.slave_id)
             return self.get_state(client)
         return None
 
@@ -184,6 +232,17 @@ class Interface(BasicRevert, BaseInterface):
         self.slave_id = config_dict.get("slave_id", 0)
         self.ip_address = config_dict["device_address"]
         self.port = config_dict.get("port", Defaults.Port)
+        self.pooled = config_dict.get("connection_pool", True)
+        self.scheduled = self.pooled and config_dict.get("request_scheduler", False)
+        if self.pooled:
+            connection_pool.configure_gateway(self.ip_address, self.port,
+                                              max_connections=config_dict.get("max_connections", 1),
+                                              idle_timeout=config_dict.get("idle_timeout", 300.0),
+                                              max_backoff=config_dict.get("max_reconnect_backoff", 60.0))
+        if self.scheduled:
+            self.scheduler = get_gateway_scheduler(self.ip_address, self.port,
+                                                   batch_window=config_dict.get("batch_window", 0.05),
+                                                   pipeline_depth=config_dict.get("pipeline_depth", 1))
         self.parse_config(registry_config_str)
 
     def build_ranges_map(self):
@@ -229,11 +288,11 @@ class Interface(BasicRevert, BaseInterface):
 
     def get_point(self, point_name):
         register = self.get_register_by_name(point_name)
-        with modbus_client(self.ip_address, self.port) as client:
-            try:
+        try:
+            with modbus_client(self.ip_address, self.port, self.pooled) as client:
                 result = register.get_state(client)
-            except (ConnectionException, ModbusIOException, ModbusInterfaceException):
-                result = None
+        except (ConnectionException, ModbusIOException, ModbusInterfaceException, ModbusDeviceException):
+            result = None
         return result
 
     def _set_point(self, point_name, value):
@@ -241,11 +300,11 @@ class Interface(BasicRevert, BaseInterface):
         if register.read_only:
             raise  IOError("Trying to write to a point configured read only: "+point_name)
 
-        with modbus_client(self.ip_address, self.port) as client:
-            try:
+        try:
+            with modbus_client(self.ip_address, self.port, self.pooled) as client:
                 result = register.set_state(client, value)
-            except (ConnectionException, ModbusIOException, ModbusInterfaceException) as ex:
-                raise IOError("Error encountered trying to write to point {}: {}".format(point_name, ex))
+        except (ConnectionException, ModbusIOException, ModbusInterfaceException, ModbusDeviceException) as ex:
+            raise IOError("Error encountered trying to write to point {}: {}".format(point_name, ex))
         return result
 
     def scrape_byte_registers(self, client, read_only):
@@ -260,11 +319,7 @@ class Interface(BasicRevert, BaseInterface):
 
             for group in range(start, end + 1, MODBUS_READ_MAX):
                 count = min(end - group + 1, MODBUS_READ_MAX)
-                response = read_func(group, count, unit=self.slave_id)
-                if response is None:
-                    raise ModbusInterfaceException("pymodbus returned None")
-                if isinstance(response, ModbusException):
-                    raise response
+                response = check_response(read_func(group, count, unit=self.slave_id), self.slave_id)
                 response_bytes = response.encode()
                 # Trim off length byte.
                 result += response_bytes[1:]
@@ -291,11 +346,7 @@ class Interface(BasicRevert, BaseInterface):
                 count = min(end - group + 1, MODBUS_READ_MAX)
                 response = client.read_discrete_inputs(group, count, unit=self.slave_id) if read_only else \
                     client.read_coils(group, count, unit=self.slave_id)
-                if response is None:
-                    raise ModbusInterfaceException("pymodbus returned None")
-                if isinstance(response, ModbusException):
-                    raise response
-                result += response.bits
+                result += check_response(response, self.slave_id).bits
 
             for register in registers:
                 point = register.point_name
@@ -304,19 +355,51 @@ class Interface(BasicRevert, BaseInterface):
 
         return result_dict
 
-    def _scrape_all(self):
+    def scrape_scheduled(self):
+        """
+        Read all registers through the gateway scheduler, batched with the
+        scrapes of the other devices behind the gateway.
+        """
+        requests = []
+        ranges = []
+        for register_type, register_ranges in self.register_ranges.items():
+            function_code = READ_FUNCTIONS[register_type]
+            for start, end, registers in register_ranges:
+                first = len(requests)
+                for group in range(start, end + 1, MODBUS_READ_MAX):
+                    count = min(end - group + 1, MODBUS_READ_MAX)
+                    requests.append(ReadRequest(self.slave_id, function_code, group, count))
+                ranges.append((register_type[0], start, registers, first, len(requests)))
+
+        results = self.scheduler.submit(requests)
+
         result_dict = {}
-        with modbus_client(self.ip_address, self.port) as client:
+        for register_type, start, registers, first, last in ranges:
+            data = b''.join(results[first:last]) if register_type == 'byte' else sum(results[first:last], [])
+            for register in registers:
+                result_dict[register.point_name] = register.parse_value(start, data)
+        return result_dict
+
+    def _scrape_all(self):
+        if self.scheduled:
             try:
+                return self.scrape_scheduled()
+            except (ConnectionException, ModbusIOException, ModbusInterfaceException, ModbusDeviceException,
+                    OSError) as e:
+                raise DriverInterfaceError("Failed to scrape device at " + self.ip_address + ":" + str(self.port) +
+                                           " ID: " + str(self.slave_id) + str(e))
 
+        result_dict = {}
+        try:
+            with modbus_client(self.ip_address, self.port, self.pooled) as client:
                 result_dict.update(self.scrape_byte_registers(client, True))
                 result_dict.update(self.scrape_byte_registers(client, False))
 
                 result_dict.update(self.scrape_bit_registers(client, True))
                 result_dict.update(self.scrape_bit_registers(client, False))
-            except (ConnectionException, ModbusIOException, ModbusInterfaceException) as e:
-                raise DriverInterfaceError("Failed to scrape device at " + self.ip_address + ":" + str(self.port) +
-                                           " ID: " + str(self.slave_id) + str(e))
+        except (ConnectionException, ModbusIOException, ModbusInterfaceException, ModbusDeviceException) as e:
+            raise DriverInterfaceError("Failed to scrape device at " + self.ip_address + ":" + str(self.port) +
+                                       " ID: " + str(self.slave_id) + str(e))
 
         return result_dict
 
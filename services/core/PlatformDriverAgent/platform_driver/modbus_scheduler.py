@@ -0,0 +1,294 @@
+# -*- coding: utf-8 -*- {{{
+# ===----------------------------------------------------------------------===
+#
+#                 Component of Eclipse VOLTTRON
+#
+# ===----------------------------------------------------------------------===
+#
+# Copyright 2023 Battelle Memorial Institute
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not
+# use this file except in compliance with the License. You may obtain a copy
+# of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+#
+# ===----------------------------------------------------------------------===
+# }}}
+
+"""
+Request scheduler for Modbus TCP gateways.
+
+All devices behind a gateway, usually slaves with different unit ids behind
+a TCP to RTU gateway, submit their scrapes to the gateway's scheduler. Scrapes
+submitted within ``batch_window`` seconds, or while the previous batch is
+running, are executed as a single batch on one pooled connection. Up to
+``pipeline_depth`` read requests are sent before waiting for their responses,
+which are matched to the requests by Modbus transaction id. Gateways that
+handle one request at a time use a pipeline depth of 1 and the requests are
+serialized. If a batch fails, the scrapes of the batch are retried one by
+one, so a device that does not respond only fails its own scrape.
+
+Read requests are framed here, so the scheduler works with any pooled client
+that exposes its connected ``socket``.
+"""
+
+import logging
+import socket
+import struct
+
+import gevent
+from gevent.event import AsyncResult
+
+_log = logging.getLogger(__name__)
+
+READ_COILS = 1
+READ_DISCRETE_INPUTS = 2
+READ_HOLDING_REGISTERS = 3
+READ_INPUT_REGISTERS = 4
+BIT_FUNCTIONS = (READ_COILS, READ_DISCRETE_INPUTS)
+
+# transaction id, protocol id, length, unit id
+MBAP_HEADER = struct.Struct('>HHHB')
+READ_PDU = struct.Struct('>BHH')
+MAX_PDU_SIZE = 253
+
+DEFAULT_BATCH_WINDOW = 0.05
+DEFAULT_PIPELINE_DEPTH = 1
+DEFAULT_TIMEOUT = 3.0
+
+
+class ModbusProtocolError(IOError):
+    """
+    Invalid or unexpected response. The connection can not be used any more.
+    """
+    pass
+
+
+class ModbusDeviceException(Exception):
+    """
+    Exception response of a device
+    """
+
+    def __init__(self, unit, function_code, exception_code):
+        super(ModbusDeviceException, self).__init__(
+            "Unit {} returned exception code {} for function {}".format(unit, exception_code, function_code))
+        self.unit = unit
+        self.function_code = function_code
+        self.exception_code = exception_code
+
+
+class ReadRequest:
+    """
+    Read of count coils, inputs or registers starting at address
+
+    :param unit: unit (slave) id
+    :param function_code: one of READ_COILS, READ_DISCRETE_INPUTS,
+                          READ_HOLDING_REGISTERS and READ_INPUT_REGISTERS
+    """
+
+    def __init__(self, unit, function_code, address, count):
+        self.unit = unit
+        self.function_code = function_code
+        self.address = address
+        self.count = count
+
+    def key(self):
+        return self.unit, self.function_code, self.address, self.count
+
+    def encode(self, transaction_id):
+        return MBAP_HEADER.pack(transaction_id, 0, READ_PDU.size + 1, self.unit) + \
+            READ_PDU.pack(self.function_code, self.address, self.count)
+
+    def decode(self, unit, pdu):
+        """
+        :return: list of count bools for bit reads, the big endian register
+                 bytes for register reads or a ModbusDeviceException for an
+                 exception response
+        """
+        # Many devices answer with unit id 0 or 255 instead of the requested one. The response is matched to the
+        # request by transaction id.
+        if unit != self.unit and unit not in (0, 255):
+            raise ModbusProtocolError("Response from unit {} to a request to unit {}".format(unit, self.unit))
+        if pdu[0] == self.function_code | 0x80 and len(pdu) == 2:
+            return ModbusDeviceException(unit, self.function_code, pdu[1])
+        if pdu[0] != self.function_code or len(pdu) < 2 or len(pdu) != pdu[1] + 2:
+            raise ModbusProtocolError("Invalid response to function {} of unit {}".format(self.function_code, unit))
+        data = pdu[2:]
+        if self.function_code in BIT_FUNCTIONS:
+            if len(data) != (self.count + 7) // 8:
+                raise ModbusProtocolError("Expected {} bits from unit {}".format(self.count, unit))
+            return [bool(data[i // 8] >> (i % 8) & 1) for i in range(self.count)]
+        if len(data) != self.count * 2:
+            raise ModbusProtocolError("Expected {} registers from unit {}".format(self.count, unit))
+        return bytes(data)
+
+
+class TcpClient:
+    """
+    Minimal pooled client for gateways that are only used through a scheduler
+    """
+
+    def __init__(self, host, port, timeout=DEFAULT_TIMEOUT):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self.socket = None
+
+    def connect(self):
+        if self.socket is None:
+            try:
+                self.socket = socket.create_connection((self.host, self.port), self.timeout)
+            except OSError as e:
+                _log.debug("Connection to {}:{} failed: {}".format(self.host, self.port, e))
+                return False
+        return True
+
+    def close(self):
+        if self.socket is not None:
+            self.socket.close()
+            self.socket = None
+
+    def is_socket_open(self):
+        return self.socket is not None
+
+
+class _Scrape:
+    def __init__(self, requests):
+        self.requests = requests
+        self.result = AsyncResult()
+
+
+class GatewayScheduler:
+    """
+    Batches and pipelines the read requests of all devices behind one gateway
+
+    :param pool: :py:class:`platform_driver.connection_pool.ConnectionPool`
+                 providing the gateway connections
+    :param host: host name or IP address of the gateway
+    :param port: TCP port of the gateway
+    :param batch_window: seconds to wait for more scrapes before a batch is executed
+    :param pipeline_depth: maximum number of requests sent before their responses are read
+    """
+
+    def __init__(self, pool, host, port, batch_window=DEFAULT_BATCH_WINDOW, pipeline_depth=DEFAULT_PIPELINE_DEPTH):
+        self.pool = pool
+        self.host = host
+        self.port = port
+        self.batch_window = float(batch_window)
+        self.pipeline_depth = max(1, int(pipeline_depth))
+        self._pending = []
+        self._runner = None
+        self._transaction_id = 0
+
+    def submit(self, requests):
+        """
+        Execute read requests in the next batch and wait for the result.
+
+        :param requests: list of :py:class:`ReadRequest`
+        :return: list with the decoded value of every request
+        :raises ModbusDeviceException: if the device returned an exception
+                                       response to one of the requests
+        """
+        scrape = _Scrape(requests)
+        self._pending.append(scrape)
+        if self._runner is None:
+            self._runner = gevent.spawn(self._run)
+        return scrape.result.get()
+
+    def _run(self):
+        try:
+            while self._pending:
+                gevent.sleep(self.batch_window)
+                batch, self._pending = self._pending, []
+                self._execute(batch)
+        finally:
+            self._runner = None
+            # Scrapes submitted while the runner was killed
+            for scrape in self._pending:
+                scrape.result.set_exception(ModbusProtocolError("Gateway scheduler stopped"))
+            self._pending = []
+
+    def _execute(self, batch):
+        # Identical reads of different scrapes are sent once.
+        unique = {}
+        for scrape in batch:
+            for request in scrape.requests:
+                unique.setdefault(request.key(), request)
+        requests = list(unique.values())
+        try:
+            with self.pool.connection(self.host, self.port) as client:
+                values = dict(zip(unique, self._transact(client.socket, requests)))
+        except Exception as e:
+            _log.debug("Batch of {} requests to {}:{} failed: {}".format(len(requests), self.host, self.port, e))
+            if len(batch) > 1:
+                # retry the scrapes one by one to fail only the scrapes of the broken device
+                for scrape in batch:
+                    self._execute([scrape])
+            else:
+                batch[0].result.set_exception(e)
+            return
+
+        for scrape in batch:
+            results = [values[request.key()] for request in scrape.requests]
+            error = next((result for result in results if isinstance(result, ModbusDeviceException)), None)
+            if error is not None:
+                scrape.result.set_exception(error)
+            else:
+                scrape.result.set(results)
+
+    def _next_transaction_id(self):
+        self._transaction_id = self._transaction_id % 0xFFFF + 1
+        return self._transaction_id
+
+    def _transact(self, sock, requests):
+        """
+        Send requests keeping up to pipeline_depth of them outstanding
+        :return: list of decoded responses in the order of the requests
+        """
+        results = [None] * len(requests)
+        outstanding = {}
+        next_index = 0
+        while next_index < len(requests) or outstanding:
+            frames = []
+            while next_index < len(requests) and len(outstanding) < self.pipeline_depth:
+                transaction_id = self._next_transaction_id()
+                outstanding[transaction_id] = next_index
+                frames.append(requests[next_index].encode(transaction_id))
+                next_index += 1
+            if frames:
+                sock.sendall(b''.join(frames))
+
+            transaction_id, unit, pdu = _read_frame(sock)
+            index = outstanding.pop(transaction_id, None)
+            if index is None:
+                raise ModbusProtocolError("Unexpected transaction id {} from {}:{}".format(
+                    transaction_id, self.host, self.port))
+            results[index] = requests[index].decode(unit, pdu)
+        return results
+
+
+def _read_frame(sock):
+    """
+    :return: transaction id, unit id and PDU of the next frame
+    """
+    transaction_id, protocol_id, length, unit = MBAP_HEADER.unpack(_recv_exactly(sock, MBAP_HEADER.size))
+    if protocol_id != 0 or not 2 <= length <= MAX_PDU_SIZE + 1:
+        raise ModbusProtocolError("Invalid Modbus TCP header")
+    return transaction_id, unit, _recv_exactly(sock, length - 1)
+
+
+def _recv_exactly(sock, size):
+    data = b''
+    while len(data) < size:
+        chunk = sock.recv(size - len(data))
+        if not chunk:
+            raise ModbusProtocolError("Connection closed by the gateway")
+        data += chunk
+    return data
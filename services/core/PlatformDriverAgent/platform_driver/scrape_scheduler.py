@@ -0,0 +1,262 @@
+# -*- coding: utf-8 -*- {{{
+# ===----------------------------------------------------------------------===
+#
+#                 Component of Eclipse VOLTTRON
+#
+# ===----------------------------------------------------------------------===
+#
+# Copyright 2023 Battelle Memorial Institute
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not
+# use this file except in compliance with the License. You may obtain a copy
+# of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+#
+# ===----------------------------------------------------------------------===
+# }}}
+
+"""
+Central scrape scheduler of the platform driver.
+
+Scrapes of all devices are kept in a hashed timer wheel advanced by a single
+greenlet every ``tick`` seconds, instead of one scheduled event per device.
+Scrapes are due at multiples of the device interval plus an offset. The
+offsets of devices with the same interval are spread over the interval in
+proportion to the measured cost (duration) of their scrapes, ordered by
+device group, so the load is even across the interval.
+
+Scrapes of each driver type are limited to a configurable number running at
+the same time. A scrape that is due while the previous scrape of the device
+is still running or waiting for its turn is skipped and reported as an
+overrun instead of being queued.
+"""
+
+import logging
+import time
+from datetime import datetime
+
+import gevent
+import pytz
+from gevent.lock import BoundedSemaphore, DummySemaphore
+
+_log = logging.getLogger(__name__)
+
+DEFAULT_TICK = 0.1
+DEFAULT_WHEEL_SIZE = 512
+DEFAULT_REBALANCE_INTERVAL = 300.0
+# weight of the latest scrape in the moving average of the scrape cost
+COST_SMOOTHING = 0.2
+# minimum seconds between overrun warnings of a device
+OVERRUN_LOG_INTERVAL = 60.0
+# due times closer than this are the same
+MIN_PERIOD = 0.001
+
+
+class _Entry:
+    def __init__(self, driver, interval, group, driver_type):
+        self.driver = driver
+        self.interval = float(interval)
+        self.group = group
+        self.driver_type = driver_type
+        self.offset = 0.0
+        self.due = None
+        self.slot = None
+        self.busy = False
+        self.removed = False
+        self.cost = None
+        self.scrapes = 0
+        self.overruns = 0
+        self.missed = 0
+        self.last_overrun_log = 0.0
+
+    def next_due(self, after):
+        """
+        :return: first due time later than after
+        """
+        due = after - (after - self.offset) % self.interval + self.interval
+        # after is a due time itself, give or take rounding errors
+        if due - after < MIN_PERIOD:
+            due += self.interval
+        return due
+
+
+class ScrapeScheduler:
+    """
+    Timer wheel scheduling the scrapes of all devices
+
+    :param tick: seconds per slot of the wheel. Scrapes start within one tick of their due time
+    :param wheel_size: number of slots of the wheel
+    :param interface_concurrency: dictionary of the maximum number of
+                                  concurrent scrapes by driver type. Driver
+                                  types that are not listed are not limited
+    :param rebalance_interval: seconds between updates of the scrape offsets
+                               from the measured scrape costs
+    """
+
+    def __init__(self, tick=DEFAULT_TICK, wheel_size=DEFAULT_WHEEL_SIZE, interface_concurrency=None,
+                 rebalance_interval=DEFAULT_REBALANCE_INTERVAL):
+        self.tick = float(tick)
+        if self.tick <= 0:
+            raise ValueError("Scrape scheduler tick must be greater than 0")
+        self.wheel_size = max(1, int(wheel_size))
+        self.rebalance_interval = float(rebalance_interval)
+        self.slots = [[] for _ in range(self.wheel_size)]
+        self.entries = {}
+        self.locks = {}
+        for driver_type, limit in (interface_concurrency or {}).items():
+            limit = int(limit)
+            self.locks[driver_type] = BoundedSemaphore(limit) if limit > 0 else DummySemaphore()
+        self._tick_index = None
+        self._next_rebalance = 0.0
+        self._needs_rebalance = False
+        self._greenlet = None
+
+    def start(self):
+        if self._greenlet is None:
+            self._greenlet = gevent.spawn(self._run)
+
+    def stop(self):
+        if self._greenlet is not None:
+            self._greenlet.kill()
+            self._greenlet = None
+
+    def add(self, device_path, driver, interval, group=0, driver_type=None):
+        """
+        Schedule the periodic scrapes of a device. driver.scrape_and_publish
+        is called with the due time of every scrape.
+
+        :param device_path: name of the device, replacing an existing device of the same name
+        """
+        self.remove(device_path)
+        entry = _Entry(driver, interval, group, driver_type)
+        self.entries[device_path] = entry
+        self._rebalance(time.time())
+        entry.due = entry.next_due(time.time())
+        self._insert(entry)
+
+    def remove(self, device_path):
+        entry = self.entries.pop(device_path, None)
+        if entry is None:
+            return
+        entry.removed = True
+        slot = self.slots[entry.slot]
+        if entry in slot:
+            slot.remove(entry)
+        self._needs_rebalance = True
+
+    def get_schedule(self):
+        """
+        :return: dictionary of the interval, offset, average scrape cost,
+                 number of scrapes, overruns and missed scrapes by device
+        """
+        return {device_path: {"interval": entry.interval,
+                               "offset": round(entry.offset, 3),
+                               "cost": None if entry.cost is None else round(entry.cost, 3),
+                               "scrapes": entry.scrapes,
+                               "overruns": entry.overruns,
+                               "missed": entry.missed}
+                for device_path, entry in self.entries.items()}
+
+    def _insert(self, entry):
+        tick_index = int(entry.due // self.tick)
+        if self._tick_index is not None:
+            # The slot of the current tick was already expired, rounding errors may put the due time there.
+            tick_index = max(tick_index, self._tick_index + 1)
+        entry.slot = tick_index % self.wheel_size
+        self.slots[entry.slot].append(entry)
+
+    def _run(self):
+        # Start with the slot of the current tick, entries may have been added to it before the start.
+        self._tick_index = int(time.time() // self.tick) - 1
+        while True:
+            delay = (self._tick_index + 1) * self.tick - time.time()
+            if delay > 0:
+                gevent.sleep(delay)
+            now = time.time()
+            now_index = int(now // self.tick)
+            # Catch up on ticks missed while the hub was busy. A full turn visits every slot.
+            first = max(self._tick_index + 1, now_index - self.wheel_size + 1)
+            for tick_index in range(first, now_index + 1):
+                self._expire(tick_index % self.wheel_size, now)
+            self._tick_index = now_index
+
+            if self._needs_rebalance or now >= self._next_rebalance:
+                self._rebalance(now)
+
+    def _expire(self, slot_index, now):
+        # Everything in the slot that is due in this turn of the wheel. Scrapes may start up to a tick early.
+        slot = self.slots[slot_index]
+        due = [entry for entry in slot if entry.due < now + self.tick]
+        if not due:
+            return
+        self.slots[slot_index] = [entry for entry in slot if entry.due >= now + self.tick]
+        for entry in due:
+            self._dispatch(entry, now)
+
+    def _dispatch(self, entry, now):
+        scheduled = entry.due
+        entry.due = entry.next_due(scheduled)
+        if entry.due < now:
+            # The scheduler was blocked (or the machine suspended) for more than an interval.
+            entry.missed += int((now - entry.due) // entry.interval) + 1
+            entry.due = entry.next_due(now)
+        self._insert(entry)
+
+        if entry.busy:
+            entry.overruns += 1
+            if now - entry.last_overrun_log >= OVERRUN_LOG_INTERVAL:
+                entry.last_overrun_log = now
+                _log.warning("Skipping scrape of {}, the previous scrape is still running after {} seconds "
+                             "({} overruns)".format(entry.driver.device_path, entry.interval, entry.overruns))
+            return
+        entry.busy = True
+        gevent.spawn(self._scrape, entry, scheduled)
+
+    def _scrape(self, entry, scheduled):
+        lock = self.locks.get(entry.driver_type) or DummySemaphore()
+        try:
+            with lock:
+                if entry.removed:
+                    return
+                start = time.time()
+                try:
+                    entry.driver.scrape_and_publish(datetime.fromtimestamp(scheduled, pytz.UTC))
+                except Exception as e:
+                    _log.error("Scrape of {} failed: {}".format(entry.driver.device_path, e))
+                cost = time.time() - start
+                entry.cost = cost if entry.cost is None else \
+                    entry.cost + COST_SMOOTHING * (cost - entry.cost)
+                entry.scrapes += 1
+        finally:
+            entry.busy = False
+
+    def _rebalance(self, now):
+        """
+        Spread the offsets of devices with the same interval in proportion to
+        their scrape cost. Devices that were not scraped yet count with the
+        average cost of the others.
+        """
+        self._needs_rebalance = False
+        self._next_rebalance = now + self.rebalance_interval
+        by_interval = {}
+        for device_path, entry in self.entries.items():
+            by_interval.setdefault(entry.interval, []).append((entry.group, device_path, entry))
+
+        for interval, devices in by_interval.items():
+            devices.sort(key=lambda device: device[:2])
+            known = [entry.cost for _, _, entry in devices if entry.cost]
+            default_cost = sum(known) / len(known) if known else 1.0
+            costs = [entry.cost or default_cost for _, _, entry in devices]
+            total = sum(costs)
+            elapsed = 0.0
+            for (_, _, entry), cost in zip(devices, costs):
+                entry.offset = interval * elapsed / total
+                entry.driver.time_slot_offset = entry.offset
+                elapsed += cost
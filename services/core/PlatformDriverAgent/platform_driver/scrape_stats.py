@@ -0,0 +1,237 @@
+# -*- coding: utf-8 -*- {{{
+# ===----------------------------------------------------------------------===
+#
+#                 Component of Eclipse VOLTTRON
+#
+# ===----------------------------------------------------------------------===
+#
+# Copyright 2023 Battelle Memorial Institute
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not
+# use this file except in compliance with the License. You may obtain a copy
+# of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+#
+# ===----------------------------------------------------------------------===
+# }}}
+
+"""
+Scrape telemetry of the platform driver.
+
+Every scrape records its duration, the number of points scraped and its
+lateness (seconds between the time the scrape was scheduled for and the time
+it started) in fixed bucket histograms, per device and per driver type.
+Recording a scrape is a few additions, so the telemetry is always on.
+"""
+
+import bisect
+import time
+
+# upper bounds of the histogram buckets, the last bucket has no upper bound
+DURATION_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+LATENESS_BUCKETS = (0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 30.0, 60.0)
+POINTS_BUCKETS = (1, 10, 25, 50, 100, 250, 500, 1000, 2500)
+
+
+class Histogram:
+    """
+    Histogram with fixed buckets
+
+    :param bounds: ascending upper bounds of the buckets
+    """
+
+    def __init__(self, bounds):
+        self.bounds = tuple(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = None
+
+    def add(self, value):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.total += value
+        if self.max is None or value > self.max:
+            self.max = value
+
+    def merge(self, other):
+        """
+        Add the counts of a histogram with the same buckets
+        """
+        if tuple(other.bounds) != self.bounds:
+            raise ValueError("Cannot merge histograms with different buckets")
+        self.counts = [a + b for a, b in zip(self.counts, other.counts)]
+        self.count += other.count
+        self.total += other.total
+        if other.max is not None and (self.max is None or other.max > self.max):
+            self.max = other.max
+
+    def percentile(self, fraction):
+        """
+        :return: upper bound of the bucket of the percentile, the maximum for
+                 the last bucket or None without values
+        """
+        if not self.count:
+            return None
+        rank = fraction * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if count and seen >= rank:
+                return self.bounds[index] if index < len(self.bounds) else self.max
+        return self.max
+
+    def to_dict(self):
+        return {"bounds": list(self.bounds),
+                "counts": list(self.counts),
+                "count": self.count,
+                "sum": round(self.total, 6),
+                "mean": round(self.total / self.count, 6) if self.count else None,
+                "max": self.max,
+                "p50": self.percentile(0.5),
+                "p95": self.percentile(0.95),
+                "p99": self.percentile(0.99)}
+
+    @classmethod
+    def from_dict(cls, values):
+        histogram = cls(values["bounds"])
+        histogram.counts = list(values["counts"])
+        histogram.count = values["count"]
+        histogram.total = values["sum"]
+        histogram.max = values["max"]
+        return histogram
+
+
+class ScrapeStats:
+    """
+    Scrape statistics of a device or a driver type
+    """
+
+    def __init__(self):
+        self.scrapes = 0
+        self.failures = 0
+        self.last_scrape = None
+        self.duration = Histogram(DURATION_BUCKETS)
+        self.points = Histogram(POINTS_BUCKETS)
+        self.lateness = Histogram(LATENESS_BUCKETS)
+
+    def record(self, duration, points=None, lateness=None, failed=False):
+        self.scrapes += 1
+        self.last_scrape = time.time()
+        if failed:
+            self.failures += 1
+        self.duration.add(duration)
+        if points is not None:
+            self.points.add(points)
+        if lateness is not None:
+            self.lateness.add(max(lateness, 0.0))
+
+    def merge(self, other):
+        self.scrapes += other.scrapes
+        self.failures += other.failures
+        if other.last_scrape is not None:
+            self.last_scrape = max(self.last_scrape or 0.0, other.last_scrape)
+        self.duration.merge(other.duration)
+        self.points.merge(other.points)
+        self.lateness.merge(other.lateness)
+
+    def to_dict(self):
+        return {"scrapes": self.scrapes,
+                "failures": self.failures,
+                "last_scrape": self.last_scrape,
+                "duration": self.duration.to_dict(),
+                "points": self.points.to_dict(),
+                "lateness": self.lateness.to_dict()}
+
+    @classmethod
+    def from_dict(cls, values):
+        stats = cls()
+        stats.scrapes = values["scrapes"]
+        stats.failures = values["failures"]
+        stats.last_scrape = values["last_scrape"]
+        stats.duration = Histogram.from_dict(values["duration"])
+        stats.points = Histogram.from_dict(values["points"])
+        stats.lateness = Histogram.from_dict(values["lateness"])
+        return stats
+
+
+class ScrapeTelemetry:
+    """
+    Scrape statistics of all devices and driver types
+    """
+
+    def __init__(self):
+        self.started = time.time()
+        self.devices = {}
+        self.interfaces = {}
+
+    def record(self, device_path, driver_type, duration, points=None, lateness=None, failed=False):
+        """
+        Record a scrape
+
+        :param device_path: device topic
+        :param driver_type: driver type of the device
+        :param duration: seconds the scrape took
+        :param points: number of points scraped
+        :param lateness: seconds the scrape started after its scheduled time
+        :param failed: True if the scrape failed
+        """
+        for stats, key in ((self.devices, device_path), (self.interfaces, driver_type)):
+            entry = stats.get(key)
+            if entry is None:
+                entry = stats[key] = ScrapeStats()
+            entry.record(duration, points, lateness, failed)
+
+    def remove(self, device_path):
+        """
+        Drop the statistics of a stopped device. The statistics of its driver
+        type are kept.
+        """
+        self.devices.pop(device_path, None)
+
+    def reset(self):
+        self.started = time.time()
+        self.devices.clear()
+        self.interfaces.clear()
+
+    def get_stats(self, device_path=None):
+        """
+        :param device_path: only include this device
+        :return: dictionary with the statistics by device and by driver type
+        """
+        devices = self.devices
+        if device_path is not None:
+            devices = {device_path: devices[device_path]} if device_path in devices else {}
+        return {"since": self.started,
+                "devices": {path: stats.to_dict() for path, stats in devices.items()},
+                "interfaces": {driver_type: stats.to_dict() for driver_type, stats in self.interfaces.items()}}
+
+
+def merge_stats(reports):
+    """
+    Merge the statistics reported by several platform driver processes
+
+    :param reports: list of get_stats results
+    :return: combined statistics
+    """
+    merged = {"since": None, "devices": {}, "interfaces": {}}
+    interfaces = {}
+    for report in reports:
+        if merged["since"] is None or report["since"] < merged["since"]:
+            merged["since"] = report["since"]
+        merged["devices"].update(report["devices"])
+        for driver_type, values in report["interfaces"].items():
+            stats = ScrapeStats.from_dict(values)
+            if driver_type in interfaces:
+                interfaces[driver_type].merge(stats)
+            else:
+                interfaces[driver_type] = stats
+    merged["interfaces"] = {driver_type: stats.to_dict() for driver_type, stats in interfaces.items()}
+    return merged
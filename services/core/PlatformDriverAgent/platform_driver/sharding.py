@@ -0,0 +1,213 @@
+# -*- coding: utf-8 -*- {{{
+# ===----------------------------------------------------------------------===
+#
+#                 Component of Eclipse VOLTTRON
+#
+# ===----------------------------------------------------------------------===
+#
+# Copyright 2023 Battelle Memorial Institute
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not
+# use this file except in compliance with the License. You may obtain a copy
+# of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+#
+# ===----------------------------------------------------------------------===
+# }}}
+
+"""
+Sharding of devices over platform driver worker processes.
+
+In sharded mode the platform driver starts ``worker_processes`` worker
+processes. Every worker is a platform driver agent with the identity
+``<platform driver identity>.worker<n>`` that scrapes and publishes the
+devices assigned to it. Devices are assigned by a hash of the device topic or
+by the ``device_workers`` configuration.
+
+The platform driver keeps a :py:class:`RemoteDriver` for every device in
+place of the DriverAgent, so its RPC methods and override handling work
+unchanged and are routed to the worker owning the device.
+"""
+
+import fnmatch
+import logging
+import os
+import sys
+import tempfile
+import zlib
+
+import gevent
+from gevent import subprocess
+from gevent.event import Event
+
+from volttron.platform import jsonapi
+
+_log = logging.getLogger(__name__)
+
+# seconds to wait for the response of a worker
+WORKER_RPC_TIMEOUT = 60.0
+# seconds before a worker that exited is started again
+WORKER_RESTART_DELAY = 5.0
+
+
+def assign_worker(device_topic, worker_count, device_workers=None):
+    """
+    :param device_topic: device topic, such as campus/building/device
+    :param worker_count: number of worker processes
+    :param device_workers: dictionary of worker index by device topic
+                           pattern. Patterns use bash style filename
+                           matching. Devices that do not match are assigned
+                           by hash
+    :return: index of the worker owning the device
+    """
+    for pattern, index in (device_workers or {}).items():
+        if fnmatch.fnmatch(device_topic, pattern):
+            return int(index) % worker_count
+    return zlib.crc32(device_topic.lower().encode('utf-8')) % worker_count
+
+
+class ShardWorker:
+    """
+    Worker process of the platform driver
+
+    :param parent: platform driver agent
+    :param index: number of the worker
+    :param config: main configuration of the worker
+    """
+
+    def __init__(self, parent, index, config):
+        self.parent = parent
+        self.index = index
+        self.identity = "{}.worker{}".format(parent.core.identity, index)
+        self.config = config
+        # device configurations by device topic
+        self.devices = {}
+        self.ready = Event()
+        self.process = None
+        self._stopped = False
+        self._greenlet = None
+        self._config_path = None
+
+    def start(self):
+        fd, self._config_path = tempfile.mkstemp(prefix="platform-driver-worker{}-".format(self.index),
+                                                 suffix=".config")
+        with os.fdopen(fd, 'w') as config_file:
+            jsonapi.dump(self.config, config_file)
+        self._greenlet = gevent.spawn(self._run)
+
+    def stop(self):
+        self._stopped = True
+        self.ready.clear()
+        if self.process is not None and self.process.poll() is None:
+            self.process.terminate()
+            try:
+                self.process.wait(timeout=10.0)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+        if self._config_path is not None:
+            os.remove(self._config_path)
+            self._config_path = None
+
+    def _run(self):
+        # platform_driver must be importable by the worker
+        package_path = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        env = dict(os.environ)
+        env.pop('AGENT_UUID', None)
+        env['AGENT_VIP_IDENTITY'] = self.identity
+        env['AGENT_CONFIG'] = self._config_path
+        env['PYTHONPATH'] = os.pathsep.join(filter(None, [package_path, env.get('PYTHONPATH')]))
+        while not self._stopped:
+            _log.info("Starting driver worker {}".format(self.identity))
+            self.process = subprocess.Popen([sys.executable, '-m', 'platform_driver.agent'], env=env)
+            exit_code = self.process.wait()
+            self.ready.clear()
+            if self._stopped:
+                break
+            _log.error("Driver worker {} exited with code {}. Restarting in {} seconds".format(
+                self.identity, exit_code, WORKER_RESTART_DELAY))
+            gevent.sleep(WORKER_RESTART_DELAY)
+
+    def call(self, method, *args, **kwargs):
+        """
+        Call an RPC method of the worker
+        """
+        if not self.ready.wait(timeout=WORKER_RPC_TIMEOUT):
+            raise RuntimeError("Driver worker {} is not running".format(self.identity))
+        return self.parent.vip.rpc.call(self.identity, method, *args, **kwargs).get(timeout=WORKER_RPC_TIMEOUT)
+
+    def started(self):
+        """
+        Called when the worker connected. Sends the configurations of all its
+        devices, which also restores the devices of a restarted worker.
+        """
+        _log.info("Driver worker {} started with {} devices".format(self.identity, len(self.devices)))
+        self.ready.set()
+        for device_topic, contents in list(self.devices.items()):
+            self.add_device(device_topic, contents)
+
+    def add_device(self, device_topic, contents):
+        self.devices[device_topic] = contents
+        if not self.ready.is_set():
+            # sent when the worker starts
+            return
+        try:
+            self.call('add_device', device_topic, contents)
+        except Exception as e:
+            _log.error("Failed to start device {} on driver worker {}: {}".format(device_topic, self.identity, e))
+
+    def remove_device(self, device_topic):
+        self.devices.pop(device_topic, None)
+        if not self.ready.is_set():
+            return
+        try:
+            self.call('remove_device', device_topic)
+        except Exception as e:
+            _log.error("Failed to stop device {} on driver worker {}: {}".format(device_topic, self.identity, e))
+
+
+class RemoteDriver:
+    """
+    Stand-in for the DriverAgent of a device scraped by a worker process.
+    Calls are forwarded to the RPC methods of the worker.
+    """
+
+    def __init__(self, worker, device_path, config):
+        self.worker = worker
+        self.device_path = device_path
+        self.config = config
+        self.group = int(config.get("group", 0))
+
+    @property
+    def schema(self):
+        return self.worker.call('get_device_schema', self.device_path)
+
+    def get_point(self, point_name, **kwargs):
+        return self.worker.call('get_point', self.device_path, point_name, **kwargs)
+
+    def set_point(self, point_name, value, **kwargs):
+        return self.worker.call('set_point', self.device_path, point_name, value, **kwargs)
+
+    def scrape_all(self):
+        return self.worker.call('scrape_all', self.device_path)
+
+    def get_multiple_points(self, point_names, **kwargs):
+        return self.worker.call('get_multiple_points', self.device_path, point_names, **kwargs)
+
+    def set_multiple_points(self, point_names_values, **kwargs):
+        return self.worker.call('set_multiple_points', self.device_path, point_names_values, **kwargs)
+
+    def revert_point(self, point_name, **kwargs):
+        self.worker.call('revert_point', self.device_path, point_name, **kwargs)
+
+    def revert_all(self, **kwargs):
+        self.worker.call('revert_device', self.device_path, **kwargs)
+
+    def publish_cov_value(self, point_name, point_values):
+        self.worker.call('forward_bacnet_cov_value', self.device_path, point_name, point_values)
@@ -0,0 +1,57 @@
+import time
+
+import pytest
+from mock import MagicMock
+
+from platform_driver.interfaces.bacnet import Interface
+
+REGISTRY = [{"Volttron Point Name": "ZoneTemperature", "BACnet Object Type": "analogInput", "Property": "presentValue",
+             "Writable": "FALSE", "Index": "1", "Units": "degreesFahrenheit"},
+            {"Volttron Point Name": "SupplyFanStatus", "BACnet Object Type": "binaryInput", "Property": "presentValue",
+             "Writable": "FALSE", "Index": "2", "Units": "Enum", "COV Flag": "FALSE"},
+            {"Volttron Point Name": "ZoneSetpoint", "BACnet Object Type": "analogValue", "Property": "presentValue",
+             "Writable": "TRUE", "Index": "3", "Units": "degreesFahrenheit", "Write Priority": "16"}]
+
+
+@pytest.fixture()
+def interface():
+    vip = MagicMock()
+    interface = Interface(vip=vip, core=MagicMock(), device_path="campus/building/vav1")
+    interface.configure({"device_address": "10.0.0.5", "device_id": 500, "cov_first": True}, REGISTRY)
+    vip.rpc.call.reset_mock()
+    return interface
+
+
+def read_points(interface):
+    args = interface.vip.rpc.call.call_args[0]
+    assert args[1] == "read_properties"
+    return set(args[3])
+
+
+@pytest.mark.driver_unit
+def test_cov_first_should_subscribe_present_values(interface):
+    assert interface.cov_points == ["ZoneTemperature", "ZoneSetpoint"]
+
+
+@pytest.mark.driver_unit
+def test_scrape_should_read_points_without_cached_values(interface):
+    interface.vip.rpc.call.return_value.get.return_value = {"SupplyFanStatus": 1, "ZoneSetpoint": 70.0}
+    interface.cov_update("ZoneTemperature", {"presentValue": 72.5, "statusFlags": [0, 0, 0, 0]})
+
+    result = interface.scrape_all()
+
+    assert read_points(interface) == {"SupplyFanStatus", "ZoneSetpoint"}
+    assert result == {"ZoneTemperature": 72.5, "SupplyFanStatus": 1, "ZoneSetpoint": 70.0}
+
+
+@pytest.mark.driver_unit
+def test_scrape_should_read_stale_and_written_points(interface):
+    interface.vip.rpc.call.return_value.get.return_value = {}
+    interface.cov_update("ZoneTemperature", {"presentValue": 72.5})
+    interface.cov_update("ZoneSetpoint", {"presentValue": 70.0})
+    interface.cov_cache["ZoneTemperature"] = (72.5, time.time() - interface.cov_stale_after - 1)
+
+    interface.set_point("ZoneSetpoint", 68.0)
+    interface.scrape_all()
+
+    assert read_points(interface) == {"ZoneTemperature", "SupplyFanStatus", "ZoneSetpoint"}
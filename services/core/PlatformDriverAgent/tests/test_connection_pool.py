@@ -0,0 +1,89 @@
+import pytest
+
+from platform_driver import driver_locks
+from platform_driver.connection_pool import ConnectionPool
+
+
+class FakeClient:
+    refuse = False
+
+    def __init__(self, host, port):
+        self.host = host
+        self.port = port
+        self.open = False
+        self.connects = 0
+
+    def connect(self):
+        self.connects += 1
+        self.open = not FakeClient.refuse
+        return self.open
+
+    def close(self):
+        self.open = False
+
+    def is_socket_open(self):
+        return self.open
+
+
+@pytest.fixture()
+def pool():
+    if driver_locks._socket_lock is None:
+        driver_locks.configure_socket_lock()
+    FakeClient.refuse = False
+    yield ConnectionPool(FakeClient, broken_errors=(IOError,))
+    FakeClient.refuse = False
+
+
+@pytest.mark.driver
+def test_devices_on_gateway_should_share_connection(pool):
+    with pool.connection("10.0.0.1", 502) as first:
+        pass
+    with pool.connection("10.0.0.1", 502) as second:
+        assert second is first
+        assert second.is_socket_open()
+    with pool.connection("10.0.0.2", 502) as other:
+        assert other is not first
+    assert first.connects == 1
+
+
+@pytest.mark.driver
+def test_broken_connection_should_be_replaced(pool):
+    with pytest.raises(IOError):
+        with pool.connection("10.0.0.1", 502) as first:
+            raise IOError("timeout")
+    assert not first.is_socket_open()
+
+    # device errors keep the connection
+    with pytest.raises(ValueError):
+        with pool.connection("10.0.0.1", 502) as second:
+            raise ValueError("bad value")
+    assert second is not first
+    with pool.connection("10.0.0.1", 502) as third:
+        assert third is second
+
+    third.close()
+    with pool.connection("10.0.0.1", 502) as fourth:
+        assert fourth is not third
+
+
+@pytest.mark.driver
+def test_reconnect_should_back_off(pool):
+    gateway = pool.configure_gateway("10.0.0.1", 502, initial_backoff=10.0, max_backoff=30.0)
+    FakeClient.refuse = True
+    with pytest.raises(ConnectionError, match="Failed to connect"):
+        with pool.connection("10.0.0.1", 502):
+            pass
+    assert gateway.backoff() == 10.0
+
+    # no connection attempt while backing off
+    FakeClient.refuse = False
+    with pytest.raises(ConnectionError, match="Not connecting"):
+        with pool.connection("10.0.0.1", 502):
+            pass
+
+    gateway.failures = 3
+    assert gateway.backoff() == 30.0
+    gateway.retry_at = 0.0
+    with pool.connection("10.0.0.1", 502) as client:
+        assert client.is_socket_open()
+    assert gateway.failures == 0
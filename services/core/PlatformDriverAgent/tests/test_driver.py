@@ -34,7 +34,9 @@ from platform_driver import agent
 from platform_driver.agent import DriverAgent
 from platform_driver.interfaces import BaseInterface
 from platform_driver.interfaces.fakedriver import Interface as FakeInterface
+from platform_driver.scrape_scheduler import ScrapeScheduler
 from volttrontesting.utils.utils import AgentMock
+from volttron.platform.agent.device_schema import make_schema
 from volttron.platform.vip.agent import Agent
 from volttron.platform.messaging.utils import Topic
 from volttron.platform.vip.agent.core import ScheduledEvent
@@ -146,6 +148,17 @@ def test_starting_should_succeed():
         assert isinstance(driver_agent.periodic_read_event, ScheduledEvent)
 
 
+@pytest.mark.driver_unit
+def test_starting_should_add_device_to_scrape_scheduler():
+    with get_driver_agent() as driver_agent:
+        driver_agent.scrape_scheduler = create_autospec(ScrapeScheduler)
+        driver_agent.starting("somesender")
+
+        driver_agent.scrape_scheduler.add.assert_called_once_with("path/to/my/device", driver_agent, 60, 42,
+                                                                  "fakedriver")
+        assert driver_agent.periodic_read_event is None
+
+
 @pytest.mark.driver_unit
 def test_setup_device_should_succeed():
     expected_base_topic = Topic("devices/path/to/my/device/{point}")
@@ -173,6 +186,11 @@ def test_periodic_read_should_succeed():
         driver_agent.parent.scrape_ending.assert_called_once()
         driver_agent._publish_wrapper.assert_called_once()
         assert isinstance(driver_agent.periodic_read_event, ScheduledEvent)
+        args, kwargs = driver_agent.parent.record_scrape.call_args
+        assert args[:2] == ("path/to/my/device", "fakedriver")
+        assert kwargs["points"] == 1
+        assert not kwargs["failed"]
+        assert kwargs["lateness"] >= 0
 
 
 @pytest.mark.driver_unit
@@ -188,9 +206,88 @@ def test_periodic_read_should_return_none_on_scrape_response(scrape_all_response
         driver_agent.parent.scrape_starting.assert_called_once()
         driver_agent.parent.scrape_ending.assert_not_called()
         driver_agent._publish_wrapper.assert_not_called()
+        assert driver_agent.parent.record_scrape.call_args[1]["failed"]
         assert isinstance(driver_agent.periodic_read_event, ScheduledEvent)
 
 
+@pytest.mark.driver_unit
+def test_get_deadbands_should_read_registry_columns():
+    registry_config = [{"Volttron Point Name": "Temp", "Deadband": "0.5", "Percent Deadband": ""},
+                       {"Volttron Point Name": "Flow", "Percent Deadband": "2"},
+                       {"Volttron Point Name": "Mode", "Deadband": ""}]
+
+    assert DriverAgent.get_deadbands(registry_config) == {"Temp": (0.5, 0.0), "Flow": (0.0, 2.0)}
+    assert DriverAgent.get_deadbands("raw registry") == {}
+
+
+@pytest.mark.driver_unit
+def test_filter_changed_points_should_apply_deadbands():
+    with get_driver_agent() as driver_agent:
+        driver_agent.full_publish_interval = 3
+        driver_agent.deadbands = {"Temp": (0.5, 0.0), "Flow": (0.0, 10.0)}
+
+        results = {"Temp": 70.0, "Flow": 100.0, "Mode": "cool", "Count": 1}
+        assert driver_agent.filter_changed_points(results) == (results, "full")
+        assert driver_agent.filter_changed_points({"Temp": 70.4, "Flow": 109.0, "Mode": "cool", "Count": 2}) == \
+            ({"Count": 2}, "delta")
+        # changes are compared to the last published value
+        assert driver_agent.filter_changed_points({"Temp": 70.6, "Flow": 111.0, "Mode": "heat", "Count": 2}) == \
+            ({"Temp": 70.6, "Flow": 111.0, "Mode": "heat"}, "delta")
+        assert driver_agent.filter_changed_points(results) == (results, "full")
+
+
+@pytest.mark.driver_unit
+def test_periodic_read_should_publish_changes_with_publish_type():
+    now = pytz.UTC.localize(datetime.utcnow())
+
+    with get_driver_agent(has_core_schedule=True, meta_data={"foo": {"units": "F"}, "bar": {"units": "F"}},
+                          has_base_topic=True, mock_publish_wrapper=True,
+                          interface_scrape_all={"foo": 1, "bar": 2}) as driver_agent:
+        driver_agent.publish_on_change = True
+        driver_agent.publish_depth_first = False
+        driver_agent.publish_depth_first_all = True
+        driver_agent.all_path_depth = "devices/path/to/my/device/all"
+
+        driver_agent.periodic_read(now)
+        headers = driver_agent._publish_wrapper.call_args[1]["headers"]
+        assert headers["PublishType"] == "full"
+
+        driver_agent.periodic_read(now)
+        assert driver_agent._publish_wrapper.call_count == 1
+        assert driver_agent.parent.scrape_ending.call_count == 2
+
+        driver_agent.interface.scrape_all.return_value = {"foo": 1, "bar": 3}
+        driver_agent.periodic_read(now)
+        kwargs = driver_agent._publish_wrapper.call_args[1]
+        assert kwargs["headers"]["PublishType"] == "delta"
+        assert kwargs["message"] == [{"bar": 3}, {"bar": {"units": "F"}}]
+
+
+@pytest.mark.driver_unit
+def test_periodic_read_should_publish_compact_values_with_schema():
+    now = pytz.UTC.localize(datetime.utcnow())
+
+    with get_driver_agent(has_core_schedule=True, meta_data={"foo": {"units": "F"}, "bar": {"units": "F"}},
+                          has_base_topic=True, mock_publish_wrapper=True,
+                          interface_scrape_all={"foo": 1, "bar": 2}) as driver_agent:
+        driver_agent.compact_publish = True
+        driver_agent.publish_depth_first = False
+        driver_agent.publish_depth_first_all = True
+        driver_agent.all_path_depth = "devices/path/to/my/device/all"
+        driver_agent.schema = make_schema(driver_agent.meta_data)
+
+        driver_agent.periodic_read(now)
+        (schema_call, all_call) = driver_agent._publish_wrapper.call_args_list
+        assert schema_call[0][0] == "schema"
+        assert schema_call[1]["message"]["points"] == ["bar", "foo"]
+        assert all_call[1]["message"] == [2, 1]
+        assert all_call[1]["headers"]["SchemaId"] == driver_agent.schema["id"]
+
+        # the schema is only published again after schema_publish_interval scrapes
+        driver_agent.periodic_read(now)
+        assert driver_agent._publish_wrapper.call_count == 3
+
+
 @pytest.mark.driver_unit
 def test_heart_beat_should_return_none_on_no_heart_beat_point():
     with get_driver_agent() as driver_agent:
@@ -299,6 +396,9 @@ class MockedParent:
     def scrape_ending(self, device_name):
         pass
 
+    def record_scrape(self, device_path, driver_type, duration, points=None, lateness=None, failed=False):
+        pass
+
 
 class MockedBaseTopic:
     def __call__(self, point):
@@ -0,0 +1,90 @@
+import pytest
+from mock import MagicMock
+
+from platform_driver.interfaces.home_assistant import Interface
+
+REGISTRY = [{"Entity ID": "light.kitchen", "Entity Point": "state", "Volttron Point Name": "kitchen_state",
+             "Writable": True, "Type": "int"},
+            {"Entity ID": "light.kitchen", "Entity Point": "brightness", "Volttron Point Name": "kitchen_brightness",
+             "Writable": True, "Type": "int"},
+            {"Entity ID": "light.hallway", "Entity Point": "state", "Volttron Point Name": "hallway_state",
+             "Writable": True, "Type": "int"},
+            {"Entity ID": "climate.office", "Entity Point": "state", "Volttron Point Name": "office_mode",
+             "Writable": True, "Type": "int"},
+            {"Entity ID": "sensor.outdoor", "Entity Point": "state", "Volttron Point Name": "outdoor_temperature",
+             "Writable": False, "Type": "float"}]
+
+STATES = [{"entity_id": "light.kitchen", "state": "on", "attributes": {"brightness": 128}},
+          {"entity_id": "light.hallway", "state": "off", "attributes": {}},
+          {"entity_id": "climate.office", "state": "cool", "attributes": {}},
+          {"entity_id": "sensor.outdoor", "state": "61.5", "attributes": {}},
+          {"entity_id": "light.garage", "state": "on", "attributes": {}}]
+
+
+def response(status_code=200, json_data=None):
+    resp = MagicMock()
+    resp.status_code = status_code
+    resp.json.return_value = json_data
+    resp.content = b"[]" if json_data is not None else b""
+    return resp
+
+
+@pytest.fixture()
+def interface():
+    interface = Interface(vip=MagicMock(), core=MagicMock(), device_path="campus/building/home")
+    interface.configure({"ip_address": "127.0.0.1", "access_token": "token", "port": 8123}, REGISTRY)
+    interface.api.session = MagicMock()
+    return interface
+
+
+@pytest.mark.driver_unit
+def test_scrape_should_fetch_all_states_once(interface):
+    interface.api.session.get.return_value = response(json_data=STATES)
+
+    result = interface.scrape_all()
+
+    interface.api.session.get.assert_called_once()
+    assert interface.api.session.get.call_args[0][0] == "http://127.0.0.1:8123/api/states"
+    assert result == {"kitchen_state": 1, "kitchen_brightness": 128, "hallway_state": 0, "office_mode": 3,
+                      "outdoor_temperature": "61.5"}
+
+
+@pytest.mark.driver_unit
+def test_scrape_should_fetch_entities_without_bulk_states(interface):
+    interface.bulk_states = False
+    interface.api.session.get.side_effect = lambda url, **kwargs: response(
+        json_data=next(s for s in STATES if url.endswith(s["entity_id"])))
+
+    result = interface.scrape_all()
+
+    assert interface.api.session.get.call_count == 5
+    assert result["office_mode"] == 3
+
+
+@pytest.mark.driver_unit
+def test_writes_should_be_batched_by_service(interface):
+    interface.api.session.post.return_value = response()
+
+    errors = interface.set_multiple_points("campus/building/home", [("kitchen_state", 1),
+                                                                    ("hallway_state", 1),
+                                                                    ("kitchen_brightness", 200),
+                                                                    ("office_mode", 7),
+                                                                    ("outdoor_temperature", 60.0)])
+
+    assert set(errors) == {"campus/building/home/office_mode", "campus/building/home/outdoor_temperature"}
+    calls = [(c[0][0], c[1]["json"]) for c in interface.api.session.post.call_args_list]
+    assert calls == [("http://127.0.0.1:8123/api/services/light/turn_on",
+                      {"entity_id": ["light.kitchen", "light.hallway"]}),
+                     ("http://127.0.0.1:8123/api/services/light/turn_on",
+                      {"entity_id": "light.kitchen", "brightness": 200})]
+    assert interface.get_register_by_name("hallway_state").value == 1
+
+
+@pytest.mark.driver_unit
+def test_failed_batch_should_report_all_its_points(interface):
+    interface.api.session.post.return_value = response(status_code=500)
+
+    errors = interface.set_multiple_points("campus/building/home", [("kitchen_state", 0), ("hallway_state", 0)])
+
+    assert set(errors) == {"campus/building/home/kitchen_state", "campus/building/home/hallway_state"}
+    assert interface.get_register_by_name("kitchen_state").value is None
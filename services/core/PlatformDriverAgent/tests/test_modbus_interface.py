@@ -0,0 +1,76 @@
+import pytest
+from mock import MagicMock
+from pymodbus.bit_write_message import WriteSingleCoilResponse
+from pymodbus.pdu import ExceptionResponse
+
+from platform_driver import driver_locks
+from platform_driver.interfaces import modbus
+from platform_driver.interfaces.modbus import Interface
+
+ADDRESS = "10.0.0.9"
+REGISTRY = [{"Volttron Point Name": "Fan", "Modbus Register": "BOOL", "Writable": "TRUE", "Point Address": "1",
+             "Units": "On/Off"}]
+
+
+class FakeClient:
+    """
+    pymodbus client returning the responses set by the tests
+    """
+
+    def __init__(self, host, port):
+        self.open = False
+        self.responses = []
+
+    def connect(self):
+        self.open = True
+        return True
+
+    def close(self):
+        self.open = False
+
+    def is_socket_open(self):
+        return self.open
+
+    def write_coil(self, address, value, unit=0):
+        return self.responses.pop(0)
+
+
+@pytest.fixture()
+def interface(monkeypatch):
+    if driver_locks._socket_lock is None:
+        driver_locks.configure_socket_lock()
+    monkeypatch.setattr(modbus.connection_pool, "client_factory", FakeClient)
+    interface = Interface(vip=MagicMock(), core=MagicMock(), device_path="campus/building/fan")
+    interface.configure({"device_address": ADDRESS, "slave_id": 3}, REGISTRY)
+    yield interface
+    modbus.connection_pool.gateways.pop((ADDRESS, 502)).close_idle()
+
+
+def pooled_client():
+    idle = modbus.connection_pool.gateways[(ADDRESS, 502)].idle
+    return idle[0][0] if idle else None
+
+
+@pytest.mark.driver_unit
+def test_exception_response_should_keep_pooled_connection(interface):
+    with modbus.connection_pool.connection(ADDRESS, 502) as client:
+        client.responses = [ExceptionResponse(5, 2), WriteSingleCoilResponse(1, True)]
+
+    with pytest.raises(IOError, match="exception code 2"):
+        interface.set_point("Fan", True)
+    assert pooled_client() is client
+    assert client.is_socket_open()
+
+    assert interface.set_point("Fan", True) is True
+    assert pooled_client() is client
+
+
+@pytest.mark.driver_unit
+def test_missing_response_should_close_pooled_connection(interface):
+    with modbus.connection_pool.connection(ADDRESS, 502) as client:
+        client.responses = [None]
+
+    with pytest.raises(IOError, match="returned None"):
+        interface.set_point("Fan", True)
+    assert pooled_client() is None
+    assert not client.is_socket_open()
@@ -0,0 +1,150 @@
+import select
+import struct
+
+import gevent
+import pytest
+from gevent.server import StreamServer
+
+from platform_driver import driver_locks
+from platform_driver.connection_pool import ConnectionPool
+from platform_driver.modbus_scheduler import (GatewayScheduler, ModbusDeviceException, ModbusProtocolError,
+                                              ReadRequest, TcpClient, READ_COILS, READ_HOLDING_REGISTERS, MBAP_HEADER)
+
+
+class FakeGateway:
+    """
+    Modbus TCP gateway returning the address as value of every register. Coils
+    are on at odd addresses. Unit 9 does not exist, unit 8 returns invalid
+    frames and unit 5 answers with unit id 0. Pipelined requests are answered
+    in reverse order.
+    """
+
+    def __init__(self):
+        self.server = StreamServer(("127.0.0.1", 0), self.handle)
+        self.requests = []
+        self.max_outstanding = 0
+        self.connections = 0
+
+    def handle(self, sock, address):
+        self.connections += 1
+        buffer = b''
+        while True:
+            chunk = sock.recv(4096)
+            if not chunk:
+                return
+            buffer += chunk
+            # let the client finish sending pipelined requests
+            gevent.sleep(0.01)
+            while select.select([sock], [], [], 0)[0]:
+                chunk = sock.recv(4096)
+                if not chunk:
+                    break
+                buffer += chunk
+            frames = []
+            while len(buffer) >= 12:
+                frames.append(buffer[:12])
+                buffer = buffer[12:]
+            self.max_outstanding = max(self.max_outstanding, len(frames))
+            sock.sendall(b''.join(self.respond(frame) for frame in reversed(frames)))
+
+    def respond(self, frame):
+        transaction_id, _, _, unit = MBAP_HEADER.unpack(frame[:7])
+        function_code, address, count = struct.unpack('>BHH', frame[7:])
+        self.requests.append((unit, function_code, address, count))
+        if unit == 8:
+            return MBAP_HEADER.pack(transaction_id, 1, 2, unit) + b'\x00'
+        if unit == 9:
+            pdu = struct.pack('>BB', function_code | 0x80, 11)
+        elif function_code == READ_COILS:
+            bits = [(address + i) % 2 for i in range(count)]
+            data = bytes(sum(bit << (i % 8) for i, bit in enumerate(bits[byte:byte + 8]))
+                         for byte in range(0, count, 8))
+            pdu = struct.pack('>BB', function_code, len(data)) + data
+        else:
+            data = b''.join(struct.pack('>H', address + i) for i in range(count))
+            pdu = struct.pack('>BB', function_code, len(data)) + data
+        return MBAP_HEADER.pack(transaction_id, 0, len(pdu) + 1, 0 if unit == 5 else unit) + pdu
+
+
+@pytest.fixture()
+def gateway():
+    if driver_locks._socket_lock is None:
+        driver_locks.configure_socket_lock()
+    gateway = FakeGateway()
+    gateway.server.start()
+    yield gateway
+    gateway.server.stop()
+
+
+def scrape(scheduler, unit, results):
+    try:
+        results[unit] = scheduler.submit([ReadRequest(unit, READ_HOLDING_REGISTERS, 0, 2),
+                                          ReadRequest(unit, READ_COILS, 1, 10),
+                                          ReadRequest(unit, READ_HOLDING_REGISTERS, 10, 1)])
+    except (ModbusDeviceException, ModbusProtocolError) as e:
+        results[unit] = e
+
+
+@pytest.mark.driver
+def test_scrapes_in_window_should_be_batched(gateway):
+    pool = ConnectionPool(TcpClient, broken_errors=(IOError,))
+    scheduler = GatewayScheduler(pool, "127.0.0.1", gateway.server.server_port, pipeline_depth=1)
+    results = {}
+    gevent.joinall([gevent.spawn(scrape, scheduler, unit, results) for unit in (1, 2, 9)], timeout=10)
+
+    assert results[1] == [b'\x00\x00\x00\x01', [True, False] * 5, b'\x00\x0a']
+    assert results[2] == results[1]
+    assert isinstance(results[9], ModbusDeviceException)
+    assert results[9].exception_code == 11
+    # one connection, requests are serialized
+    assert gateway.connections == 1
+    assert gateway.max_outstanding == 1
+    assert len(gateway.requests) == 9
+
+    # the connection is reused and identical requests are sent once
+    gevent.joinall([gevent.spawn(scrape, scheduler, 1, results) for _ in range(3)], timeout=10)
+    assert gateway.connections == 1
+    assert len(gateway.requests) == 12
+
+
+@pytest.mark.driver
+def test_requests_should_be_pipelined(gateway):
+    pool = ConnectionPool(TcpClient, broken_errors=(IOError,))
+    scheduler = GatewayScheduler(pool, "127.0.0.1", gateway.server.server_port, pipeline_depth=4)
+    results = {}
+    gevent.joinall([gevent.spawn(scrape, scheduler, unit, results) for unit in (1, 2, 3)], timeout=10)
+
+    assert gateway.max_outstanding == 4
+    for unit in (1, 2, 3):
+        assert results[unit] == [b'\x00\x00\x00\x01', [True, False] * 5, b'\x00\x0a']
+
+
+@pytest.mark.driver
+def test_failed_batch_should_only_fail_scrapes_of_broken_device(gateway):
+    pool = ConnectionPool(TcpClient, broken_errors=(IOError,))
+    scheduler = GatewayScheduler(pool, "127.0.0.1", gateway.server.server_port)
+    results = {}
+    gevent.joinall([gevent.spawn(scrape, scheduler, unit, results) for unit in (1, 8, 5)], timeout=10)
+
+    assert isinstance(results[8], ModbusProtocolError)
+    assert results[1] == [b'\x00\x00\x00\x01', [True, False] * 5, b'\x00\x0a']
+    # a response with unit id 0 is accepted
+    assert results[5] == results[1]
+    # the batch failed, the scrapes were retried one by one and the broken connections replaced
+    assert gateway.connections == 3
+
+
+@pytest.mark.driver
+def test_connection_errors_should_fail_batch():
+    if driver_locks._socket_lock is None:
+        driver_locks.configure_socket_lock()
+    pool = ConnectionPool(TcpClient, broken_errors=(IOError,))
+    # nothing listens on the port of a stopped server
+    server = StreamServer(("127.0.0.1", 0), lambda sock, address: None)
+    server.start()
+    port = server.server_port
+    server.stop()
+    scheduler = GatewayScheduler(pool, "127.0.0.1", port)
+    with pytest.raises(ConnectionError):
+        scheduler.submit([ReadRequest(1, READ_HOLDING_REGISTERS, 0, 1)])
+    assert pool.gateways[("127.0.0.1", port)].failures == 1
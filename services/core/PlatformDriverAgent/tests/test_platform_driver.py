@@ -163,6 +163,48 @@ def test_scrape_ending_should_increase_test_results_iterations():
         assert platform_driver_agent.test_iterations > 0
 
 
+@pytest.mark.driver_unit
+def test_scrape_ending_should_write_scalability_report(tmp_path):
+    topic = "campus/building1/"
+    report_path = tmp_path / "report.jsonl"
+
+    with get_platform_driver_agent(scalability_test=True, waiting_to_finish={topic},
+                                   current_test_start=datetime.now()) as platform_driver_agent:
+        platform_driver_agent.scalability_test_warmup = 1
+        platform_driver_agent.scalability_test_iterations = 1
+        platform_driver_agent.scalability_test_report = str(report_path)
+        platform_driver_agent.record_scrape(topic, "fake", 0.2, points=10, lateness=0.0)
+
+        # the first iteration is a warm up
+        platform_driver_agent.scrape_ending(topic)
+        assert platform_driver_agent.test_results == []
+        assert platform_driver_agent.scrape_telemetry.get_stats()["interfaces"] == {}
+
+        platform_driver_agent.scrape_starting(topic)
+        platform_driver_agent.record_scrape(topic, "fake", 0.2, points=10, lateness=0.0)
+        with pytest.raises(SystemExit):
+            platform_driver_agent.scrape_ending(topic)
+
+    report = json.loads(report_path.read_text().splitlines()[0])
+    assert report["devices"] == 1
+    assert report["driver_types"] == {"fake": 1}
+    assert report["iterations"] == 1
+    assert report["warmup_iterations"] == 1
+    assert report["stdev"] == 0.0
+    assert report["scrape_stats"]["fake"]["scrapes"] == 1
+
+
+@pytest.mark.driver_unit
+def test_get_scrape_stats_should_return_device_stats():
+    with get_platform_driver_agent() as platform_driver_agent:
+        platform_driver_agent.record_scrape("campus/building1/", "fake", 0.2, points=10, lateness=0.0)
+
+        stats = platform_driver_agent.get_scrape_stats("campus/building1/")
+
+        assert stats["devices"]["campus/building1/"]["points"]["count"] == 1
+        assert stats["interfaces"]["fake"]["scrapes"] == 1
+
+
 @pytest.mark.driver_unit
 def test_clear_overrides():
     override_patterns = set("ffdfdsfd")
@@ -176,6 +218,8 @@ def test_clear_overrides():
 
 
 class MockedInstance:
+    config = {"driver_type": "fake"}
+
     def revert_all(self):
         pass
 
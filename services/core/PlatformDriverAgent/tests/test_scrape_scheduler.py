@@ -0,0 +1,89 @@
+import gevent
+import pytest
+
+from platform_driver.scrape_scheduler import ScrapeScheduler
+
+
+class FakeDriver:
+    running = 0
+    max_running = 0
+
+    def __init__(self, device_path, duration=0.0):
+        self.device_path = device_path
+        self.duration = duration
+        self.time_slot_offset = 0
+        self.scrapes = []
+
+    def scrape_and_publish(self, now):
+        FakeDriver.running += 1
+        FakeDriver.max_running = max(FakeDriver.max_running, FakeDriver.running)
+        self.scrapes.append(now)
+        gevent.sleep(self.duration)
+        FakeDriver.running -= 1
+
+
+@pytest.fixture()
+def scheduler():
+    FakeDriver.running = FakeDriver.max_running = 0
+    scheduler = ScrapeScheduler(tick=0.01, interface_concurrency={"slow": 1})
+    yield scheduler
+    scheduler.stop()
+    # let running scrapes finish before the next test resets the counters
+    while FakeDriver.running:
+        gevent.sleep(0.01)
+
+
+@pytest.mark.driver_unit
+def test_offsets_should_be_spread_by_cost(scheduler):
+    drivers = [FakeDriver("device{}".format(i)) for i in range(4)]
+    for driver in drivers:
+        scheduler.add(driver.device_path, driver, 60, group=0)
+    assert [driver.time_slot_offset for driver in drivers] == [0.0, 15.0, 30.0, 45.0]
+
+    # expensive devices get a larger share of the interval, groups are scraped in order
+    scheduler.entries["device0"].cost = 3.0
+    scheduler.entries["device1"].cost = 1.0
+    scheduler.add("device4", FakeDriver("device4"), 60, group=1)
+    scheduler._rebalance(0.0)
+    assert [driver.time_slot_offset for driver in drivers] == [0.0, 18.0, 24.0, 36.0]
+    assert scheduler.entries["device4"].offset == 48.0
+
+    scheduler.remove("device0")
+    scheduler._rebalance(0.0)
+    assert drivers[1].time_slot_offset == 0.0
+    assert "device0" not in scheduler.get_schedule()
+
+
+@pytest.mark.driver_unit
+def test_overruns_should_be_skipped(scheduler):
+    driver = FakeDriver("device", duration=0.25)
+    scheduler.add(driver.device_path, driver, 0.1, driver_type="fake")
+    scheduler.start()
+    gevent.sleep(0.6)
+
+    schedule = scheduler.get_schedule()["device"]
+    assert 2 <= len(driver.scrapes) <= 3
+    assert schedule["overruns"] >= 2
+    assert FakeDriver.max_running == 1
+    # scrapes are scheduled on interval boundaries
+    for scrape in driver.scrapes:
+        assert round(scrape.timestamp() * 10) == pytest.approx(scrape.timestamp() * 10)
+
+
+@pytest.mark.driver_unit
+def test_interface_concurrency_should_be_limited(scheduler):
+    fast = [FakeDriver("fast{}".format(i), duration=0.05) for i in range(3)]
+    slow = [FakeDriver("slow{}".format(i), duration=0.05) for i in range(3)]
+    for driver in fast:
+        scheduler.add(driver.device_path, driver, 10, driver_type="fake")
+    for driver in slow:
+        scheduler.add(driver.device_path, driver, 10, driver_type="slow")
+    # all scrapes are due now
+    for entry in scheduler.entries.values():
+        entry.offset = 0.0
+        scheduler._dispatch(entry, entry.due)
+    gevent.sleep(0.01)
+    assert FakeDriver.running == 4
+    gevent.sleep(0.2)
+    assert all(len(driver.scrapes) == 1 for driver in fast + slow)
+    assert scheduler.get_schedule()["slow2"]["cost"] == pytest.approx(0.05, abs=0.03)
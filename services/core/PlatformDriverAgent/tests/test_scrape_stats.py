@@ -0,0 +1,58 @@
+import pytest
+
+from platform_driver.scrape_stats import Histogram, ScrapeTelemetry, merge_stats
+
+
+@pytest.mark.driver_unit
+def test_histogram_should_count_values_in_buckets():
+    histogram = Histogram((0.1, 1.0, 10.0))
+    for value in (0.05, 0.1, 0.5, 0.7, 3.0, 20.0):
+        histogram.add(value)
+
+    values = histogram.to_dict()
+    assert values["counts"] == [2, 2, 1, 1]
+    assert values["count"] == 6
+    assert values["max"] == 20.0
+    assert values["p50"] == 1.0
+    assert values["p99"] == 20.0
+    assert Histogram.from_dict(values).to_dict() == values
+
+
+@pytest.mark.driver_unit
+def test_telemetry_should_keep_device_and_interface_stats():
+    telemetry = ScrapeTelemetry()
+    telemetry.record("campus/building/device1", "bacnet", 0.2, points=40, lateness=0.01)
+    telemetry.record("campus/building/device1", "bacnet", 1.5, lateness=0.3, failed=True)
+    telemetry.record("campus/building/device2", "bacnet", 0.3, points=20, lateness=-0.01)
+
+    stats = telemetry.get_stats()
+    device1 = stats["devices"]["campus/building/device1"]
+    assert device1["scrapes"] == 2
+    assert device1["failures"] == 1
+    assert device1["points"]["count"] == 1
+    bacnet = stats["interfaces"]["bacnet"]
+    assert bacnet["scrapes"] == 3
+    assert bacnet["duration"]["max"] == 1.5
+    # scrapes starting early are not late
+    assert bacnet["lateness"]["counts"][0] == 2
+
+    telemetry.remove("campus/building/device1")
+    assert list(telemetry.get_stats()["devices"]) == ["campus/building/device2"]
+    assert telemetry.get_stats("campus/building/device1")["devices"] == {}
+    assert telemetry.get_stats()["interfaces"]["bacnet"]["scrapes"] == 3
+
+
+@pytest.mark.driver_unit
+def test_stats_of_workers_should_be_merged():
+    first = ScrapeTelemetry()
+    first.record("device1", "bacnet", 0.2, points=10)
+    second = ScrapeTelemetry()
+    second.record("device2", "bacnet", 0.4, points=10, failed=True)
+    second.record("device3", "modbus", 0.01, points=5)
+
+    merged = merge_stats([first.get_stats(), second.get_stats()])
+    assert sorted(merged["devices"]) == ["device1", "device2", "device3"]
+    assert merged["interfaces"]["bacnet"]["scrapes"] == 2
+    assert merged["interfaces"]["bacnet"]["failures"] == 1
+    assert merged["interfaces"]["bacnet"]["duration"]["max"] == 0.4
+    assert merged["interfaces"]["modbus"]["scrapes"] == 1
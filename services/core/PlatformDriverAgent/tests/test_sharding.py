@@ -0,0 +1,161 @@
+from collections import Counter
+
+import pytest
+from mock import MagicMock
+
+from platform_driver.agent import PlatformDriverAgent
+from platform_driver.sharding import RemoteDriver, ShardWorker, assign_worker
+from volttron.platform.vip.agent import Agent
+from volttrontesting.utils.utils import AgentMock
+
+
+class FakeResult:
+    def __init__(self, value):
+        self.value = value
+
+    def get(self, timeout=None):
+        return self.value
+
+
+class FakeParent:
+    """
+    Platform driver recording the RPC calls to its workers
+    """
+
+    def __init__(self):
+        self.calls = []
+        self.core = self
+        self.vip = self
+        self.rpc = self
+        self.identity = "platform.driver"
+
+    def call(self, peer, method, *args, **kwargs):
+        self.calls.append((peer, method) + args)
+        return FakeResult(method)
+
+
+@pytest.mark.driver_unit
+def test_devices_should_be_assigned_by_hash_or_configuration():
+    devices = ["campus/building/device{}".format(i) for i in range(200)]
+    counts = Counter(assign_worker(device, 4) for device in devices)
+    assert set(counts) == {0, 1, 2, 3}
+    assert min(counts.values()) > 25
+    # the assignment is stable and does not depend on case
+    assert assign_worker("Campus/Building/Device1", 4) == assign_worker("campus/building/device1", 4)
+
+    device_workers = {"campus/building/device1*": 3}
+    assert assign_worker("campus/building/device12", 4, device_workers) == 3
+    assert assign_worker("campus/building/device2", 4, device_workers) == assign_worker("campus/building/device2", 4)
+
+
+@pytest.mark.driver_unit
+def test_devices_should_be_sent_when_worker_starts():
+    parent = FakeParent()
+    worker = ShardWorker(parent, 1, {})
+    assert worker.identity == "platform.driver.worker1"
+
+    worker.add_device("campus/building/device1", {"driver_type": "fake"})
+    worker.add_device("campus/building/device2", {"driver_type": "fake"})
+    worker.remove_device("campus/building/device2")
+    assert parent.calls == []
+
+    worker.started()
+    assert parent.calls == [("platform.driver.worker1", "add_device", "campus/building/device1",
+                             {"driver_type": "fake"})]
+
+    # a restarted worker gets its devices again
+    worker.ready.clear()
+    worker.started()
+    assert len(parent.calls) == 2
+
+    worker.remove_device("campus/building/device1")
+    assert parent.calls[-1] == ("platform.driver.worker1", "remove_device", "campus/building/device1")
+    assert worker.devices == {}
+
+
+@pytest.mark.driver_unit
+def test_remote_driver_should_call_worker():
+    parent = FakeParent()
+    worker = ShardWorker(parent, 0, {})
+    worker.ready.set()
+    driver = RemoteDriver(worker, "campus/building/device1", {"group": "2"})
+    assert driver.group == 2
+
+    assert driver.get_point("SampleWritableFloat1") == "get_point"
+    driver.revert_all()
+    driver.publish_cov_value("SampleWritableFloat1", {"present_value": 1.0})
+    assert parent.calls == [
+        ("platform.driver.worker0", "get_point", "campus/building/device1", "SampleWritableFloat1"),
+        ("platform.driver.worker0", "revert_device", "campus/building/device1"),
+        ("platform.driver.worker0", "forward_bacnet_cov_value", "campus/building/device1", "SampleWritableFloat1",
+         {"present_value": 1.0})]
+
+
+@pytest.fixture()
+def driver_agent():
+    bases = PlatformDriverAgent.__bases__
+    PlatformDriverAgent.__bases__ = (AgentMock.imitate(Agent, Agent()),)
+
+    def create(**kwargs):
+        agent = PlatformDriverAgent([], **kwargs)
+        agent.core.identity = "platform.driver.worker0" if kwargs.get("shard_parent") else "platform.driver"
+        agent.update_driver = MagicMock()
+        agent.remove_driver = MagicMock()
+        agent.instances["campus/building/device1"] = MagicMock()
+        return agent
+    yield create
+    PlatformDriverAgent.__bases__ = bases
+
+
+@pytest.mark.driver_unit
+def test_worker_should_only_accept_calls_of_platform_driver(driver_agent):
+    worker = driver_agent(shard_parent="platform.driver")
+
+    worker.vip.rpc.context.vip_message.peer = "platform.driver"
+    worker.add_device("campus/building/device2", {"driver_type": "fake"})
+    worker.set_point("campus/building/device1", "SampleWritableFloat1", 1.0)
+    worker.update_driver.assert_called_once()
+    worker.instances["campus/building/device1"].set_point.assert_called_once()
+
+    worker.vip.rpc.context.vip_message.peer = "other.agent"
+    for method, args in [(worker.add_device, ("campus/building/device3", {})),
+                         (worker.remove_device, ("campus/building/device1",)),
+                         (worker.set_point, ("campus/building/device1", "SampleWritableFloat1", 2.0)),
+                         (worker.revert_device, ("campus/building/device1",))]:
+        with pytest.raises(RuntimeError):
+            method(*args)
+    worker.update_driver.assert_called_once()
+    worker.remove_driver.assert_not_called()
+    worker.instances["campus/building/device1"].set_point.assert_called_once()
+
+
+@pytest.mark.driver_unit
+def test_platform_driver_should_only_accept_its_workers(driver_agent):
+    parent = driver_agent()
+    worker = ShardWorker(parent, 0, {})
+    worker.started = MagicMock()
+    parent.workers.append(worker)
+    parent.vip.rpc.context.vip_message.peer = "other.agent"
+
+    with pytest.raises(RuntimeError):
+        parent.add_device("campus/building/device2", {"driver_type": "fake"})
+    parent.update_driver.assert_not_called()
+
+    parent.driver_worker_started("platform.driver.worker0")
+    parent.core.spawn.assert_not_called()
+
+    parent.vip.rpc.context.vip_message.peer = "platform.driver.worker0"
+    parent.driver_worker_started("platform.driver.worker0")
+    parent.core.spawn.assert_called_once_with(worker.started)
+
+
+@pytest.mark.driver_unit
+def test_heart_beat_should_skip_workers_not_running(driver_agent):
+    parent = driver_agent()
+    running = ShardWorker(parent, 0, {})
+    running.ready.set()
+    parent.workers = [running, ShardWorker(parent, 1, {})]
+    parent.vip.rpc.call = MagicMock()
+
+    parent.heart_beat()
+    parent.vip.rpc.call.assert_called_once_with("platform.driver.worker0", "heart_beat")
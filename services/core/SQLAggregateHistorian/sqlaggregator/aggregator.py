@@ -52,6 +52,8 @@ class SQLAggregateHistorian(AggregateHistorian):
         self.dbfuncts_class = None
         self.tables_def = None
         self.table_names = None
+        self.connection_params = None
+        self.database_type = None
         super(SQLAggregateHistorian, self).__init__(config_path, **kwargs)
 
     def configure(self, config_name, action, config):
@@ -68,6 +70,8 @@ class SQLAggregateHistorian(AggregateHistorian):
         tables_def = config.get('tables_def', None)
         self.tables_def, self.table_names = self.parse_table_def(tables_def)
 
+        self.database_type = database_type
+        self.connection_params = connection['params']
         class_name = sqlutils.get_dbfuncts_class(database_type)
         self.dbfuncts_class = class_name(connection['params'], self.table_names)
         self.dbfuncts_class.setup_aggregate_historian_tables()
@@ -116,6 +120,19 @@ class SQLAggregateHistorian(AggregateHistorian):
             start_time,
             end_time)
 
+    def collect_topic_aggregates(self, topic_ids, start_time, end_time):
+        return self.dbfuncts_class.collect_topic_aggregates(
+            topic_ids,
+            start_time,
+            end_time)
+
+    def open_backfill_connection(self):
+        class_name = sqlutils.get_dbfuncts_class(self.database_type)
+        return class_name(self.connection_params, self.table_names)
+
+    def insert_aggregates(self, records):
+        self.dbfuncts_class.insert_aggregates(records)
+
     def insert_aggregate(self, topic_id, agg_type, period, end_time,
                          value, topic_ids):
         self.dbfuncts_class.insert_aggregate(topic_id,
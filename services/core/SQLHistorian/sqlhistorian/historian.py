@@ -26,10 +26,13 @@
 import logging
 import sys
 import threading
+from datetime import timedelta
 
 from volttron.platform.agent import utils
 from volttron.platform.agent.base_historian import BaseHistorian
+from volttron.platform.agent.tiered_retention import TieredRetention
 from volttron.platform.dbutils import sqlutils
+from volttron.platform.dbutils.topicindex import TopicIndex
 from volttron.utils.docs import doc_inherit
 
 __version__ = "4.0.0"
@@ -89,7 +92,7 @@ class SQLHistorian(BaseHistorian):
      - :py:mod:`volttron.platform.dbutils.sqlitefuncts`
     """
 
-    def __init__(self, connection, tables_def=None, **kwargs):
+    def __init__(self, connection, tables_def=None, retention=None, **kwargs):
         """Initialise the historian.
 
         The historian makes two connections to the data store.  Both of
@@ -116,6 +119,11 @@ class SQLHistorian(BaseHistorian):
           4. "meta_table": name of the table that stores the metadata data
           for topics
 
+        :param retention: optional parameter. dictionary configuring tiered
+        retention. Raw data older than raw_days is compacted into rollups
+        that are queried with agg_type and agg_period and is then deleted.
+        See :py:class:`volttron.platform.agent.tiered_retention.TieredRetention`
+
         :param kwargs: additional keyword arguments.
         """
         self.connection = connection
@@ -124,6 +132,9 @@ class SQLHistorian(BaseHistorian):
         self.topic_name_map = {}
         self.topic_meta = {}
         self.agg_topic_id_map = {}
+        # In memory index of topic names used to answer get_topics_by_pattern
+        # without querying the database. Kept up to date by publish_to_historian
+        self.topic_index = TopicIndex()
         # Create two instance so connection is shared within a single thread.
         # This is because sqlite only supports sharing of connection within
         # a single thread.
@@ -135,13 +146,35 @@ class SQLHistorian(BaseHistorian):
         # One utils class instance( hence one db connection) for background thread
         # this gets initialized in the bg_thread within historian_setup
         self.bg_thread_dbutils = None
+        self.retention = TieredRetention.from_config(retention)
+        if self.retention is not None:
+            TieredRetention.check_support(sqlutils.get_dbfuncts_class(self.connection['type']))
         super(SQLHistorian, self).__init__(**kwargs)
+        if self.retention and self._history_limit_days is not None and \
+                timedelta(days=self._history_limit_days) <= self.retention.raw_age:
+            _log.warning("history_limit_days deletes raw data before it is compacted into rollups. "
+                         "Set it higher than retention raw_days")
 
     def manage_db_size(self, history_limit_timestamp, storage_limit_gb):
         """
-        Optional function to manage database size.
+        Optional function to manage database size. Also runs the tiered
+        retention compaction if retention is configured.
+
+        :return: timestamp data older than which may have been removed
         """
         self.bg_thread_dbutils.manage_db_size(history_limit_timestamp, storage_limit_gb)
+        removed_before = None
+        if storage_limit_gb is not None:
+            # the oldest data is removed to stay below the storage limit
+            try:
+                removed_before = self.bg_thread_dbutils.get_oldest_data_ts()
+            except NotImplementedError:
+                pass
+        if self.retention is not None and not self._readonly:
+            compacted = self.retention.run_if_due(self.bg_thread_dbutils)
+            if compacted is not None and (removed_before is None or compacted > removed_before):
+                removed_before = compacted
+        return removed_before
 
     @doc_inherit
     def version(self):
@@ -173,6 +206,7 @@ class SQLHistorian(BaseHistorian):
                         # user lower case topic name when storing in map for case insensitive comparison
                         self.topic_name_map[lowercase_name] = topic
                         self.topic_id_map[lowercase_name] = topic_id
+                        self.topic_index.add(topic, topic_id)
                         update_topic_meta = False
                     elif db_topic_name != topic:
                         if old_meta != meta:
@@ -184,6 +218,7 @@ class SQLHistorian(BaseHistorian):
                         else:
                             self.bg_thread_dbutils.update_topic(topic, topic_id)
                         self.topic_name_map[lowercase_name] = topic
+                        self.topic_index.add(topic, topic_id)
 
                     if old_meta != meta:
                         if self.bg_thread_dbutils.topics_table != self.bg_thread_dbutils.meta_table:
@@ -239,7 +274,10 @@ class SQLHistorian(BaseHistorian):
 
     @doc_inherit
     def query_topics_by_pattern(self, topic_pattern):
-        return self.main_thread_dbutils.query_topics_by_pattern(topic_pattern)
+        # In readonly mode another historian instance writes to the database, so the in memory index could be stale.
+        if self._readonly or not self.topic_index.loaded:
+            return self.main_thread_dbutils.query_topics_by_pattern(topic_pattern)
+        return self.topic_index.match(topic_pattern)
 
     @doc_inherit
     def query_topics_metadata(self, topics):
@@ -334,6 +372,7 @@ class SQLHistorian(BaseHistorian):
         topic_id_map, topic_name_map = self.bg_thread_dbutils.get_topic_map()
         self.topic_id_map.update(topic_id_map)
         self.topic_name_map.update(topic_name_map)
+        self.topic_index.load(self.topic_id_map, self.topic_name_map)
         self.agg_topic_id_map = self.bg_thread_dbutils.get_agg_topic_map()
         topic_meta_map = self.bg_thread_dbutils.get_topic_meta_map()
         self.topic_meta.update(topic_meta_map)
@@ -35,6 +35,7 @@ from collections import OrderedDict
 from volttron.platform.agent import utils
 from volttron.platform.agent.base_tagging import BaseTaggingService
 from volttron.platform.dbutils.sqlitefuncts import SqlLiteFuncts
+from volttron.platform.dbutils.tagindex import TagIndex
 from volttron.utils.docs import doc_inherit
 
 from volttron.platform.messaging.health import (STATUS_BAD,
@@ -85,12 +86,16 @@ def tagging_service(config_path, **kwargs):
 class SQLiteTaggingService(BaseTaggingService):
     """This is a tagging service agent that writes data to a SQLite database.
     """
-    def __init__(self, connection, table_prefix=None, **kwargs):
+    def __init__(self, connection, table_prefix=None, use_tag_index=True,
+                 **kwargs):
         """Initialise the tagging service.
 
         :param connection: dictionary object containing the database
         connection details
         :param table_prefix: optional prefix to be used for all tag tables
+        :param use_tag_index: answer get_topics_by_tags from an in-memory
+                              index of the topic tags instead of querying
+                              the database
         :param kwargs: additional keyword arguments. (optional identity and
                        topic_replace_list used by parent classes)
         """
@@ -111,6 +116,7 @@ class SQLiteTaggingService(BaseTaggingService):
             self.category_tags_table = table_prefix + "_" + \
                                        self.category_tags_table
         self.sqlite_utils = SqlLiteFuncts(self.connection['params'], None)
+        self.tag_index = TagIndex() if use_tag_index else None
 
     @doc_inherit
     def setup(self):
@@ -174,6 +180,12 @@ class SQLiteTaggingService(BaseTaggingService):
             err_message = "Initialization of " + table_name + \
                           " table failed with exception: {}" \
                           "Stopping tagging service agent. ".format(str(e))
+        if not err_message and self.tag_index is not None:
+            try:
+                self._load_tag_index()
+            except Exception as e:
+                err_message = "Loading of tag index failed with exception: " \
+                              "{}. Stopping tagging service agent".format(e)
         if err_message:
             _log.error(err_message)
             self.vip.health.set_status(STATUS_BAD,
@@ -183,6 +195,17 @@ class SQLiteTaggingService(BaseTaggingService):
             self.vip.health.send_alert(TAGGING_SERVICE_SETUP_FAILED, status)
             self.core.stop()
 
+    def _load_tag_index(self):
+        cursor = self.sqlite_utils.select(
+            "SELECT topic_prefix, tag, value FROM " + self.topic_tags_table,
+            fetch_all=False)
+        try:
+            self.tag_index.load(cursor)
+        finally:
+            cursor.close()
+        _log.info("Loaded tags of {} topic prefixes into tag "
+                  "index".format(len(self.tag_index)))
+
     @doc_inherit
     def load_valid_tags(self):
         # Now cache list of tags and kind/type for validation during insert
@@ -519,15 +542,24 @@ class SQLiteTaggingService(BaseTaggingService):
                 result['info'].pop(topic_pattern)
 
         if to_db:
-            self.sqlite_utils.execute_many(
-                "REPLACE INTO {} (topic_prefix, tag, value) "
-                    "VALUES (?, ?, ?);".format(self.topic_tags_table),
-                to_db)
-            self.sqlite_utils.commit()
+            self.insert_topic_tags_batch(to_db)
         return result
 
+    @doc_inherit
+    def insert_topic_tags_batch(self, rows):
+        self.sqlite_utils.execute_many(
+            "REPLACE INTO {} (topic_prefix, tag, value) "
+                "VALUES (?, ?, ?);".format(self.topic_tags_table),
+            rows)
+        self.sqlite_utils.commit()
+        if self.tag_index is not None:
+            self.tag_index.update(rows)
+
     @doc_inherit
     def query_topics_by_tags(self, ast, skip=0, count=None, order=None):
+        if self.tag_index is not None:
+            return self.tag_index.query(ast, self.tag_refs, skip=skip,
+                                        count=count, order=order)
 
         query = self.sqlite_utils.get_tagging_query_from_ast(
             self.topic_tags_table, ast, self.tag_refs)
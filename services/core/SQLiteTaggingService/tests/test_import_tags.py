@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*- {{{
+# ===----------------------------------------------------------------------===
+#
+#                 Component of Eclipse VOLTTRON
+#
+# ===----------------------------------------------------------------------===
+#
+# Copyright 2023 Battelle Memorial Institute
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not
+# use this file except in compliance with the License. You may obtain a copy
+# of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+#
+# ===----------------------------------------------------------------------===
+# }}}
+
+import json
+
+import pytest
+from mock import MagicMock
+
+from sqlite.tagging import SQLiteTaggingService
+from volttron.platform.agent.base_tagging import BaseTaggingService
+from volttron.platform.vip.agent import Agent
+from volttrontesting.utils.utils import AgentMock
+
+TOPICS = ["campus1/ahu1/SAT", "campus1/ahu1/fan1", "campus1/ahu1/fan2", "campus1/ahu2/SAT"]
+
+
+@pytest.fixture()
+def tagging_service(tmp_path):
+    bases = BaseTaggingService.__bases__
+    BaseTaggingService.__bases__ = (AgentMock.imitate(Agent, Agent()),)
+    import_dir = tmp_path / "import"
+    import_dir.mkdir()
+    service = SQLiteTaggingService({"params": {"database": str(tmp_path / "tags.sqlite")}},
+                                   tag_import_dir=str(import_dir))
+    service.vip = MagicMock()
+    service.vip.rpc.call.return_value.get.return_value = TOPICS
+    service.setup()
+    service.load_valid_tags()
+    service.load_tag_refs()
+    yield service
+    BaseTaggingService.__bases__ = bases
+
+
+def get_tags(service, topic_prefix):
+    return dict(service.query_tags_by_topic(topic_prefix, skip=0, count=None, order="FIRST_TO_LAST"))
+
+
+@pytest.mark.tagging
+def test_import_csv_tags(tagging_service, tmp_path):
+    (tmp_path / "import" / "tags.csv").write_text("topic,tag,value\n"
+                                                  "campus1/ahu1,equip,\n"
+                                                  "campus1/ahu1,dis,AHU 1\n"
+                                                  "campus1/ahu1/fan*,point,\n"
+                                                  "campus1/ahu1,ahu,\n"
+                                                  "campus1/ahu1/SAT,maxVal,120\n"
+                                                  "campus1/ahu1/SAT,invalidTag,1\n"
+                                                  "campus2/ahu1,equip,\n")
+
+    result = tagging_service.import_tags("tags.csv", batch_size=4)
+
+    # csv rows of a topic in the same batch are merged into one record
+    assert result["records"] == 4
+    assert result["topics"] == 3
+    assert result["error_count"] == 2
+    assert set(result["error"]) == {"campus1/ahu1/SAT", "campus2/ahu1"}
+    assert get_tags(tagging_service, "campus1/ahu1") == {"ahu": 1, "dis": "AHU 1", "equip": 1,
+                                                         "id": "campus1/ahu1"}
+    assert get_tags(tagging_service, "campus1/ahu1/fan2") == {"id": "campus1/ahu1/fan2", "point": 1}
+    assert get_tags(tagging_service, "campus1/ahu1/SAT") == {}
+    assert tagging_service.get_topics_by_tags(and_condition=["point"]) == ["campus1/ahu1/fan1",
+                                                                           "campus1/ahu1/fan2"]
+
+
+@pytest.mark.tagging
+def test_import_haystack_tags(tagging_service, tmp_path):
+    grid = {"meta": {"ver": "3.0"},
+            "cols": [{"name": "id"}, {"name": "maxVal"}],
+            "rows": [{"id": "r:campus1/ahu2 AHU 2", "equip": "m:", "dis": "s:AHU 2"},
+                     {"id": {"_kind": "ref", "val": "campus1/ahu2/SAT"}, "point": {"_kind": "marker"},
+                      "maxVal": {"_kind": "number", "val": 120, "unit": "°F"}, "minVal": "n:-5.5 °F"}]}
+    (tmp_path / "import" / "site.json").write_text(json.dumps(grid))
+
+    result = tagging_service.import_tags("site.json")
+
+    assert result["records"] == 2
+    assert result["error_count"] == 0
+    assert get_tags(tagging_service, "campus1/ahu2") == {"dis": "AHU 2", "equip": 1, "id": "campus1/ahu2"}
+    assert get_tags(tagging_service, "campus1/ahu2/SAT") == {"id": "campus1/ahu2/SAT", "maxVal": 120,
+                                                             "minVal": -5.5, "point": 1}
+
+
+@pytest.mark.tagging
+@pytest.mark.parametrize("file_name", ["../tags.csv", "/etc/passwd", "link.csv"])
+def test_import_should_refuse_files_outside_of_import_dir(tagging_service, tmp_path, file_name):
+    (tmp_path / "tags.csv").write_text("topic,tag,value\ncampus1/ahu1,equip,\n")
+    (tmp_path / "import" / "link.csv").symlink_to(tmp_path / "tags.csv")
+
+    with pytest.raises(ValueError, match="tag import directory"):
+        tagging_service.import_tags(file_name)
+    assert get_tags(tagging_service, "campus1/ahu1") == {}
@@ -0,0 +1,242 @@
+# -*- coding: utf-8 -*- {{{
+# ===----------------------------------------------------------------------===
+#
+#                 Component of Eclipse VOLTTRON
+#
+# ===----------------------------------------------------------------------===
+#
+# Copyright 2023 Battelle Memorial Institute
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not
+# use this file except in compliance with the License. You may obtain a copy
+# of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+#
+# ===----------------------------------------------------------------------===
+# }}}
+
+"""
+Historical backfill of aggregate data.
+
+A backfill splits the time slices of an aggregation period between a start
+and an end time into chunks of consecutive slices. :py:class:`BackfillJob`
+runs the chunks on a bounded pool of worker threads so that the agent's
+greenlets, including the live aggregation schedule, keep running while
+years of history are aggregated. Completed chunks are recorded per aggregate
+topic in a :py:class:`BackfillProgress` table so that an interrupted or
+repeated backfill skips the work already done.
+"""
+
+import logging
+import sqlite3
+import threading
+import time
+import uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from volttron.platform.agent.utils import format_timestamp
+
+_log = logging.getLogger(__name__)
+
+RUNNING = 'RUNNING'
+COMPLETED = 'COMPLETED'
+FAILED = 'FAILED'
+CANCELLED = 'CANCELLED'
+SKIPPED = 'SKIPPED'
+
+
+def chunk_time_slices(time_slices, chunk_size):
+    """
+    Group consecutive time slices into chunks
+    :param time_slices: list of (start, end) tuples ordered by time
+    :param chunk_size: maximum number of time slices in a chunk
+    :return: list of lists of time slices
+    """
+    chunk_size = max(1, int(chunk_size))
+    return [time_slices[i:i + chunk_size] for i in range(0, len(time_slices), chunk_size)]
+
+
+class BackfillProgress:
+    """
+    Table of the chunks completed for each aggregate topic, stored in a local
+    SQLite database shared by the worker threads of all backfill jobs.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.execute('''CREATE TABLE IF NOT EXISTS backfill_progress
+                                    (agg_topic_id INTEGER NOT NULL,
+                                     chunk_start TEXT NOT NULL,
+                                     chunk_end TEXT NOT NULL,
+                                     completed_at TEXT NOT NULL,
+                                     PRIMARY KEY (agg_topic_id, chunk_start, chunk_end))''')
+        self._connection.commit()
+
+    def is_completed(self, agg_topic_id, start, end):
+        """
+        :return: True if a completed chunk of the aggregate topic covers the
+                 time range between start and end
+        """
+        with self._lock:
+            cursor = self._connection.execute('''SELECT 1 FROM backfill_progress
+                                                 WHERE agg_topic_id = ? AND chunk_start <= ? AND chunk_end >= ?
+                                                 LIMIT 1''',
+                                              (agg_topic_id, format_timestamp(start), format_timestamp(end)))
+            return cursor.fetchone() is not None
+
+    def mark_completed(self, agg_topic_ids, start, end, completed_at):
+        """
+        Record that the aggregates of the given aggregate topics were written
+        for the chunk between start and end
+        """
+        rows = [(agg_topic_id, format_timestamp(start), format_timestamp(end), format_timestamp(completed_at))
+                for agg_topic_id in agg_topic_ids]
+        with self._lock:
+            self._connection.executemany('''INSERT OR REPLACE INTO backfill_progress
+                                            VALUES (?, ?, ?, ?)''', rows)
+            self._connection.commit()
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
+
+
+class BackfillJob:
+    """
+    Runs the chunks of a backfill on a bounded worker pool and keeps track of
+    its progress. Counters are updated by the worker threads and read by the
+    agent's greenlets, so they are guarded by a lock.
+
+    :param chunks: list of work items passed to run_chunk
+    :param run_chunk: callable run in a worker thread for every chunk. It
+                      returns False if the chunk was skipped because it was
+                      already completed
+    :param max_workers: maximum number of chunks run concurrently
+    :param close_worker: callable run in every worker thread once the thread
+                         has no chunks left, e.g. to close the connection the
+                         thread opened
+    """
+
+    def __init__(self, chunks, run_chunk, max_workers, job_id=None, close_worker=None):
+        self.job_id = job_id or uuid.uuid4().hex[:8]
+        self.chunks = chunks
+        self.max_workers = max(1, int(max_workers))
+        self.state = RUNNING
+        self.completed = 0
+        self.skipped = 0
+        self.failed = 0
+        self.errors = []
+        self._run_chunk = run_chunk
+        self._close_worker = close_worker
+        self._queue = deque(chunks)
+        self._workers = 0
+        self._lock = threading.Lock()
+        self._done = threading.Event()
+        self._cancelled = False
+        self._pending = len(chunks)
+        self._executor = None
+        self._started = None
+        self._finished = None
+
+    def start(self):
+        self._started = time.time()
+        if not self.chunks:
+            self._finish()
+            return
+        # every worker thread runs chunks until none are left, so it can clean up before it exits
+        self._workers = min(self.max_workers, len(self.chunks))
+        self._executor = ThreadPoolExecutor(max_workers=self._workers,
+                                            thread_name_prefix='backfill-{}'.format(self.job_id))
+        for _ in range(self._workers):
+            self._executor.submit(self._work)
+        self._executor.shutdown(wait=False)
+
+    def cancel(self):
+        """
+        Stop the job after the chunks that are currently running
+        """
+        self._cancelled = True
+
+    def wait(self, timeout=None):
+        return self._done.wait(timeout)
+
+    def _work(self):
+        try:
+            while True:
+                try:
+                    chunk = self._queue.popleft()
+                except IndexError:
+                    break
+                self._run(chunk)
+        finally:
+            if self._close_worker is not None:
+                try:
+                    self._close_worker()
+                except Exception:
+                    _log.exception("Backfill {} failed to clean up worker".format(self.job_id))
+            with self._lock:
+                self._workers -= 1
+                if self._workers == 0:
+                    self._finish()
+
+    def _run(self, chunk):
+        result = None
+        error = None
+        if not self._cancelled:
+            try:
+                result = COMPLETED if self._run_chunk(chunk) is not False else SKIPPED
+            except Exception as e:
+                _log.exception("Backfill {} failed to aggregate chunk".format(self.job_id))
+                result, error = FAILED, str(e)
+        with self._lock:
+            if result == COMPLETED:
+                self.completed += 1
+            elif result == FAILED:
+                self.failed += 1
+                self.errors = (self.errors + [error])[-10:]
+            elif result == SKIPPED:
+                self.skipped += 1
+            self._pending -= 1
+            finished = len(self.chunks) - self._pending
+            if result is not None and finished % max(1, len(self.chunks) // 10) == 0:
+                _log.info("Backfill {} processed {} of {} chunks".format(self.job_id, finished, len(self.chunks)))
+
+    def _finish(self):
+        self._finished = time.time()
+        if self._cancelled:
+            self.state = CANCELLED
+        elif self.failed:
+            self.state = FAILED
+        else:
+            self.state = COMPLETED
+        _log.info("Backfill {} {}: {} chunks completed, {} skipped, {} failed".format(
+            self.job_id, self.state.lower(), self.completed, self.skipped, self.failed))
+        self._done.set()
+
+    def get_status(self):
+        """
+        :return: dictionary describing the progress of the job
+        """
+        with self._lock:
+            total = len(self.chunks)
+            finished = self.completed + self.skipped + self.failed
+            end = self._finished or time.time()
+            return {'job_id': self.job_id,
+                    'state': self.state,
+                    'total_chunks': total,
+                    'completed_chunks': self.completed,
+                    'skipped_chunks': self.skipped,
+                    'failed_chunks': self.failed,
+                    'percent_complete': round(100.0 * finished / total, 1) if total else 100.0,
+                    'elapsed_seconds': round(end - self._started, 1) if self._started else 0.0,
+                    'errors': list(self.errors)}
@@ -26,14 +26,23 @@
 
 import copy
 import logging
+import os
+import threading
 from datetime import datetime, timedelta
+from functools import partial
 
 import pytz
 from abc import abstractmethod
 
 from volttron.platform.agent import utils
+from volttron.platform.agent.aggregate_backfill import BackfillJob, BackfillProgress, RUNNING, chunk_time_slices
+from volttron.platform.agent.device_schema import DeviceSchemaCache, is_compact_publish
 from volttron.platform.agent.known_identities import (PLATFORM_HISTORIAN)
-from volttron.platform.vip.agent import Agent
+from volttron.platform.agent.streaming_aggregate import (STREAMING_AGGREGATIONS, Accumulator,
+                                                         StreamingAggregator, period_to_timedelta)
+from volttron.platform.messaging import topics, headers as headers_mod
+from volttron.platform.scheduling import periodic
+from volttron.platform.vip.agent import Agent, Core
 from volttron.platform.vip.agent.subsystems import RPC
 
 _log = logging.getLogger(__name__)
@@ -54,7 +63,17 @@ class AggregateHistorian(Agent):
     - :py:meth:`insert_aggregate() <AggregateHistorian.insert_aggregate>`
     - :py:meth:`get_aggregation_list() <AggregateHistorian.get_aggregation_list>`
 
+    Subclasses can implement
+    :py:meth:`collect_topic_aggregates() <AggregateHistorian.collect_topic_aggregates>`
+    and :py:meth:`insert_aggregates() <AggregateHistorian.insert_aggregates>`
+    to collect the avg, sum, min, max and count aggregates of all points with
+    a single query and insert them together, and
+    :py:meth:`open_backfill_connection() <AggregateHistorian.open_backfill_connection>`
+    to run historical backfills on parallel worker threads.
+
     """
+    # maximum number of topic ids in a single grouped aggregate query
+    GROUPED_QUERY_MAX_TOPICS = 500
 
     def __init__(self, config_path, **kwargs):
         """
@@ -69,6 +88,16 @@ class AggregateHistorian(Agent):
         config = utils.load_config(config_path)
         self.topic_id_map = None
         self.aggregate_topic_id_map = None
+        self._streaming = None
+        self._device_schemas = DeviceSchemaCache()
+        self._checkpoint_event = None
+        self._grouped_collection = True
+        self._aggregation_groups = []
+        self._backfill_max_workers = 4
+        self._backfill_chunk_size = 100
+        self._backfill_jobs = {}
+        self._backfill_progress = None
+        self._backfill_local = threading.local()
 
         self.vip.config.set_default("config", config)
         self.vip.config.subscribe(self.configure, actions=["NEW", "UPDATE"],
@@ -106,6 +135,12 @@ class AggregateHistorian(Agent):
         _log.debug("In start of aggregate historian. "
                    "After loading topic and aggregate topic maps")
 
+        self._configure_streaming(bool(config.get('streaming_aggregation', False)),
+                                  float(config.get('streaming_checkpoint_interval', 60)))
+        self._backfill_max_workers = int(config.get('backfill_max_workers', 4))
+        self._backfill_chunk_size = int(config.get('backfill_chunk_size', 100))
+        self._aggregation_groups = []
+
         if not config.get("aggregations"):
             _log.debug("End of onstart method - current time{}".format(
                 datetime.utcnow()))
@@ -133,6 +168,11 @@ class AggregateHistorian(Agent):
             else:
                 utc_collection_start_time = datetime.utcnow().replace(
                     tzinfo=pytz.utc)
+            if self._streaming is not None:
+                self._register_streaming_points(agg_group['points'], agg_time_period, utc_collection_start_time,
+                                                use_calendar_periods)
+            self._aggregation_groups.append((agg_time_period, use_calendar_periods, agg_group['points'],
+                                             utc_collection_start_time))
             self.collect_aggregate_data(
                 utc_collection_start_time,
                 agg_time_period,
@@ -141,6 +181,298 @@ class AggregateHistorian(Agent):
         _log.debug("End of onstart method - current time{}".format(
             datetime.utcnow()))
 
+    def _configure_streaming(self, streaming, checkpoint_interval):
+        """
+        Start or stop computing aggregates from device data published on the message bus.
+
+        :param streaming: True to compute aggregates of points that support it from device publishes
+        :param checkpoint_interval: interval in seconds at which the streaming state is saved to disk
+        """
+        if self._checkpoint_event is not None:
+            self._checkpoint_event.cancel()
+            self._checkpoint_event = None
+
+        if not streaming:
+            if self._streaming is not None:
+                self._streaming.checkpoint()
+                self.vip.pubsub.unsubscribe(peer='pubsub', prefix=topics.DRIVER_TOPIC_BASE,
+                                            callback=self._capture_streaming_data)
+                self._streaming = None
+            return
+
+        if self._streaming is None:
+            self._streaming = StreamingAggregator(self._get_checkpoint_path())
+            self._streaming.restore()
+            self.vip.pubsub.subscribe(peer='pubsub', prefix=topics.DRIVER_TOPIC_BASE,
+                                      callback=self._capture_streaming_data)
+        self._streaming.reset_registrations()
+        if checkpoint_interval > 0:
+            self._checkpoint_event = self.core.schedule(
+                periodic(checkpoint_interval, start=timedelta(seconds=checkpoint_interval)),
+                self._checkpoint_streaming)
+
+    @staticmethod
+    def _get_checkpoint_path():
+        return AggregateHistorian._get_agent_data_path('streaming_aggregate_state.json')
+
+    def _register_streaming_points(self, points, agg_time_period, collection_time, use_calendar_periods):
+        """
+        Register the points of an aggregation group that can be computed incrementally. Points configured
+        with a topic_name_pattern, aggregation types that cannot be merged and monthly periods are always
+        collected by querying the historian.
+        """
+        if period_to_timedelta(agg_time_period) is None:
+            return
+        first_end = AggregateHistorian.compute_aggregation_time_slice(
+            collection_time, agg_time_period, use_calendar_periods)[1]
+        for data in points:
+            agg_type = data['aggregation_type'].lower()
+            if data.get('topic_name_pattern') or agg_type not in STREAMING_AGGREGATIONS:
+                data['streaming'] = False
+                continue
+            aggregate_topic_id = self.agg_topic_id_map[(data['aggregation_topic_name'].lower(), agg_type,
+                                                        agg_time_period)]
+            self._streaming.register(aggregate_topic_id, data['topic_ids'], agg_type, agg_time_period, first_end)
+            data['streaming'] = True
+
+    def _capture_streaming_data(self, peer, sender, bus, topic, headers, message):
+        """
+        Add the values of device all publishes to the running aggregates.
+        Compact publishes are expanded with the schemas of the devices.
+        """
+        self._device_schemas.receive(self.vip, topic, headers, message, self._add_streaming_data)
+
+    def _add_streaming_data(self, topic, headers, message):
+        if self._streaming is None or not topic.endswith('/all'):
+            return
+        if is_compact_publish(topic, headers):
+            message = self._device_schemas.expand(headers, message)
+            if message is None:
+                return
+        device = topic[len(topics.DRIVER_TOPIC_BASE) + 1:-len('/all')]
+        timestamp_string = headers.get(headers_mod.TIMESTAMP, headers.get(headers_mod.DATE))
+        if timestamp_string is None:
+            timestamp = utils.get_aware_utc_now()
+        else:
+            result = utils.process_timestamp(timestamp_string, topic)
+            if result is None:
+                return
+            timestamp = result[0]
+        values = message[0] if isinstance(message, list) else message
+        if not isinstance(values, dict):
+            return
+        for point, value in values.items():
+            topic_id = self.topic_id_map.get((device + '/' + point).lower())
+            if topic_id is not None:
+                self._streaming.add(topic_id, timestamp, value)
+
+    def _checkpoint_streaming(self):
+        if self._streaming is None:
+            return
+        try:
+            self._streaming.checkpoint()
+        except Exception:
+            _log.exception("Unable to save streaming aggregation state")
+
+    @Core.receiver("onstop")
+    def _stop_streaming(self, sender, **kwargs):
+        self._checkpoint_streaming()
+
+    def _collect_late_aggregates(self, aggregate_topic_id, data, agg_time_period, topic_ids):
+        """
+        Re-query the historian for streamed buckets that received data after they were written
+        """
+        period = period_to_timedelta(agg_time_period)
+        for end_time in self._streaming.pop_dirty(aggregate_topic_id):
+            start_time = end_time - period
+            agg_value, count = self.collect_aggregate(topic_ids, data['aggregation_type'], start_time, end_time)
+            if count and count >= data.get('min_count', 0):
+                _log.debug("Updating aggregate {} between {} and {} with late data".format(
+                    data['aggregation_topic_name'], start_time, end_time))
+                self.insert_aggregate(aggregate_topic_id, data['aggregation_type'], agg_time_period, end_time,
+                                      agg_value, topic_ids)
+
+    @RPC.export
+    def backfill(self, start, end=None, aggregation_period=None, max_workers=None, chunk_size=None):
+        """
+        Compute the aggregates of the configured points for past time periods. The time range is split into
+        chunks of consecutive aggregation periods that are run on a bounded pool of worker threads, so the
+        live aggregation schedule is not blocked. Chunks that were completed by an earlier backfill are
+        skipped. Returns immediately, use
+        :py:meth:`get_backfill_status() <AggregateHistorian.get_backfill_status>` to follow the progress.
+
+        :param start: start of the time range to backfill as an ISO 8601 timestamp string
+        :param end: end of the time range to backfill as an ISO 8601 timestamp string. Defaults to the start
+                    of the first time period collected by the live schedule of each aggregation period
+        :param aggregation_period: only backfill this aggregation period. Defaults to all configured periods
+        :param max_workers: number of chunks computed in parallel. Defaults to the backfill_max_workers
+                            configuration
+        :param chunk_size: number of aggregation periods in a chunk. Defaults to the backfill_chunk_size
+                           configuration
+        :return: status of the new backfill job
+        """
+        start = self._parse_backfill_time(start)
+        end = self._parse_backfill_time(end) if end else None
+        if aggregation_period:
+            aggregation_period = AggregateHistorian.normalize_aggregation_time_period(aggregation_period)
+        chunk_size = int(chunk_size or self._backfill_chunk_size)
+
+        chunks = []
+        for agg_time_period, use_calendar_periods, points, collection_time in self._aggregation_groups:
+            if aggregation_period and aggregation_period != agg_time_period:
+                continue
+            if end is None:
+                group_end = AggregateHistorian.compute_aggregation_time_slice(
+                    collection_time, agg_time_period, use_calendar_periods)[0]
+            else:
+                group_end = end
+            backfill_points = self._get_backfill_points(points, agg_time_period)
+            time_slices = AggregateHistorian.compute_time_slices(start, group_end, agg_time_period,
+                                                                 use_calendar_periods)
+            for chunk in chunk_time_slices(time_slices, chunk_size):
+                chunks.append((agg_time_period, backfill_points, chunk))
+        if not chunks and aggregation_period:
+            raise ValueError("No aggregation configured for aggregation_period {}".format(aggregation_period))
+
+        max_workers = int(max_workers or self._backfill_max_workers)
+        if max_workers > 1 and type(self).open_backfill_connection is AggregateHistorian.open_backfill_connection:
+            _log.info("Backfill workers share the connection of the historian. Running the backfill on a single "
+                      "worker thread")
+            max_workers = 1
+
+        if self._backfill_progress is None:
+            self._backfill_progress = BackfillProgress(self._get_agent_data_path('aggregate_backfill.sqlite'))
+        # state of the job shared by its worker threads
+        job_state = {'grouped': self._grouped_collection}
+        job = BackfillJob(chunks, partial(self._run_backfill_chunk, job_state), max_workers,
+                          close_worker=self._close_backfill_connection)
+        self._backfill_jobs[job.job_id] = job
+        _log.info("Starting backfill {} of {} chunks between {} and {}".format(job.job_id, len(chunks), start,
+                                                                               end))
+        job.start()
+        return job.get_status()
+
+    @RPC.export
+    def get_backfill_status(self, job_id=None):
+        """
+        :param job_id: id of a backfill job. Defaults to all jobs started since the agent started
+        :return: status of the job, or a dictionary of job id to status
+        """
+        if job_id is not None:
+            if job_id not in self._backfill_jobs:
+                raise ValueError("Unknown backfill job {}".format(job_id))
+            return self._backfill_jobs[job_id].get_status()
+        return {job_id: job.get_status() for job_id, job in self._backfill_jobs.items()}
+
+    @RPC.export
+    def cancel_backfill(self, job_id):
+        """
+        Stop a backfill job once the chunks that are currently being computed are done. Completed chunks
+        are skipped when the backfill is started again.
+
+        :param job_id: id of a backfill job
+        :return: status of the job
+        """
+        if job_id not in self._backfill_jobs:
+            raise ValueError("Unknown backfill job {}".format(job_id))
+        self._backfill_jobs[job_id].cancel()
+        return self._backfill_jobs[job_id].get_status()
+
+    @Core.receiver("onstop")
+    def _stop_backfill(self, sender, **kwargs):
+        for job in self._backfill_jobs.values():
+            if job.state == RUNNING:
+                job.cancel()
+
+    @staticmethod
+    def _parse_backfill_time(timestamp):
+        if isinstance(timestamp, datetime):
+            value = timestamp
+        else:
+            value = utils.parse_timestamp_string(timestamp)
+        if value.tzinfo is None:
+            return value.replace(tzinfo=pytz.utc)
+        return value.astimezone(pytz.utc)
+
+    def _get_backfill_points(self, points, agg_time_period):
+        """
+        Resolve the aggregate topic id and topic ids of the points of an aggregation group. Topic name
+        patterns are resolved once, before the chunks are handed to the worker threads.
+
+        :return: list of (point configuration, aggregate topic id, topic ids) tuples
+        """
+        backfill_points = []
+        for data in points:
+            aggregate_topic_id = self.agg_topic_id_map.get((data['aggregation_topic_name'].lower(),
+                                                            data['aggregation_type'].lower(),
+                                                            agg_time_period))
+            if not aggregate_topic_id:
+                continue
+            topic_ids = data.get('topic_ids')
+            if data.get('topic_name_pattern'):
+                topic_map = self.vip.rpc.call(PLATFORM_HISTORIAN, "get_topics_by_pattern",
+                                              topic_pattern=data['topic_name_pattern']).get()
+                if not topic_map:
+                    _log.warning("Skipping backfill of {} as no topics match the topic_name_pattern".format(
+                        data['aggregation_topic_name']))
+                    continue
+                topic_ids = list(topic_map.values())
+            backfill_points.append((data, aggregate_topic_id, topic_ids))
+        return backfill_points
+
+    def _run_backfill_chunk(self, job_state, chunk):
+        """
+        Compute and insert the aggregates of one backfill chunk. Runs in a backfill worker thread with a
+        connection of its own.
+
+        :param job_state: dictionary with the 'grouped' flag of the job, cleared when the backfill connection
+                          does not support grouped queries
+        :param chunk: tuple of (aggregation period, list of points, list of time slices)
+        :return: False if the chunk was already completed for all points
+        """
+        agg_time_period, points, time_slices = chunk
+        chunk_start, chunk_end = time_slices[0][0], time_slices[-1][1]
+        points = [p for p in points if not self._backfill_progress.is_completed(p[1], chunk_start, chunk_end)]
+        if not points:
+            return False
+        connection = getattr(self._backfill_local, 'connection', None)
+        if connection is None:
+            connection = self._backfill_local.connection = self.open_backfill_connection()
+        records = []
+        for start_time, end_time in time_slices:
+            try:
+                records.extend(self._compute_aggregate_records(connection, points, agg_time_period, start_time,
+                                                               end_time, job_state['grouped'], quiet=True))
+            except NotImplementedError:
+                job_state['grouped'] = False
+                records.extend(self._compute_aggregate_records(connection, points, agg_time_period, start_time,
+                                                               end_time, False, quiet=True))
+        if records:
+            connection.insert_aggregates(records)
+        self._backfill_progress.mark_completed([p[1] for p in points], chunk_start, chunk_end,
+                                               utils.get_aware_utc_now())
+        return True
+
+    def _close_backfill_connection(self):
+        """
+        Close the connection opened by the current backfill worker thread
+        """
+        connection = getattr(self._backfill_local, 'connection', None)
+        if connection is None:
+            return
+        del self._backfill_local.connection
+        # the default backfill connection is the historian itself
+        if connection is not self:
+            connection.close()
+
+    @staticmethod
+    def _get_agent_data_path(file_name):
+        # agents only have write access to their agent-data directory in agent isolation mode
+        agent_data_dir = os.path.join(os.getcwd(), os.path.basename(os.getcwd()) + ".agent-data")
+        if os.path.exists(agent_data_dir):
+            return os.path.join(agent_data_dir, file_name)
+        return os.path.join(os.getcwd(), file_name)
+
     @staticmethod
     def parse_table_def(tables_def):
         default_table_def = {"table_prefix": "",
@@ -332,6 +664,7 @@ class AggregateHistorian(Agent):
                 "After  compute agg_time_period = {} start_time {} end_time "
                 "{} ".format(agg_time_period, start_time, end_time))
             schedule_next = True
+            grouped_points = []
             for data in points:
                 _log.debug("data in loop {}".format(data))
                 topic_ids = data.get('topic_ids', None)
@@ -370,27 +703,27 @@ class AggregateHistorian(Agent):
                                         topic=topic_pattern,
                                         start_time=start_time,
                                         end_time=end_time))
-                        return
-
-                agg_value, count = self.collect_aggregate(
-                    topic_ids,
-                    data['aggregation_type'],
-                    start_time,
-                    end_time)
-                if count == 0:
-                    _log.warning("No records found for topic {topic} between {start_time} and {end_time}".format(
-                        topic=topic_pattern if topic_pattern else
-                        data['topic_names'],
-                        start_time=start_time,
-                        end_time=end_time))
-                elif count < data.get('min_count', 0):
-                    _log.warning("Skipping recording of aggregate data for {topic} between {start_time} and {end_time}"
-                                 " as number of records is less than minimum allowed({count})".format(
-                                    topic=topic_pattern if topic_pattern else data['topic_names'],
-                                    start_time=start_time,
-                                    end_time=end_time,
-                                    count=data.get('min_count', 0)))
+                        continue
+
+                if data.get('streaming') and self._streaming is not None \
+                        and aggregate_topic_id in self._streaming:
+                    self._collect_late_aggregates(aggregate_topic_id, data, agg_time_period, topic_ids)
+                    agg_value, count = self._streaming.close(
+                        aggregate_topic_id,
+                        start_time,
+                        end_time,
+                        self.collect_aggregate)
+                elif self._grouped_collection and data['aggregation_type'].lower() in STREAMING_AGGREGATIONS:
+                    # collected together with the other points after the loop
+                    grouped_points.append((data, aggregate_topic_id, topic_ids))
+                    continue
                 else:
+                    agg_value, count = self.collect_aggregate(
+                        topic_ids,
+                        data['aggregation_type'],
+                        start_time,
+                        end_time)
+                if self._should_record_aggregate(data, count, start_time, end_time):
                     _log.debug("data is {} aggg_time_period is {}".format(data, agg_time_period))
                     _log.debug(" topic id map {}".format(self.agg_topic_id_map))
                     self.insert_aggregate(aggregate_topic_id,
@@ -400,6 +733,9 @@ class AggregateHistorian(Agent):
                                           agg_value,
                                           topic_ids)
 
+            if grouped_points and schedule_next:
+                self._collect_grouped_aggregates(grouped_points, agg_time_period, start_time, end_time)
+
         finally:
             if schedule_next:
                 collection_time = AggregateHistorian.compute_next_collection_time(
@@ -414,6 +750,94 @@ class AggregateHistorian(Agent):
                                            points)
                 _log.debug("After Scheduling next collection.{}".format(event))
 
+    @staticmethod
+    def _should_record_aggregate(data, count, start_time, end_time):
+        topic = data.get('topic_name_pattern') or data['topic_names']
+        if count == 0:
+            _log.warning("No records found for topic {topic} between {start_time} and {end_time}".format(
+                topic=topic,
+                start_time=start_time,
+                end_time=end_time))
+            return False
+        elif count < data.get('min_count', 0):
+            _log.warning("Skipping recording of aggregate data for {topic} between {start_time} and {end_time}"
+                         " as number of records is less than minimum allowed({count})".format(
+                            topic=topic,
+                            start_time=start_time,
+                            end_time=end_time,
+                            count=data.get('min_count', 0)))
+            return False
+        return True
+
+    def _collect_grouped_aggregates(self, grouped_points, agg_time_period, start_time, end_time):
+        """
+        Compute the aggregates of several points from the count, sum, minimum and maximum of each topic
+        returned by a grouped query and insert them together.
+
+        :param grouped_points: list of (point configuration, aggregate topic id, topic ids) tuples
+        """
+        try:
+            records = self._compute_aggregate_records(self, grouped_points, agg_time_period, start_time, end_time)
+        except NotImplementedError:
+            _log.info("Grouped aggregate collection is not supported. Collecting aggregates point by point")
+            self._grouped_collection = False
+            records = self._compute_aggregate_records(self, grouped_points, agg_time_period, start_time, end_time,
+                                                      False)
+        if records:
+            self.insert_aggregates(records)
+
+    def _compute_aggregate_records(self, source, points, agg_time_period, start_time, end_time, grouped=True,
+                                   quiet=False):
+        """
+        Compute the aggregates of several points for one time slice. Points whose aggregation type can be
+        combined from the count, sum, minimum and maximum of each topic are computed from a grouped query.
+        Other points, historians that do not support grouped queries and failed grouped queries are
+        queried point by point.
+
+        :param source: object providing collect_aggregate and collect_topic_aggregates. This is the agent
+                       itself or a connection returned by
+                       :py:meth:`open_backfill_connection() <AggregateHistorian.open_backfill_connection>`
+        :param points: list of (point configuration, aggregate topic id, topic ids) tuples
+        :param grouped: use grouped queries
+        :param quiet: skip aggregates without enough records without logging a warning
+        :return: list of records for :py:meth:`insert_aggregates() <AggregateHistorian.insert_aggregates>`
+        :raises NotImplementedError: if the source does not support grouped queries
+        """
+        topic_ids = sorted({topic_id for data, _, ids in points
+                            if data['aggregation_type'].lower() in STREAMING_AGGREGATIONS for topic_id in ids})
+        topic_aggregates = None
+        if topic_ids and grouped:
+            topic_aggregates = {}
+            try:
+                for i in range(0, len(topic_ids), self.GROUPED_QUERY_MAX_TOPICS):
+                    topic_aggregates.update(source.collect_topic_aggregates(
+                        topic_ids[i:i + self.GROUPED_QUERY_MAX_TOPICS], start_time, end_time))
+            except NotImplementedError:
+                raise
+            except Exception:
+                _log.exception("Grouped aggregate query failed. Collecting aggregates point by point")
+                topic_aggregates = None
+
+        records = []
+        for data, aggregate_topic_id, ids in points:
+            agg_type = data['aggregation_type'].lower()
+            if topic_aggregates is None or agg_type not in STREAMING_AGGREGATIONS:
+                agg_value, count = source.collect_aggregate(ids, data['aggregation_type'], start_time, end_time)
+            else:
+                accumulator = Accumulator()
+                for topic_id in ids:
+                    if topic_id in topic_aggregates:
+                        accumulator.combine(*topic_aggregates[topic_id])
+                agg_value, count = accumulator.value(agg_type), accumulator.count
+            if quiet:
+                record = count and count >= data.get('min_count', 0)
+            else:
+                record = self._should_record_aggregate(data, count, start_time, end_time)
+            if record:
+                records.append((data['aggregation_type'], agg_time_period, end_time, aggregate_topic_id, agg_value,
+                                ids))
+        return records
+
     @abstractmethod
     def get_topic_map(self):
         """
@@ -491,6 +915,50 @@ class AggregateHistorian(Agent):
         """
         pass
 
+    def collect_topic_aggregates(self, topic_ids, start_time, end_time):
+        """
+        Collect the count, sum, minimum and maximum of the raw data of each
+        topic with a single query of the historian's data store
+
+        :param topic_ids: list of topic ids
+        :param start_time: start time for query (inclusive)
+        :param end_time:  end time for query (exclusive)
+        :return: dictionary of {topic_id: (count, sum, min, max)}
+        :raises NotImplementedError: if not supported by the data store.
+                                     Aggregates are then collected point by
+                                     point with
+                                     :py:meth:`collect_aggregate() <AggregateHistorian.collect_aggregate>`
+        """
+        raise NotImplementedError()
+
+    def insert_aggregates(self, records):
+        """
+        Insert aggregates of several points collected for the same time
+        period. Override to insert them with fewer round trips.
+
+        :param records: list of (agg_type, agg_time_period, end_time,
+                        agg_topic_id, value, topic_ids) tuples. See
+                        :py:meth:`insert_aggregate() <AggregateHistorian.insert_aggregate>`
+        """
+        for agg_type, agg_time_period, end_time, agg_topic_id, value, topic_ids in records:
+            self.insert_aggregate(agg_topic_id, agg_type, agg_time_period, end_time, value, topic_ids)
+
+    def open_backfill_connection(self):
+        """
+        Open a connection to the historian's data store for a backfill
+        worker thread. Each worker thread opens one connection and uses its
+        collect_aggregate, collect_topic_aggregates and insert_aggregates
+        methods, which take the same arguments as the methods of this class.
+        Subclasses whose data store connection cannot be shared between
+        threads should override this method. The connection is closed with
+        its close method in the worker thread once the backfill job has no
+        chunks left for the thread. The default connection is the historian
+        itself, which limits backfills to a single worker thread.
+
+        :return: the connection
+        """
+        return self
+
     @abstractmethod
     def insert_aggregate(self, agg_topic_id, agg_type, agg_time_period,
                          end_time, value, topic_ids):
@@ -618,6 +1086,35 @@ class AggregateHistorian(Agent):
                 period_int *= 30
                 return collection_time + timedelta(days=period_int)
 
+    @staticmethod
+    def compute_time_slices(start_time, end_time, agg_period, use_calendar_periods):
+        """
+        Computes the time slices of an aggregation period that lie between
+        start_time and end_time. The slices are computed backwards from
+        end_time the same way
+        :py:meth:`compute_aggregation_time_slice() <AggregateHistorian.compute_aggregation_time_slice>`
+        computes them for collection times.
+
+        :param start_time: start of the time range (inclusive)
+        :param end_time: end of the time range (exclusive)
+        :param agg_period: time period of the aggregation
+        :param use_calendar_periods: boolean to indicate if the time
+                                     period should align to the calendar
+                                     time periods
+        :return: list of (start time, end time) tuples ordered by time
+        """
+        time_slices = []
+        collection_time = end_time
+        while True:
+            slice_start, slice_end = AggregateHistorian.compute_aggregation_time_slice(
+                collection_time, agg_period, use_calendar_periods)
+            if slice_start < start_time or slice_start >= collection_time:
+                break
+            time_slices.append((slice_start, slice_end))
+            collection_time = slice_start
+        time_slices.reverse()
+        return time_slices
+
     @staticmethod
     def compute_aggregation_time_slice(collection_time, agg_period,
                                        use_calender_time_periods):
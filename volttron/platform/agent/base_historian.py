@@ -128,6 +128,13 @@ again until successful. Exception thrown by
 :py:meth:`BaseHistorianAgent.publish_to_historian` would also raise alerts
 and process loop will continue to back up data.
 
+Setting `decode_in_process_loop` moves the parsing of incoming messages off
+the main greenlet. Subscription callbacks only append the raw message to a
+lock free queue and wake the process loop, which parses timestamps, applies
+the device data filter and topic replacements and builds the records of all
+queued messages before caching them together. This keeps RPC handling and
+heartbeats of the agent responsive at high publish rates.
+
 Storing Data
 ------------
 
@@ -187,6 +194,12 @@ Querying Data
 - When a request is made for the list of aggregate topics available
   :py:meth:`BaseQueryHistorianAgent.query_aggregate_topics` will be called
 
+Results of raw data queries can optionally be cached in memory by setting
+`query_cache_size` to the maximum number of results to keep. Cached results
+for a topic are evicted when records whose timestamps fall in the query's time
+window are published, so repeated queries for historical data are served
+without going to the data store.
+
 
 Other Notes
 -----------
@@ -201,7 +214,7 @@ the same date over again.
 
 
 from abc import abstractmethod
-from collections import defaultdict
+from collections import defaultdict, deque
 from datetime import datetime, timedelta
 from functools import wraps
 import logging
@@ -219,6 +232,8 @@ from gevent import get_hub
 import pytz
 
 from volttron.platform.agent.base_aggregate_historian import AggregateHistorian
+from volttron.platform.agent.device_schema import DeviceSchemaCache, is_compact_publish, is_schema_publish
+from volttron.platform.agent.query_cache import QueryResultCache
 from volttron.platform.agent.utils import process_timestamp, \
     fix_sqlite3_datetime, get_aware_utc_now, parse_timestamp_string
 from volttron.platform.async_ import AsyncCall
@@ -262,6 +277,8 @@ time_parser = None
 
 ACTUATOR_TOPIC_PREFIX_PARTS = len(topics.ACTUATOR_VALUE.split('/'))
 ALL_REX = re.compile('.*/all$')
+# Put on the event queue to wake the process loop when raw messages are queued
+RAW_MESSAGES_QUEUED = 'raw_messages_queued'
 
 # Register a better datetime parser in sqlite3.
 fix_sqlite3_datetime()
@@ -354,6 +371,8 @@ class BaseHistorianAgent(Agent):
                  time_tolerance=None,
                  time_tolerance_topics=None,
                  cache_only_enabled=False,
+                 query_cache_size=0,
+                 decode_in_process_loop=False,
                  **kwargs):
 
         super(BaseHistorianAgent, self).__init__(**kwargs)
@@ -383,6 +402,13 @@ class BaseHistorianAgent(Agent):
         self._current_subscriptions = set()
         self._topic_replace_map = {}
         self._event_queue = gevent.queue.Queue() if self._process_loop_in_greenlet else Queue()
+        # Raw messages decoded by the process loop. deque appends and pops are atomic, so the subscription
+        # callbacks do not take a lock
+        self._decode_in_process_loop = bool(decode_in_process_loop)
+        self._raw_queue = deque()
+        self._raw_wakeup_pending = False
+        # Schemas of compact device publishes
+        self._device_schemas = DeviceSchemaCache()
         self._readonly = bool(readonly)
         self._stop_process_loop = False
         self._setup_failed = False
@@ -417,6 +443,9 @@ class BaseHistorianAgent(Agent):
             self._current_status_context[STATUS_KEY_CACHE_ONLY] = cache_only_enabled
         else:
             raise ValueError(f"cache_only_enabled should be either True or False")
+        self._query_cache_size = int(query_cache_size) if query_cache_size else 0
+        self._query_cache = None
+        self._set_query_cache()
 
         self._default_config = {
                                 "retry_period":self._retry_period,
@@ -439,7 +468,9 @@ class BaseHistorianAgent(Agent):
                                 "all_platforms": self._all_platforms,
                                 "time_tolerance": self._time_tolerance,
                                 "time_tolerance_topics": self._time_tolerance_topics,
-                                "cache_only_enabled": self._cache_only_enabled
+                                "cache_only_enabled": self._cache_only_enabled,
+                                "query_cache_size": self._query_cache_size,
+                                "decode_in_process_loop": self._decode_in_process_loop
                                }
 
         self.vip.config.set_default("config", self._default_config)
@@ -473,6 +504,9 @@ class BaseHistorianAgent(Agent):
 
         :param history_limit_timestamp: remove all data older than this timestamp
         :param storage_limit_gb: remove oldest data until database is smaller than this value.
+        :return: None or the timestamp data older than which may have been
+                 removed. Cached query results of windows that start before
+                 it are evicted.
         """
         pass
 
@@ -554,6 +588,11 @@ class BaseHistorianAgent(Agent):
             if str(cache_only_enabled) not in ('True', 'False'):
                 raise ValueError(f"cache_only_enabled should be either True or False")
 
+            query_cache_size = config.get("query_cache_size")
+            query_cache_size = int(query_cache_size) if query_cache_size else 0
+
+            decode_in_process_loop = bool(config.get("decode_in_process_loop", False))
+
             self._cache_only_enabled = cache_only_enabled
             self._current_status_context[STATUS_KEY_CACHE_ONLY] = cache_only_enabled
             self._time_tolerance_topics = time_tolerance_topics
@@ -587,6 +626,7 @@ class BaseHistorianAgent(Agent):
         self._message_publish_count = message_publish_count
         self._time_tolerance = time_tolerance
         self._time_tolerance_topics = time_tolerance_topics
+        self._decode_in_process_loop = decode_in_process_loop
 
         custom_topics_list = []
         for handler, topic_list in config.get("custom_topics", {}).items():
@@ -610,6 +650,9 @@ class BaseHistorianAgent(Agent):
                                    custom_topics_list)
 
         self.stop_process_thread()
+        # replaced only after the process loop stopped so that the old loop cannot miss invalidating new entries
+        self._query_cache_size = query_cache_size
+        self._set_query_cache()
         self._device_data_filter = config.get("device_data_filter")
         try:
             self.configure(config)
@@ -618,6 +661,14 @@ class BaseHistorianAgent(Agent):
 
         self.start_process_thread()
 
+    def _set_query_cache(self):
+        # The cache is invalidated by the process loop, so a readonly historian, whose data is written by another
+        # agent, cannot cache query results
+        if self._query_cache_size > 0 and not self._readonly:
+            self._query_cache = QueryResultCache(self._query_cache_size)
+        else:
+            self._query_cache = None
+
     def _update_subscriptions(self, capture_device_data,
                                     capture_log_data,
                                     capture_analysis_data,
@@ -788,13 +839,54 @@ class BaseHistorianAgent(Agent):
     def is_cache_only_enabled(self):
         return self._cache_only_enabled
 
+    def _queue_message(self, decode, *args):
+        """
+        Decode a message into records for the cache. With decode_in_process_loop the raw message is queued and
+        decoded by the process loop instead.
+
+        :param decode: one of the _decode_*_data methods
+        :param args: arguments of the decode method
+        """
+        if self._decode_in_process_loop:
+            # keep the time of arrival for messages without a timestamp header
+            self._raw_queue.append((decode, args, get_aware_utc_now()))
+            if not self._raw_wakeup_pending:
+                self._raw_wakeup_pending = True
+                self._event_queue.put(RAW_MESSAGES_QUEUED)
+        else:
+            for record in decode(*args):
+                self._event_queue.put(record)
+
+    def _decode_raw_messages(self, new_to_publish):
+        """
+        Called in the process loop. Decode the raw messages queued by :py:meth:`_queue_message`.
+
+        :param new_to_publish: items read from the event queue
+        :return: the records of new_to_publish followed by the records of the raw messages
+        """
+        records = [item for item in new_to_publish if item != RAW_MESSAGES_QUEUED]
+        # reset before draining so that messages queued from now on wake the loop again
+        self._raw_wakeup_pending = False
+        # only decode what is queued now so a fast publisher cannot keep the loop from caching
+        for _ in range(len(self._raw_queue)):
+            decode, args, received = self._raw_queue.popleft()
+            try:
+                records.extend(decode(*args, received=received))
+            except Exception as e:
+                _log.exception("Failed to decode message for {}: {}".format(args[3], e))
+        return records
+
     def _capture_record_data(self, peer, sender, bus, topic, headers,
                              message):
+        self._queue_message(self._decode_record_data, peer, sender, bus, topic, headers, message)
+
+    def _decode_record_data(self, peer, sender, bus, topic, headers,
+                            message, received=None):
         # _log.debug('Capture record data {}'.format(topic))
         # Anon the topic if necessary.
         topic = self.get_renamed_topic(topic)
         timestamp_string = headers.get(headers_mod.DATE, None)
-        timestamp = get_aware_utc_now()
+        timestamp = received or get_aware_utc_now()
         if timestamp_string is not None:
             timestamp, my_tz = process_timestamp(timestamp_string, topic)
             headers['time_error'] = self.does_time_exceed_tolerance(topic, timestamp)
@@ -805,16 +897,17 @@ class BaseHistorianAgent(Agent):
         if self.gather_timing_data:
             add_timing_data_to_header(headers, self.core.agent_uuid or self.core.identity, "collected")
 
-        self._event_queue.put(
-            {'source': 'record',
-             'topic': topic,
-             'readings': [(timestamp, message)],
-             'meta': {},
-             'headers': headers})
+        return [{'source': 'record',
+                 'topic': topic,
+                 'readings': [(timestamp, message)],
+                 'meta': {},
+                 'headers': headers}]
 
     def _capture_log_data(self, peer, sender, bus, topic, headers, message):
         """Capture log data and submit it to be published by a historian."""
+        self._queue_message(self._decode_log_data, peer, sender, bus, topic, headers, message)
 
+    def _decode_log_data(self, peer, sender, bus, topic, headers, message, received=None):
         # Anon the topic if necessary.
         topic = self.get_renamed_topic(topic)
         try:
@@ -828,15 +921,16 @@ class BaseHistorianAgent(Agent):
             _log.error("message for {topic} bad message string: "
                        "{message_string}".format(topic=topic,
                                                  message_string=message[0]))
-            return
+            return []
         except IndexError as e:
             _log.error("message for {topic} missing message string".format(
                 topic=topic))
-            return
+            return []
 
         if self.gather_timing_data:
             add_timing_data_to_header(headers, self.core.agent_uuid or self.core.identity, "collected")
 
+        records = []
         for point, item in data.items():
             if 'Readings' not in item or 'Units' not in item:
                 _log.error("logging request for {topic} missing Readings "
@@ -853,7 +947,7 @@ class BaseHistorianAgent(Agent):
             readings = item['Readings']
 
             if not isinstance(readings, list):
-                readings = [(get_aware_utc_now(), readings)]
+                readings = [(received or get_aware_utc_now(), readings)]
             elif isinstance(readings[0], str):
                 my_ts, my_tz = process_timestamp(readings[0], topic)
                 headers['time_error'] = self.does_time_exceed_tolerance(topic, my_ts)
@@ -863,22 +957,32 @@ class BaseHistorianAgent(Agent):
                 elif my_tz:
                     meta['tz'] = my_tz.zone
 
-            self._event_queue.put({'source': 'log',
-                                   'topic': topic + '/' + point,
-                                   'readings': readings,
-                                   'meta': meta,
-                                   'headers': headers})
+            records.append({'source': 'log',
+                            'topic': topic + '/' + point,
+                            'readings': readings,
+                            'meta': meta,
+                            'headers': headers})
+        return records
 
     def _capture_device_data(self, peer, sender, bus, topic, headers,
                              message):
         """Capture device data and submit it to be published by a historian.
 
         Filter out only the */all topics for publishing to the historian.
+        Schemas of compact device publishes are stored to expand the publishes.
+        Compact publishes received before their schema are held until the
+        schema is fetched from the platform driver or published.
         """
-
-        if not ALL_REX.match(topic):
+        if not is_schema_publish(topic, headers) and not ALL_REX.match(topic):
             return
 
+        def queue_device_data(topic, headers, message):
+            self._queue_message(self._decode_device_data, peer, sender, bus, topic, headers, message)
+
+        self._device_schemas.receive(self.vip, topic, headers, message, queue_device_data)
+
+    def _decode_device_data(self, peer, sender, bus, topic, headers,
+                            message, received=None):
         # Anon the topic if necessary.
         topic = self.get_renamed_topic(topic)
 
@@ -886,6 +990,10 @@ class BaseHistorianAgent(Agent):
         # we strip it off to get the base device
         parts = topic.split('/')
         device = '/'.join(parts[1:-1])
+        if is_compact_publish(topic, headers):
+            message = self._device_schemas.expand(headers, message)
+            if message is None:
+                return []
         # msg = [{data},{meta}] format
         msg = [{}, {}]
         try:
@@ -912,13 +1020,13 @@ class BaseHistorianAgent(Agent):
                 if (isinstance(msg, list) and not msg[0]) or \
                         (isinstance(msg, (float, int, str)) and msg is None):
                     _log.debug("Topic: {} - is not in configured to be stored".format(topic))
-                    return
+                    return []
             else:
                 msg = message
         except Exception as e:
             _log.debug("Error handling device_data_filter. {}".format(e))
             msg = message
-        self._capture_data(peer, sender, bus, topic, headers, msg, device)
+        return self._decode_data(peer, sender, bus, topic, headers, msg, device, received=received)
 
     def _capture_analysis_data(self, peer, sender, bus, topic, headers,
                                message):
@@ -926,7 +1034,10 @@ class BaseHistorianAgent(Agent):
 
         Filter out all but the all topics
         """
+        self._queue_message(self._decode_analysis_data, peer, sender, bus, topic, headers, message)
 
+    def _decode_analysis_data(self, peer, sender, bus, topic, headers,
+                              message, received=None):
         # Anon the topic.
         topic = self.get_renamed_topic(topic)
 
@@ -940,15 +1051,19 @@ class BaseHistorianAgent(Agent):
         # strip off the first part of the topic.
         device = '/'.join(parts[1:-1])
 
-        self._capture_data(peer, sender, bus, topic, headers, message, device)
+        return self._decode_data(peer, sender, bus, topic, headers, message, device, received=received)
 
     def _capture_data(self, peer, sender, bus, topic, headers, message,
                       device):
+        self._queue_message(self._decode_data, peer, sender, bus, topic, headers, message, device)
+
+    def _decode_data(self, peer, sender, bus, topic, headers, message,
+                     device, received=None):
         # Anon the topic if necessary.
         topic = self.get_renamed_topic(topic)
         timestamp_string = headers.get(headers_mod.SYNC_TIMESTAMP if self._sync_timestamp else headers_mod.TIMESTAMP,
                                        headers.get(headers_mod.DATE))
-        timestamp = get_aware_utc_now()
+        timestamp = received or get_aware_utc_now()
         if timestamp_string is not None:
             timestamp, my_tz = process_timestamp(timestamp_string, topic)
             headers['time_error'] = self.does_time_exceed_tolerance(topic, timestamp)
@@ -968,14 +1083,14 @@ class BaseHistorianAgent(Agent):
             _log.error("message for {topic} bad message string: "
                        "{message_string}".format(topic=topic,
                                                  message_string=message[0]))
-            return
+            return []
         except IndexError as e:
             _log.error("message for {topic} missing message string".format(
                 topic=topic))
-            return
+            return []
         except Exception as e:
             _log.exception(e)
-            return
+            return []
 
         meta = {}
         if not isinstance(message, dict):
@@ -993,13 +1108,11 @@ class BaseHistorianAgent(Agent):
         if self.gather_timing_data:
             add_timing_data_to_header(headers, self.core.agent_uuid or self.core.identity, "collected")
 
-        for key, value in values.items():
-            point_topic = device + '/' + key
-            self._event_queue.put({'source': source,
-                                   'topic': point_topic,
-                                   'readings': [(timestamp, value)],
-                                   'meta': meta.get(key, {}),
-                                   'headers': headers})
+        return [{'source': source,
+                 'topic': device + '/' + key,
+                 'readings': [(timestamp, value)],
+                 'meta': meta.get(key, {}),
+                 'headers': headers} for key, value in values.items()]
 
     def _capture_actuator_data(self, topic, headers, message, match):
         """Capture actuation data and submit it to be published by a historian.
@@ -1143,6 +1256,9 @@ class BaseHistorianAgent(Agent):
                         except Empty:
                             break
 
+                if new_to_publish or self._raw_queue:
+                    new_to_publish = self._decode_raw_messages(new_to_publish)
+
                 # We wake the thread after a configuration change by passing a None to the queue.
                 # Backup anything new before checking for a stop.
                 cache_full = backupdb.backup_new_data(new_to_publish, bool(self._time_tolerance))
@@ -1202,7 +1318,7 @@ class BaseHistorianAgent(Agent):
                         if self._history_limit_days is not None:
                             last_element = to_publish_list[-1]
                             last_time_stamp = last_element["timestamp"]
-                            history_limit_timestamp = last_time_stamp - self._history_limit_days
+                            history_limit_timestamp = last_time_stamp - timedelta(days=self._history_limit_days)
 
                         try:
                             if not cache_only_enabled:
@@ -1213,8 +1329,10 @@ class BaseHistorianAgent(Agent):
                                 f"An unhandled exception occurred while publishing: {e}")
 
                         try:
-                            self.manage_db_size(history_limit_timestamp, self._storage_limit_gb)
+                            removed_before = self.manage_db_size(history_limit_timestamp, self._storage_limit_gb)
                             self._update_status({STATUS_KEY_ERROR_MANAGE_DB_SIZE: False})
+                            if self._query_cache is not None:
+                                self._evict_removed_query_results(history_limit_timestamp, removed_before)
                         except Exception as e:
                             _log.exception(
                                 f"An unhandled exception occurred while attempting to managing db size: {e}")
@@ -1227,6 +1345,9 @@ class BaseHistorianAgent(Agent):
                             self._send_alert({STATUS_KEY_PUBLISHING: False}, "historian_not_publishing")
                             break
 
+                        if self._query_cache is not None and not cache_only_enabled:
+                            self._advance_query_watermarks(to_publish_list)
+
                         # _successful_published is set when publish_to_historian is called to the concrete
                         # historian.  Because we don't call that function when cache_only_enabled is True
                         # the _successful_published will be set().  Therefore we don't need to wrap
@@ -1278,6 +1399,36 @@ class BaseHistorianAgent(Agent):
             _log.debug("Process loop stopped.")
             self._stop_process_loop = False
 
+    def _evict_removed_query_results(self, history_limit_timestamp, removed_before):
+        """
+        Evict the cached query results that may include data removed by
+        :py:meth:`BaseHistorianAgent.manage_db_size`
+        """
+        cutoffs = [ts for ts in (history_limit_timestamp, removed_before) if ts is not None]
+        if cutoffs:
+            self._query_cache.evict_before(max(cutoffs))
+
+    def _advance_query_watermarks(self, to_publish_list):
+        """
+        Advance the query cache watermark of every topic that had records published in the last call to
+        :py:meth:`BaseHistorianAgent.publish_to_historian`
+        """
+        published_all = None in self._successful_published
+        ranges = {}
+        for record in to_publish_list:
+            if not published_all and record['_id'] not in self._successful_published:
+                continue
+            ts = record['timestamp']
+            topic_range = ranges.get(record['topic'])
+            if topic_range is None:
+                ranges[record['topic']] = [ts, ts]
+            elif ts < topic_range[0]:
+                topic_range[0] = ts
+            elif ts > topic_range[1]:
+                topic_range[1] = ts
+        for topic, (min_ts, max_ts) in ranges.items():
+            self._query_cache.advance(topic, min_ts, max_ts)
+
     def _historian_setup(self):
         try:
             _log.info("Trying to setup historian")
@@ -1909,6 +2060,8 @@ class BaseQueryHistorianAgent(Agent):
                                         outputdir=agent_data_dir)
             else:
                 time_parser = yacc.yacc(write_tables=0)
+        # Set by BaseHistorianAgent when query_cache_size is configured
+        self._query_cache = None
         super(BaseQueryHistorianAgent, self).__init__(**kwargs)
 
     @RPC.export
@@ -2115,6 +2268,17 @@ class BaseQueryHistorianAgent(Agent):
         if start:
             _log.debug("start={}".format(start))
 
+        # Only raw data is cached. Aggregate tables are written by a separate agent, so writes to them would not
+        # invalidate the cache
+        query_cache = self._query_cache if not agg_type else None
+        if query_cache is not None:
+            topics_list = [topic] if isinstance(topic, str) else list(topic)
+            cache_key = query_cache.make_key(topics_list, start, end, agg_type, agg_period, skip, count, order)
+            results = query_cache.get(cache_key)
+            if results is not None:
+                return results
+            watermarks = query_cache.get_watermarks(topics_list)
+
         results = self.query_historian(topic, start, end, agg_type,
                                        agg_period, skip, count, order)
         metadata = results.get("metadata", None)
@@ -2122,6 +2286,8 @@ class BaseQueryHistorianAgent(Agent):
         if values and metadata is None:
             results['metadata'] = {}
 
+        if query_cache is not None:
+            query_cache.put(cache_key, topics_list, start, end, results, watermarks)
         return results
 
     @abstractmethod
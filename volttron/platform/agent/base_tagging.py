@@ -37,6 +37,7 @@ Implementing classes should implement the following methods
   - :py:meth:`BaseTaggingService.query_tags_by_topic`
   - :py:meth:`BaseTaggingService.query_topics_by_tags`
   - :py:meth:`BaseTaggingService.insert_topic_tags`
+  - :py:meth:`BaseTaggingService.insert_topic_tags_batch`
 
 On start calls the following methods
 
@@ -57,10 +58,15 @@ condition for querying topics based on tags. Please see documentation of
 import logging
 import os
 import re
+import time
 
 from abc import abstractmethod
 
+import gevent
+
+from volttron.platform.agent import tag_import
 from volttron.platform.agent.known_identities import (PLATFORM_HISTORIAN)
+from volttron.platform.dbutils.topicindex import TopicPrefixTrie
 from volttron.platform.vip.agent import Agent, Core, RPC
 from volttron.platform.vip.agent.errors import Unreachable
 
@@ -74,13 +80,28 @@ class BaseTaggingService(Agent):
     the tag details
     """
 
-    def __init__(self, historian_vip_identity=None, **kwargs):
+    # minimum seconds between refreshes of the topic snapshot triggered by
+    # topic patterns that do not match any topic
+    TOPIC_SNAPSHOT_MIN_REFRESH = 5
+    # maximum number of errors returned by import_tags
+    IMPORT_MAX_ERRORS = 100
+
+    def __init__(self, historian_vip_identity=None, topic_snapshot_ttl=300,
+                 tag_import_dir=None, **kwargs):
         super(BaseTaggingService, self).__init__(**kwargs)
         self.valid_tags = dict()
         self.tag_refs = dict()
         self.historian_vip_identity = historian_vip_identity
         if historian_vip_identity is None:
             self.historian_vip_identity = PLATFORM_HISTORIAN
+        # seconds after which the snapshot of the historian's topic list is
+        # refreshed. 0 queries the historian for every topic pattern
+        self.topic_snapshot_ttl = float(topic_snapshot_ttl or 0)
+        self._topic_snapshot = None
+        self._topic_snapshot_time = 0
+        # directory of the files that can be imported with import_tags.
+        # None uses the agent-data directory of the agent
+        self.tag_import_dir = tag_import_dir
         current_dir = os.path.dirname(os.path.abspath(__file__))
         self.resource_sub_dir = os.path.join(current_dir, "../../..",
                                              "volttron_data/tagging_resources")
@@ -550,6 +571,121 @@ class BaseTaggingService(Agent):
         """
         pass
 
+    @RPC.export
+    def import_tags(self, file_name, file_format=None, batch_size=5000):
+        """
+        Bulk import tags from a file of the tag import directory of the
+        tagging service. The import directory is the tag_import_dir
+        configuration option, or the agent-data directory of the agent if it
+        is not configured. Files outside of it are refused. The file is
+        streamed and imported in batches so that tags of hundreds of
+        thousands of topics can be loaded with constant memory and one bulk
+        write per batch. See :py:mod:`volttron.platform.agent.tag_import` for
+        the supported file formats.
+
+        Topics and topic patterns are matched against a snapshot of the
+        historian's topic list that is refreshed once at the start of the
+        import, instead of querying the historian for every topic. Records
+        with invalid tag names or topics that do not match any topic are
+        skipped and reported in the result.
+
+        :param file_name: name of a csv, Haystack JSON grid or JSON lines
+         file, relative to the tag import directory
+        :param file_format: csv, json or jsonl. Defaults to the file extension
+        :param batch_size: number of records validated and written together
+        :type file_name: str
+        :type file_format: str
+        :type batch_size: int
+        :return: dictionary with the number of records, topic prefixes and
+         tags imported, the number of records that failed, the version of the
+         topic snapshot and up to IMPORT_MAX_ERRORS errors keyed by topic
+        :rtype: dict
+        """
+        file_path = self._get_import_path(file_name)
+        records = tag_import.read_tag_file(file_path, file_format)
+        self.refresh_topic_snapshot()
+        snapshot = self._topic_snapshot
+        result = {'records': 0, 'topics': 0, 'tags': 0, 'error_count': 0,
+                  'snapshot_version': snapshot.version, 'error': {}}
+        prefixes_imported = set()
+        start = time.time()
+        for batch in tag_import.batches(records, batch_size):
+            to_db = []
+            for topic_pattern, topic_tags in self._merge_tag_records(batch):
+                result['records'] += 1
+                invalid = [tag for tag in topic_tags
+                           if tag not in self.valid_tags]
+                if invalid:
+                    self._add_import_error(
+                        result, topic_pattern,
+                        "Invalid tag name:{}".format(", ".join(invalid)))
+                    continue
+                prefixes = snapshot.match_prefixes(
+                    topic_pattern.replace("*", ".*"))
+                if not prefixes:
+                    self._add_import_error(result, topic_pattern,
+                                           "No matching topic found")
+                    continue
+                for prefix in prefixes:
+                    to_db.extend((prefix, t, v) for t, v in topic_tags.items())
+                    to_db.append((prefix, 'id', prefix))
+                prefixes_imported.update(prefixes)
+            if to_db:
+                self.insert_topic_tags_batch(to_db)
+                result['tags'] += len(to_db)
+            # let other greenlets of the agent run between batches
+            gevent.sleep(0)
+        result['topics'] = len(prefixes_imported)
+        _log.info("Imported {} tags of {} topic prefixes from {} in {:.1f}s. "
+                  "{} records failed".format(result['tags'], result['topics'],
+                                             file_path, time.time() - start,
+                                             result['error_count']))
+        return result
+
+    def _get_import_path(self, file_name):
+        import_dir = self.tag_import_dir
+        if not import_dir:
+            import_dir = os.path.join(
+                os.getcwd(), os.path.basename(os.getcwd()) + ".agent-data")
+        import_dir = os.path.realpath(os.path.expanduser(import_dir))
+        # resolve links and .. so that the file can not be outside of the
+        # import directory
+        file_path = os.path.realpath(os.path.join(import_dir, file_name))
+        if os.path.commonpath([import_dir, file_path]) != import_dir:
+            raise ValueError("{} is not in the tag import directory {}".format(
+                file_name, import_dir))
+        return file_path
+
+    @staticmethod
+    def _merge_tag_records(batch):
+        # csv files have one record per tag. Merge the records of a topic
+        # that are in the same batch so that each topic is matched once
+        merged = dict()
+        for topic_pattern, topic_tags in batch:
+            merged.setdefault(topic_pattern, dict()).update(topic_tags)
+        for topic_pattern, topic_tags in merged.items():
+            topic_tags.pop('id', None)
+            yield topic_pattern, topic_tags
+
+    def _add_import_error(self, result, topic_pattern, message):
+        result['error_count'] += 1
+        if len(result['error']) < self.IMPORT_MAX_ERRORS:
+            result['error'][topic_pattern] = message
+
+    def insert_topic_tags_batch(self, rows):
+        """
+        Write a batch of tags of bulk import. Topic patterns have already
+        been expanded and tag names validated. Implementing classes should
+        write the whole batch with a single bulk operation.
+
+        :param rows: list of (topic_prefix, tag, value) tuples. Includes an
+         id tag for every topic prefix
+        :type rows: list
+        """
+        raise NotImplementedError(
+            "{} does not support bulk import of tags".format(
+                self.__class__.__name__))
+
     def get_matching_topic_prefixes(self, topic_pattern):
         """
         Queries the configured/platform historian to get the list of topics
@@ -567,12 +703,20 @@ class BaseTaggingService(Agent):
         only if separator is /. Else tags are always applied
         to full topic names
 
+        If topic_snapshot_ttl is configured, patterns are matched against a
+        snapshot of the historian's topic list that is fetched with a single
+        get_topic_list call and refreshed once it is older than
+        topic_snapshot_ttl seconds, or when a pattern does not match any
+        topic in it.
+
         :param topic_pattern: pattern to match again
         :type topic_pattern: str
         :return: list of topic prefixes.
         """
         # replace * with .* so regex would match correctly
         topic_pattern = topic_pattern.replace("*", ".*")
+        if self.topic_snapshot_ttl > 0:
+            return self._match_topic_snapshot(topic_pattern)
         topic_prefixes = set()
         try:
             _log.debug("Querying {} for matching topics for pattern "
@@ -624,6 +768,52 @@ class BaseTaggingService(Agent):
             raise
         return topic_prefixes
 
+    def _match_topic_snapshot(self, topic_pattern):
+        age = time.time() - self._topic_snapshot_time
+        if self._topic_snapshot is None or age > self.topic_snapshot_ttl:
+            self.refresh_topic_snapshot()
+            age = 0
+        topic_prefixes = self._topic_snapshot.match_prefixes(topic_pattern)
+        if not topic_prefixes and age > self.TOPIC_SNAPSHOT_MIN_REFRESH:
+            # the topic may have been added to the historian after the
+            # snapshot was taken
+            self.refresh_topic_snapshot()
+            topic_prefixes = self._topic_snapshot.match_prefixes(topic_pattern)
+        _log.debug("topic prefixes {}".format(topic_prefixes))
+        return topic_prefixes
+
+    @RPC.export
+    def refresh_topic_snapshot(self):
+        """
+        Fetch the list of topics from the configured historian and replace the
+        snapshot used to match topic patterns. The version of the snapshot is
+        incremented when the list of topics changed.
+
+        :return: version of the snapshot
+        :rtype: int
+        """
+        try:
+            topics = self.vip.rpc.call(self.historian_vip_identity,
+                                       "get_topic_list").get(timeout=30)
+        except Unreachable:
+            _log.error("add_topic_tags and add_tags "
+                       "operations need plaform.historian to be running."
+                       "Topics and topic patterns sent are matched against "
+                       "list of valid topics queried"
+                       " from {}".format(self.historian_vip_identity))
+            raise
+        previous = self._topic_snapshot
+        if previous is not None and previous.topics == frozenset(topics):
+            snapshot = previous
+        else:
+            version = previous.version + 1 if previous is not None else 1
+            snapshot = TopicPrefixTrie(topics, version)
+            _log.debug("Loaded version {} of topic snapshot with {} "
+                       "topics".format(version, len(snapshot)))
+        self._topic_snapshot = snapshot
+        self._topic_snapshot_time = time.time()
+        return snapshot.version
+
     @staticmethod
     def _process_and_or_param(query_and_cond, query_or_cond):
         """
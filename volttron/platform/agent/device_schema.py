@@ -0,0 +1,234 @@
+# -*- coding: utf-8 -*- {{{
+# ===----------------------------------------------------------------------===
+#
+#                 Component of Eclipse VOLTTRON
+#
+# ===----------------------------------------------------------------------===
+#
+# Copyright 2023 Battelle Memorial Institute
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not
+# use this file except in compliance with the License. You may obtain a copy
+# of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+#
+# ===----------------------------------------------------------------------===
+# }}}
+
+"""
+Compact device publishes.
+
+A device "all" publish normally is ``[values, meta]`` with dictionaries of
+the value and the metadata of every point. Drivers configured for compact
+publishes instead publish the schema of the device, the ordered point names
+and their metadata, to ``devices/<device path>/schema`` when it changes and
+periodically. Every "all" publish then only carries the list of values in
+schema order, with the id of the schema in the ``SchemaId`` header. Points
+that are not part of a publish are None.
+
+The schema id is derived from the content of the schema, so devices with the
+same points and metadata share a schema and ids stay the same when the driver
+restarts. Subscribers keep the schemas in a :py:class:`DeviceSchemaCache` and
+expand compact publishes back to ``[values, meta]``. Subscribers that receive
+a compact publish before its schema, e.g. after they restarted, hold the
+publish and fetch the schema with the ``get_device_schema`` RPC method of the
+platform driver.
+"""
+
+import hashlib
+import logging
+from collections import deque
+
+import gevent
+
+from volttron.platform import jsonapi
+from volttron.platform.agent.known_identities import PLATFORM_DRIVER
+from volttron.platform.messaging import headers as headers_mod
+
+_log = logging.getLogger(__name__)
+
+SCHEMA_TOPIC_SUFFIX = 'schema'
+# maximum number of publishes held per unknown schema, older ones are dropped
+MAX_HELD_PUBLISHES = 1000
+
+
+def make_schema(meta_data):
+    """
+    Create the schema of a device
+
+    :param meta_data: dictionary of the metadata of every point
+    :return: schema dictionary with the id, the ordered point names and the
+             metadata of every point
+    """
+    points = sorted(meta_data)
+    meta = [meta_data[point] for point in points]
+    digest = hashlib.sha1(jsonapi.dumps([points, meta], sort_keys=True).encode('utf-8'))
+    return {'id': digest.hexdigest()[:16], 'points': points, 'meta': meta}
+
+
+def compact_values(schema, values):
+    """
+    :param schema: device schema
+    :param values: dictionary of point values
+    :return: list of the values in schema order, None for missing points
+    """
+    return [values.get(point) for point in schema['points']]
+
+
+def is_schema_publish(topic, headers):
+    return headers_mod.SCHEMA_ID in headers and topic.endswith('/' + SCHEMA_TOPIC_SUFFIX)
+
+
+def is_compact_publish(topic, headers):
+    return headers_mod.SCHEMA_ID in headers and not topic.endswith('/' + SCHEMA_TOPIC_SUFFIX)
+
+
+def device_path(topic):
+    """
+    :param topic: topic of a device publish, such as devices/campus/building/device/all
+    :return: device path, such as campus/building/device
+    """
+    parts = topic.split('/')
+    return '/'.join(parts[1:-1])
+
+
+class DeviceSchemaCache:
+    """
+    Schemas of compact device publishes by schema id
+    """
+
+    def __init__(self):
+        self._schemas = {}
+        self._missing = set()
+        # publishes received before their schema by schema id
+        self._held = {}
+
+    def update(self, schema):
+        """
+        Add the schema of a schema publish or of a get_device_schema call
+        """
+        try:
+            schema_id = schema['id']
+            if len(schema['points']) != len(schema['meta']):
+                raise ValueError("number of points and metadata differ")
+        except (KeyError, TypeError, ValueError) as e:
+            _log.error("Invalid device schema: {}".format(e))
+            return
+        self._schemas[schema_id] = (schema['points'], schema['meta'])
+        self._missing.discard(schema_id)
+
+    def get(self, schema_id):
+        return self._schemas.get(schema_id)
+
+    def hold(self, schema_id, publish):
+        """
+        Keep a publish with an unknown schema until the schema is known
+
+        :param schema_id: id of the unknown schema
+        :param publish: publish to keep
+        :return: True for the first publish held for the schema, the caller
+                 should then fetch the schema
+        """
+        held = self._held.get(schema_id)
+        first = held is None
+        if first:
+            held = self._held[schema_id] = deque(maxlen=MAX_HELD_PUBLISHES)
+            _log.info("Holding device publishes with unknown schema {} until the schema is known".format(
+                schema_id))
+        elif len(held) == held.maxlen and schema_id not in self._missing:
+            self._missing.add(schema_id)
+            _log.warning("Dropping device publishes with unknown schema {} until the schema is "
+                         "published".format(schema_id))
+        held.append(publish)
+        return first
+
+    def release(self, schema_id):
+        """
+        :return: list of the publishes held for a schema that is now known
+        """
+        if schema_id not in self._schemas:
+            return []
+        return list(self._held.pop(schema_id, ()))
+
+    def receive(self, vip, topic, headers, message, callback):
+        """
+        Handle a publish of a devices/ subscriber. Schema publishes are
+        stored, compact publishes received before their schema are held until
+        the schema is fetched from the platform driver or published and every
+        other publish is passed on.
+
+        :param vip: vip subsystems of the subscriber, used to fetch schemas
+        :param topic: topic of the publish
+        :param headers: headers of the publish
+        :param message: message of the publish
+        :param callback: called with the topic, headers and message of the
+                         publishes whose schema is known, compact publishes
+                         are passed on as they are and can be expanded with
+                         :py:meth:`expand`
+        """
+        if is_schema_publish(topic, headers):
+            self.update(message)
+            self._release(headers.get(headers_mod.SCHEMA_ID))
+            return
+        if is_compact_publish(topic, headers):
+            schema_id = headers.get(headers_mod.SCHEMA_ID)
+            if schema_id not in self._schemas:
+                if self.hold(schema_id, (callback, topic, headers, message)):
+                    gevent.spawn(self._fetch, vip, schema_id, topic)
+                return
+        callback(topic, headers, message)
+
+    def _fetch(self, vip, schema_id, topic):
+        """
+        Get the schema of a compact publish from the platform driver and pass
+        on the publishes held for it. If the call fails the publishes are held
+        until the driver publishes the schema.
+        """
+        try:
+            schema = vip.rpc.call(PLATFORM_DRIVER, 'get_device_schema', device_path(topic)).get(timeout=30)
+        except Exception as e:
+            _log.warning("Failed to get the schema {} of {} from the platform driver: {}".format(
+                schema_id, topic, e))
+            return
+        self.update(schema)
+        self._release(schema_id)
+
+    def _release(self, schema_id):
+        for callback, topic, headers, message in self.release(schema_id):
+            callback(topic, headers, message)
+
+    def expand(self, headers, message):
+        """
+        Expand a compact publish
+
+        :param headers: headers of the publish, with the schema id
+        :param message: list of values in schema order
+        :return: [values, meta] dictionaries of the points in the publish or
+                 None if the schema is not known (yet)
+        """
+        schema_id = headers.get(headers_mod.SCHEMA_ID)
+        schema = self._schemas.get(schema_id)
+        if schema is None:
+            if schema_id not in self._missing:
+                self._missing.add(schema_id)
+                _log.warning("Dropping device publishes with unknown schema {} until the schema is "
+                             "published".format(schema_id))
+            return None
+        points, meta = schema
+        if len(message) != len(points):
+            _log.error("Device publish does not match schema {}".format(schema_id))
+            return None
+        values = {}
+        metadata = {}
+        for point, point_meta, value in zip(points, meta, message):
+            if value is not None:
+                values[point] = value
+                metadata[point] = point_meta
+        return [values, metadata]
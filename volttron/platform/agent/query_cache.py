@@ -0,0 +1,185 @@
+# -*- coding: utf-8 -*- {{{
+# ===----------------------------------------------------------------------===
+#
+#                 Component of Eclipse VOLTTRON
+#
+# ===----------------------------------------------------------------------===
+#
+# Copyright 2023 Battelle Memorial Institute
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not
+# use this file except in compliance with the License. You may obtain a copy
+# of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+#
+# ===----------------------------------------------------------------------===
+# }}}
+
+"""
+Result cache for historian queries.
+
+:py:class:`QueryResultCache` holds the results of recent
+:py:meth:`BaseQueryHistorianAgent.query` calls in a size limited LRU map.
+Every topic has a write watermark that the historian's process loop advances
+after records for the topic were published. Advancing the watermark evicts
+the cached results for that topic whose time window overlaps the published
+records, so results for historical windows that can no longer change stay in
+memory while results that include the present are refreshed on the next
+query. When old data is removed from the store the results whose window
+starts before the removed data are evicted.
+"""
+
+import logging
+import threading
+from collections import OrderedDict, defaultdict
+
+_log = logging.getLogger(__name__)
+
+
+class _CacheEntry:
+    __slots__ = ('topics', 'start', 'end', 'result')
+
+    def __init__(self, topics, start, end, result):
+        self.topics = topics
+        self.start = start
+        self.end = end
+        self.result = result
+
+    def overlaps(self, min_ts, max_ts):
+        return (self.start is None or max_ts >= self.start) and (self.end is None or min_ts <= self.end)
+
+
+class QueryResultCache:
+    """
+    LRU cache of query results with per topic invalidation.
+
+    The cache is read and filled by the thread answering queries and
+    invalidated by the historian's process thread, so all access is guarded
+    by a lock.
+    """
+
+    def __init__(self, max_size):
+        self.max_size = int(max_size)
+        self._entries = OrderedDict()
+        # topic name (lower case) -> keys of the entries that contain the topic
+        self._topic_keys = defaultdict(set)
+        # topic name (lower case) -> number of times records for the topic were published
+        self._watermarks = defaultdict(int)
+        # number of times old data was removed from the store
+        self._removals = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    @staticmethod
+    def make_key(topics, start, end, agg_type, agg_period, skip, count, order):
+        """
+        Build the cache key of a query from its normalized arguments
+        :param topics: list of topic names
+        :return: hashable key
+        """
+        return tuple(topics), start, end, agg_type, agg_period, skip, count, order
+
+    def get_watermarks(self, topics):
+        """
+        Read the current watermarks of the given topics. Pass the return
+        value to :py:meth:`put` to detect records published while the query
+        was running.
+        :param topics: list of topic names
+        :return: tuple of watermarks
+        """
+        with self._lock:
+            return (self._removals,) + tuple(self._watermarks.get(t.lower(), 0) for t in topics)
+
+    def get(self, key):
+        """
+        :param key: key returned by :py:meth:`make_key`
+        :return: cached result or None
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry.result
+
+    def put(self, key, topics, start, end, result, watermarks):
+        """
+        Cache the result of a query unless records were published for any of
+        its topics since `watermarks` were read.
+        :param key: key returned by :py:meth:`make_key`
+        :param topics: list of topic names in the query
+        :param start: start of the query window as a datetime or None
+        :param end: end of the query window as a datetime or None
+        :param result: query result
+        :param watermarks: value returned by :py:meth:`get_watermarks` before the query was run
+        :return: True if the result was cached
+        """
+        topics = tuple(t.lower() for t in topics)
+        with self._lock:
+            if watermarks != (self._removals,) + tuple(self._watermarks.get(t, 0) for t in topics):
+                return False
+            self._remove(key)
+            self._entries[key] = _CacheEntry(topics, start, end, result)
+            for topic in topics:
+                self._topic_keys[topic].add(key)
+            while len(self._entries) > self.max_size:
+                self._remove(next(iter(self._entries)))
+            return True
+
+    def advance(self, topic, min_ts, max_ts):
+        """
+        Advance the write watermark of a topic after records with timestamps
+        between min_ts and max_ts were published, evicting the cached results
+        whose window overlaps that range.
+        :param topic: topic name
+        :param min_ts: timestamp of the oldest record published
+        :param max_ts: timestamp of the newest record published
+        """
+        topic = topic.lower()
+        with self._lock:
+            self._watermarks[topic] += 1
+            keys = self._topic_keys.get(topic)
+            if not keys:
+                return
+            for key in [k for k in keys if self._entries[k].overlaps(min_ts, max_ts)]:
+                self._remove(key)
+
+    def evict_before(self, cutoff):
+        """
+        Evict the cached results whose window starts before cutoff, after
+        data older than cutoff was removed from the store.
+        :param cutoff: timestamp of the oldest data that was kept
+        """
+        with self._lock:
+            self._removals += 1
+            for key in [k for k, e in self._entries.items() if e.start is None or e.start < cutoff]:
+                self._remove(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._topic_keys.clear()
+
+    def _remove(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        for topic in entry.topics:
+            keys = self._topic_keys.get(topic)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._topic_keys[topic]
@@ -0,0 +1,391 @@
+# -*- coding: utf-8 -*- {{{
+# ===----------------------------------------------------------------------===
+#
+#                 Component of Eclipse VOLTTRON
+#
+# ===----------------------------------------------------------------------===
+#
+# Copyright 2023 Battelle Memorial Institute
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not
+# use this file except in compliance with the License. You may obtain a copy
+# of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+#
+# ===----------------------------------------------------------------------===
+# }}}
+
+"""
+Incremental computation of aggregates from data published on the message bus.
+
+:py:class:`StreamingAggregator` keeps a running count, sum, minimum and
+maximum per aggregation point and time bucket. Buckets are laid out on the
+same grid as the periodic collection of
+:py:class:`volttron.platform.agent.base_aggregate_historian.AggregateHistorian`,
+so closing a bucket at collection time yields the same value as querying the
+historian's data table for the time slice. Parts of a bucket that were not
+observed live (before the point was registered or while the agent was down)
+are filled in by querying the data table for just those time ranges. Data
+that arrives after its bucket was closed marks the bucket for a full
+re-query.
+
+State can be saved to and restored from a json file so that a restart only
+needs to query the data table for the time the agent was not running.
+"""
+
+import logging
+import os
+from datetime import timedelta
+
+from volttron.platform import jsonapi
+from volttron.platform.agent.utils import (format_timestamp, get_aware_utc_now,
+                                           parse_timestamp_string)
+
+_log = logging.getLogger(__name__)
+
+# Aggregations that can be computed from partial results of disjoint sets of records
+STREAMING_AGGREGATIONS = ('avg', 'sum', 'min', 'max', 'count')
+
+
+def period_to_timedelta(agg_period):
+    """
+    Convert a normalized aggregation period to a timedelta.
+
+    :param agg_period: aggregation period such as 15m, 1h, 1d or 1w
+    :return: timedelta or None for monthly periods, which do not have a fixed length
+    """
+    period_int = int(agg_period[:-1])
+    unit = agg_period[-1:]
+    if unit == 'm':
+        return timedelta(minutes=period_int)
+    elif unit == 'h':
+        return timedelta(hours=period_int)
+    elif unit == 'd':
+        return timedelta(days=period_int)
+    elif unit == 'w':
+        return timedelta(weeks=period_int)
+    return None
+
+
+class Accumulator:
+    """
+    Running count, sum, minimum and maximum of a set of values
+    """
+    __slots__ = ('count', 'total', 'minimum', 'maximum')
+
+    def __init__(self, count=0, total=0.0, minimum=None, maximum=None):
+        self.count = count
+        self.total = total
+        self.minimum = minimum
+        self.maximum = maximum
+
+    def add(self, value):
+        self.count += 1
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            # counted but not aggregated, same as the text values of the data table
+            return
+        self.total += value
+        if self.minimum is None or value < self.minimum:
+            self.minimum = value
+        if self.maximum is None or value > self.maximum:
+            self.maximum = value
+
+    def combine(self, count, total, minimum, maximum):
+        """
+        Combine with the count, sum, minimum and maximum of a disjoint set of records
+        """
+        if not count:
+            return
+        self.count += count
+        self.total += float(total or 0.0)
+        # databases storing values as text may return the minimum and maximum as strings
+        minimum = float(minimum) if minimum is not None else None
+        maximum = float(maximum) if maximum is not None else None
+        if minimum is not None and (self.minimum is None or minimum < self.minimum):
+            self.minimum = minimum
+        if maximum is not None and (self.maximum is None or maximum > self.maximum):
+            self.maximum = maximum
+
+    def merge(self, agg_type, value, count):
+        """
+        Merge the result of aggregating a disjoint set of records as returned by
+        :py:meth:`AggregateHistorian.collect_aggregate`
+
+        :param agg_type: aggregation type the value was computed with
+        :param value: aggregated value
+        :param count: number of records the value was computed from
+        """
+        if not count or value is None:
+            return
+        # databases storing values as text may return the value as a string
+        value = float(value)
+        self.count += count
+        if agg_type == 'avg':
+            self.total += value * count
+        elif agg_type == 'sum':
+            self.total += value
+        elif agg_type == 'min':
+            self.minimum = value if self.minimum is None else min(self.minimum, value)
+        elif agg_type == 'max':
+            self.maximum = value if self.maximum is None else max(self.maximum, value)
+
+    def value(self, agg_type):
+        if agg_type == 'avg':
+            return self.total / self.count if self.count else None
+        elif agg_type == 'sum':
+            return self.total
+        elif agg_type == 'min':
+            return self.minimum
+        elif agg_type == 'max':
+            return self.maximum
+        elif agg_type == 'count':
+            return self.count
+        raise ValueError("Invalid aggregation type {}".format(agg_type))
+
+    def to_list(self):
+        return [self.count, self.total, self.minimum, self.maximum]
+
+
+class StreamingPoint:
+    """
+    Streaming state of a single configured aggregation point
+
+    :param topic_ids: ids of the topics aggregated into this point
+    :param agg_type: one of :py:data:`STREAMING_AGGREGATIONS`
+    :param agg_period: normalized aggregation period
+    :param first_end: end of the first time slice collected for this point. Buckets end at
+                      first_end + n * period
+    """
+
+    def __init__(self, topic_ids, agg_type, agg_period, first_end):
+        self.topic_ids = sorted(topic_ids)
+        self.agg_type = agg_type
+        self.agg_period = agg_period
+        self.period = period_to_timedelta(agg_period)
+        self.first_end = first_end
+        # bucket end time -> Accumulator
+        self.buckets = {}
+        self.last_closed = None
+        # end times of closed buckets that received data after they were closed
+        self.dirty = set()
+        # (start, end) time ranges for which data was not observed live. start of None is unbounded
+        self.gaps = []
+
+    @property
+    def signature(self):
+        return self.topic_ids, self.agg_type, self.agg_period
+
+    def is_aligned(self, end_time):
+        return (end_time - self.first_end) % self.period == timedelta(0)
+
+    def bucket_end(self, timestamp):
+        return self.first_end + ((timestamp - self.first_end) // self.period + 1) * self.period
+
+    def add(self, timestamp, value):
+        end = self.bucket_end(timestamp)
+        if end < self.first_end:
+            # older than anything this point will ever collect
+            return
+        if self.last_closed is not None and end <= self.last_closed:
+            self.dirty.add(end)
+            return
+        accumulator = self.buckets.get(end)
+        if accumulator is None:
+            accumulator = self.buckets[end] = Accumulator()
+        accumulator.add(value)
+
+    def to_dict(self):
+        return {
+            "topic_ids": self.topic_ids,
+            "agg_type": self.agg_type,
+            "agg_period": self.agg_period,
+            "last_closed": format_timestamp(self.last_closed) if self.last_closed else None,
+            "dirty": [format_timestamp(end) for end in sorted(self.dirty)],
+            "gaps": [[format_timestamp(start) if start else None, format_timestamp(end)]
+                     for start, end in self.gaps],
+            "buckets": {format_timestamp(end): accumulator.to_list()
+                        for end, accumulator in self.buckets.items()}
+        }
+
+    def load_dict(self, state):
+        """
+        Restore state saved with :py:meth:`to_dict`.
+
+        :return: False if the saved state does not fit the bucket grid of this point, True otherwise
+        """
+        last_closed = parse_timestamp_string(state["last_closed"]) if state.get("last_closed") else None
+        dirty = {parse_timestamp_string(end) for end in state.get("dirty", [])}
+        buckets = {parse_timestamp_string(end): Accumulator(*values)
+                   for end, values in state.get("buckets", {}).items()}
+        ends = list(dirty) + list(buckets)
+        if last_closed is not None:
+            ends.append(last_closed)
+        if not all(self.is_aligned(end) for end in ends):
+            return False
+        self.last_closed = last_closed
+        self.dirty = dirty
+        self.buckets = buckets
+        self.gaps = [(parse_timestamp_string(start) if start else None, parse_timestamp_string(end))
+                     for start, end in state.get("gaps", [])]
+        return True
+
+
+class StreamingAggregator:
+    """
+    Running aggregates of configured points keyed by aggregate topic id.
+
+    :param checkpoint_path: json file the state is saved to and restored from. None disables checkpoints
+    """
+
+    def __init__(self, checkpoint_path=None):
+        self.checkpoint_path = checkpoint_path
+        self._points = {}
+        self._previous_points = {}
+        # topic id -> list of StreamingPoints the topic is aggregated into
+        self._topic_points = {}
+        self._restored = {}
+        self._restored_time = None
+
+    def __contains__(self, agg_topic_id):
+        return agg_topic_id in self._points
+
+    def restore(self):
+        """
+        Load the last checkpoint. The state is applied to points as they are registered
+        """
+        if not self.checkpoint_path or not os.path.exists(self.checkpoint_path):
+            return
+        try:
+            with open(self.checkpoint_path) as f:
+                checkpoint = jsonapi.load(f)
+            self._restored_time = parse_timestamp_string(checkpoint["checkpoint_time"])
+            self._restored = {int(agg_topic_id): state for agg_topic_id, state in checkpoint["points"].items()}
+            _log.info("Loaded streaming aggregation state of {} points saved at {}".format(
+                len(self._restored), self._restored_time))
+        except Exception:
+            _log.exception("Unable to load streaming aggregation checkpoint {}. Missing data will be "
+                           "queried from the historian".format(self.checkpoint_path))
+            self._restored = {}
+            self._restored_time = None
+
+    def checkpoint(self):
+        """
+        Save the state of all registered points
+        """
+        if not self.checkpoint_path:
+            return
+        checkpoint = {
+            "checkpoint_time": format_timestamp(get_aware_utc_now()),
+            "points": {str(agg_topic_id): point.to_dict() for agg_topic_id, point in self._points.items()}
+        }
+        tmp_path = self.checkpoint_path + ".tmp"
+        with open(tmp_path, 'w') as f:
+            jsonapi.dump(checkpoint, f)
+        os.replace(tmp_path, self.checkpoint_path)
+
+    def reset_registrations(self):
+        """
+        Start a new set of registrations after a configuration change. State of points that are registered
+        again with the same topics, aggregation type and period is kept
+        """
+        self._previous_points.update(self._points)
+        self._points = {}
+        self._topic_points = {}
+
+    def register(self, agg_topic_id, topic_ids, agg_type, agg_period, first_end):
+        """
+        Start aggregating the given topics for an aggregate topic
+
+        :param agg_topic_id: id of the aggregate topic
+        :param topic_ids: ids of the topics to aggregate
+        :param agg_type: one of :py:data:`STREAMING_AGGREGATIONS`
+        :param agg_period: normalized aggregation period
+        :param first_end: end time of the first time slice that will be collected
+        """
+        now = get_aware_utc_now()
+        point = StreamingPoint(topic_ids, agg_type, agg_period, first_end)
+        previous = self._previous_points.pop(agg_topic_id, None)
+        restored = self._restored.pop(agg_topic_id, None)
+        if previous is not None and previous.signature == point.signature and \
+                previous.is_aligned(first_end):
+            previous.first_end = min(previous.first_end, first_end)
+            point = previous
+        elif restored is not None and \
+                (sorted(restored["topic_ids"]), restored["agg_type"], restored["agg_period"]) == point.signature \
+                and point.load_dict(restored):
+            point.gaps.append((self._restored_time, now))
+        else:
+            point.gaps = [(None, now)]
+
+        self._points[agg_topic_id] = point
+        for topic_id in point.topic_ids:
+            self._topic_points.setdefault(topic_id, []).append(point)
+
+    def add(self, topic_id, timestamp, value):
+        """
+        Add a value published for a topic
+
+        :param topic_id: id of the topic
+        :param timestamp: timestamp of the value as an aware datetime
+        :param value: published value. Values that are not numbers are counted but do not add to the sum,
+                      minimum and maximum, as when the data table is queried
+        """
+        points = self._topic_points.get(topic_id)
+        if not points:
+            return
+        for point in points:
+            point.add(timestamp, value)
+
+    def pop_dirty(self, agg_topic_id):
+        """
+        :return: sorted end times of the closed buckets of an aggregate topic that received late data
+        """
+        point = self._points[agg_topic_id]
+        dirty = sorted(point.dirty)
+        point.dirty.clear()
+        return dirty
+
+    def close(self, agg_topic_id, start_time, end_time, collect_aggregate):
+        """
+        Finish the bucket that ends at end_time and return its aggregate.
+
+        Time ranges of the bucket that were not observed live are queried with collect_aggregate and merged
+        into the result. If no data was observed for the bucket at all, the whole bucket is queried so that
+        topics that are not published on the device topics are still aggregated.
+
+        :param agg_topic_id: id of the aggregate topic
+        :param start_time: start time of the time slice (inclusive)
+        :param end_time: end time of the time slice (exclusive)
+        :param collect_aggregate: function with the signature of
+                                  :py:meth:`AggregateHistorian.collect_aggregate`
+        :return: tuple of (aggregated value, count of records)
+        """
+        point = self._points[agg_topic_id]
+        accumulator = point.buckets.pop(end_time, None) or Accumulator()
+        queried = False
+        for gap_start, gap_end in point.gaps:
+            start = start_time if gap_start is None else max(start_time, gap_start)
+            end = min(end_time, gap_end)
+            if start < end:
+                accumulator.merge(point.agg_type,
+                                  *collect_aggregate(point.topic_ids, point.agg_type, start, end))
+                queried = queried or (start == start_time and end == end_time)
+
+        if point.last_closed is None or end_time > point.last_closed:
+            point.last_closed = end_time
+        # buckets older than the closed one were never collected. Re-query them on the next collection
+        for end in [end for end in point.buckets if end < end_time]:
+            del point.buckets[end]
+            point.dirty.add(end)
+        point.gaps = [(start, end) for start, end in point.gaps if end > end_time]
+
+        if accumulator.count == 0 and not queried:
+            return collect_aggregate(point.topic_ids, point.agg_type, start_time, end_time)
+        return accumulator.value(point.agg_type), accumulator.count
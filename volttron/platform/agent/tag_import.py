@@ -0,0 +1,313 @@
+# -*- coding: utf-8 -*- {{{
+# ===----------------------------------------------------------------------===
+#
+#                 Component of Eclipse VOLTTRON
+#
+# ===----------------------------------------------------------------------===
+#
+# Copyright 2023 Battelle Memorial Institute
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not
+# use this file except in compliance with the License. You may obtain a copy
+# of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+#
+# ===----------------------------------------------------------------------===
+# }}}
+
+"""
+Streaming readers for bulk tag import files.
+
+Each reader yields (topic name or pattern, {tag: value}) tuples one record
+at a time so that files with tags for hundreds of thousands of topics are
+imported with constant memory. Supported formats are
+
+  - csv: a header row with the columns topic, tag and value followed by one
+    row per tag. An empty value is imported as a marker tag (True)
+  - json: a Haystack JSON grid ({"meta": ..., "cols": ..., "rows": [...]})
+    or a list of entities. The rows of the grid are decoded one at a time
+  - jsonl: one Haystack JSON entity per line
+
+The topic of a Haystack entity is its topic tag if present, else the value
+of its id ref. Values encoded in the Haystack 3 (``"m:"``, ``"n:72 °F"``,
+``"r:campus1"``...) or Haystack 4 (``{"_kind": "marker"}``...) JSON formats
+are converted to plain python values.
+"""
+
+import csv
+import itertools
+import json
+import os
+
+CSV = 'csv'
+JSON = 'json'
+JSON_LINES = 'jsonl'
+FORMATS = (CSV, JSON, JSON_LINES)
+
+_READ_SIZE = 64 * 1024
+_REMOVE = object()
+
+
+def get_file_format(file_path, file_format=None):
+    """
+    :param file_path: path of the import file
+    :param file_format: csv, json or jsonl. Defaults to the extension of the
+                        file
+    :return: format of the file
+    """
+    if file_format is None:
+        file_format = os.path.splitext(file_path)[1][1:]
+    file_format = file_format.lower()
+    if file_format == 'ndjson':
+        file_format = JSON_LINES
+    if file_format not in FORMATS:
+        raise ValueError("Unsupported tag file format {}. Supported formats "
+                         "are {}".format(file_format, ", ".join(FORMATS)))
+    return file_format
+
+
+def read_tag_file(file_path, file_format=None):
+    """
+    Stream the records of a tag import file
+    :param file_path: path of the import file
+    :param file_format: csv, json or jsonl. Defaults to the extension of the
+                        file
+    :return: iterator of (topic, {tag: value}) tuples
+    """
+    file_format = get_file_format(file_path, file_format)
+    if file_format == CSV:
+        return read_csv_tags(file_path)
+    if file_format == JSON_LINES:
+        return read_json_lines_tags(file_path)
+    return read_haystack_json_tags(file_path)
+
+
+def read_csv_tags(file_path):
+    with open(file_path, newline='') as f:
+        reader = csv.DictReader(f)
+        missing = {'topic', 'tag', 'value'} - set(reader.fieldnames or ())
+        if missing:
+            raise ValueError("Tag file {} is missing the column(s) {}".format(
+                file_path, ", ".join(sorted(missing))))
+        for row in reader:
+            if not row['topic'] or not row['tag']:
+                continue
+            yield row['topic'].strip(), {row['tag'].strip(): csv_value(row['value'])}
+
+
+def read_json_lines_tags(file_path):
+    with open(file_path) as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                record = haystack_entity(json.loads(line))
+                if record is not None:
+                    yield record
+
+
+def read_haystack_json_tags(file_path):
+    with open(file_path) as f:
+        for entity in iter_json_rows(f):
+            record = haystack_entity(entity)
+            if record is not None:
+                yield record
+
+
+def csv_value(value):
+    """
+    Convert the text of a csv value column to a tag value
+    """
+    if value is None or not value.strip():
+        return True
+    value = value.strip()
+    if value.lower() in ('true', 'false'):
+        return value.lower() == 'true'
+    for convert in (int, float):
+        try:
+            return convert(value)
+        except ValueError:
+            pass
+    return value
+
+
+def haystack_value(value):
+    """
+    Convert a value in Haystack 3 or Haystack 4 JSON encoding to a python
+    value
+    :return: the value, or _REMOVE for remove and NA values
+    """
+    if isinstance(value, dict):
+        kind = value.get('_kind')
+        if kind == 'marker':
+            return True
+        if kind in ('remove', 'na'):
+            return _REMOVE
+        return value.get('val', value)
+    if not isinstance(value, str):
+        return value
+    if value == '✓':
+        return True
+    if len(value) < 2 or value[1] != ':':
+        return value
+    prefix, text = value[0], value[2:]
+    if prefix == 'm':
+        return True
+    if prefix in ('z', '-'):
+        return _REMOVE
+    if prefix == 'n':
+        number = text.split(' ', 1)[0]
+        try:
+            return int(number)
+        except ValueError:
+            try:
+                return float(number)
+            except ValueError:
+                return number
+    if prefix == 'r':
+        # r:<id> <display name>
+        return text.split(' ', 1)[0].lstrip('@')
+    if prefix in 'sbudthcx':
+        return text
+    return value
+
+
+def haystack_entity(entity):
+    """
+    :param entity: dictionary of the tags of a Haystack entity
+    :return: (topic, {tag: value}) or None if the entity has no topic or id
+    """
+    tags = {}
+    for name, value in entity.items():
+        value = haystack_value(value)
+        if value is not _REMOVE:
+            tags[name] = value
+    topic = tags.pop('topic', None) or tags.get('id')
+    # the topic prefix is the unique identifier of an entity. id is
+    # generated by the tagging service
+    tags.pop('id', None)
+    if not topic:
+        return None
+    return str(topic), tags
+
+
+def iter_json_rows(f):
+    """
+    Incrementally decode the entities of a Haystack JSON grid or of a JSON
+    list of entities without loading the whole document
+    :param f: file object opened in text mode
+    :return: iterator of the decoded items of the rows list
+    """
+    reader = _JsonReader(f)
+    start = reader.next_char()
+    if start == '[':
+        yield from reader.array_items()
+        return
+    if start != '{':
+        raise ValueError("Expected a JSON grid or a list of entities")
+    while True:
+        if reader.peek() == '}':
+            return
+        key = reader.decode()
+        reader.expect(':')
+        if key == 'rows':
+            reader.expect('[')
+            yield from reader.array_items()
+        else:
+            reader.decode()
+        if reader.next_char() != ',':
+            return
+
+
+class _JsonReader:
+    """
+    Reads a JSON document in blocks and decodes one value at a time
+    """
+
+    def __init__(self, f):
+        self._file = f
+        self._decoder = json.JSONDecoder()
+        self._buffer = ''
+        self._pos = 0
+        self._eof = False
+
+    def _fill(self):
+        if self._eof:
+            return False
+        data = self._file.read(_READ_SIZE)
+        if not data:
+            self._eof = True
+            return False
+        self._buffer = self._buffer[self._pos:] + data
+        self._pos = 0
+        return True
+
+    def _skip_whitespace(self):
+        while True:
+            while self._pos < len(self._buffer) and self._buffer[self._pos].isspace():
+                self._pos += 1
+            if self._pos < len(self._buffer) or not self._fill():
+                return
+
+    def peek(self):
+        self._skip_whitespace()
+        if self._pos >= len(self._buffer):
+            raise ValueError("Unexpected end of JSON document")
+        return self._buffer[self._pos]
+
+    def next_char(self):
+        char = self.peek()
+        self._pos += 1
+        return char
+
+    def expect(self, char):
+        found = self.next_char()
+        if found != char:
+            raise ValueError("Expected '{}' but found '{}' in JSON document".format(char, found))
+
+    def decode(self):
+        self._skip_whitespace()
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(self._buffer, self._pos)
+            except json.JSONDecodeError:
+                # the value may continue in the next block
+                if not self._fill():
+                    raise
+                continue
+            if end == len(self._buffer) and self._fill():
+                # a number may continue in the next block
+                continue
+            self._pos = end
+            return value
+
+    def array_items(self):
+        if self.peek() == ']':
+            self._pos += 1
+            return
+        while True:
+            yield self.decode()
+            separator = self.next_char()
+            if separator == ']':
+                return
+            if separator != ',':
+                raise ValueError("Expected ',' or ']' but found '{}' in JSON document".format(separator))
+
+
+def batches(records, batch_size):
+    """
+    Group records into lists of up to batch_size records
+    """
+    records = iter(records)
+    batch_size = max(1, int(batch_size))
+    while True:
+        batch = list(itertools.islice(records, batch_size))
+        if not batch:
+            return
+        yield batch
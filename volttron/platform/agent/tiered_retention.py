@@ -0,0 +1,290 @@
+# -*- coding: utf-8 -*- {{{
+# ===----------------------------------------------------------------------===
+#
+#                 Component of Eclipse VOLTTRON
+#
+# ===----------------------------------------------------------------------===
+#
+# Copyright 2023 Battelle Memorial Institute
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not
+# use this file except in compliance with the License. You may obtain a copy
+# of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+#
+# ===----------------------------------------------------------------------===
+# }}}
+
+"""
+Tiered retention of historian data.
+
+Raw data is kept for ``raw_days``. Older raw data is compacted into rollups
+of one or more aggregation periods, for example 5 minute rollups kept for two
+years and hourly rollups kept forever, and then deleted. Rollups are written
+to the same <agg_type>_<agg_period> tables and aggregate topics as the
+aggregate historians, with the raw topic as aggregate topic name, so they are
+read with the agg_type and agg_period parameters of the historian's query
+RPC.
+
+Compaction is incremental. Each run compacts up to ``compaction_hours`` of
+the oldest raw data and commits the rollups before the raw rows are deleted,
+so an interrupted run is repeated from the same raw data. Rollups of all
+tiers are computed from the count, sum, minimum and maximum of the raw data
+of each topic, queried once per slice of the shortest period.
+
+Existing rollups are never replaced. Raw data that arrives late for a window
+that was already compacted would be rolled up alone, so it is deleted with
+the next run without changing the complete rollup of that window.
+"""
+
+import logging
+import time
+from datetime import datetime, timedelta
+
+import pytz
+
+from volttron.platform.agent import utils
+from volttron.platform.agent.base_aggregate_historian import AggregateHistorian
+from volttron.platform.agent.streaming_aggregate import (STREAMING_AGGREGATIONS, Accumulator,
+                                                         period_to_timedelta)
+from volttron.platform.dbutils.basedb import DbDriver
+
+_log = logging.getLogger(__name__)
+
+# metadata types of the topics that are rolled up. Other topics are only deleted
+NUMERIC_TYPES = ('integer', 'int', 'float', 'double', 'long', 'number')
+DEFAULT_AGG_TYPES = ('avg', 'min', 'max')
+EPOCH = datetime(1970, 1, 1, tzinfo=pytz.UTC)
+
+
+def align_time(ts, period):
+    """
+    :return: the start of the period that contains ts. Periods are aligned to
+             multiples of the period since the Unix epoch (UTC)
+    """
+    return ts - (ts - EPOCH) % period
+
+
+class RollupTier:
+    """
+    Aggregates of one aggregation period
+
+    :param agg_period: aggregation period such as 5m or 1h. Monthly periods
+                       are not supported
+    :param agg_types: aggregation types stored. One or more of avg, sum,
+                      min, max and count
+    :param keep_days: days rollups are kept. None keeps them forever
+    """
+
+    def __init__(self, agg_period, agg_types=DEFAULT_AGG_TYPES, keep_days=None):
+        self.agg_period = AggregateHistorian.normalize_aggregation_time_period(agg_period)
+        self.period = period_to_timedelta(self.agg_period)
+        if self.period is None:
+            raise ValueError("Monthly rollup period {} is not supported".format(agg_period))
+        if isinstance(agg_types, str):
+            agg_types = [agg_types]
+        self.agg_types = [agg_type.lower() for agg_type in agg_types]
+        for agg_type in self.agg_types:
+            if agg_type not in STREAMING_AGGREGATIONS:
+                raise ValueError("Invalid rollup aggregation type {}. Valid types are {}".format(
+                    agg_type, STREAMING_AGGREGATIONS))
+        self.keep = timedelta(days=float(keep_days)) if keep_days else None
+
+
+class TieredRetention:
+    """
+    Compacts raw historian data into rollup tiers.
+
+    Example configuration::
+
+        {
+            "raw_days": 30,
+            "rollups": [
+                {"agg_period": "5m", "agg_types": ["avg", "min", "max"], "keep_days": 730},
+                {"agg_period": "1h", "agg_types": ["avg", "min", "max"]}
+            ],
+            "compaction_interval": 300,
+            "compaction_hours": 24
+        }
+
+    :param raw_days: days raw data is kept before it is compacted
+    :param rollups: list of rollup tier configurations. See
+                    :py:class:`RollupTier`. Each period must be a multiple of
+                    the shorter periods
+    :param compaction_interval: minimum seconds between compaction runs
+    :param compaction_hours: hours of raw data compacted per run
+    """
+    # maximum number of topic ids in a single grouped aggregate query
+    QUERY_MAX_TOPICS = 500
+    # rollups buffered before they are inserted
+    INSERT_BATCH_SIZE = 10000
+    # DbDriver methods a database driver must implement to compact its data
+    REQUIRED_METHODS = ('get_oldest_data_ts', 'delete_data_before', 'delete_aggregates_before',
+                        'collect_topic_aggregates', 'insert_new_aggregate_stmt')
+
+    def __init__(self, raw_days, rollups, compaction_interval=300, compaction_hours=24):
+        self.raw_age = timedelta(days=float(raw_days))
+        if self.raw_age <= timedelta(0):
+            raise ValueError("raw_days must be greater than 0")
+        if not rollups:
+            raise ValueError("At least one rollup tier must be configured")
+        self.tiers = sorted((RollupTier(**tier) for tier in rollups), key=lambda tier: tier.period)
+        for shorter, longer in zip(self.tiers, self.tiers[1:]):
+            if longer.period % shorter.period:
+                raise ValueError("Rollup period {} is not a multiple of {}".format(
+                    longer.agg_period, shorter.agg_period))
+        # every run compacts whole periods of the longest tier
+        self.window = self.tiers[-1].period
+        self.batch = max(self.window, self.window * int(timedelta(hours=float(compaction_hours)) / self.window))
+        self.compaction_interval = float(compaction_interval)
+        self._last_run = None
+        self._stores_created = False
+
+    @classmethod
+    def from_config(cls, config):
+        """
+        :param config: retention configuration dictionary. See :py:class:`TieredRetention`
+        :return: TieredRetention or None if config is empty
+        """
+        if not config:
+            return None
+        return cls(config.get('raw_days', 30), config.get('rollups'),
+                   config.get('compaction_interval', 300), config.get('compaction_hours', 24))
+
+    @classmethod
+    def check_support(cls, dbfuncts_class):
+        """
+        :param dbfuncts_class: :py:class:`volttron.platform.dbutils.basedb.DbDriver` subclass of the historian
+        :raises ValueError: if the database driver does not implement the methods used for compaction
+        """
+        missing = [name for name in cls.REQUIRED_METHODS
+                   if getattr(dbfuncts_class, name) is getattr(DbDriver, name)]
+        if missing:
+            raise ValueError("Tiered retention is not supported by {}. It does not implement {}".format(
+                dbfuncts_class.__name__, ", ".join(missing)))
+
+    def run_if_due(self, dbfuncts):
+        """
+        Compact raw data if compaction_interval seconds passed since the last run
+
+        :return: end of the compacted raw data or None if nothing was compacted
+        """
+        if self._last_run is not None and time.time() - self._last_run < self.compaction_interval:
+            return None
+        self._last_run = time.time()
+        return self.compact(dbfuncts)
+
+    def compact(self, dbfuncts, now=None):
+        """
+        Compact up to compaction_hours of raw data older than raw_days and
+        delete rollups that are past their keep_days.
+
+        :param dbfuncts: :py:class:`volttron.platform.dbutils.basedb.DbDriver` of the historian
+        :param now: current time. Defaults to the current UTC time
+        :return: end of the compacted raw data or None if there was nothing to compact
+        """
+        if now is None:
+            now = utils.get_aware_utc_now()
+        if not self._stores_created:
+            dbfuncts.setup_aggregate_historian_tables()
+            for tier in self.tiers:
+                for agg_type in tier.agg_types:
+                    dbfuncts.create_aggregate_store(agg_type, tier.agg_period)
+            self._stores_created = True
+
+        compacted = None
+        cutoff = align_time(now - self.raw_age, self.window)
+        oldest = dbfuncts.get_oldest_data_ts()
+        if oldest is not None and oldest < cutoff:
+            start = align_time(oldest, self.window)
+            end = min(cutoff, start + self.batch)
+            count = self._write_rollups(dbfuncts, start, end)
+            # rollups are committed, the raw data can be removed
+            deleted = dbfuncts.delete_data_before(end)
+            _log.info("Compacted raw data between {} and {} into {} rollups. Deleted {} rows".format(
+                start, end, count, deleted))
+            compacted = end
+
+        for tier in self.tiers:
+            if tier.keep is None:
+                continue
+            for agg_type in tier.agg_types:
+                deleted = dbfuncts.delete_aggregates_before(agg_type, tier.agg_period, now - tier.keep)
+                if deleted:
+                    _log.debug("Deleted {} expired {}_{} rollups".format(deleted, agg_type, tier.agg_period))
+        return compacted
+
+    def _get_rollup_topics(self, dbfuncts):
+        """
+        :return: list of (topic_id, topic_name) of numeric topics, ordered by topic id
+        """
+        id_map, name_map = dbfuncts.get_topic_map()
+        meta_map = dbfuncts.get_topic_meta_map()
+        topics = []
+        for lower_name, topic_id in id_map.items():
+            meta = meta_map.get(topic_id) or {}
+            if str(meta.get('type', '')).lower() in NUMERIC_TYPES:
+                topics.append((topic_id, name_map[lower_name]))
+        return sorted(topics)
+
+    def _write_rollups(self, dbfuncts, start, end):
+        """
+        Compute and commit the rollups of all tiers for the raw data between start and end
+        :return: number of rollups written
+        """
+        topics = self._get_rollup_topics(dbfuncts)
+        names = dict(topics)
+        topic_ids = [topic_id for topic_id, _ in topics]
+        agg_topic_map = dbfuncts.get_agg_topic_map()
+        # accumulators of the open bucket of each tier, by topic id
+        buckets = [{} for _ in self.tiers]
+        records = []
+        count = 0
+
+        def agg_topic_id(topic_id, agg_type, agg_period):
+            key = (names[topic_id].lower(), agg_type, agg_period)
+            agg_id = agg_topic_map.get(key)
+            if agg_id is None:
+                agg_id = agg_topic_map[key] = dbfuncts.insert_agg_topic(names[topic_id], agg_type, agg_period)
+                dbfuncts.insert_agg_meta(agg_id, {'configured_topics': names[topic_id]})
+            return agg_id
+
+        def close_bucket(index, bucket_end):
+            tier = self.tiers[index]
+            for topic_id, accumulator in buckets[index].items():
+                for agg_type in tier.agg_types:
+                    value = accumulator.value(agg_type)
+                    if value is not None:
+                        records.append((agg_type, tier.agg_period, bucket_end,
+                                        agg_topic_id(topic_id, agg_type, tier.agg_period), value, [topic_id]))
+            buckets[index] = {}
+
+        slice_start = start
+        while slice_start < end:
+            slice_end = slice_start + self.tiers[0].period
+            for i in range(0, len(topic_ids), self.QUERY_MAX_TOPICS):
+                aggregates = dbfuncts.collect_topic_aggregates(topic_ids[i:i + self.QUERY_MAX_TOPICS],
+                                                               slice_start, slice_end)
+                for topic_id, values in aggregates.items():
+                    for bucket in buckets:
+                        bucket.setdefault(topic_id, Accumulator()).combine(*values)
+            for index, tier in enumerate(self.tiers):
+                if (slice_end - EPOCH) % tier.period == timedelta(0):
+                    close_bucket(index, slice_end)
+            if len(records) >= self.INSERT_BATCH_SIZE:
+                count += len(records)
+                dbfuncts.insert_aggregates(records, replace=False)
+                records = []
+            slice_start = slice_end
+
+        count += len(records)
+        # commits new aggregate topics even if there are no records
+        dbfuncts.insert_aggregates(records, replace=False)
+        return count
@@ -26,12 +26,17 @@
 import contextlib
 import importlib
 import logging
+import re
 import threading
 import sqlite3
 import sys
 from abc import abstractmethod
+from collections import defaultdict
+from datetime import datetime, timedelta
 from gevent.local import local
 
+import pytz
+
 from volttron.platform.agent import utils
 from volttron.platform import jsonapi
 
@@ -39,6 +44,10 @@ utils.setup_logging()
 _log = logging.getLogger(__name__)
 
 
+# Supported time periods for partitioning of historian data tables
+PARTITION_PERIODS = ('month', 'week')
+
+
 class ConnectionError(Exception):
     """
     Custom class for connection errors
@@ -46,6 +55,86 @@ class ConnectionError(Exception):
     pass
 
 
+def validate_partition_period(partition_period):
+    """
+    Validate the partition_period connection parameter
+    :param partition_period: None, 'month' or 'week'
+    :return: the validated partition period in lower case or None
+    """
+    if not partition_period:
+        return None
+    if str(partition_period).lower() not in PARTITION_PERIODS:
+        raise ValueError(f"Invalid partition_period {partition_period}. Valid values are {PARTITION_PERIODS}")
+    return str(partition_period).lower()
+
+
+def get_partition_bounds(ts, partition_period):
+    """
+    Get the time range of the data partition that contains the given timestamp
+    :param ts: timestamp. Naive timestamps are assumed to be in UTC
+    :param partition_period: 'month' or 'week'. Weekly partitions start on Monday
+    :return: tuple of (start, end) as UTC datetimes. start is inclusive and end is exclusive
+    """
+    if ts.tzinfo is None:
+        ts = ts.replace(tzinfo=pytz.UTC)
+    else:
+        ts = ts.astimezone(pytz.UTC)
+    if partition_period == 'month':
+        start = datetime(ts.year, ts.month, 1, tzinfo=pytz.UTC)
+        end = datetime(ts.year + ts.month // 12, ts.month % 12 + 1, 1, tzinfo=pytz.UTC)
+    elif partition_period == 'week':
+        start = datetime(ts.year, ts.month, ts.day, tzinfo=pytz.UTC) - timedelta(days=ts.weekday())
+        end = start + timedelta(days=7)
+    else:
+        raise ValueError(f"Invalid partition_period {partition_period}. Valid values are {PARTITION_PERIODS}")
+    return start, end
+
+
+def get_partition_name(table_name, partition_period, start):
+    """
+    :return: name of the partition of table_name that starts at the given time.
+    For example data_month_20240101 or data_week_20240108
+    """
+    return f"{table_name}_{partition_period}_{start.strftime('%Y%m%d')}"
+
+
+def parse_partition_name(table_name, name):
+    """
+    Parse a table name created by :py:func:`get_partition_name`
+    :param table_name: name of the partitioned table
+    :param name: name of a table in the database
+    :return: tuple of (start, end, name) if name is a partition of table_name, None otherwise
+    """
+    match = re.match(r'^{}_({})_(\d{{8}})$'.format(re.escape(table_name), '|'.join(PARTITION_PERIODS)), name)
+    if not match:
+        return None
+    start = datetime.strptime(match.group(2), '%Y%m%d').replace(tzinfo=pytz.UTC)
+    return get_partition_bounds(start, match.group(1)) + (name,)
+
+
+def filter_partitions(partitions, start=None, end=None):
+    """
+    Prune partitions that cannot contain data between start and end
+    :param partitions: list of tuples (partition start, partition end, name)
+    :param start: start of the time range (inclusive)
+    :param end: end of the time range (exclusive)
+    :return: list of partitions that overlap the time range, ordered by time
+    """
+    if start is not None and start.tzinfo is None:
+        start = start.replace(tzinfo=pytz.UTC)
+    if end is not None and end.tzinfo is None:
+        end = end.replace(tzinfo=pytz.UTC)
+    result = []
+    for partition in sorted(partitions):
+        if start is not None and partition[1] <= start:
+            continue
+        # a query where start == end is a query for that exact timestamp
+        if end is not None and (partition[0] > end or (partition[0] == end and start != end)):
+            continue
+        result.append(partition)
+    return result
+
+
 @contextlib.contextmanager
 def closing(obj):
     try:
@@ -265,6 +354,41 @@ class DbDriver:
         """
         pass
 
+    def get_data_partitions(self, start=None, end=None):
+        """
+        Optional function for data stores that support partitioning the data table by time.
+        :param start: if not None only return partitions that contain data at or after this time
+        :param end: if not None only return partitions that contain data before this time
+        :return: list of tuples (partition start, partition end, partition table name) ordered by time
+        """
+        return []
+
+    def get_oldest_data_ts(self):
+        """
+        Used by tiered retention to find the raw data that has not been compacted yet.
+        :return: timestamp of the oldest row of raw data as a UTC datetime, None if there is no data
+        """
+        raise NotImplementedError("get_oldest_data_ts is not supported by {}".format(self.__class__.__name__))
+
+    def delete_data_before(self, end):
+        """
+        Delete and commit all raw data older than the given time. Partitions of the data table that only contain
+        data older than end are dropped.
+        :param end: delete rows with a timestamp before this time
+        :return: number of rows deleted from tables that were not dropped
+        """
+        raise NotImplementedError("delete_data_before is not supported by {}".format(self.__class__.__name__))
+
+    def delete_aggregates_before(self, agg_type, period, end):
+        """
+        Delete and commit the aggregates of the <agg_type>_<period> table older than the given time
+        :param agg_type: type of aggregation
+        :param period: time period of aggregation
+        :param end: delete aggregates with a timestamp before this time
+        :return: number of rows deleted
+        """
+        raise NotImplementedError("delete_aggregates_before is not supported by {}".format(self.__class__.__name__))
+
     def insert_meta(self, topic_id, metadata):
         """
         Inserts metadata for topic
@@ -492,6 +616,33 @@ class DbDriver:
         """
         pass
 
+    def stream_data(self, topic_ids, start=None, end=None, fetch_size=10000):
+        """
+        Read the raw data of topics for bulk exports. Rows are read with a
+        server side cursor where the database supports one and are fetched
+        fetch_size at a time, so memory use does not depend on the number of
+        rows read.
+        :param topic_ids: list of topic ids
+        :param start: if not None only return rows at or after this time
+        :param end: if not None only return rows before this time
+        :param fetch_size: number of rows fetched from the database at a time
+        :return: iterator of (topic_id, ts, value_string) tuples ordered by
+                 topic_id and ts
+        """
+        raise NotImplementedError("stream_data is not supported by {}".format(self.__class__.__name__))
+
+    @staticmethod
+    def _iter_cursor(cursor, fetch_size):
+        """
+        Yield the rows of an executed cursor, fetching fetch_size rows at a time, and close the cursor
+        """
+        with closing(cursor):
+            while True:
+                rows = cursor.fetchmany(fetch_size)
+                if not rows:
+                    return
+                yield from rows
+
     @abstractmethod
     def create_aggregate_store(self, agg_type, period):
         """
@@ -513,6 +664,17 @@ class DbDriver:
         """
         pass
 
+    def insert_new_aggregate_stmt(self, table_name):
+        """
+        The sql statement to insert collected aggregates that do not exist yet. An existing aggregate of the same
+        topic and time is kept
+        :param table_name: name of the table into which the aggregate data needs to be inserted
+        :return: sql insert statement that skips existing aggregates
+        :rtype: str
+        """
+        raise NotImplementedError("insert_new_aggregate_stmt is not supported by {}".format(
+            self.__class__.__name__))
+
     def insert_aggregate(self, agg_topic_id, agg_type, period, ts, data, topic_ids):
         """
         Insert aggregate data collected for a specific  time period into
@@ -532,6 +694,36 @@ class DbDriver:
                           (ts, agg_topic_id, data, str(topic_ids)), commit=True)
         return True
 
+    def insert_aggregates(self, records, replace=True):
+        """
+        Insert many aggregates with one statement per aggregate table and a single commit
+        :param records: list of (agg_type, period, ts, agg_topic_id, data, topic_ids) tuples. See
+        :py:meth:`insert_aggregate` for a description of the values
+        :param replace: True replaces existing aggregates of the same topic and time, False keeps them
+        :return: True if execution was successful, raises exception in case of connection failures
+        """
+        insert_stmt = self.insert_aggregate_stmt if replace else self.insert_new_aggregate_stmt
+        tables = defaultdict(list)
+        for agg_type, period, ts, agg_topic_id, data, topic_ids in records:
+            tables[agg_type + '_' + period].append((ts, agg_topic_id, data, str(topic_ids)))
+        for table_name, rows in tables.items():
+            _log.debug("Inserting {} aggregates into table {}".format(len(rows), table_name))
+            self.execute_many(insert_stmt(table_name), rows)
+        self.commit()
+        return True
+
+    def collect_topic_aggregates(self, topic_ids, start=None, end=None):
+        """
+        Compute the count, sum, minimum and maximum of the raw data of each topic in a single grouped query.
+        Aggregates such as avg across several topics can be derived from these values without another query.
+        :param topic_ids: list of topic ids
+        :param start: start time for query (inclusive)
+        :param end:  end time for query (exclusive)
+        :return: dictionary of {topic_id: (count, sum, min, max)}. Topics without records in the time range are
+        not included
+        """
+        raise NotImplementedError("Grouped aggregate collection is not supported by " + self.__class__.__name__)
+
     @abstractmethod
     def collect_aggregate(self, topic_ids, agg_type, start=None, end=None):
         """
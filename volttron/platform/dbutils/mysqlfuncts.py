@@ -37,6 +37,9 @@ from volttron.platform import jsonapi
 utils.setup_logging()
 _log = logging.getLogger(__name__)
 
+# values are stored as text, this condition matches the values that are numbers
+NUMERIC_VALUE = "value_string REGEXP '^[-+]?[0-9]*[.]?[0-9]+([eE][-+]?[0-9]+)?$'"
+
 """
 Implementation of Mysql database operation for
 :py:class:`sqlhistorian.historian.SQLHistorian` and
@@ -45,9 +48,15 @@ For method details please refer to base class
 :py:class:`volttron.platform.dbutils.basedb.DbDriver`
 """
 class MySqlFuncts(DbDriver):
+    # bytes reserved in each statement for the packet header and the statement text outside of the values
+    PACKET_OVERHEAD = 1024
+    # upper bound on rows per multi-row insert statement, independent of max_allowed_packet
+    MAX_ROWS_PER_INSERT = 10000
+
     def __init__(self, connect_params, table_names):
         # kwargs['dbapimodule'] = 'mysql.connector'
         self.MICROSECOND_SUPPORT = None
+        self._max_allowed_packet = None
         self.db_name = connect_params.get('database')
 
         self.data_table = None
@@ -172,6 +181,37 @@ class MySqlFuncts(DbDriver):
             self.commit()
         _log.debug(f"Created aggregate topics and meta tables: {self.agg_topics_table}  and {self.agg_meta_table}")
 
+    def _get_time_bound(self, ts):
+        """
+        Convert a query start or end time to UTC, without microseconds if the database does not support them
+        """
+        if ts is None:
+            return None
+        if ts.tzinfo != pytz.UTC:
+            ts = ts.astimezone(pytz.UTC)
+        if not self.MICROSECOND_SUPPORT:
+            ts_str = ts.isoformat()
+            ts = ts_str[:ts_str.rfind('.')]
+        return ts
+
+    def stream_data(self, topic_ids, start=None, end=None, fetch_size=10000):
+        if self.MICROSECOND_SUPPORT is None:
+            self.init_microsecond_support()
+        where_clauses = ["WHERE topic_id IN ({})".format(", ".join(["%s"] * len(topic_ids)))]
+        args = list(topic_ids)
+        start = self._get_time_bound(start)
+        end = self._get_time_bound(end)
+        if start:
+            where_clauses.append("ts >= %s")
+            args.append(start)
+        if end:
+            where_clauses.append("ts < %s")
+            args.append(end)
+        # the default cursor of mysql.connector is unbuffered, so rows are read from the server as they are fetched
+        cursor = self.select('SELECT topic_id, ts, value_string FROM ' + self.data_table + ' ' +
+                             ' AND '.join(where_clauses) + ' ORDER BY topic_id ASC, ts ASC', args, fetch_all=False)
+        return self._iter_cursor(cursor, fetch_size)
+
     def query(self, topic_ids, id_name_map, start=None, end=None, skip=0,
               agg_type=None, agg_period=None, count=None,
               order="FIRST_TO_LAST"):
@@ -194,19 +234,8 @@ class MySqlFuncts(DbDriver):
         where_clauses = ["WHERE topic_id = %s"]
         args = [topic_ids[0]]
 
-        if start is not None:
-            if start.tzinfo != pytz.UTC:
-                start = start.astimezone(pytz.UTC)
-            if not self.MICROSECOND_SUPPORT:
-                start_str = start.isoformat()
-                start = start_str[:start_str.rfind('.')]
-
-        if end is not None:
-            if end.tzinfo != pytz.UTC:
-                end = end.astimezone(pytz.UTC)
-            if not self.MICROSECOND_SUPPORT:
-                end_str = end.isoformat()
-                end = end_str[:end_str.rfind('.')]
+        start = self._get_time_bound(start)
+        end = self._get_time_bound(end)
 
         if start and end and start == end:
             where_clauses.append("ts = %s")
@@ -298,12 +327,12 @@ class MySqlFuncts(DbDriver):
         yield insert_data
 
         if records:
-            query = f"""
-INSERT INTO {self.data_table} (ts, topic_id, value_string) VALUES(%s, %s, %s)
-ON DUPLICATE KEY UPDATE value_string=VALUES(value_string);
-"""
-            _log.debug(f"calling execute many with records {len(records)}")
-            self.execute_many(query, records)
+            _log.debug(f"calling batched insert with records {len(records)}")
+            self.execute_batched_insert(
+                f"INSERT INTO {self.data_table} (ts, topic_id, value_string) VALUES ",
+                "(%s, %s, %s)",
+                " ON DUPLICATE KEY UPDATE value_string=VALUES(value_string)",
+                records)
 
     @contextlib.contextmanager
     def bulk_insert_meta(self):
@@ -330,12 +359,87 @@ ON DUPLICATE KEY UPDATE value_string=VALUES(value_string);
         yield insert_meta
 
         if meta:
-            query = f"""
-            INSERT INTO {self.meta_table} (topic_id, metadata) VALUES(%s, %s)
-            ON DUPLICATE KEY UPDATE metadata=VALUES(metadata);
-            """
-            _log.debug(f"###DEBUG calling execute many with meta len {len(meta)}")
-            self.execute_many(query, meta)
+            _log.debug(f"calling batched insert with meta len {len(meta)}")
+            self.execute_batched_insert(
+                f"INSERT INTO {self.meta_table} (topic_id, metadata) VALUES ",
+                "(%s, %s)",
+                " ON DUPLICATE KEY UPDATE metadata=VALUES(metadata)",
+                meta)
+
+    def get_max_allowed_packet(self):
+        """
+        :return: the server's max_allowed_packet in bytes. Value is read once and cached
+        """
+        if self._max_allowed_packet is None:
+            rows = self.select("SELECT @@max_allowed_packet", None)
+            self._max_allowed_packet = int(rows[0][0])
+            _log.debug(f"MySQL max_allowed_packet is {self._max_allowed_packet}")
+        return self._max_allowed_packet
+
+    @staticmethod
+    def _estimate_row_size(row):
+        # worst case size of the row once rendered into the statement. Escaping can at most double the length
+        # of a string value, plus quotes and separators
+        size = 3
+        for value in row:
+            if isinstance(value, str):
+                size += 2 * len(value.encode('utf-8')) + 4
+            else:
+                size += len(str(value)) + 6
+        return size
+
+    def execute_batched_insert(self, prefix, row_template, suffix, rows):
+        """
+        Insert rows with multi-row INSERT statements of the form
+        prefix + row_template, row_template, ... + suffix. Rows are split across as few statements as possible
+        such that no statement exceeds the server's max_allowed_packet.
+
+        :param prefix: start of the statement up to and including VALUES
+        :param row_template: placeholders for a single row, for example "(%s, %s)"
+        :param suffix: end of the statement, for example an ON DUPLICATE KEY UPDATE clause
+        :param rows: list of tuples with values for row_template
+        :return: count of the number of affected rows
+        """
+        budget = self.get_max_allowed_packet() - len(prefix) - len(suffix) - self.PACKET_OVERHEAD
+        rowcount = 0
+        with contextlib.closing(self.cursor()) as cursor:
+            start = 0
+            while start < len(rows):
+                end = start
+                size = 0
+                while end < len(rows) and (end == start or end - start < self.MAX_ROWS_PER_INSERT):
+                    row_size = self._estimate_row_size(rows[end])
+                    if end > start and size + row_size > budget:
+                        break
+                    size += row_size
+                    end += 1
+                batch = rows[start:end]
+                stmt = prefix + ", ".join([row_template] * len(batch)) + suffix
+                cursor.execute(stmt, [value for row in batch for value in row])
+                rowcount += cursor.rowcount
+                start = end
+        return rowcount
+
+    def get_oldest_data_ts(self):
+        rows = self.select('SELECT min(ts) FROM ' + self.data_table)
+        if not rows or rows[0][0] is None:
+            return None
+        return rows[0][0].replace(tzinfo=pytz.UTC)
+
+    def delete_data_before(self, end):
+        if self.MICROSECOND_SUPPORT is None:
+            self.init_microsecond_support()
+        count = self.execute_stmt('DELETE FROM ' + self.data_table + ' WHERE ts < %s', (self._get_time_bound(end),))
+        self.commit()
+        return count
+
+    def delete_aggregates_before(self, agg_type, period, end):
+        if self.MICROSECOND_SUPPORT is None:
+            self.init_microsecond_support()
+        count = self.execute_stmt('DELETE FROM ' + agg_type + '_' + period + ' WHERE ts < %s',
+                                  (self._get_time_bound(end),))
+        self.commit()
+        return count
 
     def insert_meta_query(self):
         return '''REPLACE INTO ''' + self.meta_table + ''' (topic_id, metadata) ''' + ''' VALUES(%s, %s)'''
@@ -491,13 +595,22 @@ ON DUPLICATE KEY UPDATE value_string=VALUES(value_string);
         return '''REPLACE INTO ''' + table_name + \
                ''' values(%s, %s, %s, %s)'''
 
+    def insert_new_aggregate_stmt(self, table_name):
+        return '''INSERT INTO ''' + table_name + \
+               ''' values(%s, %s, %s, %s) ON DUPLICATE KEY UPDATE ts = ts'''
+
     def collect_aggregate(self, topic_ids, agg_type, start=None, end=None):
         if isinstance(agg_type, str):
             if agg_type.upper() not in ['AVG', 'MIN', 'MAX', 'COUNT', 'SUM']:
                 raise ValueError(
                     "Invalid aggregation type {}".format(agg_type))
+        # values are stored as text, numbers are converted so that minimum and maximum compare them as numbers.
+        # The minimum or maximum of the text is used if none of the values are numbers
+        min_max = agg_type.upper() in ('MIN', 'MAX')
+        value = 'CASE WHEN ' + NUMERIC_VALUE + ' THEN value_string + 0 END' if min_max else 'value_string'
         query = '''SELECT ''' \
-                + agg_type + '''(value_string), count(value_string) FROM ''' \
+                + agg_type + '''(''' + value + '''), count(value_string)''' \
+                + (''', ''' + agg_type + '''(value_string)''' if min_max else '') + ''' FROM ''' \
                 + self.data_table + ''' {where}'''
         where_clauses = ["WHERE topic_id = %s"]
         args = [topic_ids[0]]
@@ -537,6 +650,41 @@ ON DUPLICATE KEY UPDATE value_string=VALUES(value_string);
 
         rows = self.select(real_query, args)
         if rows:
+            if min_max and rows[0][0] is None:
+                return rows[0][2], rows[0][1]
             return rows[0][0], rows[0][1]
         else:
             return 0, 0
+
+    def collect_topic_aggregates(self, topic_ids, start=None, end=None):
+        where_clauses = ["WHERE topic_id IN (" + ", ".join(["%s"] * len(topic_ids)) + ")"]
+        args = list(topic_ids)
+        if self.MICROSECOND_SUPPORT is None:
+            self.init_microsecond_support()
+
+        if start is not None:
+            where_clauses.append("ts >= %s")
+            if self.MICROSECOND_SUPPORT:
+                args.append(start)
+            else:
+                start_str = start.isoformat()
+                args.append(start_str[:start_str.rfind('.')])
+
+        if end is not None:
+            where_clauses.append("ts < %s")
+            if self.MICROSECOND_SUPPORT:
+                args.append(end)
+            else:
+                end_str = end.isoformat()
+                args.append(end_str[:end_str.rfind('.')])
+
+        # values are stored as text, the minimum and maximum are those of the values that are numbers
+        number = "CASE WHEN " + NUMERIC_VALUE + " THEN value_string + 0 END"
+        real_query = "SELECT topic_id, count(value_string), sum(value_string), min(" + number + "), " \
+                     "max(" + number + ") FROM " + self.data_table + " " + ' AND '.join(where_clauses) + \
+                     " GROUP BY topic_id"
+        _log.debug("Real Query: " + real_query)
+        _log.debug("args: " + str(args))
+
+        rows = self.select(real_query, args)
+        return {row[0]: tuple(row[1:]) for row in rows}
@@ -18,19 +18,24 @@
 
 import ast
 import contextlib
+import csv
+import io
 import logging
 import copy
+import sys
+from datetime import datetime
 
 import pytz
 import psycopg2
-from psycopg2 import InterfaceError, ProgrammingError, errorcodes
+from psycopg2 import InterfaceError, OperationalError, ProgrammingError, errorcodes
 from psycopg2.sql import Identifier, Literal, SQL
 from psycopg2.extras import execute_values
 
 from volttron.platform.agent import utils
 from volttron.platform import jsonapi
 
-from .basedb import DbDriver
+from .basedb import (DbDriver, validate_partition_period, get_partition_bounds, get_partition_name,
+                     parse_partition_name, filter_partitions)
 
 utils.setup_logging()
 _log = logging.getLogger(__name__)
@@ -44,6 +49,10 @@ For method details please refer to base class
 :py:class:`volttron.platform.dbutils.basedb.DbDriver`
 """
 class PostgreSqlFuncts(DbDriver):
+    # Batches smaller than this are inserted with INSERT ... VALUES as the fixed cost of the COPY path
+    # (temp table setup and merge) outweighs its benefit.
+    COPY_MIN_RECORDS = 100
+
     def __init__(self, connect_params, table_names):
         self.db_name = connect_params.get('dbname')
         if table_names:
@@ -58,13 +67,25 @@ class PostgreSqlFuncts(DbDriver):
             del connect_params["timescale_dialect"]
         else:
             self.timescale_dialect = False
-        def connect():
+        # Optional native range partitioning of the data table by month or week.
+        # Only applied when the historian creates the data table.
+        self.partition_period = validate_partition_period(connect_params.pop("partition_period", None))
+        if self.partition_period and self.timescale_dialect:
+            _log.warning("partition_period is ignored when timescale_dialect is enabled. "
+                         "TimescaleDB hypertables are already partitioned by time")
+            self.partition_period = None
+        self._partition_tables = set()
+        # Load bulk inserts with COPY FROM STDIN into a temporary table and merge into the data table.
+        # Set to False to always use INSERT ... ON CONFLICT
+        self.copy_bulk_insert = bool(connect_params.pop("copy_bulk_insert", True))
+        def connect(autocommit=True):
             connection = psycopg2.connect(**connect_params)
-            connection.autocommit = True
+            connection.autocommit = autocommit
             with connection.cursor() as cursor:
                 cursor.execute('SET TIME ZONE UTC')
             return connection
         connect.__name__ = 'psycopg2'
+        self._connect = connect
         super(PostgreSqlFuncts, self).__init__(connect)
 
     @contextlib.contextmanager
@@ -97,12 +118,66 @@ class PostgreSqlFuncts(DbDriver):
         yield insert_data
 
         if records:
+            if self.partition_period:
+                for ts in {record[0] for record in records}:
+                    self._get_partition_table(ts)
+            if self.copy_bulk_insert and len(records) >= self.COPY_MIN_RECORDS:
+                try:
+                    self._copy_insert(records)
+                    return
+                except (InterfaceError, OperationalError):
+                    # connection problems. the fallback would fail too
+                    raise
+                except psycopg2.Error:
+                    _log.exception("Bulk insert using COPY failed. Falling back to INSERT for this and all "
+                                   "subsequent inserts")
+                    self.copy_bulk_insert = False
             query = SQL('INSERT INTO {} VALUES %s '
                         'ON CONFLICT (ts, topic_id) DO UPDATE '
                         'SET value_string = EXCLUDED.value_string').format(
                             Identifier(self.data_table))
             execute_values(self.cursor(), query, records)
 
+    def _copy_insert(self, records):
+        """
+        Stream records into a session temporary table with COPY and merge them into the data table with upsert
+        semantics. If the same (topic_id, ts) occurs more than once, the last record wins, same as the row by row
+        insert.
+
+        :param records: list of (ts, topic_id, value_string) tuples
+        """
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        for ts, topic_id, value in records:
+            if isinstance(ts, datetime):
+                # ts column is TIMESTAMP without time zone and holds UTC values
+                if ts.tzinfo is not None:
+                    ts = ts.astimezone(pytz.UTC).replace(tzinfo=None)
+                ts = ts.isoformat()
+            writer.writerow((ts, topic_id, value))
+        buffer.seek(0)
+
+        temp_table = Identifier(self.data_table + '_copy')
+        with self.cursor() as cursor:
+            cursor.execute(SQL(
+                'CREATE TEMP TABLE IF NOT EXISTS {} ('
+                    'seq BIGSERIAL, '
+                    'ts TIMESTAMP NOT NULL, '
+                    'topic_id INTEGER NOT NULL, '
+                    'value_string TEXT NOT NULL'
+                ')').format(temp_table))
+            cursor.execute(SQL('TRUNCATE {} RESTART IDENTITY').format(temp_table))
+            cursor.copy_expert(SQL(
+                'COPY {} (ts, topic_id, value_string) FROM STDIN WITH (FORMAT csv)').format(
+                temp_table).as_string(cursor), buffer)
+            cursor.execute(SQL(
+                'INSERT INTO {} (ts, topic_id, value_string) '
+                'SELECT DISTINCT ON (topic_id, ts) ts, topic_id, value_string FROM {} '
+                'ORDER BY topic_id, ts, seq DESC '
+                'ON CONFLICT (ts, topic_id) DO UPDATE '
+                'SET value_string = EXCLUDED.value_string').format(
+                Identifier(self.data_table), temp_table))
+
     @contextlib.contextmanager
     def bulk_insert_meta(self):
         """
@@ -158,6 +233,20 @@ class PostgreSqlFuncts(DbDriver):
             if rows:
                 # metadata is in topics table
                 self.meta_table = self.topics_table
+            if self._is_partitioned():
+                if not self.partition_period:
+                    # keep creating partitions of the same length as the existing ones
+                    partitions = self.get_data_partitions()
+                    if partitions:
+                        start, end, _ = partitions[-1]
+                        self.partition_period = 'week' if (end - start).days == 7 else 'month'
+                    else:
+                        self.partition_period = 'month'
+                    _log.info(f"Existing table {self.data_table} is partitioned by {self.partition_period}")
+            elif self.partition_period:
+                _log.warning(f"partition_period is configured but existing table {self.data_table} is not "
+                             f"partitioned. Data will not be partitioned")
+                self.partition_period = None
         else:
             self.execute_stmt(SQL(
                 'CREATE TABLE IF NOT EXISTS {} ('
@@ -165,7 +254,8 @@ class PostgreSqlFuncts(DbDriver):
                     'topic_id INTEGER NOT NULL, '
                     'value_string TEXT NOT NULL, '
                     'UNIQUE (topic_id, ts)'
-                ')').format(Identifier(self.data_table)))
+                '){}').format(Identifier(self.data_table),
+                              SQL(' PARTITION BY RANGE (ts)' if self.partition_period else '')))
             if self.timescale_dialect:
                 _log.debug("trying to create hypertable")
                 self.execute_stmt(SQL(
@@ -193,6 +283,97 @@ class PostgreSqlFuncts(DbDriver):
             self.meta_table = self.topics_table
             self.commit()
 
+    def _is_partitioned(self):
+        rows = self.select("SELECT relkind FROM pg_class WHERE relname = %s", (self.data_table,))
+        return bool(rows) and rows[0][0] == 'p'
+
+    def get_data_partitions(self, start=None, end=None):
+        rows = self.select(
+            "SELECT c.relname FROM pg_inherits i "
+            "JOIN pg_class c ON c.oid = i.inhrelid "
+            "JOIN pg_class p ON p.oid = i.inhparent "
+            "WHERE p.relname = %s", (self.data_table,))
+        partitions = []
+        for row in rows:
+            partition = parse_partition_name(self.data_table, row[0])
+            if partition:
+                partitions.append(partition)
+        return filter_partitions(partitions, start, end)
+
+    def _get_partition_table(self, ts):
+        """
+        Return the partition of the data table for the given timestamp, creating it if necessary
+        """
+        start, end = get_partition_bounds(ts, self.partition_period)
+        table_name = get_partition_name(self.data_table, self.partition_period, start)
+        if table_name not in self._partition_tables:
+            _log.info("Creating data partition {}".format(table_name))
+            # ts column is TIMESTAMP without time zone and holds UTC values
+            self.execute_stmt(SQL(
+                'CREATE TABLE IF NOT EXISTS {} PARTITION OF {} '
+                'FOR VALUES FROM ({}) TO ({})').format(
+                Identifier(table_name), Identifier(self.data_table),
+                Literal(start.replace(tzinfo=None)), Literal(end.replace(tzinfo=None))))
+            self._partition_tables.add(table_name)
+        return table_name
+
+    def insert_data(self, ts, topic_id, data):
+        if self.partition_period:
+            self._get_partition_table(ts)
+        return super(PostgreSqlFuncts, self).insert_data(ts, topic_id, data)
+
+    def manage_db_size(self, history_limit_timestamp, storage_limit_gb):
+        """
+        Manage database size by dropping whole partitions of the data table. Only supported when the data table is
+        partitioned by time. The partition that receives current data is never dropped.
+        :param history_limit_timestamp: drop partitions that only contain data older than this timestamp
+        :param storage_limit_gb: drop oldest partitions until database is smaller than this value.
+        """
+        if not self.partition_period:
+            return
+        partitions = self.get_data_partitions()
+
+        if history_limit_timestamp is not None:
+            while len(partitions) > 1 and partitions[0][1] <= history_limit_timestamp:
+                self._drop_partition(partitions.pop(0)[2])
+
+        if storage_limit_gb is not None:
+            max_storage_bytes = storage_limit_gb * 1024 ** 3
+            while len(partitions) > 1:
+                rows = self.select("SELECT pg_database_size(current_database())")
+                if rows[0][0] < max_storage_bytes:
+                    break
+                self._drop_partition(partitions.pop(0)[2])
+
+    def _drop_partition(self, table_name):
+        _log.info("Dropping data partition {}".format(table_name))
+        self.execute_stmt(SQL('DROP TABLE IF EXISTS {}').format(Identifier(table_name)))
+        self._partition_tables.discard(table_name)
+
+    def get_oldest_data_ts(self):
+        rows = self.select(SQL('SELECT min(ts) FROM {}').format(Identifier(self.data_table)))
+        if not rows or rows[0][0] is None:
+            return None
+        # ts column is TIMESTAMP without time zone and holds UTC values
+        return rows[0][0].replace(tzinfo=pytz.UTC)
+
+    def delete_data_before(self, end):
+        end = end.astimezone(pytz.UTC)
+        if self.partition_period:
+            for partition_start, partition_end, table_name in self.get_data_partitions(end=end):
+                if partition_end <= end:
+                    self._drop_partition(table_name)
+        count = self.execute_stmt(SQL('DELETE FROM {} WHERE ts < {}').format(
+            Identifier(self.data_table), Literal(end.replace(tzinfo=None))))
+        self.commit()
+        return count
+
+    def delete_aggregates_before(self, agg_type, period, end):
+        count = self.execute_stmt(SQL('DELETE FROM {} WHERE ts < {}').format(
+            Identifier(agg_type + '_' + period), Literal(end.astimezone(pytz.UTC).replace(tzinfo=None))))
+        self.commit()
+        return count
+
     def setup_aggregate_historian_tables(self):
 
         self.execute_stmt(SQL(
@@ -259,6 +440,39 @@ class PostgreSqlFuncts(DbDriver):
                                     for ts, value in cursor]
         return values
 
+    def stream_data(self, topic_ids, start=None, end=None, fetch_size=10000):
+        query = [SQL('SELECT topic_id, ts, value_string\n'
+                     'FROM {}\n'
+                     'WHERE topic_id = ANY({})').format(Identifier(self.data_table), Literal(list(topic_ids)))]
+        if start:
+            query.append(SQL(' AND ts >= {}').format(Literal(start.astimezone(pytz.UTC))))
+        if end:
+            query.append(SQL(' AND ts < {}').format(Literal(end.astimezone(pytz.UTC))))
+        query.append(SQL('ORDER BY topic_id ASC, ts ASC'))
+        # a named cursor is a server side cursor and only exists within a transaction, so it gets a
+        # connection of its own instead of the shared autocommit connection
+        try:
+            connection = self._connect(autocommit=False)
+        except Exception as e:
+            raise ConnectionError(e).with_traceback(sys.exc_info()[2])
+        try:
+            cursor = connection.cursor(name='stream_data')
+            cursor.itersize = fetch_size
+            cursor.execute(SQL('\n').join(query))
+        except Exception:
+            connection.close()
+            raise
+        return self._iter_stream(connection, cursor, fetch_size)
+
+    def _iter_stream(self, connection, cursor, fetch_size):
+        """
+        Yield the rows of a stream_data cursor and close its connection, which ends the read only transaction
+        """
+        try:
+            yield from self._iter_cursor(cursor, fetch_size)
+        finally:
+            connection.close()
+
     def insert_topic(self, topic, **kwargs):
         meta = kwargs.get('metadata')
         with self.cursor() as cursor:
@@ -423,6 +637,12 @@ class PostgreSqlFuncts(DbDriver):
                 'topics_list = EXCLUDED.topics_list').format(
             Identifier(table_name))
 
+    def insert_new_aggregate_stmt(self, table_name):
+        return SQL(
+            'INSERT INTO {} VALUES (%s, %s, %s, %s) '
+            'ON CONFLICT (ts, topic_id) DO NOTHING').format(
+            Identifier(table_name))
+
     def collect_aggregate(self, topic_ids, agg_type, start=None, end=None):
         if (isinstance(agg_type, str) and
                 agg_type.upper() not in self.get_aggregation_list()):
@@ -440,3 +660,19 @@ class PostgreSqlFuncts(DbDriver):
             query.append(SQL(' AND ts < {}').format(Literal(end)))
         rows = self.select(SQL('\n').join(query))
         return rows[0] if rows else (0, 0)
+
+    def collect_topic_aggregates(self, topic_ids, start=None, end=None):
+        query = [
+            SQL('SELECT topic_id, COUNT(value_string), SUM(CAST(value_string as float)), '
+                'MIN(CAST(value_string as float)), MAX(CAST(value_string as float))'),
+            SQL('FROM {}').format(Identifier(self.data_table)),
+            SQL('WHERE topic_id in ({})').format(
+                SQL(', ').join(Literal(tid) for tid in topic_ids)),
+        ]
+        if start is not None:
+            query.append(SQL(' AND ts >= {}').format(Literal(start)))
+        if end is not None:
+            query.append(SQL(' AND ts < {}').format(Literal(end)))
+        query.append(SQL('GROUP BY topic_id'))
+        rows = self.select(SQL('\n').join(query))
+        return {row[0]: tuple(row[1:]) for row in rows}
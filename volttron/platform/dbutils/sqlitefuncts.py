@@ -30,7 +30,8 @@ import pytz
 import threading
 import os
 import re
-from .basedb import DbDriver
+from .basedb import (DbDriver, validate_partition_period, get_partition_bounds, get_partition_name,
+                     parse_partition_name, filter_partitions)
 from collections import defaultdict
 from datetime import datetime
 from math import ceil
@@ -42,6 +43,9 @@ from volttron.platform.agent.utils import fix_sqlite3_datetime
 utils.setup_logging()
 _log = logging.getLogger(__name__)
 
+# values are stored as text, this condition matches the values that are numbers
+NUMERIC_VALUE = "(value_string GLOB '*[0-9]*' AND value_string NOT GLOB '*[^0-9.eE+-]*')"
+
 # Make sure sqlite3 datetime adapters are updated.
 fix_sqlite3_datetime()
 
@@ -88,6 +92,14 @@ class SqlLiteFuncts(DbDriver):
         if 'timeout' not in connect_params.keys():
             connect_params['timeout'] = 10
 
+        # Optional time partitioning of the data table. When set, data is written to one table per month or week
+        # (for example data_month_20240101) and retention drops whole tables instead of deleting rows.
+        # Partitions are discovered from the database on read, so readers do not need this parameter.
+        self.partition_period = validate_partition_period(connect_params.get('partition_period'))
+        self._partition_tables = set()
+        # Whether the data table still has rows written before partitioning was enabled. None if unknown
+        self._legacy_data = None
+
         self.data_table = None
         self.topics_table = None
         self.meta_table = None
@@ -101,7 +113,8 @@ class SqlLiteFuncts(DbDriver):
             self.agg_topics_table = table_names['agg_topics_table']
             self.agg_meta_table = table_names['agg_meta_table']
         _log.debug("In sqlitefuncts connect params {}".format(connect_params))
-        super(SqlLiteFuncts, self).__init__('sqlite3', **connect_params)
+        super(SqlLiteFuncts, self).__init__('sqlite3', **{k: v for k, v in connect_params.items()
+                                                          if k != 'partition_period'})
 
     def setup_historian_tables(self):
 
@@ -182,22 +195,12 @@ class SqlLiteFuncts(DbDriver):
         @param count:
         @param order:
         """
-        table_name = self.data_table
+        table_names = None
         value_col = 'value_string'
         if agg_type and agg_period:
-            table_name = agg_type + "_" + agg_period
+            table_names = [agg_type + "_" + agg_period]
             value_col = 'agg_value'
 
-        query = '''SELECT topic_id, ts, ''' + value_col + '''
-                   FROM ''' + table_name + '''
-                   {where}
-                   {order_by}
-                   {limit}
-                   {offset}'''
-
-        where_clauses = ["WHERE topic_id = ?"]
-        args = [topic_ids[0]]
-
         # base historian converts naive timestamps to UTC, but if the start and end had explicit timezone info then they
         # need to get converted to UTC since sqlite3 only store naive timestamp
         if start:
@@ -205,18 +208,31 @@ class SqlLiteFuncts(DbDriver):
         if end:
             end = end.astimezone(pytz.UTC)
 
+        if table_names is None:
+            table_names = self.get_data_tables(start, end)
+
+        query = '''SELECT topic_id, ts, ''' + value_col + '''
+                   FROM {source}
+                   {order_by}
+                   {limit}
+                   {offset}'''
+
+        where_clauses = ["WHERE topic_id = ?"]
+        where_args = []
+
         if start and end and start == end:
             where_clauses.append("ts = ?")
-            args.append(start)
+            where_args.append(start)
         else:
             if start:
                 where_clauses.append("ts >= ?")
-                args.append(start)
+                where_args.append(start)
             if end:
                 where_clauses.append("ts < ?")
-                args.append(end)
+                where_args.append(end)
 
         where_statement = ' AND '.join(where_clauses)
+        source = self._get_data_source(table_names, value_col, where_statement)
 
         order_by = 'ORDER BY topic_id ASC, ts ASC'
         if order == 'LAST_TO_FIRST':
@@ -228,24 +244,25 @@ class SqlLiteFuncts(DbDriver):
             count = -1
 
         limit_statement = 'LIMIT ?'
-        args.append(count)
+        limit_args = [count]
 
         offset_statement = ''
         if skip > 0:
             offset_statement = 'OFFSET ?'
-            args.append(skip)
+            limit_args.append(skip)
 
-        real_query = query.format(where=where_statement,
+        real_query = query.format(source=source,
                                   limit=limit_statement,
                                   offset=offset_statement,
                                   order_by=order_by)
         _log.debug("Real Query: " + real_query)
-        _log.debug("args: " + str(args))
+        _log.debug("args: " + str(where_args + limit_args))
 
         values = defaultdict(list)
         start_t = datetime.utcnow()
         for topic_id in topic_ids:
-            args[0] = topic_id
+            # where clause is repeated for every table the data is read from
+            args = ([topic_id] + where_args) * len(table_names) + limit_args
             values[id_name_map[topic_id]] = []
             cursor = self.select(real_query, args, fetch_all=False)
             if cursor:
@@ -261,6 +278,104 @@ class SqlLiteFuncts(DbDriver):
         _log.debug("Time taken to load results from db:{}".format(datetime.utcnow()-start_t))
         return values
 
+    def stream_data(self, topic_ids, start=None, end=None, fetch_size=10000):
+        if start:
+            start = start.astimezone(pytz.UTC)
+        if end:
+            end = end.astimezone(pytz.UTC)
+        table_names = self.get_data_tables(start, end)
+        where_clauses = ["WHERE topic_id IN ({})".format(", ".join("?" * len(topic_ids)))]
+        where_args = list(topic_ids)
+        if start:
+            where_clauses.append("ts >= ?")
+            where_args.append(start)
+        if end:
+            where_clauses.append("ts < ?")
+            where_args.append(end)
+        source = self._get_data_source(table_names, 'value_string', ' AND '.join(where_clauses))
+        query = "SELECT topic_id, ts, value_string FROM " + source + " ORDER BY topic_id ASC, ts ASC"
+        cursor = self.select(query, where_args * len(table_names), fetch_all=False)
+        return self._iter_cursor(cursor, fetch_size)
+
+    @staticmethod
+    def _get_data_source(table_names, value_col, where_statement):
+        """
+        Build the FROM clause used to read (ts, topic_id, value) rows from one or more tables. If there is more than
+        one table, the where clause is applied to each table and the results are combined with UNION ALL.
+        """
+        if len(table_names) == 1:
+            return table_names[0] + " " + where_statement
+        return "(" + " UNION ALL ".join(
+            "SELECT topic_id, ts, {} FROM {} {}".format(value_col, table_name, where_statement)
+            for table_name in table_names) + ")"
+
+    def get_data_partitions(self, start=None, end=None):
+        rows = self.select("SELECT name FROM sqlite_master WHERE type='table'")
+        partitions = []
+        for row in rows:
+            partition = parse_partition_name(self.data_table, row[0])
+            if partition:
+                partitions.append(partition)
+        return filter_partitions(partitions, start, end)
+
+    def get_data_tables(self, start=None, end=None):
+        """
+        Return the tables that could contain raw data between start and end. This is the data table followed by
+        any time partitions of the data table that overlap the time range.
+        """
+        return [self.data_table] + [name for _, _, name in self.get_data_partitions(start, end)]
+
+    def _get_partition_table(self, ts):
+        """
+        Return the partition table for the given timestamp, creating it if necessary
+        """
+        start, _ = get_partition_bounds(ts, self.partition_period)
+        table_name = get_partition_name(self.data_table, self.partition_period, start)
+        if table_name not in self._partition_tables:
+            _log.info("Creating data partition {}".format(table_name))
+            self.execute_stmt(
+                '''CREATE TABLE IF NOT EXISTS ''' + table_name +
+                ''' (ts timestamp NOT NULL,
+                     topic_id INTEGER NOT NULL,
+                     value_string TEXT NOT NULL,
+                     UNIQUE(topic_id, ts))''', commit=False)
+            self.execute_stmt(
+                '''CREATE INDEX IF NOT EXISTS idx_''' + table_name +
+                ''' ON ''' + table_name + ''' (ts ASC)''', commit=False)
+            self._partition_tables.add(table_name)
+        return table_name
+
+    def insert_data(self, ts, topic_id, data):
+        if not self.partition_period:
+            return super(SqlLiteFuncts, self).insert_data(ts, topic_id, data)
+        table_name = self._get_partition_table(ts)
+        if self._has_legacy_data():
+            # a record sent again replaces the row of the data table instead of being read twice
+            self.execute_stmt('''DELETE FROM ''' + self.data_table + ''' WHERE topic_id = ? AND ts = ?''',
+                              (topic_id, ts), commit=False)
+        self.execute_stmt('''INSERT OR REPLACE INTO ''' + table_name + ''' values(?, ?, ?)''',
+                          (ts, topic_id, jsonapi.dumps(data)), commit=False)
+        return True
+
+    def _has_legacy_data(self):
+        """
+        :return: True if the data table has rows written before partitioning was enabled. Partitioned
+                 historians never write to it, so it is checked again only after rows were deleted
+        """
+        if self._legacy_data is None:
+            self._legacy_data = bool(self.select("SELECT 1 FROM " + self.data_table + " LIMIT 1"))
+        return self._legacy_data
+
+    def rollback(self):
+        # partitions created in the rolled back transaction no longer exist
+        self._partition_tables.clear()
+        return super(SqlLiteFuncts, self).rollback()
+
+    def _drop_partition(self, table_name):
+        _log.info("Dropping data partition {}".format(table_name))
+        self.execute_stmt('''DROP TABLE IF EXISTS ''' + table_name, commit=True)
+        self._partition_tables.discard(table_name)
+
     def manage_db_size(self, history_limit_timestamp, storage_limit_gb):
         """
         Manage database size.
@@ -272,6 +387,7 @@ class SqlLiteFuncts(DbDriver):
             history_limit_timestamp, storage_limit_gb))
 
         commit = False
+        partitions = self.get_data_partitions()
 
         if history_limit_timestamp is not None:
             count = self.execute_stmt(
@@ -282,6 +398,10 @@ class SqlLiteFuncts(DbDriver):
                 _log.debug("Deleted {} old items from historian. (TTL exceeded)".format(count))
                 commit = True
 
+            # Only partitions that contain nothing but expired data are dropped, never the latest one
+            while len(partitions) > 1 and partitions[0][1] <= history_limit_timestamp:
+                self._drop_partition(partitions.pop(0)[2])
+
         if storage_limit_gb is not None:
             result = self.select('''PRAGMA page_size''')
             page_size = result[0][0]
@@ -292,21 +412,64 @@ class SqlLiteFuncts(DbDriver):
                 result = self.select("PRAGMA page_count")
                 return result[0][0]
 
+            # Drop the oldest partitions first but never the latest one.
+            # Pages of dropped tables are released on commit since auto_vacuum is full.
+            if commit and partitions:
+                self.commit()
+                commit = False
+            while len(partitions) > 1 and page_count() >= max_pages:
+                self._drop_partition(partitions.pop(0)[2])
+
+            table_name = self.data_table
+            if partitions and not self.select("SELECT 1 FROM " + self.data_table + " LIMIT 1"):
+                table_name = partitions[0][2]
+
             while page_count() >= max_pages:
                 count = self.execute_stmt(
-                    '''DELETE FROM ''' + self.data_table +
+                    '''DELETE FROM ''' + table_name +
                     '''
                     WHERE ts IN
-                    (SELECT ts FROM ''' + self.data_table +
+                    (SELECT ts FROM ''' + table_name +
                     '''
                     ORDER BY ts ASC LIMIT 100)''')
 
                 _log.debug("Deleted 100 old items from historian. (Managing store size)".format(count))
                 commit = True
+                if not count:
+                    break
 
         if commit:
             _log.debug("Committing changes for manage_db_size.")
             self.commit()
+            self._legacy_data = None
+
+    def get_oldest_data_ts(self):
+        oldest = None
+        for table_name in self.get_data_tables():
+            # the column name type makes the timestamp converter parse the result
+            rows = self.select('''SELECT min(ts) AS "ts [timestamp]" FROM ''' + table_name)
+            if rows and rows[0][0] is not None and (oldest is None or rows[0][0] < oldest):
+                oldest = rows[0][0]
+        return oldest.astimezone(pytz.UTC) if oldest is not None else None
+
+    def delete_data_before(self, end):
+        end = end.astimezone(pytz.UTC)
+        count = 0
+        for partition_start, partition_end, table_name in self.get_data_partitions(end=end):
+            if partition_end <= end:
+                self._drop_partition(table_name)
+            else:
+                count += self.execute_stmt('''DELETE FROM ''' + table_name + ''' WHERE ts < ?''', (end,))
+        count += self.execute_stmt('''DELETE FROM ''' + self.data_table + ''' WHERE ts < ?''', (end,))
+        self.commit()
+        self._legacy_data = None
+        return count
+
+    def delete_aggregates_before(self, agg_type, period, end):
+        count = self.execute_stmt('''DELETE FROM ''' + agg_type + '''_''' + period + ''' WHERE ts < ?''',
+                                  (end.astimezone(pytz.UTC),))
+        self.commit()
+        return count
 
     def insert_meta_query(self):
         return '''INSERT OR REPLACE INTO ''' + self.meta_table + \
@@ -412,7 +575,7 @@ class SqlLiteFuncts(DbDriver):
 
     @staticmethod
     def regexp(expr, item):
-        _log.debug("item {} matched against expr {}".format(item, expr))
+        # called once per row. re caches compiled patterns so only the search is done per row
         return re.search(expr, item, re.IGNORECASE) is not None
 
     def set_cache(self, cache_size):
@@ -453,8 +616,6 @@ class SqlLiteFuncts(DbDriver):
                     conn.close()
 
     def query_topics_by_pattern(self, topic_pattern):
-        id_map, name_map = self.get_topic_map()
-        _log.debug("Contents of topics table {}".format(list(id_map.keys())))
         q = "SELECT topic_id, topic_name FROM " + self.topics_table + " WHERE topic_name REGEXP '" + topic_pattern + \
             "';"
 
@@ -483,6 +644,9 @@ class SqlLiteFuncts(DbDriver):
     def insert_aggregate_stmt(self, table_name):
         return '''INSERT OR REPLACE INTO ''' + table_name + ''' values(?, ?, ?, ?)'''
 
+    def insert_new_aggregate_stmt(self, table_name):
+        return '''INSERT OR IGNORE INTO ''' + table_name + ''' values(?, ?, ?, ?)'''
+
     def collect_aggregate(self, topic_ids, agg_type, start=None, end=None):
         """
         This function should return the results of a aggregation query
@@ -496,8 +660,11 @@ class SqlLiteFuncts(DbDriver):
         if isinstance(agg_type, str):
             if agg_type.upper() not in ['AVG', 'MIN', 'MAX', 'COUNT', 'SUM']:
                 raise ValueError("Invalid aggregation type {}".format(agg_type))
-        query = '''SELECT ''' + agg_type + '''(value_string), count(value_string) FROM ''' + \
-                self.data_table + ''' {where}'''
+        # values are stored as text, cast numbers so that minimum and maximum compare them as numbers
+        value = 'value_string'
+        if agg_type.upper() in ('MIN', 'MAX'):
+            value = 'CASE WHEN ' + NUMERIC_VALUE + ' THEN CAST(value_string AS REAL) ELSE value_string END'
+        query = '''SELECT ''' + agg_type + '''(''' + value + '''), count(value_string) FROM {source}'''
 
         where_clauses = ["WHERE topic_id = ?"]
         args = [topic_ids[0]]
@@ -529,8 +696,10 @@ class SqlLiteFuncts(DbDriver):
                 args.append(end)
 
         where_statement = ' AND '.join(where_clauses)
+        table_names = self.get_data_tables(start, end)
 
-        real_query = query.format(where=where_statement)
+        real_query = query.format(source=self._get_data_source(table_names, 'value_string', where_statement))
+        args = args * len(table_names)
         _log.debug("Real Query: " + real_query)
         _log.debug("args: " + str(args))
 
@@ -541,6 +710,31 @@ class SqlLiteFuncts(DbDriver):
         else:
             return 0, 0
 
+    def collect_topic_aggregates(self, topic_ids, start=None, end=None):
+        where_clauses = ["WHERE topic_id IN (" + ", ".join("?" * len(topic_ids)) + ")"]
+        args = list(topic_ids)
+        if start:
+            start = start.astimezone(pytz.UTC)
+            where_clauses.append("ts >= ?")
+            args.append(start)
+        if end:
+            end = end.astimezone(pytz.UTC)
+            where_clauses.append("ts < ?")
+            args.append(end)
+
+        where_statement = ' AND '.join(where_clauses)
+        table_names = self.get_data_tables(start, end)
+        # values are stored as text, the minimum and maximum are those of the values that are numbers
+        number = 'CASE WHEN ' + NUMERIC_VALUE + ' THEN CAST(value_string AS REAL) END'
+        real_query = '''SELECT topic_id, count(value_string), sum(value_string), min({number}), max({number})
+                        FROM {source} GROUP BY topic_id'''.format(
+            number=number, source=self._get_data_source(table_names, 'value_string', where_statement))
+        args = args * len(table_names)
+        _log.debug("Real Query: " + real_query)
+        _log.debug("args: " + str(args))
+
+        return {row[0]: tuple(row[1:]) for row in self.select(real_query, args)}
+
     @staticmethod
     def get_tagging_query_from_ast(topic_tags_table, tup, tag_refs):
         """
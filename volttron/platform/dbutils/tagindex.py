@@ -0,0 +1,322 @@
+# -*- coding: utf-8 -*- {{{
+# ===----------------------------------------------------------------------===
+#
+#                 Component of Eclipse VOLTTRON
+#
+# ===----------------------------------------------------------------------===
+#
+# Copyright 2023 Battelle Memorial Institute
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not
+# use this file except in compliance with the License. You may obtain a copy
+# of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+#
+# ===----------------------------------------------------------------------===
+# }}}
+
+"""
+In-memory inverted index of topic tags.
+
+:py:class:`TagIndex` maps every tag and every tag=value pair to a bitmap of
+the topic prefixes that carry it. Bitmaps are python integers in which bit
+n is set if the topic prefix with id n matches, so the AND, OR and NOT of
+a query condition are evaluated as integer bit operations. Comparisons
+(<, <=, >, >=) are answered from a sorted array of the values of a tag.
+
+Values are compared the way SQLite compares the value column of the
+topic_tags table. The column has numeric affinity, so booleans and numeric
+strings are stored as numbers, numbers compare lower than any text, and
+text is compared as text. LIKE applies a case insensitive regular
+expression search to text values only.
+"""
+
+import bisect
+import logging
+import re
+import threading
+from collections import defaultdict
+
+_log = logging.getLogger(__name__)
+
+# sort keys of numbers are lower than the sort keys of text
+_NUMBER = 0
+_TEXT = 1
+# text that SQLite converts to a number when stored in a column with numeric affinity
+_INTEGER = re.compile(r'^\s*[-+]?\d+\s*$')
+_REAL = re.compile(r'^\s*[-+]?(\d+\.?\d*|\.\d+)([eE][-+]?\d+)?\s*$')
+
+
+def value_key(value):
+    """
+    Normalize a tag value to the key used to compare it with other values
+    :param value: tag value or query value
+    :return: (_NUMBER, number) or (_TEXT, string) tuple. None for None
+    """
+    if value is None:
+        return None
+    if isinstance(value, bool):
+        return _NUMBER, int(value)
+    if isinstance(value, (int, float)):
+        return _NUMBER, value
+    value = str(value)
+    if _INTEGER.match(value):
+        return _NUMBER, int(value)
+    if _REAL.match(value):
+        return _NUMBER, float(value)
+    return _TEXT, value
+
+
+def bitmap_from_ids(ids):
+    """
+    :param ids: iterable of non-negative integers
+    :return: bitmap with the bits of the given ids set
+    """
+    ids = list(ids)
+    if not ids:
+        return 0
+    buffer = bytearray(max(ids) // 8 + 1)
+    for i in ids:
+        buffer[i >> 3] |= 1 << (i & 7)
+    return int.from_bytes(buffer, 'little')
+
+
+def ids_from_bitmap(bitmap):
+    """
+    :param bitmap: bitmap as a non-negative integer
+    :return: list of the ids whose bit is set, in ascending order
+    """
+    bits = bin(bitmap)[:1:-1]
+    ids = []
+    i = bits.find('1')
+    while i != -1:
+        ids.append(i)
+        i = bits.find('1', i + 1)
+    return ids
+
+
+class _SortedValues:
+    __slots__ = ('keys', 'ids')
+
+    def __init__(self, entries):
+        entries.sort()
+        self.keys = [key for key, _ in entries]
+        self.ids = [topic_id for _, topic_id in entries]
+
+
+class TagIndex:
+    """
+    Inverted index of (topic prefix, tag, value) rows.
+
+    Rows are added while loading the tagging service and after every insert.
+    Queries are answered from the greenlet that handles the RPC call while
+    updates may be done by others, so access is guarded by a lock.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self._ids = {}
+        self._prefixes = []
+        # every topic prefix that has at least one tag
+        self._all = 0
+        # tag -> bitmap of topic prefixes that have a non null value for the tag
+        self._tags = {}
+        # tag -> {value key: bitmap}
+        self._values = {}
+        # topic id -> {tag: value key}
+        self._topic_values = {}
+        # tag -> _SortedValues, built on first comparison after a change
+        self._sorted = {}
+
+    def __len__(self):
+        return len(self._ids)
+
+    def load(self, rows):
+        """
+        Replace the contents of the index
+        :param rows: iterable of (topic_prefix, tag, value) tuples
+        """
+        with self._lock:
+            self._reset()
+            count = self._update(rows)
+        _log.debug("Loaded {} topic tags into tag index".format(count))
+
+    def update(self, rows):
+        """
+        Add or replace tag values. A row replaces the value the topic prefix
+        had for the tag, like REPLACE INTO the topic_tags table does.
+        :param rows: iterable of (topic_prefix, tag, value) tuples
+        """
+        with self._lock:
+            self._update(rows)
+
+    def _update(self, rows):
+        # bitmaps are rebuilt once per batch. Setting bits one row at a time
+        # would copy the bitmap of a common tag for every topic prefix
+        new_ids = []
+        original_keys = {}
+        count = 0
+        for topic_prefix, tag, value in rows:
+            topic_id = self._ids.get(topic_prefix)
+            if topic_id is None:
+                topic_id = self._ids[topic_prefix] = len(self._prefixes)
+                self._prefixes.append(topic_prefix)
+                self._topic_values[topic_id] = {}
+                new_ids.append(topic_id)
+            topic_values = self._topic_values[topic_id]
+            if (topic_id, tag) not in original_keys:
+                original_keys[(topic_id, tag)] = topic_values.get(tag)
+            topic_values[tag] = value_key(value)
+            count += 1
+
+        # (tag, value key) -> topic ids. A key of None stands for the bitmap of the tag itself
+        added = defaultdict(list)
+        removed = defaultdict(list)
+        for (topic_id, tag), old_key in original_keys.items():
+            new_key = self._topic_values[topic_id][tag]
+            if old_key == new_key:
+                continue
+            if old_key is not None:
+                removed[tag, old_key].append(topic_id)
+                if new_key is None:
+                    removed[tag, None].append(topic_id)
+            if new_key is not None:
+                added[tag, new_key].append(topic_id)
+                if old_key is None:
+                    added[tag, None].append(topic_id)
+
+        for (tag, key), ids in removed.items():
+            bitmap = bitmap_from_ids(ids)
+            if key is None:
+                self._tags[tag] &= ~bitmap
+                continue
+            values = self._values[tag]
+            values[key] &= ~bitmap
+            if not values[key]:
+                del values[key]
+        for (tag, key), ids in added.items():
+            bitmap = bitmap_from_ids(ids)
+            if key is None:
+                self._tags[tag] = self._tags.get(tag, 0) | bitmap
+                continue
+            values = self._values.setdefault(tag, {})
+            values[key] = values.get(key, 0) | bitmap
+        for tag in {tag for _, tag in original_keys}:
+            self._sorted.pop(tag, None)
+        self._all |= bitmap_from_ids(new_ids)
+        return count
+
+    def query(self, ast, tag_refs, skip=0, count=None, order=None):
+        """
+        Find the topic prefixes matching a query condition
+        :param ast: abstract syntax tree created by
+                    :py:func:`volttron.platform.agent.base_tagging.parse_query`
+        :param tag_refs: dictionary of ref tags and its parent tag
+        :param skip: number of results to skip
+        :param count: maximum number of results
+        :param order: "FIRST_TO_LAST" (default) or "LAST_TO_FIRST"
+        :return: list of topic prefixes sorted by name
+        """
+        with self._lock:
+            bitmap = self._evaluate(ast, tag_refs)
+            result = sorted(self._prefixes[i] for i in ids_from_bitmap(bitmap))
+        if order == 'LAST_TO_FIRST':
+            result.reverse()
+        if count is None or count < 0:
+            return result[skip:]
+        return result[skip:skip + count]
+
+    def _evaluate(self, tup, tag_refs):
+        operator = tup[0].upper()
+        if operator == 'AND':
+            return self._evaluate(tup[1], tag_refs) & self._evaluate(tup[2], tag_refs)
+        if operator == 'OR':
+            return self._evaluate(tup[1], tag_refs) | self._evaluate(tup[2], tag_refs)
+        if operator == 'NOT':
+            return self._all & ~self._evaluate(tup[2], tag_refs)
+
+        tag = tup[1]
+        if '.' in tag:
+            # parent.tag condition: topics whose ref tag points to a parent
+            # that has the parent marker tag and matches the condition
+            ref_tag, child_tag = tag.split('.', 1)
+            parents = self._match(tag_refs[ref_tag], '=', True) & \
+                self._match(child_tag, operator, self._expression(tup[2]))
+            ref_values = self._values.get(ref_tag, {})
+            bitmap = 0
+            for parent_id in ids_from_bitmap(parents):
+                bitmap |= ref_values.get(value_key(self._prefixes[parent_id]), 0)
+            return bitmap
+        return self._match(tag, operator, self._expression(tup[2]))
+
+    def _match(self, tag, operator, value):
+        values = self._values.get(tag)
+        if not values:
+            return 0
+        if operator == 'LIKE':
+            regex = re.compile(value, re.IGNORECASE)
+            bitmap = 0
+            for key, key_bitmap in values.items():
+                if key[0] == _TEXT and regex.search(key[1]):
+                    bitmap |= key_bitmap
+            return bitmap
+        key = value_key(value)
+        if key is None:
+            return 0
+        if operator == '=':
+            return values.get(key, 0)
+        if operator == '!=':
+            return self._tags[tag] & ~values.get(key, 0)
+        if operator not in ('<', '<=', '>', '>='):
+            raise ValueError("Unsupported operator {} in query condition".format(operator))
+
+        sorted_values = self._sorted.get(tag)
+        if sorted_values is None:
+            entries = [(topic_key, topic_id) for topic_id, topic_values in self._topic_values.items()
+                       for topic_key in (topic_values.get(tag),) if topic_key is not None]
+            sorted_values = self._sorted[tag] = _SortedValues(entries)
+        keys = sorted_values.keys
+        if operator == '<':
+            ids = sorted_values.ids[:bisect.bisect_left(keys, key)]
+        elif operator == '<=':
+            ids = sorted_values.ids[:bisect.bisect_right(keys, key)]
+        elif operator == '>':
+            ids = sorted_values.ids[bisect.bisect_right(keys, key):]
+        else:
+            ids = sorted_values.ids[bisect.bisect_left(keys, key):]
+        return bitmap_from_ids(ids)
+
+    @staticmethod
+    def _expression(value):
+        """
+        Evaluate the arithmetic expressions the query parser creates for
+        unary minus and +, -, *, /, % on numbers
+        """
+        if not isinstance(value, tuple):
+            return value
+        operator = value[0]
+        left = float(TagIndex._expression(value[1]))
+        right = float(TagIndex._expression(value[2]))
+        if operator == '+':
+            result = left + right
+        elif operator == '-':
+            result = left - right
+        elif operator == '*':
+            result = left * right
+        elif operator == '/':
+            result = left / right
+        elif operator == '%':
+            result = left % right
+        else:
+            raise ValueError("Unsupported operator {} in query condition".format(operator))
+        return int(result) if result.is_integer() else result
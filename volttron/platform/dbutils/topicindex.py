@@ -0,0 +1,246 @@
+# -*- coding: utf-8 -*- {{{
+# ===----------------------------------------------------------------------===
+#
+#                 Component of Eclipse VOLTTRON
+#
+# ===----------------------------------------------------------------------===
+#
+# Copyright 2023 Battelle Memorial Institute
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not
+# use this file except in compliance with the License. You may obtain a copy
+# of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+#
+# ===----------------------------------------------------------------------===
+# }}}
+
+"""
+In-memory index of historian topic names.
+
+:py:class:`TopicIndex` stores topic names in a trie keyed on the lower case
+'/' separated topic segments so that regular expression lookups done by
+`get_topics_by_pattern` can be answered without going to the database.
+Matching follows the semantics of the database implementations, i.e. a case
+insensitive search (not a full match) of the pattern against the topic name.
+Patterns anchored with '^' that start with a literal prefix only visit the
+part of the trie under that prefix.
+
+:py:class:`TopicPrefixTrie` is a case sensitive trie over a snapshot of
+topic names that expands tagging topic patterns into topic prefixes.
+"""
+
+import logging
+import re
+import threading
+from collections import OrderedDict
+
+_log = logging.getLogger(__name__)
+
+# characters that end the literal prefix of a regular expression
+_REGEX_SPECIAL = set('.^$*+?{}[]\\|()')
+# quantifiers that make the character preceding them optional
+_OPTIONAL_QUANTIFIERS = set('*?{')
+
+
+class _TrieNode:
+    __slots__ = ('children', 'topic_name', 'topic_id')
+
+    def __init__(self):
+        self.children = {}
+        self.topic_name = None
+        self.topic_id = None
+
+
+class TopicIndex:
+    """
+    Segment trie over topic names with an LRU cache of compiled patterns.
+
+    Instances are shared between the historian's processing thread, which
+    adds topics as they are inserted, and the main thread, which answers
+    queries, so all access is guarded by a lock.
+    """
+
+    def __init__(self, pattern_cache_size=256):
+        self._root = _TrieNode()
+        self._count = 0
+        self._lock = threading.Lock()
+        self._patterns = OrderedDict()
+        self._pattern_cache_size = pattern_cache_size
+        self.loaded = False
+
+    def __len__(self):
+        return self._count
+
+    def load(self, topic_id_map, topic_name_map):
+        """
+        Replace contents of the index with the topics in the given maps
+        :param topic_id_map: dictionary of {topic_name.lower(): topic_id}
+        :param topic_name_map: dictionary of {topic_name.lower(): topic_name}
+        """
+        root = _TrieNode()
+        count = 0
+        for lower_name, topic_id in topic_id_map.items():
+            if self._add(root, topic_name_map.get(lower_name, lower_name), topic_id):
+                count += 1
+        with self._lock:
+            self._root = root
+            self._count = count
+            self.loaded = True
+        _log.debug("Loaded {} topics into topic index".format(count))
+
+    def add(self, topic_name, topic_id):
+        """
+        Add a topic to the index or update the name/id of an existing topic
+        :param topic_name: topic name as stored in the database
+        :param topic_id: id of the topic
+        """
+        with self._lock:
+            if self._add(self._root, topic_name, topic_id):
+                self._count += 1
+
+    @staticmethod
+    def _add(root, topic_name, topic_id):
+        node = root
+        for segment in topic_name.lower().split('/'):
+            child = node.children.get(segment)
+            if child is None:
+                child = node.children[segment] = _TrieNode()
+            node = child
+        is_new = node.topic_name is None
+        node.topic_name = topic_name
+        node.topic_id = topic_id
+        return is_new
+
+    def match(self, topic_pattern):
+        """
+        Find the topics whose name matches the given regular expression
+        :param topic_pattern: regular expression to search for in topic names
+        :return: dictionary of {topic_name: topic_id}
+        """
+        regex = self._compile(topic_pattern)
+        prefix = self.literal_prefix(topic_pattern)
+        segments = prefix.lower().split('/')
+        partial = segments.pop()
+        results = {}
+        with self._lock:
+            node = self._root
+            for segment in segments:
+                node = node.children.get(segment)
+                if node is None:
+                    return results
+            if partial:
+                starts = [child for key, child in node.children.items() if key.startswith(partial)]
+            else:
+                starts = [node]
+            stack = starts
+            while stack:
+                node = stack.pop()
+                if node.topic_name is not None and regex.search(node.topic_name):
+                    results[node.topic_name] = node.topic_id
+                stack.extend(node.children.values())
+        return results
+
+    def _compile(self, topic_pattern):
+        with self._lock:
+            regex = self._patterns.get(topic_pattern)
+            if regex is not None:
+                self._patterns.move_to_end(topic_pattern)
+                return regex
+        regex = re.compile(topic_pattern, re.IGNORECASE)
+        with self._lock:
+            self._patterns[topic_pattern] = regex
+            if len(self._patterns) > self._pattern_cache_size:
+                self._patterns.popitem(last=False)
+        return regex
+
+    @staticmethod
+    def literal_prefix(topic_pattern):
+        """
+        Return the literal text every match of an anchored pattern must start with.
+
+        Only patterns that start with '^' and do not contain an alternation
+        have a usable prefix. For all other patterns an empty string is
+        returned and the whole index has to be searched.
+        :param topic_pattern: regular expression
+        :return: literal prefix of the pattern
+        """
+        if not topic_pattern.startswith('^') or '|' in topic_pattern:
+            return ''
+        prefix = []
+        for char in topic_pattern[1:]:
+            if char in _REGEX_SPECIAL:
+                if char in _OPTIONAL_QUANTIFIERS and prefix:
+                    prefix.pop()
+                break
+            prefix.append(char)
+        return ''.join(prefix)
+
+
+class TopicPrefixTrie:
+    """
+    Immutable trie over the case sensitive '/' separated segments of a list
+    of topic names, used to expand the topic name patterns of tagging
+    requests into the topic prefixes they apply to.
+
+    :param topics: iterable of topic names
+    :param version: version number of the topic list
+    """
+
+    def __init__(self, topics=(), version=0):
+        self.topics = frozenset(topics)
+        self.version = version
+        self._root = {}
+        for topic in self.topics:
+            node = self._root
+            for segment in topic.split('/'):
+                node = node.setdefault(segment, {})
+            # None marks the end of a topic name
+            node[None] = True
+
+    def __len__(self):
+        return len(self.topics)
+
+    def match_prefixes(self, topic_pattern):
+        """
+        Find the topic names and topic name prefixes that have as many
+        segments as the pattern and match the whole pattern. For example
+        'campus/building1/device.*' matches campus/building1/device1 but not
+        campus/building1/device1/p1. Only the part of the trie under the
+        literal prefix of the pattern and above the depth of the pattern is
+        visited.
+
+        :param topic_pattern: regular expression
+        :return: set of topic names and topic name prefixes
+        """
+        regex = re.compile(topic_pattern + '$')
+        depth = len(topic_pattern.split('/'))
+        segments = TopicIndex.literal_prefix('^' + topic_pattern).split('/')
+        partial = segments.pop()
+        node = self._root
+        for segment in segments:
+            node = node.get(segment)
+            if node is None:
+                return set()
+
+        results = set()
+        stack = [(segments + [key], child) for key, child in node.items()
+                 if key is not None and key.startswith(partial)]
+        while stack:
+            path, node = stack.pop()
+            name = '/'.join(path)
+            if len(path) == depth:
+                if regex.match(name):
+                    results.add(name)
+                continue
+            if None in node and regex.match(name):
+                results.add(name)
+            stack.extend((path + [key], child) for key, child in node.items() if key is not None)
+        return results
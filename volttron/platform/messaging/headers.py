@@ -40,6 +40,16 @@ TIMESTAMP = 'TimeStamp'
 
 SYNC_TIMESTAMP = 'SynchronizedTimeStamp'
 
+# Set on device publishes of drivers that publish on change: a full publish
+# of all points or a delta publish of the points that changed.
+PUBLISH_TYPE = type('PublishTypeStr', (str,),
+                    {'FULL': 'full',
+                     'DELTA': 'delta'})('PublishType')
+
+# Id of the device schema of compact device publishes. See
+# volttron.platform.agent.device_schema.
+SCHEMA_ID = 'SchemaId'
+
 FROM = 'From'
 TO = 'To'
 
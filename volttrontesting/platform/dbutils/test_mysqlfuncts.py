@@ -136,6 +136,23 @@ def test_insert_data_query_should_succeed(get_container_func):
     assert get_data_in_table(connection_port, "data") == expected_data
 
 
+def test_bulk_insert_should_split_statements_by_max_allowed_packet(get_container_func):
+    container, sqlfuncts, connection_port, historian_version = get_container_func
+    # small enough to force several statements for 50 records
+    sqlfuncts._max_allowed_packet = sqlfuncts.PACKET_OVERHEAD + 1000
+    expected_data = [(datetime.datetime(2001, 9, 11, 8, 46, i), 11, f'"value{i}"') for i in range(50)]
+
+    with sqlfuncts.bulk_insert() as insert_data:
+        for i in range(50):
+            insert_data(f"2001-09-11 08:46:{i:02}", 11, "old")
+        # later records for the same topic and timestamp win
+        for i in range(50):
+            insert_data(f"2001-09-11 08:46:{i:02}", 11, f"value{i}")
+    sqlfuncts._max_allowed_packet = None
+
+    assert sorted(get_data_in_table(connection_port, "data")) == expected_data
+
+
 def test_insert_topic_query_should_succeed(get_container_func):
     container, sqlfuncts, connection_port, historian_version = get_container_func
     topic = "football"
@@ -379,6 +396,26 @@ def test_collect_aggregate_should_return_aggregate_result(get_container_func):
     assert actual_aggregate == expected_aggregate
 
 
+def test_collect_aggregate_min_max_should_compare_numbers(get_container_func):
+    container, sqlfuncts, connection_port, historian_version = get_container_func
+    query = f"""
+                REPLACE INTO {DATA_TABLE}
+                VALUES ('2020-06-01 12:30:59', 42, '9');
+                REPLACE INTO {DATA_TABLE}
+                VALUES ('2020-06-01 12:31:59', 42, '10');
+                REPLACE INTO {DATA_TABLE}
+                VALUES ('2020-06-01 12:30:59', 43, '"on"');
+                REPLACE INTO {DATA_TABLE}
+                VALUES ('2020-06-01 12:31:59', 43, '"off"')
+            """
+    seed_database(container, query)
+
+    assert sqlfuncts.collect_aggregate([42], "max") == (10.0, 2)
+    # text values are not converted to 0
+    assert sqlfuncts.collect_aggregate([43], "min") == ('"off"', 2)
+    assert sqlfuncts.collect_topic_aggregates([42, 43]) == {42: (2, 19.0, 9.0, 10.0), 43: (2, 0.0, None, None)}
+
+
 def test_collect_aggregate_should_raise_value_error(get_container_func):
     container, sqlfuncts, connection_port, historian_version = get_container_func
     with pytest.raises(ValueError):
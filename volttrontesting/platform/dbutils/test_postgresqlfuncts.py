@@ -4,6 +4,8 @@ import logging
 
 import gevent
 import pytest
+import pytz
+from mock import MagicMock
 
 try:
     import psycopg2
@@ -21,6 +23,7 @@ logging.getLogger("urllib3.connectionpool").setLevel(logging.INFO)
 pytestmark = [pytest.mark.postgresqlfuncts, pytest.mark.dbutils, pytest.mark.unit]
 
 DATA_TABLE = "data"
+PARTITIONED_TABLE = "data_partitioned"
 TOPICS_TABLE = "topics"
 META_TABLE = "meta"
 AGG_TOPICS_TABLE = "aggregate_topics"
@@ -219,6 +222,131 @@ def test_insert_data_should_return_true(setup_functs):
     cleanup_tables(truncate_tables=[DATA_TABLE], drop_tables=False)
 
 
+def test_bulk_insert_should_copy_records(setup_functs, monkeypatch):
+    sqlfuncts, historian_version = setup_functs
+    cleanup_tables(truncate_tables=[DATA_TABLE], drop_tables=False)
+    monkeypatch.setattr(sqlfuncts, "copy_bulk_insert", True)
+    copy_insert = MagicMock(wraps=sqlfuncts._copy_insert)
+    monkeypatch.setattr(sqlfuncts, "_copy_insert", copy_insert)
+    start = datetime.datetime(2020, 6, 1, 12, 30, tzinfo=pytz.UTC)
+    seed_database(f"INSERT INTO {DATA_TABLE} VALUES ('2020-06-01 12:30:00', 1, '\"old\"')")
+
+    with sqlfuncts.bulk_insert() as insert_data:
+        for i in range(sqlfuncts.COPY_MIN_RECORDS):
+            insert_data(start + datetime.timedelta(seconds=i), 1, i)
+        # the same topic and time again, the last record wins
+        insert_data(start + datetime.timedelta(seconds=1), 1, "last")
+
+    copy_insert.assert_called_once()
+    rows = sorted(get_data_in_table(DATA_TABLE))
+    assert len(rows) == sqlfuncts.COPY_MIN_RECORDS
+    # the existing row is updated
+    assert rows[0] == (datetime.datetime(2020, 6, 1, 12, 30), 1, '0')
+    assert rows[1] == (datetime.datetime(2020, 6, 1, 12, 30, 1), 1, '"last"')
+    assert rows[-1][2] == str(sqlfuncts.COPY_MIN_RECORDS - 1)
+    cleanup_tables(truncate_tables=[DATA_TABLE], drop_tables=False)
+
+
+def test_bulk_insert_should_fall_back_to_insert_if_copy_fails(setup_functs, monkeypatch):
+    sqlfuncts, historian_version = setup_functs
+    cleanup_tables(truncate_tables=[DATA_TABLE], drop_tables=False)
+    monkeypatch.setattr(sqlfuncts, "copy_bulk_insert", True)
+    copy_insert = MagicMock(side_effect=psycopg2.ProgrammingError("permission denied for COPY"))
+    monkeypatch.setattr(sqlfuncts, "_copy_insert", copy_insert)
+    start = datetime.datetime(2020, 6, 1, 12, 30)
+
+    for batch in range(2):
+        with sqlfuncts.bulk_insert() as insert_data:
+            for i in range(sqlfuncts.COPY_MIN_RECORDS):
+                insert_data(start + datetime.timedelta(seconds=i), batch, i)
+
+    # COPY is not tried again after it failed
+    copy_insert.assert_called_once()
+    assert sqlfuncts.copy_bulk_insert is False
+    assert len(get_data_in_table(DATA_TABLE)) == 2 * sqlfuncts.COPY_MIN_RECORDS
+    cleanup_tables(truncate_tables=[DATA_TABLE], drop_tables=False)
+
+
+def test_bulk_insert_should_raise_connection_errors_of_copy(setup_functs, monkeypatch):
+    sqlfuncts, historian_version = setup_functs
+    monkeypatch.setattr(sqlfuncts, "copy_bulk_insert", True)
+    monkeypatch.setattr(sqlfuncts, "_copy_insert",
+                        MagicMock(side_effect=psycopg2.OperationalError("server closed the connection")))
+
+    with pytest.raises(psycopg2.OperationalError):
+        with sqlfuncts.bulk_insert() as insert_data:
+            for i in range(sqlfuncts.COPY_MIN_RECORDS):
+                insert_data(datetime.datetime(2020, 6, 1, 12, 30, i % 60), i, i)
+
+    # COPY is used again once the connection is back
+    assert sqlfuncts.copy_bulk_insert is True
+
+
+def test_stream_data_should_use_a_server_side_cursor_of_its_own_connection(setup_functs):
+    sqlfuncts, historian_version = setup_functs
+    cleanup_tables(truncate_tables=[DATA_TABLE], drop_tables=False)
+    seed_database(f"INSERT INTO {DATA_TABLE} VALUES ('2020-06-01 12:30:59', 43, '1'), "
+                  f"('2020-06-01 12:31:59', 42, '2'), ('2020-06-01 12:30:59', 42, '3'), "
+                  f"('2020-06-01 12:32:59', 44, '4')")
+
+    rows = sqlfuncts.stream_data([43, 42], fetch_size=1)
+    first = next(rows)
+    # the shared connection of the historian stays in autocommit mode without an open transaction
+    with sqlfuncts.cursor() as cursor:
+        assert cursor.connection.autocommit is True
+        cursor.execute("SELECT count(*) FROM pg_cursors WHERE name = 'stream_data'")
+        assert cursor.fetchone()[0] == 0
+    assert [first] + list(rows) == [(42, datetime.datetime(2020, 6, 1, 12, 30, 59), '3'),
+                                    (42, datetime.datetime(2020, 6, 1, 12, 31, 59), '2'),
+                                    (43, datetime.datetime(2020, 6, 1, 12, 30, 59), '1')]
+
+    rows = sqlfuncts.stream_data([42, 43, 44], start=datetime.datetime(2020, 6, 1, 12, 31, tzinfo=pytz.UTC),
+                                 end=datetime.datetime(2020, 6, 1, 12, 32, 59, tzinfo=pytz.UTC))
+    assert [row[2] for row in rows] == ['2']
+    cleanup_tables(truncate_tables=[DATA_TABLE], drop_tables=False)
+
+
+def test_partitioned_insert_should_create_partitions_first(partitioned_functs):
+    partitioned_functs.insert_data(datetime.datetime(2020, 1, 31, 23, 59, tzinfo=pytz.UTC), 42, 1)
+    with partitioned_functs.bulk_insert() as insert_data:
+        insert_data(datetime.datetime(2020, 2, 1, tzinfo=pytz.UTC), 42, 2)
+        insert_data(datetime.datetime(2020, 3, 15, tzinfo=pytz.UTC), 42, 3)
+
+    assert [name for _, _, name in partitioned_functs.get_data_partitions()] == [
+        f"{PARTITIONED_TABLE}_month_20200101", f"{PARTITIONED_TABLE}_month_20200201",
+        f"{PARTITIONED_TABLE}_month_20200301"]
+    assert get_data_in_table(f"{PARTITIONED_TABLE}_month_20200201") == [
+        (datetime.datetime(2020, 2, 1), 42, '2')]
+    assert len(get_data_in_table(PARTITIONED_TABLE)) == 3
+
+
+def test_partitioned_manage_db_size_should_drop_expired_partitions(partitioned_functs):
+    for month in (1, 2, 3):
+        partitioned_functs.insert_data(datetime.datetime(2020, month, 10, tzinfo=pytz.UTC), 42, month)
+
+    # the February partition still has data after the limit
+    partitioned_functs.manage_db_size(datetime.datetime(2020, 2, 15, tzinfo=pytz.UTC), None)
+    assert [start.month for start, _, _ in partitioned_functs.get_data_partitions()] == [2, 3]
+
+    # the latest partition is never dropped
+    partitioned_functs.manage_db_size(datetime.datetime(2021, 1, 1, tzinfo=pytz.UTC), None)
+    assert [start.month for start, _, _ in partitioned_functs.get_data_partitions()] == [3]
+    assert get_data_in_table(PARTITIONED_TABLE) == [(datetime.datetime(2020, 3, 10), 42, '3')]
+
+
+def test_partitioned_delete_data_before_should_drop_partitions(partitioned_functs):
+    for month in (1, 2, 3):
+        partitioned_functs.insert_data(datetime.datetime(2020, month, 10, tzinfo=pytz.UTC), 42, month)
+        partitioned_functs.insert_data(datetime.datetime(2020, month, 20, tzinfo=pytz.UTC), 42, month)
+
+    # rows of dropped partitions are not counted
+    assert partitioned_functs.delete_data_before(datetime.datetime(2020, 2, 15, tzinfo=pytz.UTC)) == 1
+
+    assert [start.month for start, _, _ in partitioned_functs.get_data_partitions()] == [2, 3]
+    assert partitioned_functs.get_oldest_data_ts() == datetime.datetime(2020, 2, 20, tzinfo=pytz.UTC)
+    assert len(get_data_in_table(PARTITIONED_TABLE)) == 3
+
+
 def test_update_topic_should_return_true(setup_functs):
     sqlfuncts, historian_version = setup_functs
 
@@ -549,6 +677,18 @@ def setup_functs(request):
     yield postgresfuncts, historian_version
 
 
+@pytest.fixture()
+def partitioned_functs(setup_functs):
+    cleanup_tables([PARTITIONED_TABLE], drop_tables=True)
+    params = dict(historian_config["connection"]["params"], partition_period="month")
+    postgresfuncts = PostgreSqlFuncts(params, dict(table_names, data_table=PARTITIONED_TABLE))
+    postgresfuncts.setup_historian_tables()
+    yield postgresfuncts
+    postgresfuncts.close()
+    # partitions are dropped with the partitioned table
+    cleanup_tables([PARTITIONED_TABLE], drop_tables=True)
+
+
 def create_all_tables(historian_version, sqlfuncts=None):
     try:
         cleanup_tables(table_names.values(), drop_tables=True)
@@ -1,7 +1,9 @@
 import sqlite3
+from datetime import datetime
 
 from gevent import subprocess
 import pytest
+import pytz
 import os
 
 from setuptools import glob
@@ -418,6 +420,172 @@ def test_collect_aggregate(get_sqlitefuncts):
     assert actual_aggregate == expected_aggregate
 
 
+@pytest.mark.sqlitefuncts
+@pytest.mark.dbutils
+def test_collect_aggregate_min_max_should_compare_numbers(get_sqlitefuncts):
+    sqlitefuncts, historain_version = get_sqlitefuncts
+    query = (
+        "INSERT OR REPLACE INTO data values('2020-06-01 12:30:59', 42, '9');"
+        "INSERT OR REPLACE INTO data values('2020-06-01 12:31:59', 42, '10');"
+    )
+    query_db(query)
+
+    assert sqlitefuncts.collect_aggregate([42], "min") == (9.0, 2)
+    assert sqlitefuncts.collect_aggregate([42], "max") == (10.0, 2)
+    assert sqlitefuncts.collect_topic_aggregates([42]) == {42: (2, 19.0, 9.0, 10.0)}
+
+
+@pytest.mark.sqlitefuncts
+@pytest.mark.dbutils
+def test_collect_aggregate_min_max_should_not_convert_text(get_sqlitefuncts):
+    sqlitefuncts, historain_version = get_sqlitefuncts
+    query = (
+        "INSERT OR REPLACE INTO data values('2020-06-01 12:30:59', 42, '-1.5e1'),"
+        "('2020-06-01 12:31:59', 42, '3'),"
+        "('2020-06-01 12:30:59', 43, '\"on\"'),"
+        "('2020-06-01 12:31:59', 43, '\"off\"');"
+    )
+    query_db(query)
+
+    assert sqlitefuncts.collect_aggregate([42], "min") == (-15.0, 2)
+    # text values are compared as text instead of being converted to 0
+    assert sqlitefuncts.collect_aggregate([43], "min") == ('"off"', 2)
+    assert sqlitefuncts.collect_aggregate([43], "max") == ('"on"', 2)
+    assert sqlitefuncts.collect_topic_aggregates([42, 43]) == {42: (2, -12.0, -15.0, 3.0), 43: (2, 0.0, None, None)}
+
+
+@pytest.mark.sqlitefuncts
+@pytest.mark.dbutils
+def test_collect_topic_aggregates(get_sqlitefuncts):
+    sqlitefuncts, historain_version = get_sqlitefuncts
+    query = (
+        "INSERT OR REPLACE INTO data values('2020-06-01 12:30:59', 42, '2');"
+        "INSERT OR REPLACE INTO data values('2020-06-01 12:31:59', 42, '4');"
+        "INSERT OR REPLACE INTO data values('2020-06-01 12:31:59', 43, '8');"
+        "INSERT OR REPLACE INTO data values('2020-06-01 12:31:59', 44, '16');"
+    )
+    query_db(query)
+
+    actual_aggregates = sqlitefuncts.collect_topic_aggregates([42, 43])
+
+    assert actual_aggregates == {42: (2, 6.0, 2.0, 4.0), 43: (1, 8.0, 8.0, 8.0)}
+
+
+@pytest.mark.sqlitefuncts
+@pytest.mark.dbutils
+def test_insert_aggregates(get_sqlitefuncts):
+    sqlitefuncts, historain_version = get_sqlitefuncts
+    sqlitefuncts.create_aggregate_store("avg", "1m")
+    sqlitefuncts.create_aggregate_store("sum", "1m")
+    ts = datetime(2020, 6, 1, 12, 31, tzinfo=pytz.UTC)
+
+    sqlitefuncts.insert_aggregates([
+        ("avg", "1m", ts, 1, 3.0, [42]),
+        ("avg", "1m", ts, 2, 8.0, [43]),
+        ("sum", "1m", ts, 3, 14.0, [42, 43]),
+    ])
+
+    assert query_db("SELECT topic_id, agg_value FROM avg_1m ORDER BY topic_id") == "1|3.0\n2|8.0\n"
+    assert query_db("SELECT topic_id, agg_value, topics FROM sum_1m") == "3|14.0|[42, 43]\n"
+
+
+
+@pytest.mark.sqlitefuncts
+@pytest.mark.dbutils
+def test_partitioned_insert_query_and_aggregate(sqlitefuncts_partitioned):
+    sqlitefuncts = sqlitefuncts_partitioned
+    sqlitefuncts.insert_data(datetime(2020, 5, 31, 23, 59, tzinfo=pytz.UTC), 42, 1)
+    sqlitefuncts.insert_data(datetime(2020, 6, 1, 0, 1, tzinfo=pytz.UTC), 42, 3)
+    sqlitefuncts.commit()
+
+    assert {"data_month_20200501", "data_month_20200601"} <= get_table_names()
+    assert get_all_data(DATA_TABLE) == []
+
+    actual_results = sqlitefuncts.query([42], {42: "topic42"})
+    assert actual_results == {"topic42": [("2020-05-31T23:59:00.000000+00:00", 1),
+                                          ("2020-06-01T00:01:00.000000+00:00", 3)]}
+
+    actual_results = sqlitefuncts.query([42], {42: "topic42"}, start=datetime(2020, 6, 1, tzinfo=pytz.UTC))
+    assert actual_results == {"topic42": [("2020-06-01T00:01:00.000000+00:00", 3)]}
+
+    assert sqlitefuncts.collect_aggregate([42], "avg") == (2.0, 2)
+
+
+@pytest.mark.sqlitefuncts
+@pytest.mark.dbutils
+def test_partitioned_insert_should_replace_rows_written_before_partitioning(sqlitefuncts_partitioned):
+    sqlitefuncts = sqlitefuncts_partitioned
+    # written to the data table before partition_period was configured
+    sqlitefuncts.execute_stmt("INSERT INTO " + DATA_TABLE + " values(?, ?, ?)",
+                              (datetime(2020, 5, 31, 23, 59, tzinfo=pytz.UTC), 42, "1"))
+    sqlitefuncts.execute_stmt("INSERT INTO " + DATA_TABLE + " values(?, ?, ?)",
+                              (datetime(2020, 6, 1, 0, 1, tzinfo=pytz.UTC), 42, "2"))
+    sqlitefuncts.commit()
+
+    sqlitefuncts.insert_data(datetime(2020, 6, 1, 0, 1, tzinfo=pytz.UTC), 42, 3)
+    sqlitefuncts.commit()
+
+    actual_results = sqlitefuncts.query([42], {42: "topic42"})
+    assert actual_results == {"topic42": [("2020-05-31T23:59:00.000000+00:00", 1),
+                                          ("2020-06-01T00:01:00.000000+00:00", 3)]}
+    assert len(get_all_data(DATA_TABLE)) == 1
+
+
+@pytest.mark.sqlitefuncts
+@pytest.mark.dbutils
+def test_partitioned_manage_db_size_should_drop_expired_partitions(sqlitefuncts_partitioned):
+    sqlitefuncts = sqlitefuncts_partitioned
+    sqlitefuncts.insert_data(datetime(2020, 4, 15, tzinfo=pytz.UTC), 42, 1)
+    sqlitefuncts.insert_data(datetime(2020, 5, 15, tzinfo=pytz.UTC), 42, 2)
+    sqlitefuncts.insert_data(datetime(2020, 6, 15, tzinfo=pytz.UTC), 42, 3)
+    sqlitefuncts.commit()
+
+    sqlitefuncts.manage_db_size(datetime(2020, 6, 10, tzinfo=pytz.UTC), None)
+
+    tables = get_table_names()
+    assert "data_month_20200401" not in tables
+    assert "data_month_20200501" not in tables
+    assert "data_month_20200601" in tables
+    assert [p[2] for p in sqlitefuncts.get_data_partitions()] == ["data_month_20200601"]
+
+
+@pytest.mark.sqlitefuncts
+@pytest.mark.dbutils
+def test_partitioned_manage_db_size_should_keep_latest_partition(sqlitefuncts_partitioned):
+    sqlitefuncts = sqlitefuncts_partitioned
+    sqlitefuncts.insert_data(datetime(2020, 4, 15, tzinfo=pytz.UTC), 42, 1)
+    sqlitefuncts.insert_data(datetime(2020, 5, 15, tzinfo=pytz.UTC), 42, 2)
+    sqlitefuncts.commit()
+
+    sqlitefuncts.manage_db_size(datetime(2020, 7, 10, tzinfo=pytz.UTC), None)
+
+    tables = get_table_names()
+    assert "data_month_20200401" not in tables
+    assert "data_month_20200501" in tables
+    assert [p[2] for p in sqlitefuncts.get_data_partitions()] == ["data_month_20200501"]
+
+
+@pytest.mark.sqlitefuncts
+@pytest.mark.dbutils
+def test_partitioned_stream_data_should_return_rows_in_topic_and_time_order(sqlitefuncts_partitioned):
+    sqlitefuncts = sqlitefuncts_partitioned
+    sqlitefuncts.insert_data(datetime(2020, 6, 1, 0, 1, tzinfo=pytz.UTC), 42, 3)
+    sqlitefuncts.insert_data(datetime(2020, 5, 31, 23, 59, tzinfo=pytz.UTC), 42, 1)
+    sqlitefuncts.insert_data(datetime(2020, 5, 15, tzinfo=pytz.UTC), 43, "on")
+    sqlitefuncts.insert_data(datetime(2020, 5, 15, tzinfo=pytz.UTC), 44, 5)
+    sqlitefuncts.commit()
+
+    rows = list(sqlitefuncts.stream_data([43, 42], fetch_size=1))
+    assert [(topic_id, ts.astimezone(pytz.UTC), value) for topic_id, ts, value in rows] == [
+        (42, datetime(2020, 5, 31, 23, 59, tzinfo=pytz.UTC), "1"),
+        (42, datetime(2020, 6, 1, 0, 1, tzinfo=pytz.UTC), "3"),
+        (43, datetime(2020, 5, 15, tzinfo=pytz.UTC), '"on"')]
+
+    rows = sqlitefuncts.stream_data([42, 43], start=datetime(2020, 5, 20, tzinfo=pytz.UTC),
+                                    end=datetime(2020, 6, 1, tzinfo=pytz.UTC))
+    assert [topic_id for topic_id, _, _ in rows] == [42]
+
+
 def get_indexes(table):
     res = query_db(f"""PRAGMA index_list({table})""")
     return res.splitlines()
@@ -429,6 +597,10 @@ def get_tables():
     return res
 
 
+def get_table_names():
+    return set(query_db("SELECT name FROM sqlite_master WHERE type='table'").splitlines())
+
+
 def get_all_data(table):
     q = f"""SELECT * FROM {table}"""
     res = query_db(q)
@@ -476,6 +648,21 @@ def get_sqlitefuncts(request, sqlitefuncts_db_not_initialized):
     yield sqlitefuncts_db_not_initialized, request.param
 
 
+@pytest.fixture()
+def sqlitefuncts_partitioned(sqlitefuncts_db_not_initialized):
+    table_names = {
+        "data_table": DATA_TABLE,
+        "topics_table": TOPICS_TABLE,
+        "meta_table": META_TABLE,
+        "agg_topics_table": AGG_TOPICS_TABLE,
+        "agg_meta_table": AGG_META_TABLE,
+    }
+    client = SqlLiteFuncts(dict(CONNECT_PARAMS, partition_period="month"), table_names)
+    client.setup_historian_tables()
+    yield client
+    client.close()
+
+
 def init_database(sqlitefuncts_client, historian_version):
     global CONNECT_PARAMS
     if historian_version == "<4.0.0":
@@ -0,0 +1,114 @@
+import sqlite3
+
+import pytest
+
+from volttron.platform.agent.base_tagging import parse_query
+from volttron.platform.dbutils.sqlitefuncts import SqlLiteFuncts
+from volttron.platform.dbutils.tagindex import TagIndex, bitmap_from_ids, ids_from_bitmap
+
+VALID_TAGS = {tag: "Str" for tag in ("id", "campus", "dis", "geoCountry", "point", "maxVal", "minVal", "equip",
+                                     "elec", "phase", "campusRef")}
+TAG_REFS = {"campusRef": "campus"}
+
+TAGS = {
+    "campus1": {"campus": True, "dis": "Test description", "geoCountry": "US"},
+    "campus2": {"campus": True, "geoCountry": "UK", "dis": "United Kingdom"},
+}
+for campus, devices in (("campus1", ("d1", "d2")), ("campus2", ("d1",))):
+    for device in devices:
+        prefix = "{}/{}".format(campus, device)
+        TAGS[prefix] = {"equip": True, "elec": True, "campusRef": campus,
+                        "phase": "p1_1" if device == "d1" else "p2"}
+        if device == "d1":
+            TAGS[prefix]["dis"] = "Test description"
+        TAGS[prefix + "/p1"] = {"point": True, "maxVal": 15, "minVal": -1}
+        TAGS[prefix + "/p2"] = {"point": True, "maxVal": 10, "minVal": 0, "dis": "Test description"}
+        TAGS[prefix + "/p3"] = {"point": True, "maxVal": 5, "minVal": 1, "dis": "Test description"}
+        TAGS[prefix + "/p4"] = {"point": True, "maxVal": "12", "minVal": "low"}
+TAGS["campus2/d1"]["phase"] = "p1_2"
+
+ROWS = [(prefix, tag, value) for prefix, tags in TAGS.items() for tag, value in tags.items()] + \
+       [(prefix, "id", prefix) for prefix in TAGS]
+
+
+@pytest.fixture()
+def tag_index():
+    index = TagIndex()
+    index.load(ROWS)
+    return index
+
+
+@pytest.fixture()
+def sqlite_tags():
+    connection = sqlite3.connect(":memory:")
+    connection.create_function("REGEXP", 2, SqlLiteFuncts.regexp)
+    connection.execute("CREATE TABLE topic_tags (topic_prefix TEXT NOT NULL, tag STRING NOT NULL, value STRING, "
+                       "PRIMARY KEY (topic_prefix, tag))")
+    connection.executemany("REPLACE INTO topic_tags (topic_prefix, tag, value) VALUES (?, ?, ?)", ROWS)
+    yield connection
+    connection.close()
+
+
+CONDITIONS = [
+    "campus AND geoCountry='US'",
+    "minVal<0 OR maxVal>=5 AND maxVal<10",
+    "(minVal<0 OR maxVal>=5) AND maxVal<10",
+    "maxVal > 11",
+    "minVal >= 'a'",
+    "maxVal != 10",
+    "NOT campus AND NOT point AND dis='Test description'",
+    "point AND NOT(maxVal>=5 AND minVal=1)",
+    "minVal=-1",
+    "equip AND elec AND campusRef.geoCountry='UK'",
+    "equip AND elec AND NOT(campusRef.geoCountry='UK' AND campusRef.dis='United Kingdom')",
+]
+
+
+@pytest.mark.dbutils
+@pytest.mark.parametrize("condition", CONDITIONS)
+def test_query_should_match_sqlite_query(tag_index, sqlite_tags, condition):
+    ast = parse_query(condition, VALID_TAGS, TAG_REFS)
+    query = SqlLiteFuncts.get_tagging_query_from_ast("topic_tags", ast, TAG_REFS) + "\nORDER BY topic_prefix ASC"
+    expected = [row[0] for row in sqlite_tags.execute(query)]
+
+    assert tag_index.query(ast, TAG_REFS) == expected
+
+
+@pytest.mark.dbutils
+@pytest.mark.parametrize(
+    "condition, expected",
+    [
+        ('equip AND phase LIKE "p1.*"', ["campus1/d1", "campus2/d1"]),
+        ('equip AND NOT (phase LIKE "P1.*")', ["campus1/d2"]),
+        ('equip AND elec AND campusRef.geoCountry LIKE "UK.*"', ["campus2/d1"]),
+        ("minVal = 2 - 3", ["campus1/d1/p1", "campus1/d2/p1", "campus2/d1/p1"]),
+    ],
+)
+def test_query_should_evaluate_like_and_expressions(tag_index, condition, expected):
+    assert tag_index.query(parse_query(condition, VALID_TAGS, TAG_REFS), TAG_REFS) == expected
+
+
+@pytest.mark.dbutils
+def test_query_should_apply_skip_count_and_order(tag_index):
+    ast = parse_query("(minVal<0 OR maxVal>=5) AND maxVal<10", VALID_TAGS, TAG_REFS)
+
+    assert tag_index.query(ast, TAG_REFS, skip=1, count=2, order="LAST_TO_FIRST") == \
+        ["campus1/d2/p3", "campus1/d1/p3"]
+
+
+@pytest.mark.dbutils
+def test_update_should_replace_tag_value(tag_index):
+    tag_index.update([("campus1/d1/p1", "maxVal", 3), ("campus1/d1/p1", "maxVal", 4),
+                      ("campus3", "campus", True)])
+
+    assert tag_index.query(parse_query("maxVal < 5", VALID_TAGS, TAG_REFS), TAG_REFS) == ["campus1/d1/p1"]
+    assert tag_index.query(parse_query("maxVal = 3", VALID_TAGS, TAG_REFS), TAG_REFS) == []
+    assert tag_index.query(parse_query("campus", VALID_TAGS, TAG_REFS), TAG_REFS) == \
+        ["campus1", "campus2", "campus3"]
+
+
+@pytest.mark.dbutils
+def test_bitmap_round_trip():
+    ids = [0, 7, 8, 63, 64, 1000]
+    assert ids_from_bitmap(bitmap_from_ids(ids)) == ids
+    assert ids_from_bitmap(0) == []
@@ -0,0 +1,85 @@
+import pytest
+
+from volttron.platform.dbutils.topicindex import TopicIndex, TopicPrefixTrie
+
+
+TOPIC_ID_MAP = {"football": 1, "abcfoooxyz": 2, "xxxfoooo": 3,
+                "campus/building/device1/temp": 4, "campus/building/device2/temp": 5,
+                "campus/building2/device1/temp": 6}
+TOPIC_NAME_MAP = {"football": "FOOtball", "abcfoooxyz": "ABCFOOoXYZ", "xxxfoooo": "XXXfOoOo",
+                  "campus/building/device1/temp": "campus/building/device1/Temp",
+                  "campus/building/device2/temp": "campus/building/device2/temp",
+                  "campus/building2/device1/temp": "campus/building2/device1/temp"}
+
+
+@pytest.fixture()
+def topic_index():
+    index = TopicIndex()
+    index.load(TOPIC_ID_MAP, TOPIC_NAME_MAP)
+    return index
+
+
+@pytest.mark.dbutils
+@pytest.mark.parametrize(
+    "topic_pattern, expected_topics",
+    [
+        ("foo", {"FOOtball": 1, "ABCFOOoXYZ": 2, "XXXfOoOo": 3}),
+        ("^foo", {"FOOtball": 1}),
+        ("device1", {"campus/building/device1/Temp": 4, "campus/building2/device1/temp": 6}),
+        ("^campus/building/", {"campus/building/device1/Temp": 4, "campus/building/device2/temp": 5}),
+        ("^campus/build", {"campus/building/device1/Temp": 4, "campus/building/device2/temp": 5,
+                           "campus/building2/device1/temp": 6}),
+        ("^campus/building2?/device1", {"campus/building/device1/Temp": 4, "campus/building2/device1/temp": 6}),
+        ("^campus/.*/temp$", {"campus/building/device1/Temp": 4, "campus/building/device2/temp": 5,
+                              "campus/building2/device1/temp": 6}),
+        ("^other", {}),
+    ],
+)
+def test_match_should_search_case_insensitive(topic_index, topic_pattern, expected_topics):
+    assert topic_index.match(topic_pattern) == expected_topics
+
+
+@pytest.mark.dbutils
+def test_add_should_insert_and_rename_topics(topic_index):
+    topic_index.add("campus/building/device3/temp", 7)
+    topic_index.add("FOOTBALL", 1)
+
+    assert len(topic_index) == 7
+    assert topic_index.match("^campus/building/device3") == {"campus/building/device3/temp": 7}
+    assert topic_index.match("^football") == {"FOOTBALL": 1}
+
+
+@pytest.mark.dbutils
+@pytest.mark.parametrize(
+    "topic_pattern, expected_prefix",
+    [
+        ("foo", ""),
+        ("^campus/building/.*", "campus/building/"),
+        ("^campus/buildings?", "campus/building"),
+        ("^campus/building+", "campus/building"),
+        ("^campus|^other", ""),
+    ],
+)
+def test_literal_prefix(topic_pattern, expected_prefix):
+    assert TopicIndex.literal_prefix(topic_pattern) == expected_prefix
+
+
+@pytest.mark.dbutils
+@pytest.mark.parametrize(
+    "topic_pattern, expected_prefixes",
+    [
+        ("campus1", {"campus1"}),
+        ("campus.*/d.*/p1", {"campus1/d1/p1", "campus1/d2/p1", "campus1/d11/p1", "campus2/d1/p1"}),
+        ("campus.*/d1", {"campus1/d1", "campus2/d1"}),
+        ("campus1/d1", {"campus1/d1"}),
+        ("campus1/d.*", {"campus1/d1", "campus1/d2", "campus1/d11"}),
+        ("campus1/d1/p1", {"campus1/d1/p1"}),
+        ("Campus1/d1", set()),
+        ("campus3.*", set()),
+        ("building", {"building"}),
+    ],
+)
+def test_match_prefixes_should_match_whole_pattern(topic_pattern, expected_prefixes):
+    trie = TopicPrefixTrie(["campus1/d1/p1", "campus1/d1/p2", "campus1/d2/p1", "campus1/d11/p1",
+                            "campus2/d1/p1", "building"])
+    assert trie.match_prefixes(topic_pattern) == expected_prefixes
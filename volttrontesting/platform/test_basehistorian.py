@@ -1,6 +1,7 @@
 from datetime import datetime
 
 import os
+import gevent
 import pytest
 import mock
 
@@ -8,6 +9,7 @@ from volttron.platform.agent import utils
 from volttron.platform.messaging import headers as header_mod
 from volttron.platform.vip.agent import Agent
 from volttron.platform.agent.base_historian import BaseHistorianAgent, BaseQueryHistorianAgent, BackupDatabase
+from volttron.platform.agent.device_schema import make_schema
 from volttron.platform.vip.agent.results import AsyncResult
 # need import so that we can mock it.
 from volttron.platform.vip.agent.subsystems.query import Query
@@ -130,3 +132,101 @@ def test_cache_enable():
         # give a small amount of time so that the queue can get empty
         assert agent.has_published_items()
         assert len(agent.get_publish_list()) == 2
+
+
+def test_decode_in_process_loop():
+    now = utils.format_timestamp(datetime.utcnow())
+    headers = {
+        header_mod.DATE: now,
+        header_mod.TIMESTAMP: now
+    }
+    agent = BaseHistorianAgent(decode_in_process_loop=True)
+    device = "devices/testcampus/testbuilding/testdevice"
+    for value in (52.5, 53.0):
+        agent._capture_data(peer="foo",
+                            sender="test",
+                            bus="",
+                            topic=device,
+                            headers=dict(headers),
+                            message=[{"OutsideAirTemperature": value}, {"OutsideAirTemperature": {"units": "F"}}],
+                            device=device
+                            )
+    # the callbacks only queue the raw messages and wake the process loop once
+    assert len(agent._raw_queue) == 2
+    assert agent._event_queue.qsize() == 1
+
+    records = agent._decode_raw_messages([agent._event_queue.get_nowait()])
+
+    assert not agent._raw_queue
+    assert [record['readings'][0][1] for record in records] == [52.5, 53.0]
+    assert records[0]['topic'] == device + "/OutsideAirTemperature"
+    assert records[0]['meta'] == {"units": "F"}
+    assert records[0]['readings'][0][0].replace(tzinfo=None) == utils.parse_timestamp_string(now)
+
+
+def test_compact_device_publish_should_be_expanded():
+    now = utils.format_timestamp(datetime.utcnow())
+    agent = BaseHistorianAgent()
+    meta = {"OutsideAirTemperature": {"units": "F"}, "Damper": {"units": "%"}}
+    schema = make_schema(meta)
+    topic = "devices/testcampus/testbuilding/testdevice/all"
+    headers = {header_mod.DATE: now, header_mod.TIMESTAMP: now, header_mod.SCHEMA_ID: schema["id"]}
+
+    # publishes are dropped until the schema is known
+    assert agent._decode_device_data("foo", "test", "", topic, dict(headers), [20, None]) == []
+
+    agent._capture_device_data("foo", "test", "", "devices/testcampus/testbuilding/testdevice/schema",
+                               dict(headers), schema)
+    records = agent._decode_device_data("foo", "test", "", topic, dict(headers), [20, None])
+
+    assert schema["points"] == ["Damper", "OutsideAirTemperature"]
+    assert len(records) == 1
+    assert records[0]['topic'] == "testcampus/testbuilding/testdevice/Damper"
+    assert records[0]['readings'][0][1] == 20
+    assert records[0]['meta'] == {"units": "%"}
+
+
+def test_compact_device_publish_should_wait_for_schema_after_restart():
+    now = utils.format_timestamp(datetime.utcnow())
+    agent = BaseHistorianAgent()
+    schema = make_schema({"OutsideAirTemperature": {"units": "F"}, "Damper": {"units": "%"}})
+    topic = "devices/testcampus/testbuilding/testdevice/all"
+    headers = {header_mod.DATE: now, header_mod.TIMESTAMP: now, header_mod.SCHEMA_ID: schema["id"]}
+    agent.vip.rpc.call = mock.MagicMock()
+    agent.vip.rpc.call.return_value.get.side_effect = RuntimeError("driver not running")
+
+    # the historian restarted after the last schema publish of the driver
+    agent._capture_device_data("foo", "test", "", topic, dict(headers), [20, None])
+    agent._capture_device_data("foo", "test", "", topic, dict(headers), [25, 70.5])
+    gevent.sleep(0.1)
+
+    # the schema is fetched once and the publishes are held when the call fails
+    agent.vip.rpc.call.assert_called_once_with("platform.driver", "get_device_schema",
+                                               "testcampus/testbuilding/testdevice")
+    assert agent._event_queue.qsize() == 0
+
+    agent._capture_device_data("foo", "test", "", "devices/testcampus/testbuilding/testdevice/schema",
+                               dict(headers), schema)
+    records = [agent._event_queue.get_nowait() for _ in range(agent._event_queue.qsize())]
+    assert [(r['topic'], r['readings'][0][1]) for r in records] == [
+        ("testcampus/testbuilding/testdevice/Damper", 20),
+        ("testcampus/testbuilding/testdevice/Damper", 25),
+        ("testcampus/testbuilding/testdevice/OutsideAirTemperature", 70.5)]
+
+
+def test_compact_device_publish_should_be_stored_with_fetched_schema():
+    now = utils.format_timestamp(datetime.utcnow())
+    agent = BaseHistorianAgent()
+    schema = make_schema({"OutsideAirTemperature": {"units": "F"}})
+    headers = {header_mod.DATE: now, header_mod.TIMESTAMP: now, header_mod.SCHEMA_ID: schema["id"]}
+    agent.vip.rpc.call = mock.MagicMock()
+    agent.vip.rpc.call.return_value.get.return_value = schema
+
+    agent._capture_device_data("foo", "test", "", "devices/testcampus/testbuilding/testdevice/all",
+                               dict(headers), [71.0])
+    gevent.sleep(0.1)
+
+    record = agent._event_queue.get_nowait()
+    assert record['topic'] == "testcampus/testbuilding/testdevice/OutsideAirTemperature"
+    assert record['readings'][0][1] == 71.0
+    assert record['meta'] == {"units": "F"}
@@ -0,0 +1,91 @@
+from datetime import datetime
+
+import pytest
+from pytz import UTC
+
+from volttron.platform.agent.query_cache import QueryResultCache
+
+JAN = datetime(2023, 1, 1, tzinfo=UTC)
+FEB = datetime(2023, 2, 1, tzinfo=UTC)
+MAR = datetime(2023, 3, 1, tzinfo=UTC)
+
+
+def cache_query(cache, topics, start, end, result):
+    key = cache.make_key(topics, start, end, None, None, 0, None, "FIRST_TO_LAST")
+    assert cache.put(key, topics, start, end, result, cache.get_watermarks(topics))
+    return key
+
+
+def test_get_should_return_cached_result():
+    cache = QueryResultCache(10)
+    key = cache_query(cache, ["Campus/Temp"], JAN, FEB, {"values": [1]})
+
+    assert cache.get(key) == {"values": [1]}
+    assert cache.get(cache.make_key(["Campus/Temp"], JAN, MAR, None, None, 0, None, "FIRST_TO_LAST")) is None
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+@pytest.mark.parametrize(
+    "min_ts, max_ts, evicted",
+    [
+        (datetime(2023, 1, 15, tzinfo=UTC), datetime(2023, 1, 15, tzinfo=UTC), True),
+        (datetime(2022, 12, 1, tzinfo=UTC), datetime(2023, 3, 15, tzinfo=UTC), True),
+        (datetime(2023, 2, 15, tzinfo=UTC), datetime(2023, 3, 15, tzinfo=UTC), False),
+        (datetime(2022, 12, 1, tzinfo=UTC), datetime(2022, 12, 15, tzinfo=UTC), False),
+    ],
+)
+def test_advance_should_evict_overlapping_windows(min_ts, max_ts, evicted):
+    cache = QueryResultCache(10)
+    key = cache_query(cache, ["campus/temp"], JAN, FEB, {"values": [1]})
+    open_key = cache_query(cache, ["campus/temp"], JAN, None, {"values": [2]})
+    other_key = cache_query(cache, ["campus/humidity"], JAN, FEB, {"values": [3]})
+
+    cache.advance("Campus/Temp", min_ts, max_ts)
+
+    assert (cache.get(key) is None) == evicted
+    assert (cache.get(open_key) is None) == (max_ts >= JAN)
+    assert cache.get(other_key) == {"values": [3]}
+
+
+def test_put_should_skip_results_older_than_watermark():
+    cache = QueryResultCache(10)
+    topics = ["campus/temp", "campus/humidity"]
+    key = cache.make_key(topics, JAN, FEB, None, None, 0, None, "FIRST_TO_LAST")
+    watermarks = cache.get_watermarks(topics)
+
+    # records published while the query runs
+    cache.advance("campus/humidity", MAR, MAR)
+
+    assert not cache.put(key, topics, JAN, FEB, {"values": {}}, watermarks)
+    assert cache.get(key) is None
+
+
+def test_put_should_evict_least_recently_used():
+    cache = QueryResultCache(2)
+    first = cache_query(cache, ["a"], JAN, FEB, 1)
+    second = cache_query(cache, ["b"], JAN, FEB, 2)
+    cache.get(first)
+    third = cache_query(cache, ["c"], JAN, FEB, 3)
+
+    assert len(cache) == 2
+    assert cache.get(second) is None
+    assert cache.get(first) == 1
+    assert cache.get(third) == 3
+
+
+def test_evict_before_should_evict_windows_with_removed_data():
+    cache = QueryResultCache(10)
+    key = cache_query(cache, ["campus/temp"], JAN, FEB, {"values": [1]})
+    open_key = cache_query(cache, ["campus/temp"], None, FEB, {"values": [2]})
+    later_key = cache_query(cache, ["campus/temp"], FEB, MAR, {"values": [3]})
+    topics = ["campus/humidity"]
+    running_key = cache.make_key(topics, FEB, MAR, None, None, 0, None, "FIRST_TO_LAST")
+    watermarks = cache.get_watermarks(topics)
+
+    cache.evict_before(FEB)
+
+    assert cache.get(key) is None
+    assert cache.get(open_key) is None
+    assert cache.get(later_key) == {"values": [3]}
+    # queries running while data was removed are not cached
+    assert not cache.put(running_key, topics, FEB, MAR, {"values": [4]}, watermarks)
@@ -0,0 +1,170 @@
+import threading
+from datetime import datetime
+
+import pytest
+import pytz
+from mock import MagicMock
+
+from volttron.platform.agent.aggregate_backfill import (BackfillJob, BackfillProgress, CANCELLED, COMPLETED, FAILED,
+                                                        chunk_time_slices)
+from volttron.platform.agent.base_aggregate_historian import AggregateHistorian
+from volttron.platform.vip.agent import Agent
+from volttrontesting.utils.utils import AgentMock
+
+
+def utc(*args):
+    return datetime(*args, tzinfo=pytz.utc)
+
+
+@pytest.mark.aggregator
+@pytest.mark.parametrize(
+    "start, end, agg_period, use_calendar, expected",
+    [
+        (utc(2020, 1, 1), utc(2020, 1, 1, 3), "1h", False,
+         [(utc(2020, 1, 1), utc(2020, 1, 1, 1)), (utc(2020, 1, 1, 1), utc(2020, 1, 1, 2)),
+          (utc(2020, 1, 1, 2), utc(2020, 1, 1, 3))]),
+        (utc(2020, 1, 1), utc(2020, 1, 1, 2, 30), "1h", True,
+         [(utc(2020, 1, 1), utc(2020, 1, 1, 1)), (utc(2020, 1, 1, 1), utc(2020, 1, 1, 2))]),
+        (utc(2020, 1, 1, 0, 30), utc(2020, 1, 1, 2, 30), "1h", False,
+         [(utc(2020, 1, 1, 0, 30), utc(2020, 1, 1, 1, 30)), (utc(2020, 1, 1, 1, 30), utc(2020, 1, 1, 2, 30))]),
+        (utc(2020, 1, 1), utc(2020, 3, 15), "1M", True,
+         [(utc(2020, 1, 1), utc(2020, 1, 31)), (utc(2020, 2, 1), utc(2020, 2, 29))]),
+        (utc(2020, 1, 2), utc(2020, 1, 1), "1d", False, []),
+    ],
+)
+def test_compute_time_slices(start, end, agg_period, use_calendar, expected):
+    assert AggregateHistorian.compute_time_slices(start, end, agg_period, use_calendar) == expected
+
+
+@pytest.mark.aggregator
+def test_chunk_time_slices():
+    assert chunk_time_slices(list(range(5)), 2) == [[0, 1], [2, 3], [4]]
+
+
+@pytest.mark.aggregator
+def test_progress_should_skip_chunks_covered_by_completed_chunk(tmp_path):
+    progress = BackfillProgress(str(tmp_path / "backfill.sqlite"))
+    progress.mark_completed([1, 2], utc(2020, 1, 1), utc(2020, 1, 3), utc(2023, 1, 1))
+
+    assert progress.is_completed(1, utc(2020, 1, 1), utc(2020, 1, 2))
+    assert progress.is_completed(2, utc(2020, 1, 2), utc(2020, 1, 3))
+    assert not progress.is_completed(1, utc(2020, 1, 2), utc(2020, 1, 4))
+    assert not progress.is_completed(3, utc(2020, 1, 1), utc(2020, 1, 2))
+
+    # progress survives a restart of the agent
+    progress.close()
+    assert BackfillProgress(progress.path).is_completed(1, utc(2020, 1, 1), utc(2020, 1, 3))
+
+
+@pytest.mark.aggregator
+def test_job_should_run_chunks_on_bounded_worker_pool():
+    lock = threading.Lock()
+    running = []
+    max_running = []
+
+    def run_chunk(chunk):
+        with lock:
+            running.append(chunk)
+            max_running.append(len(running))
+        threading.Event().wait(0.01)
+        with lock:
+            running.remove(chunk)
+        if chunk == 3:
+            raise RuntimeError("query failed")
+        return chunk != 0
+
+    job = BackfillJob(list(range(10)), run_chunk, max_workers=2)
+    job.start()
+
+    assert job.wait(5)
+    assert max(max_running) <= 2
+    status = job.get_status()
+    assert status["state"] == FAILED
+    assert (status["completed_chunks"], status["skipped_chunks"], status["failed_chunks"]) == (8, 1, 1)
+    assert status["percent_complete"] == 100.0
+    assert status["errors"] == ["query failed"]
+
+
+@pytest.mark.aggregator
+def test_job_should_clean_up_every_worker_thread():
+    lock = threading.Lock()
+    worker_threads = set()
+    closed_threads = []
+
+    def run_chunk(chunk):
+        with lock:
+            worker_threads.add(threading.current_thread().name)
+        threading.Event().wait(0.01)
+
+    def close_worker():
+        with lock:
+            closed_threads.append(threading.current_thread().name)
+
+    job = BackfillJob(list(range(10)), run_chunk, max_workers=3, close_worker=close_worker)
+    job.start()
+
+    assert job.wait(5)
+    assert job.get_status()["state"] == COMPLETED
+    # each of the 3 worker threads cleans up once
+    assert len(closed_threads) == len(set(closed_threads)) == 3
+    assert worker_threads <= set(closed_threads)
+
+
+@pytest.mark.aggregator
+def test_job_should_stop_when_cancelled():
+    started = threading.Event()
+    release = threading.Event()
+
+    def run_chunk(chunk):
+        started.set()
+        release.wait(5)
+
+    job = BackfillJob(list(range(5)), run_chunk, max_workers=1)
+    job.start()
+    started.wait(5)
+    job.cancel()
+    release.set()
+
+    assert job.wait(5)
+    assert job.get_status()["state"] == CANCELLED
+    assert job.completed == 1
+
+
+@pytest.mark.aggregator
+def test_job_without_chunks_should_complete():
+    job = BackfillJob([], lambda chunk: True, max_workers=2)
+    job.start()
+
+    assert job.wait(0)
+    assert job.get_status()["state"] == COMPLETED
+
+
+@pytest.fixture()
+def historian(tmp_path):
+    bases = AggregateHistorian.__bases__
+    AggregateHistorian.__bases__ = (AgentMock.imitate(Agent, Agent()),)
+    config_path = tmp_path / "config"
+    config_path.write_text("{}")
+    historian = AggregateHistorian(str(config_path))
+    points = [{"aggregation_topic_name": "campus/building/rtu/zonetemp", "aggregation_type": "avg",
+               "topic_names": ["campus/building/rtu/zonetemp"], "topic_ids": [1]}]
+    historian._aggregation_groups = [("1h", False, points, utc(2020, 1, 2))]
+    historian.agg_topic_id_map = {("campus/building/rtu/zonetemp", "avg", "1h"): 10}
+    historian._backfill_progress = BackfillProgress(str(tmp_path / "backfill.sqlite"))
+    historian.collect_aggregate = MagicMock(return_value=(72.0, 3))
+    historian.insert_aggregate = MagicMock()
+    yield historian
+    AggregateHistorian.__bases__ = bases
+
+
+@pytest.mark.aggregator
+def test_backfill_on_historian_connection_should_use_one_worker(historian):
+    status = historian.backfill("2020-01-01T00:00:00", "2020-01-01T04:00:00", max_workers=4, chunk_size=1)
+    job = historian._backfill_jobs[status["job_id"]]
+
+    assert job.max_workers == 1
+    assert job.wait(5)
+    assert job.get_status()["completed_chunks"] == 4
+    assert historian.insert_aggregate.call_count == 4
+    # collect_topic_aggregates is not implemented, the live collection still tries grouped queries
+    assert historian._grouped_collection
@@ -0,0 +1,216 @@
+from datetime import datetime, timedelta
+
+import gevent
+import pytest
+import pytz
+from mock import MagicMock
+
+from volttron.platform.agent.base_aggregate_historian import AggregateHistorian
+from volttron.platform.agent.device_schema import make_schema
+from volttron.platform.agent.streaming_aggregate import Accumulator, StreamingAggregator
+from volttron.platform.dbutils.sqlitefuncts import SqlLiteFuncts
+from volttron.platform.messaging import headers as headers_mod
+from volttron.platform.vip.agent import Agent
+from volttrontesting.utils.utils import AgentMock
+
+FIRST_END = datetime(2023, 1, 1, 0, 1, tzinfo=pytz.utc)
+
+
+class CollectRecorder:
+    """
+    Stand in for AggregateHistorian.collect_aggregate returning a fixed result for every query
+    """
+    def __init__(self, result=(0, 0)):
+        self.result = result
+        self.calls = []
+
+    def __call__(self, topic_ids, agg_type, start_time, end_time):
+        self.calls.append((start_time, end_time))
+        return self.result
+
+
+def minute(n, second=0):
+    return FIRST_END + timedelta(minutes=n, seconds=second)
+
+
+@pytest.fixture()
+def aggregator(monkeypatch):
+    aggregator = StreamingAggregator()
+    # register as if the agent started after the first slice ended
+    monkeypatch.setattr("volttron.platform.agent.streaming_aggregate.get_aware_utc_now", lambda: minute(0, 30))
+    aggregator.register(10, [1, 2], "avg", "1m", FIRST_END)
+    monkeypatch.undo()
+    return aggregator
+
+
+@pytest.mark.aggregator
+@pytest.mark.parametrize(
+    "agg_type, expected",
+    [("avg", 2.5), ("sum", 10.0), ("min", 1), ("max", 4), ("count", 4)],
+)
+def test_accumulator_value(agg_type, expected):
+    accumulator = Accumulator()
+    for value in (3, 1, 4, 2):
+        accumulator.add(value)
+    assert accumulator.value(agg_type) == expected
+
+
+@pytest.fixture()
+def sqlitefuncts(tmp_path):
+    client = SqlLiteFuncts({"database": str(tmp_path / "historian.sqlite")},
+                           {"data_table": "data", "topics_table": "topics", "meta_table": "meta",
+                            "agg_topics_table": "aggregate_topics", "agg_meta_table": "aggregate_meta"})
+    client.setup_historian_tables()
+    client.insert_data(minute(0, 10), 1, 9)
+    client.insert_data(minute(0, 20), 1, 10)
+    client.commit()
+    yield client
+    client.close()
+
+
+@pytest.mark.aggregator
+def test_accumulator_should_merge_text_values():
+    accumulator = Accumulator()
+    accumulator.add(9.5)
+    accumulator.merge("min", "10", 1)
+    accumulator.merge("max", "10", 1)
+    accumulator.combine(2, "19", "9", "10")
+    assert accumulator.value("min") == 9.0
+    assert accumulator.value("max") == 10.0
+    assert accumulator.value("sum") == 28.5
+
+
+@pytest.mark.aggregator
+@pytest.mark.parametrize("agg_type, expected", [("min", (9.0, 3)), ("max", (11.0, 3))])
+def test_close_should_merge_database_min_max(monkeypatch, sqlitefuncts, agg_type, expected):
+    aggregator = StreamingAggregator()
+    monkeypatch.setattr("volttron.platform.agent.streaming_aggregate.get_aware_utc_now", lambda: minute(0, 30))
+    aggregator.register(10, [1], agg_type, "1m", FIRST_END)
+    monkeypatch.undo()
+    aggregator.add(1, minute(0, 40), 11.0)
+
+    assert aggregator.close(10, minute(0), minute(1), sqlitefuncts.collect_aggregate) == expected
+
+
+@pytest.mark.aggregator
+@pytest.mark.parametrize("agg_type", ["avg", "sum", "min", "count"])
+def test_values_that_are_not_numbers_should_be_counted_like_the_data_table(monkeypatch, sqlitefuncts, agg_type):
+    aggregator = StreamingAggregator()
+    monkeypatch.setattr("volttron.platform.agent.streaming_aggregate.get_aware_utc_now", lambda: minute(0))
+    aggregator.register(10, [1], agg_type, "1m", FIRST_END)
+    monkeypatch.undo()
+    sqlitefuncts.insert_data(minute(0, 30), 1, "on")
+    sqlitefuncts.insert_data(minute(0, 40), 1, True)
+    sqlitefuncts.commit()
+    for second, value in ((10, 9), (20, 10), (30, "on"), (40, True)):
+        aggregator.add(1, minute(0, second), value)
+
+    expected = sqlitefuncts.collect_aggregate([1], agg_type, minute(0), minute(1))
+    assert expected[1] == 4
+    assert aggregator.close(10, minute(0), minute(1), CollectRecorder()) == expected
+
+
+@pytest.mark.aggregator
+def test_close_should_merge_values_not_observed_live(aggregator):
+    for topic_id, value in ((1, 10.0), (2, 20.0), (3, 1000.0), (1, "on")):
+        aggregator.add(topic_id, minute(0, 40), value)
+    # 3 records with an average of 30 between the start of the slice and registration
+    collect = CollectRecorder((30.0, 3))
+
+    # "on" is counted like a text value of the data table
+    assert aggregator.close(10, minute(0), minute(1), collect) == (20.0, 6)
+    assert collect.calls == [(minute(0), minute(0, 30))]
+
+    # later slices are observed live entirely
+    aggregator.add(1, minute(1, 5), 7.0)
+    assert aggregator.close(10, minute(1), minute(2), collect) == (7.0, 1)
+    assert len(collect.calls) == 1
+
+
+@pytest.mark.aggregator
+def test_close_should_query_slice_without_live_data(aggregator):
+    aggregator.close(10, minute(0), minute(1), CollectRecorder())
+    collect = CollectRecorder((5.0, 2))
+
+    assert aggregator.close(10, minute(1), minute(2), collect) == (5.0, 2)
+    assert collect.calls == [(minute(1), minute(2))]
+
+
+@pytest.mark.aggregator
+def test_late_data_should_mark_bucket_dirty(aggregator):
+    aggregator.close(10, minute(0), minute(1), CollectRecorder())
+    aggregator.add(1, minute(0, 50), 1.0)
+    aggregator.add(1, minute(1, 10), 1.0)
+
+    assert aggregator.pop_dirty(10) == [minute(1)]
+    assert aggregator.pop_dirty(10) == []
+
+
+@pytest.mark.aggregator
+def test_checkpoint_should_restore_state_and_query_downtime(aggregator, tmp_path, monkeypatch):
+    aggregator.checkpoint_path = str(tmp_path / "state.json")
+    aggregator.close(10, minute(0), minute(1), CollectRecorder())
+    aggregator.add(1, minute(1, 10), 4.0)
+    monkeypatch.setattr("volttron.platform.agent.streaming_aggregate.get_aware_utc_now", lambda: minute(1, 20))
+    aggregator.checkpoint()
+
+    restored = StreamingAggregator(aggregator.checkpoint_path)
+    restored.restore()
+    monkeypatch.setattr("volttron.platform.agent.streaming_aggregate.get_aware_utc_now", lambda: minute(1, 40))
+    restored.register(10, [2, 1], "avg", "1m", minute(2))
+    restored.add(2, minute(1, 50), 8.0)
+    collect = CollectRecorder((6.0, 1))
+
+    assert restored.close(10, minute(1), minute(2), collect) == (6.0, 3)
+    assert collect.calls == [(minute(1, 20), minute(1, 40))]
+
+
+@pytest.mark.aggregator
+def test_register_should_discard_state_of_changed_point(aggregator):
+    aggregator.add(1, minute(1, 10), 4.0)
+    aggregator.reset_registrations()
+    aggregator.register(10, [1], "avg", "1m", minute(2))
+    collect = CollectRecorder((2.0, 1))
+
+    assert aggregator.close(10, minute(1), minute(2), collect) == (2.0, 1)
+    assert collect.calls == [(minute(1), minute(2))]
+
+
+@pytest.mark.aggregator
+def test_accumulator_combine_should_skip_topics_without_records():
+    accumulator = Accumulator()
+    for count, total, minimum, maximum in ((2, 6.0, 2.0, 4.0), (0, None, None, None), (1, 8.0, 8.0, 8.0)):
+        accumulator.combine(count, total, minimum, maximum)
+
+    assert accumulator.to_list() == [3, 14.0, 2.0, 8.0]
+
+
+@pytest.fixture()
+def historian(tmp_path):
+    bases = AggregateHistorian.__bases__
+    AggregateHistorian.__bases__ = (AgentMock.imitate(Agent, Agent()),)
+    config_path = tmp_path / "config"
+    config_path.write_text("{}")
+    historian = AggregateHistorian(str(config_path))
+    historian._streaming = MagicMock()
+    historian.topic_id_map = {"campus/building/rtu/zonetemp": 1, "campus/building/rtu/fan": 2}
+    historian.vip.rpc.call = MagicMock()
+    yield historian
+    AggregateHistorian.__bases__ = bases
+
+
+@pytest.mark.aggregator
+def test_compact_publish_should_be_aggregated(historian):
+    schema = make_schema({"ZoneTemp": {"units": "F"}, "Fan": {"units": None}})
+    headers = {headers_mod.TIMESTAMP: "2023-01-01T00:00:30+00:00", headers_mod.SCHEMA_ID: schema["id"]}
+    historian.vip.rpc.call.return_value.get.return_value = schema
+
+    # the schema is fetched from the platform driver
+    historian._capture_streaming_data("", "", "", "devices/campus/building/rtu/all", dict(headers), [1, 72.5])
+    gevent.sleep(0.1)
+    historian.vip.rpc.call.assert_called_once_with("platform.driver", "get_device_schema", "campus/building/rtu")
+    historian._capture_streaming_data("", "", "", "devices/campus/building/rtu/all", dict(headers), [0, 73.0])
+
+    timestamp = datetime(2023, 1, 1, 0, 0, 30, tzinfo=pytz.utc)
+    added = sorted(call[0] for call in historian._streaming.add.call_args_list)
+    assert added == [(1, timestamp, 72.5), (1, timestamp, 73.0), (2, timestamp, 0), (2, timestamp, 1)]
@@ -0,0 +1,111 @@
+from datetime import datetime, timedelta
+
+import pytest
+import pytz
+
+from volttron.platform.agent.tiered_retention import RollupTier, TieredRetention
+from volttron.platform.dbutils.basedb import DbDriver
+from volttron.platform.dbutils.redshiftfuncts import RedshiftFuncts
+from volttron.platform.dbutils.sqlitefuncts import SqlLiteFuncts
+
+TABLE_NAMES = {"data_table": "data", "topics_table": "topics", "meta_table": "topics",
+               "agg_topics_table": "aggregate_topics", "agg_meta_table": "aggregate_meta"}
+START = datetime(2023, 1, 1, tzinfo=pytz.UTC)
+RETENTION = {"raw_days": 30,
+             "rollups": [{"agg_period": "5m", "agg_types": ["avg", "min", "max"], "keep_days": 60},
+                         {"agg_period": "60m", "agg_types": ["avg"]}]}
+
+
+@pytest.fixture()
+def dbfuncts(tmp_path):
+    dbfuncts = SqlLiteFuncts({"database": str(tmp_path / "historian.sqlite")}, TABLE_NAMES)
+    dbfuncts.setup_historian_tables()
+    temp = dbfuncts.insert_topic("campus/rtu/ZoneTemp", metadata={"type": "float", "units": "F"})
+    mode = dbfuncts.insert_topic("campus/rtu/Mode", metadata={"type": "string"})
+    # one value per minute for two hours
+    for minute in range(120):
+        ts = START + timedelta(minutes=minute)
+        dbfuncts.insert_data(ts, temp, minute)
+        dbfuncts.insert_data(ts, mode, "cool")
+    dbfuncts.commit()
+    yield dbfuncts
+    dbfuncts.close()
+
+
+def query_agg(dbfuncts, topic, agg_type, agg_period):
+    agg_topic_id = dbfuncts.get_agg_topic_map()[(topic.lower(), agg_type, agg_period)]
+    return dbfuncts.query([agg_topic_id], {agg_topic_id: topic}, agg_type=agg_type, agg_period=agg_period)[topic]
+
+
+@pytest.mark.historian
+def test_tiers_should_be_validated():
+    assert RollupTier("60m").agg_period == "1h"
+    with pytest.raises(ValueError):
+        TieredRetention(30, [{"agg_period": "5m"}, {"agg_period": "7m"}])
+    with pytest.raises(ValueError):
+        TieredRetention(30, [{"agg_period": "1M"}])
+    with pytest.raises(ValueError):
+        TieredRetention(30, [{"agg_period": "5m", "agg_types": ["median"]}])
+    assert TieredRetention.from_config({}) is None
+
+
+@pytest.mark.historian
+@pytest.mark.parametrize("dbfuncts_class", [DbDriver, RedshiftFuncts])
+def test_unsupported_database_should_be_refused(dbfuncts_class):
+    with pytest.raises(ValueError, match="get_oldest_data_ts, delete_data_before"):
+        TieredRetention.check_support(dbfuncts_class)
+    TieredRetention.check_support(SqlLiteFuncts)
+
+
+@pytest.mark.historian
+def test_compact_should_write_rollups_before_deleting_raw_data(dbfuncts):
+    retention = TieredRetention.from_config(dict(RETENTION, compaction_hours=1))
+    now = START + timedelta(days=30, hours=3)
+
+    assert retention.compact(dbfuncts, now) == START + timedelta(hours=1)
+    # only the first hour was compacted
+    assert dbfuncts.get_oldest_data_ts() == START + timedelta(hours=1)
+    avg_5m = query_agg(dbfuncts, "campus/rtu/ZoneTemp", "avg", "5m")
+    assert len(avg_5m) == 12
+    assert avg_5m[0] == ("2023-01-01T00:05:00.000000+00:00", 2.0)
+    assert query_agg(dbfuncts, "campus/rtu/ZoneTemp", "max", "5m")[-1][1] == 59.0
+    assert query_agg(dbfuncts, "campus/rtu/ZoneTemp", "avg", "1h") == [("2023-01-01T01:00:00.000000+00:00", 29.5)]
+    # non numeric topics are not rolled up
+    assert ("campus/rtu/mode", "avg", "5m") not in dbfuncts.get_agg_topic_map()
+
+    assert retention.compact(dbfuncts, now) == START + timedelta(hours=2)
+    assert dbfuncts.get_oldest_data_ts() is None
+    assert len(query_agg(dbfuncts, "campus/rtu/ZoneTemp", "avg", "5m")) == 24
+    assert retention.compact(dbfuncts, now) is None
+
+
+@pytest.mark.historian
+def test_compact_should_expire_rollups(dbfuncts):
+    retention = TieredRetention.from_config(RETENTION)
+    retention.compact(dbfuncts, START + timedelta(days=31))
+
+    retention.compact(dbfuncts, START + timedelta(days=60, minutes=30))
+
+    # 5 minute rollups older than 60 days are deleted, hourly rollups are kept
+    assert len(query_agg(dbfuncts, "campus/rtu/ZoneTemp", "avg", "5m")) == 19
+    assert len(query_agg(dbfuncts, "campus/rtu/ZoneTemp", "avg", "1h")) == 2
+
+
+@pytest.mark.historian
+def test_late_data_should_not_replace_rollups(dbfuncts):
+    retention = TieredRetention.from_config(dict(RETENTION, compaction_hours=1))
+    now = START + timedelta(days=30, hours=3)
+    retention.compact(dbfuncts, now)
+    temp = dbfuncts.get_topic_map()[0]["campus/rtu/zonetemp"]
+
+    # published late for the compacted first hour
+    dbfuncts.insert_data(START + timedelta(minutes=2, seconds=30), temp, 1000)
+    dbfuncts.commit()
+    # the late data is compacted again and deleted
+    assert retention.compact(dbfuncts, now) == START + timedelta(hours=1)
+
+    assert dbfuncts.get_oldest_data_ts() == START + timedelta(hours=1)
+    avg_5m = query_agg(dbfuncts, "campus/rtu/ZoneTemp", "avg", "5m")
+    assert len(avg_5m) == 12
+    assert avg_5m[0] == ("2023-01-01T00:05:00.000000+00:00", 2.0)
+    assert query_agg(dbfuncts, "campus/rtu/ZoneTemp", "avg", "1h")[0] == ("2023-01-01T01:00:00.000000+00:00", 29.5)
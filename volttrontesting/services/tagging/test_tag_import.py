@@ -0,0 +1,96 @@
+import io
+import json
+
+import pytest
+
+from volttron.platform.agent import tag_import
+from volttron.platform.agent.tag_import import (batches, get_file_format, haystack_value, iter_json_rows,
+                                                read_tag_file)
+
+GRID = {
+    "meta": {"ver": "3.0", "rows": "not the rows"},
+    "cols": [{"name": "id"}, {"name": "dis"}, {"name": "equip"}, {"name": "siteRef"}],
+    "rows": [
+        {"id": "r:campus1/ahu1 AHU 1", "dis": "s:AHU 1", "equip": "m:", "siteRef": "r:campus1"},
+        {"id": {"_kind": "ref", "val": "campus1/ahu1/SAT"}, "point": {"_kind": "marker"},
+         "maxVal": {"_kind": "number", "val": 120, "unit": "°F"}, "minVal": "n:-5.5 °F", "curVal": "z:"},
+        {"topic": "campus1/ahu1/fan*", "point": "✓", "id": "r:ignored"},
+        {"dis": "s:no id"},
+    ],
+}
+
+
+@pytest.mark.tagging
+def test_read_csv_tags(tmp_path):
+    path = tmp_path / "tags.csv"
+    path.write_text("topic,tag,value\n"
+                    "campus1/ahu1,equip,\n"
+                    "campus1/ahu1,dis,AHU 1\n"
+                    "campus1/ahu1/SAT,maxVal,120\n"
+                    "campus1/ahu1/SAT,minVal,-5.5\n"
+                    "campus1/ahu1/SAT,writable,false\n")
+
+    assert list(read_tag_file(str(path))) == [
+        ("campus1/ahu1", {"equip": True}),
+        ("campus1/ahu1", {"dis": "AHU 1"}),
+        ("campus1/ahu1/SAT", {"maxVal": 120}),
+        ("campus1/ahu1/SAT", {"minVal": -5.5}),
+        ("campus1/ahu1/SAT", {"writable": False}),
+    ]
+
+
+@pytest.mark.tagging
+def test_read_csv_tags_should_require_columns(tmp_path):
+    path = tmp_path / "tags.csv"
+    path.write_text("topic,tag\ncampus1,campus\n")
+
+    with pytest.raises(ValueError):
+        list(read_tag_file(str(path)))
+
+
+@pytest.mark.tagging
+@pytest.mark.parametrize("file_name, lines", [("site.json", False), ("site.jsonl", True)])
+def test_read_haystack_json_tags(tmp_path, file_name, lines):
+    path = tmp_path / file_name
+    if lines:
+        path.write_text("\n".join(json.dumps(row) for row in GRID["rows"]) + "\n")
+    else:
+        path.write_text(json.dumps(GRID, indent=2))
+
+    assert list(read_tag_file(str(path))) == [
+        ("campus1/ahu1", {"dis": "AHU 1", "equip": True, "siteRef": "campus1"}),
+        ("campus1/ahu1/SAT", {"point": True, "maxVal": 120, "minVal": -5.5}),
+        ("campus1/ahu1/fan*", {"point": True}),
+    ]
+
+
+@pytest.mark.tagging
+def test_iter_json_rows_should_decode_across_blocks(monkeypatch):
+    monkeypatch.setattr(tag_import, "_READ_SIZE", 7)
+    rows = [{"id": "r:p{}".format(i), "maxVal": i * 1000} for i in range(50)]
+
+    assert list(iter_json_rows(io.StringIO(json.dumps({"meta": {}, "rows": rows})))) == rows
+    assert list(iter_json_rows(io.StringIO(json.dumps(rows)))) == rows
+    assert list(iter_json_rows(io.StringIO('{"rows": []}'))) == []
+
+
+@pytest.mark.tagging
+@pytest.mark.parametrize("value, expected", [("m:", True), ("n:72 °F", 72), ("n:1e3", 1000.0),
+                                             ("r:@site1 Site 1", "site1"), ("s:n:not a number", "n:not a number"),
+                                             ("plain", "plain"), (False, False), ({"_kind": "str", "val": "x"}, "x")])
+def test_haystack_value(value, expected):
+    assert haystack_value(value) == expected
+
+
+@pytest.mark.tagging
+def test_get_file_format():
+    assert get_file_format("/tmp/tags.CSV") == "csv"
+    assert get_file_format("/tmp/tags.ndjson") == "jsonl"
+    assert get_file_format("/tmp/tags.txt", "json") == "json"
+    with pytest.raises(ValueError):
+        get_file_format("/tmp/tags.txt")
+
+
+@pytest.mark.tagging
+def test_batches():
+    assert list(batches(iter(range(5)), 2)) == [[0, 1], [2, 3], [4]]
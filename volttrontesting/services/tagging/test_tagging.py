@@ -25,6 +25,8 @@
 pytest test cases for tagging service
 """
 import copy
+import json
+import os
 import sqlite3
 from datetime import datetime
 
@@ -1485,6 +1487,115 @@ def test_topic_by_tags_condition_errors(volttron_instance, tagging_service,
                             'number 1 and column number 12'
 
 
+@pytest.mark.parametrize("historian_config", historians)
+@pytest.mark.tagging
+def test_import_tags(volttron_instance, tagging_service, query_agent,
+                     historian_config):
+    global connection_type, db_connection
+    historian_id = None
+    new_tagging_id = None
+    tag_table_prefix = "import"
+    import_dir = os.path.join(volttron_instance.volttron_home, "tag_import")
+    os.makedirs(import_dir, exist_ok=True)
+    with open(os.path.join(import_dir, "tags.csv"), "w") as f:
+        f.write("topic,tag,value\n"
+                "campus1/d1,equip,\n"
+                "campus1/d1,dis,Device 1\n"
+                "campus1/d*/p*,point,\n"
+                "campus1/d1/p1,maxVal,120\n"
+                "campus1/d1/p1,invalidTag,1\n"
+                "campus3/d1,equip,\n")
+    grid = {"meta": {"ver": "3.0"},
+            "cols": [{"name": "id"}, {"name": "equip"}, {"name": "dis"}],
+            "rows": [{"id": "r:campus1/d2 Device 2", "equip": "m:",
+                      "dis": "s:Device 2"},
+                     {"id": {"_kind": "ref", "val": "campus1/d2/p2"},
+                      "maxVal": {"_kind": "number", "val": 80}}]}
+    with open(os.path.join(import_dir, "site.json"), "w") as f:
+        json.dump(grid, f)
+    try:
+        import_service = copy.copy(tagging_service)
+        import_service["tag_import_dir"] = import_dir
+        historian_id, historian_vip_identity, new_tagging_id, \
+        new_tagging_vip_id = \
+            setup_test_specific_agents(volttron_instance,
+                                       historian_config,
+                                       import_service,
+                                       tag_table_prefix)
+
+        now = utils.format_timestamp(datetime.utcnow())
+        headers = {headers_mod.DATE: now,
+                   headers_mod.TIMESTAMP: now}
+        to_send = [{'topic': 'devices/campus1/d1/all', 'headers': headers,
+                    'message': [{'p1': 2, 'p2': 2}]},
+                   {'topic': 'devices/campus1/d2/all', 'headers': headers,
+                    'message': [{'p1': 2, 'p2': 2}]}]
+        query_agent.vip.rpc.call(historian_vip_identity, 'insert',
+                                 to_send).get(timeout=10)
+        gevent.sleep(2)
+
+        result = query_agent.vip.rpc.call(new_tagging_vip_id, 'import_tags',
+                                          'tags.csv').get(timeout=10)
+        print(result)
+        # rows of a topic are merged into one record
+        assert result['records'] == 4
+        assert result['topics'] == 5
+        assert result['error_count'] == 2
+        assert set(result['error'].keys()) == {'campus1/d1/p1', 'campus3/d1'}
+
+        result = query_agent.vip.rpc.call(new_tagging_vip_id, 'import_tags',
+                                          'site.json').get(timeout=10)
+        print(result)
+        assert result['records'] == 2
+        assert result['error_count'] == 0
+
+        result1 = query_agent.vip.rpc.call(new_tagging_vip_id,
+                                           'get_tags_by_topic',
+                                           topic_prefix='campus1/d1', skip=0,
+                                           count=3,
+                                           order="FIRST_TO_LAST").get(
+            timeout=10)
+        print(result1)
+        assert result1[0] == ['dis', 'Device 1']
+        assert result1[1][0] == 'equip'
+        assert result1[1][1]
+        assert result1[2] == ['id', 'campus1/d1']
+
+        result1 = query_agent.vip.rpc.call(new_tagging_vip_id,
+                                           'get_tags_by_topic',
+                                           topic_prefix='campus1/d2/p2',
+                                           skip=0, count=3,
+                                           order="FIRST_TO_LAST").get(
+            timeout=10)
+        print(result1)
+        assert len(result1) == 3
+        assert result1[0] == ['id', 'campus1/d2/p2']
+        assert result1[1] == ['maxVal', 80]
+        assert result1[2][0] == 'point'
+        assert result1[2][1]
+
+        result1 = query_agent.vip.rpc.call(new_tagging_vip_id,
+                                           'get_topics_by_tags',
+                                           and_condition=['equip']).get(
+            timeout=10)
+        assert set(result1) == {'campus1/d1', 'campus1/d2'}
+
+        # only files of the import directory can be imported
+        try:
+            query_agent.vip.rpc.call(new_tagging_vip_id, 'import_tags',
+                                     '../tag_import/../config').get(timeout=10)
+            pytest.fail("Expected value error. Got none")
+        except RemoteError as e:
+            assert e.exc_info['exc_type'].endswith("ValueError")
+    finally:
+        cleanup_function = globals()["cleanup_" + connection_type]
+        cleanup_function(db_connection, [tag_table_prefix + '_topic_tags'])
+        if historian_id:
+            volttron_instance.remove_agent(historian_id)
+        if new_tagging_id:
+            volttron_instance.remove_agent(new_tagging_id)
+
+
 def setup_test_specific_agents(volttron_instance, historian_config,
                                tagging_service, table_prefix):
     new_tag_service = copy.copy(tagging_service)
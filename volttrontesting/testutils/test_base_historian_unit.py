@@ -3,6 +3,7 @@ import os
 from shutil import rmtree
 from pathlib import Path
 
+import gevent
 import pytest
 from pytz import UTC
 
@@ -51,7 +52,6 @@ def test_base_historian_agent_should_filter_duplicates(base_historian_agent):
     # Since this is a unit test, we have to "manually start" the base_historian to get the workflow going
     base_historian_agent.start_process_thread()
     # Adding sleep to ensure that all data gets published in the cache before testing
-    import gevent
     gevent.sleep(0.5)
 
     expected_to_publish_list = [
@@ -87,17 +87,73 @@ def test_base_historian_agent_should_filter_duplicates(base_historian_agent):
     assert base_historian_agent.last_to_publish_list == expected_to_publish_list
 
 
+def cache_query(query_cache, topic, start, end):
+    query_cache.put(topic, [topic], start, end, {"values": []}, query_cache.get_watermarks([topic]))
+
+
+def publish_record(base_historian_agent, topic, timestamp):
+    base_historian_agent._capture_record_data(peer=None, sender=None, bus=None, topic=topic,
+                                              headers={"Date": timestamp, "TimeStamp": timestamp}, message="value")
+
+
+def test_base_historian_agent_should_invalidate_query_cache_on_publish(base_historian_agent):
+    base_historian_agent._query_cache_size = 10
+    base_historian_agent._set_query_cache()
+    query_cache = base_historian_agent._query_cache
+    start = datetime.datetime(2020, 11, 17, tzinfo=UTC)
+    end = datetime.datetime(2020, 11, 18, tzinfo=UTC)
+    for topic in ("written_topic", "other_topic"):
+        cache_query(query_cache, topic, start, end)
+
+    publish_record(base_historian_agent, "written_topic", "2020-11-17 21:24:10.189393+00:00")
+    # run the process loop in this thread until the record is published
+    base_historian_agent.stop_after_publish = True
+    base_historian_agent._do_process_loop()
+
+    assert base_historian_agent.last_to_publish_list[0]["topic"] == "written_topic"
+    assert query_cache.get("written_topic") is None
+    assert query_cache.get("other_topic") == {"values": []}
+
+
+def test_base_historian_agent_should_invalidate_query_cache_on_removal(base_historian_agent):
+    base_historian_agent._query_cache_size = 10
+    base_historian_agent._set_query_cache()
+    query_cache = base_historian_agent._query_cache
+    cache_query(query_cache, "old_window", datetime.datetime(2020, 1, 1, tzinfo=UTC),
+                datetime.datetime(2020, 2, 1, tzinfo=UTC))
+    cache_query(query_cache, "all_data", None, datetime.datetime(2020, 6, 1, tzinfo=UTC))
+    cache_query(query_cache, "new_window", datetime.datetime(2020, 5, 1, tzinfo=UTC),
+                datetime.datetime(2020, 6, 1, tzinfo=UTC))
+
+    # the historian removed the data before March
+    base_historian_agent.removed_before = datetime.datetime(2020, 3, 1, tzinfo=UTC)
+    publish_record(base_historian_agent, "written_topic", "2020-11-17 21:24:10.189393+00:00")
+    base_historian_agent.stop_after_publish = True
+    base_historian_agent._do_process_loop()
+
+    assert query_cache.get("old_window") is None
+    assert query_cache.get("all_data") is None
+    assert query_cache.get("new_window") == {"values": []}
+
+
 BaseHistorianAgent.__bases__ = (AgentMock.imitate(Agent, Agent()),)
 
 
 class BaseHistorianAgentTestWrapper(BaseHistorianAgent):
     def __init__(self, **kwargs):
         self.last_to_publish_list = ""
+        self.stop_after_publish = False
+        self.removed_before = None
         super(BaseHistorianAgentTestWrapper, self).__init__(**kwargs)
 
     def publish_to_historian(self, to_publish_list):
         self.report_all_handled()
         self.last_to_publish_list = to_publish_list
+        if self.stop_after_publish:
+            self._stop_process_loop = True
+
+    def manage_db_size(self, history_limit_timestamp, storage_limit_gb):
+        return self.removed_before
 
 
 @pytest.fixture()